@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Test et micro-benchmark du moteur d'alertes (backend/alert_engine.py)
+
+Vérifie les transitions (seuil tenu for_s, hystérésis, variation, absence,
+points hors ordre, reprise de l'état depuis la base, fenêtres et absence vues
+par plusieurs workers via le flux partagé de metrics, relu sans doublon par
+id), leur regroupement par
+empreinte (une écriture par problème et par lot) puis mesure le débit
+d'ingestion: échantillons par seconde sur plusieurs tenants, projets et règles.
+Aucun serveur ni PostgreSQL requis.
+
+Usage:
+    python Script_test/bench_alert_engine.py
+    python Script_test/bench_alert_engine.py --samples 2000000 --rules 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from alert_engine import AlertEngine, AlertRule, coalesce_events, fingerprint  # noqa: E402
+from hot_tier import MetricsCursor  # noqa: E402
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def actions(events):
+    return [(event.action, event.rule.id, event.project_id) for event in events]
+
+
+def test_transitions():
+    ok = True
+    engine = AlertEngine()
+    engine.load_rules([
+        AlertRule('cpu', 'c1', 'cpu_usage', threshold=90, clear_threshold=80, window_s=10, for_s=5),
+        AlertRule('rate', 'c1', 'errors', kind='rate', threshold=5, window_s=10),
+        AlertRule('hb', 'c1', 'heartbeat', kind='absence', window_s=30),
+        AlertRule('lat', 'c1', 'latency', aggregation='max', threshold=500, window_s=5, project_id='p2'),
+    ])
+
+    opened = engine.ingest('c1', [('p1', 'cpu_usage', t, 95.0) for t in range(0, 7)])
+    ok &= check(actions(opened) == [('open', 'cpu', 'p1')] and opened[0].ts == 5,
+                "Seuil: alerte ouverte quand la condition tient depuis for_s")
+    ok &= check(not engine.ingest('c1', [('p1', 'cpu_usage', t, 85.0) for t in range(7, 30)]),
+                "Hystérésis: pas de résolution entre le seuil de retour et le seuil")
+    ok &= check(actions(engine.ingest('c1', [('p1', 'cpu_usage', t, 70.0) for t in range(30, 45)]))
+                == [('resolve', 'cpu', 'p1')], "Résolution sous le seuil de retour")
+    ok &= check(not engine.ingest('c2', [('p1', 'cpu_usage', 50, 99.0)]), "Règles isolées par tenant")
+
+    engine.ingest('c1', [('p1', 'errors', 100, 10.0)])
+    ok &= check(actions(engine.ingest('c1', [('p1', 'errors', 102, 30.0)])) == [('open', 'rate', 'p1')],
+                "Variation: (30 - 10) / 2 s > 5")
+
+    events = engine.ingest('c1', [('p1', 'latency', 1, 900.0), ('p2', 'latency', 1, 900.0), ('p2', 'latency', 7, 10.0)])
+    ok &= check(actions(events) == [('open', 'lat', 'p2'), ('resolve', 'lat', 'p2')],
+                "Règle de projet: max sur la fenêtre, autres projets ignorés")
+
+    engine.ingest('c1', [('p1', 'heartbeat', 100, 1.0)])
+    ok &= check(not engine.tick(120), "Absence: rien avant window_s")
+    ok &= check(actions(engine.tick(131)) == [('open', 'hb', 'p1')], "Absence: alerte après window_s sans point")
+    ok &= check(actions(engine.ingest('c1', [('p1', 'heartbeat', 140, 1.0)])) == [('resolve', 'hb', 'p1')],
+                "Absence: résolue au point suivant")
+
+    before = engine.stats['out_of_order']
+    engine.ingest('c1', [('p1', 'cpu_usage', 3, 1.0)])
+    ok &= check(engine.stats['out_of_order'] == before + 1, "Point plus ancien que la série: ignoré")
+
+    # Alerte ouverte par un autre worker puis résolue en base: l'état local suit la base
+    engine.load_rules(list(engine._rules.values()), firing=[('cpu', 'p3')])
+    ok &= check(actions(engine.ingest('c1', [('p3', 'cpu_usage', 200, 10.0)])) == [('resolve', 'cpu', 'p3')],
+                "Rechargement: alerte ouverte en base résolue par ce worker")
+    engine.load_rules(list(engine._rules.values()), firing=[])
+    ok &= check(engine.snapshot()['firing'] == 0, "Rechargement: alertes résolues ailleurs oubliées")
+    engine.remove_rule('cpu')
+    ok &= check(not engine.ingest('c1', [('p1', 'cpu_usage', 300, 99.0)]), "Règle supprimée: plus évaluée")
+    return ok
+
+
+def test_workers():
+    """Deux workers: l'agent n'envoie ses points qu'à B, A les voit par le suivi de metrics"""
+    ok = True
+    rule = AlertRule('hb', 'c1', 'heartbeat', kind='absence', window_s=30)
+    worker_a, worker_b = AlertEngine(), AlertEngine()
+    worker_a.load_rules([rule])
+    worker_b.load_rules([rule])
+    worker_a.ingest('c1', [('p1', 'heartbeat', 0, 1.0)])
+    opened = []
+    for t in range(10, 300, 10):
+        sample = [('p1', 'heartbeat', t, 1.0)]
+        worker_b.ingest('c1', sample)
+        worker_a.follow('c1', sample, now=t + 2)  # Suivi toutes les 2 s
+        opened += worker_a.tick(t + 5) + worker_b.tick(t + 5)
+    ok &= check(not opened, "Absence: pas d'alerte sur A tant que B reçoit les points")
+
+    # L'agent s'arrête: les deux workers ouvrent la même empreinte (écriture idempotente)
+    events = worker_a.tick(330) + worker_b.tick(330)
+    ok &= check(actions(events) == [('open', 'hb', 'p1')] * 2, "Absence: ouverte par chaque worker une fois l'agent muet")
+    ok &= check(not worker_a.follow('c1', [('p1', 'heartbeat', 290, 1.0)], now=331),
+                "Point relu plus ancien que window_s: l'absence reste ouverte")
+    ok &= check(actions(worker_a.follow('c1', [('p1', 'heartbeat', 340, 1.0)], now=342)) == [('resolve', 'hb', 'p1')],
+                "Absence résolue par un point reçu sur un autre worker")
+    return ok
+
+
+def follow(engine, cursor, table, now):
+    """Passage du suivi (follow_hot_tier_shard): lignes validées d'id > since, dans l'ordre des id"""
+    rows = sorted((row for row in table if row['id'] > cursor.since()), key=lambda row: row['id'])
+    samples = [(row['project_id'], row['metric_name'], row['ts'], row['value']) for row in cursor.fresh(rows)]
+    return engine.follow('c1', samples, now=now)
+
+
+def test_follow_stream():
+    """L'agent répartit ses points entre A (100) et B (70): moyenne réelle 85, sous le seuil"""
+    ok = True
+    rule = AlertRule('cpu', 'c1', 'cpu_usage', threshold=90, window_s=20)
+    local_a = AlertEngine()
+    local_a.load_rules([rule])
+    opened = []
+    for t in range(0, 60, 2):
+        if t % 4 == 2:
+            opened += local_a.ingest('c1', [('p1', 'cpu_usage', t, 100.0)])
+    ok &= check(actions(opened) == [('open', 'cpu', 'p1')],
+                "Évaluation à l'ingestion: A ne voit que ses points (un seul worker ou routage collant requis)")
+
+    workers = [AlertEngine(), AlertEngine()]
+    cursors = [MetricsCursor(0, rewind=5), MetricsCursor(0, rewind=5)]
+    for worker in workers:
+        worker.load_rules([rule])
+    table = []
+    opened = []
+    for i, t in enumerate(range(0, 60, 2)):
+        table.append({'id': i + 1, 'project_id': 'p1', 'metric_name': 'cpu_usage', 'ts': t,
+                      'value': 100.0 if t % 4 == 2 else 70.0})
+        for worker, cursor in zip(workers, cursors):
+            opened += follow(worker, cursor, table, t + 1)
+    ok &= check(not opened, "Suivi de metrics: chaque worker évalue la moyenne de tous les points (85)")
+    ok &= check(all(worker.stats['evaluations'] == 30 for worker in workers),
+                "Relecture des REWIND derniers id: chaque point évalué une seule fois")
+
+    # Ligne 32 validée avant la ligne 31 (transaction plus longue): relue au passage suivant
+    table.append({'id': 32, 'project_id': 'p1', 'metric_name': 'cpu_usage', 'ts': 62, 'value': 200.0})
+    events = [follow(worker, cursor, table, 63) for worker, cursor in zip(workers, cursors)]
+    table.append({'id': 31, 'project_id': 'p1', 'metric_name': 'cpu_usage', 'ts': 61, 'value': 200.0})
+    events += [follow(worker, cursor, table, 64) for worker, cursor in zip(workers, cursors)]
+    ok &= check(all(cursor.watermark == 32 and 31 in cursor.applied for cursor in cursors),
+                "Ligne validée en retard sous le watermark: transmise au passage suivant")
+    ok &= check([actions(worker_events) for worker_events in events] == [[('open', 'cpu', 'p1')]] * 2 + [[], []],
+                "Seuil franchi: la même ouverture sur chaque worker (écriture idempotente)")
+    opened = []
+    for t in range(64, 80, 2):
+        table.append({'id': len(table) + 1, 'project_id': 'p1', 'metric_name': 'cpu_usage', 'ts': t, 'value': 95.0})
+        for worker, cursor in zip(workers, cursors):
+            opened += follow(worker, cursor, table, t + 1)
+    ok &= check(not opened, "Alerte ouverte: pas de seconde ouverture à la relecture")
+    ok &= check(all(len(cursor.applied) <= cursor.rewind for cursor in cursors), "Id retenus bornés par REWIND")
+    return ok
+
+
+def test_dedup():
+    ok = True
+    rule = AlertRule('flap', 'c1', 'latency', aggregation='last', threshold=500)
+    other = AlertRule('cpu', 'c1', 'cpu_usage', aggregation='last', threshold=90)
+    ok &= check(fingerprint('p1', 'flap', rule.labels) == fingerprint('p1', 'flap', {'metric_name': 'latency'})
+                != fingerprint('p2', 'flap', rule.labels), "Empreinte: projet + règle + labels")
+
+    engine = AlertEngine()
+    engine.load_rules([rule, other])
+    # Service instable: 1000 ouvertures / résolutions sur un projet, une alerte CPU ailleurs
+    samples = [('p1', 'latency', t, 900.0 if t % 2 == 0 else 100.0) for t in range(2000)]
+    samples.append(('p2', 'cpu_usage', 2000, 95.0))
+    events = engine.ingest('c1', samples)
+    updates = coalesce_events(events)
+    ok &= check(len(events) == 2001 and len(updates) == 2,
+                f"{len(events)} transitions -> {len(updates)} écritures (une par problème)")
+    flap = updates[0]
+    ok &= check(flap.occurrences == 1000 and flap.resolved, "Occurrences cumulées, état final résolu")
+    ok &= check(updates[1].occurrences == 1 and not updates[1].resolved, "Autre problème: ouvert une fois")
+    return ok
+
+
+def bench(total, tenants, projects, rules_per_tenant, batch):
+    rng = random.Random(42)
+    metrics = ['cpu_usage', 'memory_usage', 'latency', 'errors']
+    rules = []
+    for tenant in range(tenants):
+        for i in range(rules_per_tenant):
+            metric = metrics[i % len(metrics)]
+            kind = 'rate' if i % 7 == 6 else 'threshold'
+            rules.append(AlertRule(f"r{tenant}-{i}", f"c{tenant}", metric, kind=kind,
+                                   aggregation=('avg', 'max', 'min', 'last')[i % 4],
+                                   threshold=80 + i % 20, clear_threshold=70, window_s=60, for_s=i % 3 * 10))
+    engine = AlertEngine()
+    engine.load_rules(rules)
+
+    batches = []
+    ts = 0.0
+    for _ in range(total // batch):
+        tenant = f"c{rng.randrange(tenants)}"
+        samples = []
+        for _ in range(batch):
+            ts += 0.01
+            samples.append((f"p{rng.randrange(projects)}", rng.choice(metrics), ts, rng.gauss(60, 25)))
+        batches.append((tenant, samples))
+
+    started = time.perf_counter()
+    events = 0
+    for tenant, samples in batches:
+        events += len(engine.ingest(tenant, samples))
+    elapsed = time.perf_counter() - started
+    ingested = len(batches) * batch
+    snapshot = engine.snapshot()
+    print(f"📈 {ingested} échantillons en {elapsed:.2f}s: {ingested / elapsed:,.0f} échantillons/s, "
+          f"{snapshot['stats']['evaluations'] / elapsed:,.0f} évaluations/s")
+    print(f"   {snapshot['series']} séries, {snapshot['window_points']} points en fenêtre, {events} transitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test et débit du moteur d'alertes")
+    parser.add_argument('--samples', type=int, default=500000)
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=50)
+    parser.add_argument('--rules', type=int, default=10, help="Règles par tenant")
+    parser.add_argument('--batch', type=int, default=1000, help="Points par requête POST /api/metrics")
+    args = parser.parse_args()
+
+    ok = test_transitions()
+    ok &= test_workers()
+    ok &= test_follow_stream()
+    ok &= test_dedup()
+    bench(args.samples, args.tenants, args.projects, args.rules, args.batch)
+    print("🎉 Moteur d'alertes OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
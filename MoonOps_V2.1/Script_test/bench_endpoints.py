@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark des routes de backend/app.py
+
+Exécute chaque route via le client de test Flask contre un PostgreSQL local
+(données de démo de database/init.sql ou database/generate_dataset.py) et
+mesure par route : distribution des latences, mémoire allouée par requête,
+allers-retours DB par requête. Les résultats sont comparés à une référence
+stockée (bench_baseline.json) pour détecter les régressions des routes chaudes.
+
+GitLab est remplacé par des dépôts Git nus locaux (file://) pour que les
+routes de création mesurent le vrai travail git sans dépendre du réseau.
+
+Usage:
+    python Script_test/bench_endpoints.py                      # compare à la référence
+    python Script_test/bench_endpoints.py --update-baseline    # enregistre la référence
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+ADMIN_TOKEN = 'bench-admin-token'
+
+os.environ.setdefault('MOONOPS_ADMIN_TOKEN', ADMIN_TOKEN)
+sys.path.insert(0, BACKEND_DIR)
+
+import app as moonops  # noqa: E402
+from query_log import QUERY_LOG  # noqa: E402
+
+# Routes chaudes: tolérance plus stricte
+HOT_ROUTES = {'GET /api/stats', 'GET /api/projects', 'GET /api/dashboard', 'GET /api/metrics/<id>', 'POST /api/deploy'}
+
+# Tolérances de régression (relatives, avec un plancher absolu en ms)
+LATENCY_TOLERANCE = {'hot': 0.15, 'default': 0.30}
+LATENCY_FLOOR_MS = 1.0
+MEMORY_TOLERANCE = 0.25
+
+
+class LocalGitLab:
+    """Remplace la création de dépôts GitLab par des dépôts nus locaux"""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix='moonops_bench_gitlab_')
+        self.counter = 0
+
+    def create_repository(self, project_name, description="", client_id=None):
+        self.counter += 1
+        name = f"{project_name}-{self.counter}"
+        path = os.path.join(self.root, f"{name}.git")
+        subprocess.run(['git', 'init', '--bare', '-q', path], check=True)
+        return {
+            'repo_id': self.counter,
+            'name': name,
+            'ssh_url': path,
+            'http_url': path,
+            'web_url': f"file://{path}",
+        }
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class Counters:
+    """Compte les connexions ouvertes par get_db (allers-retours hors db_query)"""
+
+    def __init__(self):
+        self.connections = 0
+        self._get_db = moonops.get_db
+
+    def install(self):
+        def counting_get_db():
+            self.connections += 1
+            return self._get_db()
+        moonops.get_db = counting_get_db
+
+    def uninstall(self):
+        moonops.get_db = self._get_db
+
+
+def make_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('bench/README.md', '# Bench\n')
+        zf.writestr('bench/package.json', '{"name": "bench", "version": "1.0.0"}')
+        for i in range(20):
+            zf.writestr(f'bench/src/module_{i}.js', f'export const value{i} = {i};\n' * 50)
+    return buffer.getvalue()
+
+
+def build_scenarios(client):
+    """(nom, itérations, fonction de requête) pour chaque route"""
+    projects = client.get('/api/projects').get_json() or []
+    if not projects:
+        raise SystemExit("❌ Aucun projet pour le client courant: charger database/init.sql d'abord")
+    project_id = projects[0]['id']
+    zip_bytes = make_zip()
+    admin = {'X-Admin-Token': os.environ['MOONOPS_ADMIN_TOKEN']}
+
+    def create_and_delete():
+        created = client.post('/api/projects', json={'name': 'bench-delete', 'template_type': 'web'}).get_json()
+        return client.delete(f"/api/projects/{created['project_id']}")
+
+    return [
+        ('GET /api/health', 200, lambda: client.get('/api/health')),
+        ('POST /api/auth/login', 20, lambda: client.post(
+            '/api/auth/login', json={'email': 'admin@techconsulting.fr', 'password': 'demo2026'})),
+        ('GET /api/projects', 200, lambda: client.get('/api/projects')),
+        ('GET /api/stats', 200, lambda: client.get('/api/stats')),
+        ('GET /api/dashboard', 200, lambda: client.get('/api/dashboard?include=stats,projects')),
+        ('GET /api/deployments', 200, lambda: client.get('/api/deployments')),
+        ('GET /api/pipelines', 200, lambda: client.get('/api/pipelines')),
+        ('GET /api/alerts', 200, lambda: client.get('/api/alerts')),
+        ('GET /api/metrics/<id>', 200, lambda: client.get(f'/api/metrics/{project_id}')),
+        ('POST /api/deploy', 50, lambda: client.post(
+            '/api/deploy', json={'project_id': project_id, 'environment': 'STAGING'})),
+        ('POST /api/projects', 10, lambda: client.post(
+            '/api/projects', json={'name': 'bench-project', 'template_type': 'api'})),
+        ('DELETE /api/projects/<id>', 10, create_and_delete),
+        ('POST /api/projects/upload', 5, lambda: client.post(
+            '/api/projects/upload',
+            data={'name': 'bench-upload', 'template_type': 'web',
+                  'file': (io.BytesIO(zip_bytes), 'bench.zip')},
+            content_type='multipart/form-data')),
+        ('GET /api/admin/slow-queries', 50, lambda: client.get('/api/admin/slow-queries', headers=admin)),
+        ('GET /api/admin/profiling', 50, lambda: client.get('/api/admin/profiling', headers=admin)),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def run_scenario(name, iterations, call, counters, warmup=3):
+    """Passe 1: latences (sans tracemalloc). Passe 2: mémoire et allers-retours DB."""
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+
+    sample = max(1, min(iterations, 20))
+    statements, connections, peaks, blocks = [], [], [], []
+    tracemalloc.start()
+    try:
+        for _ in range(sample):
+            statements_before = QUERY_LOG.stats['statements']
+            connections_before = counters.connections
+            blocks_before = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            current_before, _ = tracemalloc.get_traced_memory()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current_before)
+            blocks.append(sys.getallocatedblocks() - blocks_before)
+            statements.append(QUERY_LOG.stats['statements'] - statements_before)
+            connections.append(counters.connections - connections_before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1),
+        'retained_blocks': int(statistics.median(blocks)),
+        'db_statements': max(statements),
+        'db_connections': max(connections),
+    }
+
+
+def compare(results, baseline):
+    """Retourne la liste des régressions par rapport à la référence"""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        tolerance = LATENCY_TOLERANCE['hot' if name in HOT_ROUTES else 'default']
+        for key in ('p50_ms', 'p95_ms'):
+            limit = max(reference[key] * (1 + tolerance), reference[key] + LATENCY_FLOOR_MS)
+            if current[key] > limit:
+                regressions.append(f"{name}: {key} {current[key]} > {limit:.3f} (référence {reference[key]})")
+        if current['peak_alloc_kib'] > reference['peak_alloc_kib'] * (1 + MEMORY_TOLERANCE) + 1:
+            regressions.append(f"{name}: mémoire {current['peak_alloc_kib']} KiB "
+                               f"(référence {reference['peak_alloc_kib']} KiB)")
+        for key in ('db_statements', 'db_connections'):
+            if current[key] > reference[key]:
+                regressions.append(f"{name}: {key} {current[key]} > {reference[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark des routes MoonOps")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--only', help="Sous-chaîne filtrant les routes à mesurer")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplicateur du nombre d'itérations")
+    parser.add_argument('--output', help="Écrire les résultats JSON dans ce fichier")
+    args = parser.parse_args()
+
+    print("⏱️ Micro-benchmark MoonOps")
+    print("=" * 50)
+
+    gitlab = LocalGitLab()
+    original_create = moonops.create_gitlab_repository
+    moonops.create_gitlab_repository = gitlab.create_repository
+    counters = Counters()
+    counters.install()
+    results = {}
+    try:
+        client = moonops.app.test_client()
+        for name, iterations, call in build_scenarios(client):
+            if args.only and args.only not in name:
+                continue
+            result = run_scenario(name, max(1, int(iterations * args.scale)), call, counters)
+            results[name] = result
+            flag = '🔥' if name in HOT_ROUTES else '  '
+            print(f"{flag} {name:32} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                  f"{result['peak_alloc_kib']:8.1f} KiB  {result['db_statements']} SQL / "
+                  f"{result['db_connections']} conn  {result['errors']} err")
+    finally:
+        counters.uninstall()
+        moonops.create_gitlab_repository = original_create
+        gitlab.cleanup()
+        # Projets créés par le benchmark (cascade sur environnements, pipelines...)
+        moonops.db_query("DELETE FROM projects WHERE name IN ('bench-project', 'bench-upload', 'bench-delete')")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print("=" * 50)
+    if args.update_baseline or not os.path.exists(args.baseline):
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"💾 Référence enregistrée: {args.baseline}")
+        return True
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline)
+    if regressions:
+        print(f"❌ {len(regressions)} régression(s):")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return False
+    print("🎉 Aucune régression par rapport à la référence")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
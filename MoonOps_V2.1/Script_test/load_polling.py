@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Générateur de charge et d'endurance MoonOps
+
+Simule des sessions utilisateur qui reproduisent le polling du frontend React :
+- DashboardOverview : /api/dashboard (stats + projets) au chargement
+- CICDModule        : /api/dashboard (projets + déploiements), puis /api/deployments
+- MonitoringModule  : /api/metrics/<id> + /api/alerts toutes les 30 s (setInterval)
+- SecurityModule    : /api/alerts toutes les 30 s (setInterval)
+- ProjectsModule    : /api/projects au chargement, déploiement occasionnel
+
+Les utilisateurs sont répartis sur plusieurs tenants (loi de Zipf) via l'en-tête
+X-Client-Id (serveur lancé avec MOONOPS_TRUST_CLIENT_HEADER=1). Rapporte débit,
+latences p50/p95/p99 par route, taux d'erreur et croissance mémoire (RSS) du
+processus serveur. Fonctionne entièrement hors ligne contre la stack locale.
+
+Usage:
+    MOONOPS_TRUST_CLIENT_HEADER=1 python backend/app.py &
+    python Script_test/load_polling.py --users 500 --duration 3600 --server-pid $!
+"""
+import argparse
+import bisect
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+
+import requests
+
+API_BASE = "http://localhost:5000"
+
+DEMO_CLIENTS = [
+    'fcb79070-fca6-4367-8f74-fa138223fa97',  # TechConsulting
+    'ae89d37b-8b81-46d4-acf4-9bf17e3342db',  # ClientA
+    'ff8f1b6d-8afc-4abf-97e4-22b73f69343a',  # ClientB
+]
+
+# Écrans: requêtes au chargement, requêtes de polling, période de polling (s)
+SCREENS = {
+    'dashboard': (['/api/dashboard?include=stats,projects'], [], None),
+    'cicd': (['/api/dashboard?include=projects,deployments'], ['/api/deployments'], 30),
+    'monitoring': (['/api/projects', '/api/metrics/{project_id}', '/api/alerts'],
+                   ['/api/metrics/{project_id}', '/api/alerts'], 30),
+    'security': (['/api/alerts'], ['/api/alerts'], 30),
+    'projects': (['/api/projects'], [], None),
+}
+# Probabilités de navigation (écran de départ: dashboard)
+SCREEN_WEIGHTS = {'dashboard': 30, 'cicd': 20, 'monitoring': 25, 'security': 10, 'projects': 15}
+DEPLOY_PROBABILITY = 0.05  # par visite de l'écran projets
+
+
+class Histogram:
+    """Histogramme logarithmique (mémoire constante sur des heures de test)"""
+
+    BUCKETS_PER_DECADE = 50
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value_ms):
+        bucket = int(math.log10(max(value_ms, 0.01)) * self.BUCKETS_PER_DECADE)
+        self.counts[bucket] += 1
+        self.total += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, pct):
+        if not self.total:
+            return 0.0
+        target = self.total * pct / 100
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return 10 ** ((bucket + 1) / self.BUCKETS_PER_DECADE)
+        return self.max
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.status = collections.Counter()
+
+
+class Recorder:
+    """Statistiques globales (cumul) et de la fenêtre de rapport courante"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = collections.defaultdict(RouteStats)
+        self.window = collections.defaultdict(RouteStats)
+
+    def record(self, route, latency_ms, status):
+        with self._lock:
+            for stats in (self.total[route], self.window[route]):
+                stats.latency.add(latency_ms)
+                stats.status[status] += 1
+                if status == 0 or status >= 500:
+                    stats.errors += 1
+
+    def take_window(self):
+        with self._lock:
+            window, self.window = self.window, collections.defaultdict(RouteStats)
+        return window
+
+
+class VirtualUser:
+    """Session utilisateur: navigation entre écrans et polling de l'écran courant"""
+
+    def __init__(self, user_id, client_id, rng, think_time):
+        self.user_id = user_id
+        self.client_id = client_id
+        self.rng = rng
+        self.think_time = think_time
+        self.screen = 'dashboard'
+        self.screen_until = 0.0
+        self.project_id = None
+        self.session = requests.Session()
+        self.session.headers['X-Client-Id'] = client_id
+
+    def next_screen(self):
+        screens = list(SCREEN_WEIGHTS)
+        return self.rng.choices(screens, weights=[SCREEN_WEIGHTS[s] for s in screens])[0]
+
+
+class LoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.recorder = Recorder()
+        self.rng = random.Random(args.seed)
+        self._events = []
+        self._counter = itertools.count()
+        self._lock = threading.Condition()
+        self.stop_at = None
+        self.rss_samples = []
+
+    # --- Planification ---
+
+    def schedule(self, when, user, action):
+        with self._lock:
+            heapq.heappush(self._events, (when, next(self._counter), user, action))
+            self._lock.notify()
+
+    def _next_due(self):
+        with self._lock:
+            while True:
+                if time.monotonic() >= self.stop_at:
+                    return None
+                if self._events and self._events[0][0] <= time.monotonic():
+                    return heapq.heappop(self._events)
+                timeout = self._events[0][0] - time.monotonic() if self._events else 0.5
+                self._lock.wait(timeout=max(0.001, min(timeout, 0.5)))
+
+    # --- Requêtes ---
+
+    def request(self, user, method, path, **kwargs):
+        route = path.replace(str(user.project_id), '<id>') if user.project_id else path
+        started = time.perf_counter()
+        try:
+            response = user.session.request(method, f"{self.args.base_url}{path}", timeout=self.args.timeout, **kwargs)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            response, status = None, 0
+        self.recorder.record(f"{method} {route}", (time.perf_counter() - started) * 1000, status)
+        return response
+
+    def fetch_all(self, user, paths):
+        for path in paths:
+            if '{project_id}' in path:
+                if not user.project_id:
+                    continue
+                path = path.format(project_id=user.project_id)
+            response = self.request(user, 'GET', path)
+            if response is None or response.status_code != 200:
+                continue
+            if path == '/api/projects':
+                projects = response.json()
+            elif path.startswith('/api/dashboard'):
+                projects = response.json().get('projects')
+            else:
+                projects = None
+            if projects:
+                user.project_id = user.rng.choice(projects)['id']
+
+    # --- Actions des utilisateurs ---
+
+    def run_action(self, user, action):
+        now = time.monotonic()
+        if action == 'navigate':
+            user.screen = user.next_screen()
+            user.screen_until = now + user.rng.expovariate(1 / user.think_time)
+            on_load, _, period = SCREENS[user.screen]
+            self.fetch_all(user, on_load)
+            if user.screen == 'projects' and user.project_id and user.rng.random() < DEPLOY_PROBABILITY:
+                self.request(user, 'POST', '/api/deploy',
+                             json={'project_id': user.project_id, 'environment': 'DEV'})
+            if period:
+                self.schedule(now + period, user, 'poll')
+            self.schedule(user.screen_until, user, 'navigate')
+        elif action == 'poll':
+            _, polled, period = SCREENS[user.screen]
+            # Le polling d'un écran quitté s'arrête (clearInterval)
+            if period and now < user.screen_until:
+                self.fetch_all(user, polled)
+                self.schedule(now + period, user, 'poll')
+
+    def worker(self):
+        while True:
+            event = self._next_due()
+            if event is None:
+                return
+            _, _, user, action = event
+            try:
+                self.run_action(user, action)
+            except Exception as e:
+                print(f"⚠️ Erreur utilisateur {user.user_id}: {e}")
+
+    # --- Mémoire du serveur ---
+
+    def sample_rss(self):
+        if not self.args.server_pid:
+            return None
+        try:
+            with open(f"/proc/{self.args.server_pid}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss_mib = int(line.split()[1]) / 1024
+                        self.rss_samples.append((time.monotonic(), rss_mib))
+                        return rss_mib
+        except OSError:
+            return None
+        return None
+
+    # --- Rapports ---
+
+    def report_window(self, elapsed):
+        window = self.recorder.take_window()
+        requests_count = sum(s.latency.total for s in window.values())
+        errors = sum(s.errors for s in window.values())
+        merged = Histogram()
+        for s in window.values():
+            merged.merge(s.latency)
+        rss = self.sample_rss()
+        rss_text = f"  RSS {rss:.0f} MiB" if rss else ""
+        print(f"[{elapsed:7.0f}s] {requests_count / self.args.report_interval:7.1f} req/s  "
+              f"p50 {merged.percentile(50):7.1f} ms  p95 {merged.percentile(95):7.1f} ms  "
+              f"p99 {merged.percentile(99):7.1f} ms  erreurs {errors}{rss_text}")
+
+    def summary(self, duration):
+        routes = {}
+        for route, stats in sorted(self.recorder.total.items()):
+            routes[route] = {
+                'requests': stats.latency.total,
+                'throughput_rps': round(stats.latency.total / duration, 2),
+                'p50_ms': round(stats.latency.percentile(50), 2),
+                'p95_ms': round(stats.latency.percentile(95), 2),
+                'p99_ms': round(stats.latency.percentile(99), 2),
+                'max_ms': round(stats.latency.max, 2),
+                'error_rate': round(stats.errors / stats.latency.total, 4) if stats.latency.total else 0,
+                'status': dict(stats.status),
+            }
+        memory = None
+        if len(self.rss_samples) >= 2:
+            (t0, first), (t1, last) = self.rss_samples[0], self.rss_samples[-1]
+            memory = {
+                'rss_start_mib': round(first, 1),
+                'rss_end_mib': round(last, 1),
+                'rss_max_mib': round(max(r for _, r in self.rss_samples), 1),
+                'growth_mib_per_hour': round((last - first) / max(t1 - t0, 1) * 3600, 2),
+            }
+        return {'duration_s': round(duration, 1), 'users': self.args.users,
+                'tenants': self.args.tenants, 'routes': routes, 'server_memory': memory}
+
+    # --- Exécution ---
+
+    def run(self, tenants):
+        args = self.args
+        # Répartition des utilisateurs sur les tenants: loi de Zipf
+        weights = [1 / (rank + 1) for rank in range(len(tenants))]
+        cum_weights = list(itertools.accumulate(weights))
+        start = time.monotonic()
+        self.stop_at = start + args.duration
+        for i in range(args.users):
+            user_rng = random.Random(f"{args.seed}:{i}")
+            tenant = tenants[bisect.bisect_left(cum_weights, user_rng.random() * cum_weights[-1])]
+            user = VirtualUser(i, tenant, user_rng, args.think_time)
+            # Arrivées étalées sur la montée en charge
+            self.schedule(start + args.ramp_up * i / max(args.users, 1), user, 'navigate')
+
+        self.sample_rss()
+        with concurrent.futures.ThreadPoolExecutor(args.concurrency) as pool:
+            workers = [pool.submit(self.worker) for _ in range(args.concurrency)]
+            while time.monotonic() < self.stop_at:
+                time.sleep(min(args.report_interval, max(self.stop_at - time.monotonic(), 0)))
+                self.report_window(time.monotonic() - start)
+            with self._lock:
+                self._lock.notify_all()
+            concurrent.futures.wait(workers)
+        self.sample_rss()
+        return self.summary(time.monotonic() - start)
+
+
+def load_tenants(args):
+    """Tenants cibles: base locale (--dsn) ou clients de démo"""
+    if args.dsn:
+        import psycopg2
+        conn = psycopg2.connect(args.dsn)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.id FROM clients c JOIN projects p ON p.client_id = c.id
+                    GROUP BY c.id ORDER BY count(*) DESC LIMIT %s
+                """, (args.tenants,))
+                return [str(row[0]) for row in cur.fetchall()]
+        finally:
+            conn.close()
+    return DEMO_CLIENTS[:args.tenants]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge et endurance MoonOps (polling du frontend)")
+    parser.add_argument('--base-url', default=API_BASE)
+    parser.add_argument('--users', type=int, default=100, help="Utilisateurs virtuels simultanés")
+    parser.add_argument('--tenants', type=int, default=3, help="Nombre de tenants ciblés")
+    parser.add_argument('--dsn', help="Lire les tenants depuis PostgreSQL (sinon clients de démo)")
+    parser.add_argument('--duration', type=float, default=600, help="Durée totale (s)")
+    parser.add_argument('--ramp-up', type=float, default=60, help="Montée en charge (s)")
+    parser.add_argument('--think-time', type=float, default=60, help="Temps moyen passé sur un écran (s)")
+    parser.add_argument('--concurrency', type=int, default=64, help="Requêtes simultanées maximum")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--report-interval', type=float, default=10)
+    parser.add_argument('--server-pid', type=int, help="PID du serveur pour suivre sa mémoire (RSS)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Écrire le rapport final JSON dans ce fichier")
+    args = parser.parse_args()
+
+    tenants = load_tenants(args)
+    if not tenants:
+        print("❌ Aucun tenant disponible")
+        return False
+
+    print("🌊 Charge MoonOps - polling du frontend")
+    print("=" * 50)
+    print(f"👥 {args.users} utilisateurs sur {len(tenants)} tenants pendant {args.duration:.0f}s")
+
+    summary = LoadGenerator(args).run(tenants)
+
+    print("=" * 50)
+    print(f"{'Route':36} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erreurs':>8}")
+    for route, stats in summary['routes'].items():
+        print(f"{route:36} {stats['throughput_rps']:8.2f} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['p99_ms']:8.1f} {stats['error_rate']:8.2%}")
+    if summary['server_memory']:
+        memory = summary['server_memory']
+        print(f"🧠 RSS serveur: {memory['rss_start_mib']} → {memory['rss_end_mib']} MiB "
+              f"(max {memory['rss_max_mib']}, {memory['growth_mib_per_hour']} MiB/h)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"💾 Rapport: {args.output}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
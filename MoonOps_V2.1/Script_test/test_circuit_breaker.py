@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test du disjoncteur GitLab (backend/circuit_breaker.py)
+
+Vérifie l'ouverture sur erreurs, le refus immédiat pendant open_s, puis
+l'essai semi-ouvert: un essai interrompu sans résultat (exception hors réseau,
+asyncio.CancelledError) doit rendre sa place, sinon le disjoncteur refuserait
+tout appel jusqu'au redémarrage. Aucun serveur ni GitLab requis.
+
+Usage:
+    python Script_test/test_circuit_breaker.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError  # noqa: E402
+
+OPEN_S = 0.05
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def rejected(breaker):
+    try:
+        with breaker.call():
+            return False
+    except CircuitOpenError:
+        return True
+
+
+def opened_breaker():
+    breaker = CircuitBreaker('test', window=4, min_calls=2, failure_ratio=0.5, open_s=OPEN_S, half_open_calls=1)
+    for _ in range(2):
+        with breaker.call() as attempt:
+            attempt.record(False, 'HTTP 502')
+    return breaker
+
+
+def interrupted_probe(breaker, error):
+    try:
+        with breaker.call():
+            raise error
+    except BaseException as e:
+        return type(e) is type(error)
+    return False
+
+
+def test_open():
+    ok = True
+    breaker = opened_breaker()
+    ok &= check(breaker.state == OPEN, "Ouvert après 2 échecs sur 2")
+    ok &= check(rejected(breaker), "Appel refusé sans attendre pendant open_s")
+    time.sleep(OPEN_S * 1.5)
+    with breaker.call() as attempt:
+        ok &= check(breaker.state == HALF_OPEN, "Semi-ouvert après open_s")
+        ok &= check(rejected(breaker), "Un seul essai semi-ouvert à la fois")
+        attempt.record(True)
+    ok &= check(breaker.state == CLOSED, "Essai réussi: refermé")
+    return ok
+
+
+def test_interrupted_probe():
+    ok = True
+    for error in (RuntimeError('réponse illisible'), asyncio.CancelledError()):
+        name = type(error).__name__
+        breaker = opened_breaker()
+        time.sleep(OPEN_S * 1.5)
+        ok &= check(interrupted_probe(breaker, error), f"{name} propagée hors du disjoncteur")
+        ok &= check(breaker.state == HALF_OPEN and breaker.stats['abandoned'] == 1,
+                    f"{name}: essai rendu, toujours semi-ouvert")
+        ok &= check(not rejected(breaker), f"{name}: l'essai suivant passe")
+        with breaker.call() as attempt:
+            attempt.record(True)
+        ok &= check(breaker.state == CLOSED, f"{name}: essai suivant réussi, refermé")
+
+    # Tâche asyncio annulée pendant l'essai (appel GitLab en attente)
+    breaker = opened_breaker()
+    time.sleep(OPEN_S * 1.5)
+
+    async def probe():
+        with breaker.call():
+            await asyncio.sleep(10)
+
+    async def cancel():
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel())
+    ok &= check(not rejected(breaker), "Tâche annulée pendant l'essai: l'essai suivant passe")
+
+    # Un essai d'une période semi-ouverte précédente ne rend pas la place de la suivante
+    breaker = opened_breaker()
+    time.sleep(OPEN_S * 1.5)
+    stale = breaker.before_call()
+    breaker.record(False, 0.1, 'HTTP 502')
+    time.sleep(OPEN_S * 1.5)
+    with breaker.call() as attempt:
+        breaker.release(stale)
+        ok &= check(rejected(breaker), "Essai périmé rendu sans effet sur la période en cours")
+        attempt.record(True)
+    return ok
+
+
+def main():
+    ok = test_open()
+    ok &= test_interrupted_probe()
+    print("🎉 Disjoncteur OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test du cache de miroirs Git (backend/git_mirror.py) sur des dépôts file:// locaux
+
+Vérifie qu'un même dépôt source importé pour plusieurs projets n'est cloné
+qu'une fois, que le rafraîchissement passe par un fetch incrémental, et que
+les modes d'import full / snapshot poussent le bon contenu. Aucun serveur
+ni GitLab requis.
+
+Usage:
+    python Script_test/test_git_mirror.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ['MOONOPS_GIT_ALLOW_FILE_URLS'] = '1'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import git_mirror  # noqa: E402
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True, text=True,
+                          env=dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@moonops',
+                                   GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@moonops')).stdout.strip()
+
+
+def commit_file(repo, name, content, message):
+    with open(os.path.join(repo, name), 'w') as f:
+        f.write(content)
+    git('add', name, cwd=repo)
+    git('commit', '-q', '-m', message, cwd=repo)
+
+
+def new_target(workdir, name):
+    """Dépôt bare avec un README initial, comme un repository GitLab tout juste créé"""
+    target = os.path.join(workdir, f"{name}.git")
+    git('init', '-q', '--bare', '-b', 'main', target)
+    seed = os.path.join(workdir, f"{name}-seed")
+    git('init', '-q', '-b', 'main', seed)
+    commit_file(seed, 'README.md', '# GitLab\n', 'Initial commit')
+    git('push', '-q', target, 'main', cwd=seed)
+    return target
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def main():
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'source')
+        git('init', '-q', '-b', 'main', source)
+        commit_file(source, 'app.py', 'print(1)\n', 'first')
+        commit_file(source, 'app.py', 'print(2)\n', 'second')
+        git('tag', 'v1.0', cwd=source)
+        url = f"file://{source}"
+
+        cache = git_mirror.GitMirrorCache(root=os.path.join(workdir, 'mirrors'), refresh_s=3600)
+
+        # Import complet pour deux projets: un seul clone
+        targets = [new_target(workdir, f"project-{i}") for i in range(2)]
+        for target in targets:
+            cache.push(url, f"file://{target}")
+        ok &= check(cache.stats['clones'] == 1 and cache.stats['hits'] == 1,
+                    f"Deux imports, un seul clone ({dict(cache.stats)})")
+        source_head = git('rev-parse', 'main', cwd=source)
+        ok &= check(all(git('rev-parse', 'main', cwd=t) == source_head for t in targets),
+                    "Branche main identique à la source (README GitLab remplacé)")
+        ok &= check(git('tag', '--list', cwd=targets[0]) == 'v1.0', "Tags poussés")
+
+        # Nouveau commit en amont: fetch incrémental, pas de nouveau clone
+        commit_file(source, 'app.py', 'print(3)\n', 'third')
+        cache.refresh_s = 0
+        target = new_target(workdir, 'project-2')
+        cache.push(url, f"file://{target}")
+        ok &= check(cache.stats['clones'] == 1 and cache.stats['fetches'] == 1,
+                    f"Rafraîchissement par fetch ({dict(cache.stats)})")
+        ok &= check(git('rev-parse', 'main', cwd=target) == git('rev-parse', 'main', cwd=source),
+                    "Le nouveau commit amont est importé")
+
+        # Import snapshot: un seul commit, même arbre que la source
+        target = new_target(workdir, 'project-3')
+        cache.push(url, f"file://{target}", mode='snapshot')
+        ok &= check(git('rev-list', '--count', 'main', cwd=target) == '1', "Snapshot: un seul commit")
+        ok &= check(git('rev-parse', 'main^{tree}', cwd=target) == git('rev-parse', 'main^{tree}', cwd=source),
+                    "Snapshot: arbre identique à la source")
+
+        # URLs refusées
+        for bad in ('ext::sh -c id', '-uhack', '/etc'):
+            try:
+                git_mirror.validate_url(bad)
+                ok &= check(False, f"URL refusée: {bad}")
+            except git_mirror.GitMirrorError:
+                ok &= check(True, f"URL refusée: {bad}")
+
+        print(cache.snapshot())
+    print("🎉 Cache de miroirs Git OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
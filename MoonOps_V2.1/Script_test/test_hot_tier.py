@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test et micro-benchmark du hot tier des métriques (backend/hot_tier.py)
+
+Vérifie le tampon circulaire par série (taille fixe, compactage, points hors
+ordre, doublons relus par le suivi de la table metrics), la couverture des
+lectures « dernière valeur » et « N dernières minutes » (sinon lecture en base),
+les séries tronquées au préchauffage, l'éviction LRU des séries inactives et la borne mémoire, puis mesure le débit
+d'ajout et la latence des lectures. Aucun serveur ni PostgreSQL requis.
+
+Usage:
+    python Script_test/test_hot_tier.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from hot_tier import POINT_BYTES, HotTier  # noqa: E402
+
+NOW = 1_800_000_000.0
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def test_ring():
+    ok = True
+    tier = HotTier(max_points=100, max_series=10)
+    tier.add('c1', [('p1', 'cpu', NOW - 1000 + t, float(t)) for t in range(1000)], now=NOW - 3600)
+    times, values = tier.window('p1', 50, now=NOW)['cpu']
+    ok &= check(len(times) == 50 and values[-1] == 999.0 and times == sorted(times),
+                "Fenêtre: derniers points dans l'ordre")
+    ok &= check(tier.window('p1', 200, now=NOW) is None, "Tampon plein: fenêtre plus longue non couverte")
+    series = tier._lru[('p1', 'cpu')]
+    ok &= check(len(series) == 100 and len(series.ts) <= 125, "Taille fixe: 100 points, compactage tous les 25")
+
+    added = tier.add('c1', [('p1', 'cpu', NOW - 10 + 0.5, -1.0)], now=NOW)
+    times, values = tier.window('p1', 11, now=NOW)['cpu']
+    ok &= check(added == 1 and values[:3] == [989.0, 990.0, -1.0] and times == sorted(times),
+                "Point hors ordre: inséré à sa place")
+
+    # Relecture du suivi: horodatage relu en base (microsecondes) -> doublon
+    replay = [('p1', 'cpu', float(f"{NOW - 1000 + t:.6f}"), float(t)) for t in range(990, 1000)]
+    ok &= check(tier.add('c1', replay, now=NOW) == 0, "Points relus par le suivi: ignorés")
+    ok &= check(tier.add('c1', [('p1', 'cpu', NOW - 1, 42.0)], now=NOW) == 1,
+                "Même horodatage, autre valeur: conservé")
+    return ok
+
+
+def test_coverage():
+    ok = True
+    tier = HotTier(max_points=1000, max_series=10)
+    # Projet vu pour la première fois à l'ingestion: rien n'est connu avant
+    tier.add('c1', [('p1', 'cpu', NOW, 1.0)], now=NOW)
+    ok &= check(tier.window('p1', 60, now=NOW + 30) is None and tier.latest('p1', 3600, now=NOW + 30) is None,
+                "Projet créé à l'ingestion: lecture en base tant que la fenêtre n'est pas couverte")
+    ok &= check(tier.window('p1', 60, now=NOW + 61) is not None, "Couvert une fois la fenêtre écoulée")
+    tier.load('p1', 'c1', {'cpu': [(NOW - 600, 0.5)], 'mem': [(NOW - 300, 7.0)]}, NOW - 3600)
+    window = tier.window('p1', 900, now=NOW + 1)
+    ok &= check(window is not None and window['cpu'][1] == [0.5, 1.0] and window['mem'][1] == [7.0],
+                "Préchauffage: fenêtre complète depuis since")
+    latest = tier.latest('p1', 120, now=NOW + 1)
+    ok &= check(latest == {'cpu': (NOW, 1.0)}, "Dernière valeur: séries actives depuis max_age_s")
+    ok &= check(tier.owner('p1') == 'c1' and tier.owner('p2') is None, "Propriétaire connu sans la base")
+    tier.drop_project('p1')
+    ok &= check(tier.owner('p1') is None and not tier._lru, "Projet supprimé: séries libérées")
+
+    # Préchauffage limité aux 720 derniers points d'une série à 1 point/s (12 dernières minutes)
+    tier = HotTier(max_points=720, max_series=10)
+    points = [(NOW - 3600 + t, float(t)) for t in range(3600)]
+    tier.load('p2', 'c1', {'cpu': points[-720:]}, NOW - 3600, dropped=points[-721][0])
+    ok &= check(tier.window('p2', 1800, now=NOW) is None, "Série tronquée au préchauffage: fenêtre plus longue en base")
+    window = tier.window('p2', 600, now=NOW)
+    ok &= check(window is not None and len(window['cpu'][0]) == 600, "Série tronquée: fenêtre des points chargés couverte")
+    return ok
+
+
+def test_lru():
+    ok = True
+    tier = HotTier(max_points=50, max_series=3)
+    for project in ('p1', 'p2', 'p3'):
+        tier.load(project, 'c1', {'cpu': [(NOW - 10, 1.0)]}, NOW - 3600)
+    ok &= check(tier.window('p1', 60, now=NOW) is not None, "Lecture: p1 devient récemment utilisé")
+    tier.add('c1', [('p4', 'cpu', NOW, 1.0)], now=NOW)
+    ok &= check(tier.owner('p2') is None and tier.owner('p1') == 'c1' and tier.stats['evicted'] == 1,
+                "Éviction LRU: la série la moins récemment utilisée")
+    tier.load('p1', 'c1', {'mem': [(NOW - 5, 3.0)]}, NOW - 3600)
+    tier.add('c1', [('p5', 'cpu', NOW, 1.0)], now=NOW)
+    ok &= check(tier.latest('p1', 3600, now=NOW) is None, "Série évincée avec des points récents: lecture en base")
+    ok &= check(tier.window('p1', 1, now=NOW) is not None, "Fenêtre postérieure à l'éviction: couverte")
+    return ok
+
+
+def bench():
+    rng = random.Random(3)
+    tier = HotTier(max_points=720, max_series=20000)
+    projects = [f"p{i}" for i in range(500)]
+    metrics = ['cpu_usage', 'memory_usage', 'latency', 'errors']
+    batches = []
+    ts = NOW - 3600
+    for _ in range(500):
+        batch = []
+        for _ in range(2000):
+            ts += 0.001
+            batch.append((rng.choice(projects), rng.choice(metrics), ts, rng.random()))
+        batches.append(batch)
+    started = time.perf_counter()
+    for batch in batches:
+        tier.add('c1', batch, now=NOW - 3600)
+    elapsed = time.perf_counter() - started
+    print(f"📈 {500 * 2000:,} points ajoutés en {elapsed:.2f}s: {500 * 2000 / elapsed:,.0f} points/s")
+
+    started = time.perf_counter()
+    for project in projects:
+        tier.window(project, 60, now=ts)
+        tier.latest(project, now=ts)
+    elapsed = (time.perf_counter() - started) / (2 * len(projects))
+    snapshot = tier.snapshot()
+    print(f"📈 Lecture sans base: {elapsed * 1e6:.0f} µs, {snapshot['series']} séries, "
+          f"{snapshot['points']:,} points, {snapshot['bytes'] / 1e6:.1f} Mo")
+    return check(snapshot['bytes'] <= snapshot['series'] * 720 * 1.25 * POINT_BYTES,
+                 "Mémoire bornée par séries x points par série")
+
+
+def main():
+    ok = test_ring()
+    ok &= test_coverage()
+    ok &= test_lru()
+    ok &= bench()
+    print("🎉 Hot tier OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test des scores d'anomalie vectorisés (backend/metric_analytics.py)
+
+Compare les z-scores glissants et les scores EWMA calculés sur une matrice
+NumPy (toutes les séries à la fois) à un calcul point par point en Python,
+sur des séries de longueurs et d'ordres de grandeur différents, puis mesure
+le temps de calcul pour plusieurs milliers de séries. Aucun serveur requis.
+
+Usage:
+    python Script_test/test_metric_analytics.py
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import numpy as np  # noqa: E402
+
+import metric_analytics  # noqa: E402
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def naive_zscores(values, window, min_points):
+    scores = []
+    for t, value in enumerate(values):
+        previous = values[max(0, t - window):t]
+        if len(previous) < min_points:
+            scores.append(None)
+            continue
+        mean = sum(previous) / len(previous)
+        std = math.sqrt(sum((v - mean) ** 2 for v in previous) / len(previous))
+        scores.append((value - mean) / std if std > 1e-12 else None)
+    return scores
+
+
+def naive_ewma_scores(values, alpha, min_points):
+    scores = [None]
+    mean, var = values[0], 0.0
+    for t in range(1, len(values)):
+        diff = values[t] - mean
+        scores.append(diff / math.sqrt(var) if t >= min_points and var > 1e-24 else None)
+        mean += alpha * diff
+        var = (1 - alpha) * (var + diff * alpha * diff)
+    return scores
+
+
+def same(vectorized, naive):
+    for got, expected in zip(vectorized, naive):
+        if expected is None:
+            if not np.isnan(got):
+                return False
+        elif not abs(got - expected) <= 1e-6 * max(1.0, abs(expected)):
+            return False
+    return True
+
+
+def main():
+    ok = True
+    rng = random.Random(7)
+    # Longueurs variables, séries autour de 50 et autour de 10^6 (précision des sommes cumulées)
+    series = [[rng.gauss(50, 5) + (1e6 if i % 2 else 0) for _ in range(rng.randint(3, 300))] for i in range(60)]
+    series[4][-1] += 200
+
+    matrix = metric_analytics.to_matrix(series)
+    ok &= check(all(np.allclose(matrix[i, -len(s):], s) and np.isnan(matrix[i, :-len(s)]).all()
+                    for i, s in enumerate(series)), "Matrice alignée à droite")
+
+    zscores = metric_analytics.rolling_zscore(matrix, 30)
+    ewma = metric_analytics.ewma_scores(matrix, 0.2)
+    ok &= check(all(same(zscores[i, -len(s):], naive_zscores(s, 30, metric_analytics.MIN_POINTS))
+                    for i, s in enumerate(series)), "z-scores glissants identiques au calcul point par point")
+    ok &= check(all(same(ewma[i, -len(s):], naive_ewma_scores(s, 0.2, metric_analytics.MIN_POINTS))
+                    for i, s in enumerate(series)), "Scores EWMA identiques au calcul point par point")
+
+    report = metric_analytics.anomaly_report(series, 'zscore', window=30)
+    ok &= check(report[4]['anomalous'] and sum(r['anomalous'] for r in report) == 1,
+                "Seul le pic injecté est signalé")
+
+    big = [list(np.random.default_rng(i).normal(size=720)) for i in range(5000)]
+    for method in metric_analytics.METHODS:
+        started = time.perf_counter()
+        metric_analytics.anomaly_report(big, method)
+        print(f"📈 {method}: 5000 séries x 720 points en {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    print("🎉 Analyse des métriques OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
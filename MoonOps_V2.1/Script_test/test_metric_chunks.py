@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test de l'encodage des chunks de métriques (backend/metric_chunks.py)
+
+Vérifie que l'encodage Gorilla (delta de delta des horodatages, XOR des
+valeurs) restitue exactement les points (microsecondes, bits des doubles),
+la fusion d'un chunk avec des points arrivés en retard, puis mesure la taille
+par point face à une ligne de metrics sur des séries typiques (jauges, compteurs,
+valeurs constantes, bruit). Aucun serveur ni PostgreSQL requis.
+
+Usage:
+    python Script_test/test_metric_chunks.py
+"""
+import os
+import random
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import metric_chunks  # noqa: E402
+
+# Ligne de metrics: en-tête 24 + id 8 + 2 UUID 32 + nom ~16 + valeur 8 + horodatage 8 + pointeur 4,
+# sans les index (clé primaire et (project_id, timestamp): ~56 octets de plus)
+RAW_BYTES_PER_POINT = 100
+# Ligne de metric_chunks (en-tête, colonnes, pointeur TOAST) et ses deux entrées d'index
+CHUNK_ROW_BYTES = 200
+START_US = 1_800_000_000_000_000
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def same_bits(values, expected):
+    return [struct.pack('>d', v) for v in values] == [struct.pack('>d', v) for v in expected]
+
+
+def series(kind, points, rng, interval_us=10_000_000):
+    timestamps, values = [], []
+    ts, value = START_US, 50.0
+    for i in range(points):
+        ts += interval_us + rng.randint(-2000, 2000)  # Gigue de l'agent (ms)
+        if kind == 'gauge':
+            value = round(max(0.0, value + rng.gauss(0, 2)), 1)
+        elif kind == 'counter':
+            value += rng.randint(0, 40)
+        elif kind == 'constant':
+            value = 1.0
+        else:
+            value = rng.gauss(0, 1)
+        timestamps.append(ts)
+        values.append(value)
+    return timestamps, values
+
+
+def test_roundtrip():
+    ok = True
+    rng = random.Random(11)
+    exact = True
+    for _ in range(200):
+        count = rng.randint(0, 600)
+        ts = START_US + rng.randint(-10 ** 12, 10 ** 12)
+        timestamps, values = [], []
+        for i in range(count):
+            # Intervalles réguliers, gigue, trous de plusieurs jours, points simultanés
+            ts += rng.choice([10_000_000, 10_000_000 + rng.randint(-5000, 5000), rng.randint(0, 10 ** 12), 0])
+            timestamps.append(ts)
+            values.append(rng.choice([values[-1] if values else 0.0, rng.gauss(0, 1e6), float(i),
+                                      struct.unpack('>d', struct.pack('>Q', rng.getrandbits(62)))[0], -0.0]))
+        decoded_ts, decoded_values = metric_chunks.decode(metric_chunks.encode(timestamps, values))
+        exact &= decoded_ts == timestamps and same_bits(decoded_values, values)
+    ok &= check(exact, "200 séries aléatoires restituées à l'identique (µs, bits des doubles)")
+
+    moment = datetime(2026, 10, 19, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    us = metric_chunks.to_microseconds(moment)
+    ok &= check(metric_chunks.to_datetime(us) == moment, "Conversion datetime <-> µs exacte")
+    ok &= check(metric_chunks.chunk_start(us) % (metric_chunks.CHUNK_S * 1_000_000) == 0
+                and 0 <= us - metric_chunks.chunk_start(us) < metric_chunks.CHUNK_S * 1_000_000,
+                "Tranche alignée sur CHUNK_S")
+
+    timestamps, values = series('gauge', 100, rng)
+    chunk = metric_chunks.encode(timestamps[::2], values[::2])
+    merged = metric_chunks.merge(*metric_chunks.decode(chunk), timestamps[1::2], values[1::2])
+    ok &= check(merged == (timestamps, values), "Fusion d'un chunk et de points en retard: série triée")
+    return ok
+
+
+def test_size():
+    ok = True
+    rng = random.Random(5)
+    points = metric_chunks.CHUNK_S // 10  # Un point toutes les 10 s
+    for kind in ('gauge', 'counter', 'constant', 'noise'):
+        timestamps, values = series(kind, points, rng)
+        started = time.perf_counter()
+        data = metric_chunks.encode(timestamps, values)
+        encoded = time.perf_counter()
+        metric_chunks.decode(data)
+        decoded = time.perf_counter()
+        per_point = (len(data) + CHUNK_ROW_BYTES) / points
+        ratio = RAW_BYTES_PER_POINT / per_point
+        print(f"📦 {kind}: {len(data) / points:.2f} octets/point (+ ligne: {per_point:.2f}), x{ratio:.0f}, "
+              f"encodage {(encoded - started) * 1e6 / points:.1f} µs/point, "
+              f"décodage {(decoded - encoded) * 1e6 / points:.1f} µs/point")
+        if kind != 'noise':
+            ok &= check(ratio >= 10, f"{kind}: stockage divisé par 10 ou plus")
+    return ok
+
+
+def main():
+    ok = test_roundtrip()
+    ok &= test_size()
+    print("🎉 Chunks de métriques OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test du ré-upload incrémental (backend/project_sync.py) sur un dépôt file:// local
+
+Vérifie que seuls les fichiers modifiés d'une archive sont écrits et poussés
+en un seul commit sur main, que le manifeste stocké sert de base tant qu'il
+décrit la tête de la branche, et que l'arbre poussé correspond exactement à
+l'archive. Aucun serveur ni GitLab requis.
+
+Usage:
+    python Script_test/test_project_sync.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+os.environ['MOONOPS_GIT_ALLOW_FILE_URLS'] = '1'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import git_mirror  # noqa: E402
+import project_sync  # noqa: E402
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True, text=True,
+                          env=dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@moonops',
+                                   GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@moonops')).stdout.strip()
+
+
+def new_target(workdir):
+    """Dépôt bare avec un README initial, comme un repository GitLab tout juste créé"""
+    target = os.path.join(workdir, 'project.git')
+    git('init', '-q', '--bare', '-b', 'main', target)
+    seed = os.path.join(workdir, 'seed')
+    git('init', '-q', '-b', 'main', seed)
+    with open(os.path.join(seed, 'README.md'), 'w') as f:
+        f.write('# GitLab\n')
+    git('add', 'README.md', cwd=seed)
+    git('commit', '-q', '-m', 'Initial commit', cwd=seed)
+    git('push', '-q', target, 'main', cwd=seed)
+    return target
+
+
+def write_zip(path, files, root='my-project'):
+    """Archive avec un dossier racine (retiré au scan, comme à l'extraction)"""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            info = zipfile.ZipInfo(f"{root}/{name}")
+            info.external_attr = (0o100755 if name.endswith('.sh') else 0o100644) << 16
+            zf.writestr(info, content)
+    return path
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def main():
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        target = new_target(workdir)
+        url = f"file://{target}"
+        mirrors = git_mirror.GitMirrorCache(root=os.path.join(workdir, 'mirrors'))
+
+        # Grand projet: 2000 fichiers de 4 Ko
+        files = {f"src/module_{i}.py": f"# module {i}\n" + 'x = 1\n' * 680 for i in range(2000)}
+        files['run.sh'] = '#!/bin/sh\necho run\n'
+        first = write_zip(os.path.join(workdir, 'v1.zip'), files)
+        entries = project_sync.scan_archive(first)
+        ok &= check(len(entries) == 2001 and 'src/module_0.py' in entries, "Dossier racine retiré au scan")
+
+        # Premier upload: base = arbre du repository (README GitLab supprimé)
+        sync = project_sync.push_archive(mirrors, url, first, entries, {}, None, 'v1')
+        ok &= check(sync['base'] == 'tree' and len(sync['added']) == 2001 and sync['deleted'] == ['README.md'],
+                    f"Premier upload complet (+{len(sync['added'])} -{len(sync['deleted'])})")
+        manifest = {path: (e.blob_sha, e.mode) for path, e in entries.items()}
+        ok &= check(project_sync.tree_manifest(target, 'main') == manifest,
+                    "Arbre poussé identique à l'archive (empreintes et modes)")
+
+        # Ré-upload avec deux fichiers modifiés, un ajouté, un supprimé
+        files['src/module_7.py'] += 'y = 2\n'
+        files['src/module_8.py'] += 'y = 3\n'
+        files['docs/CHANGELOG.md'] = '- v2\n'
+        del files['src/module_9.py']
+        second = write_zip(os.path.join(workdir, 'v2.zip'), files)
+        entries = project_sync.scan_archive(second)
+        started = time.perf_counter()
+        sync2 = project_sync.push_archive(mirrors, url, second, entries, manifest, sync['commit'], 'v2')
+        elapsed = time.perf_counter() - started
+        ok &= check(sync2['base'] == 'manifest', "Base = manifeste stocké (tête inchangée)")
+        ok &= check((sync2['added'], sync2['modified'], sync2['deleted'])
+                    == (['docs/CHANGELOG.md'], ['src/module_7.py', 'src/module_8.py'], ['src/module_9.py']),
+                    "Diff: +1 ~2 -1")
+        ok &= check(sync2['bytes'] < 16 * 1024, f"Seuls les blobs modifiés écrits ({sync2['bytes']} octets, {elapsed:.2f}s)")
+        ok &= check(git('rev-parse', 'main^', cwd=target) == sync['commit'], "Un seul commit incrémental sur main")
+        ok &= check(project_sync.tree_manifest(target, 'main')
+                    == {path: (e.blob_sha, e.mode) for path, e in entries.items()}, "Arbre identique à la nouvelle archive")
+
+        # Même archive: aucun commit
+        manifest = {path: (e.blob_sha, e.mode) for path, e in entries.items()}
+        sync3 = project_sync.push_archive(mirrors, url, second, entries, manifest, sync2['commit'], 'v3')
+        ok &= check(sync3['commit'] == sync2['commit'] and not sync3['modified'], "Archive identique: rien poussé")
+
+        # Manifeste périmé (push extérieur): base relue dans l'arbre
+        sync4 = project_sync.push_archive(mirrors, url, second, entries, manifest, sync['commit'], 'v4')
+        ok &= check(sync4['base'] == 'tree' and sync4['commit'] == sync2['commit'], "Manifeste périmé: base = arbre")
+
+        # Chemins refusés
+        bad = os.path.join(workdir, 'bad.zip')
+        with zipfile.ZipFile(bad, 'w') as zf:
+            zf.writestr('../evil.sh', 'x')
+        try:
+            project_sync.scan_archive(bad)
+            ok &= check(False, "Chemin '..' refusé")
+        except project_sync.ArchiveError:
+            ok &= check(True, "Chemin '..' refusé")
+
+        print(mirrors.snapshot())
+    print("🎉 Ré-upload incrémental OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Test de régression des plans SQL pour les requêtes chaudes de l'API MoonOps
+
+Charge un jeu de données synthétique volumineux dans une base dédiée, exécute
+le SQL de chaque route (copie de backend/app.py) et échoue si le plan retombe
+sur un Seq Scan d'une grande table ou dépasse son budget de latence.
+
+Usage:
+    createdb moonops_benchdb && psql -d moonops_benchdb -f database/init.sql
+    python Script_test/test_query_plans.py --seed --scale 1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+DEFAULT_DSN = os.getenv(
+    'MOONOPS_BENCH_DSN',
+    "host=127.0.0.1 port=5432 dbname=moonops_benchdb user=moonops_app password=moonops_app_2026!"
+)
+
+# Tables pour lesquelles un Seq Scan est une régression (les petites tables
+# comme clients restent libres)
+LARGE_TABLES = {'users', 'projects', 'environments', 'pipelines', 'deployments', 'alerts', 'metrics'}
+
+# (nom, SQL, paramètres, budget en ms) - paramètres résolus dans pick_params()
+HOT_QUERIES = [
+    ("GET /api/projects", """
+        SELECT p.id, p.name, p.description, p.template_type, p.status,
+               p.repository_url, p.created_at, p.last_deployed_at,
+               c.name as client_name
+        FROM projects p
+        JOIN clients c ON p.client_id = c.id
+        WHERE p.client_id = %(client_id)s
+        ORDER BY p.created_at DESC
+    """, 50),
+    ("GET /api/deployments", """
+        SELECT d.id, d.version_tag as version, d.status, d.deployed_at,
+               e.name as environment, p.name as project_name, p.id as project_id
+        FROM deployments d
+        JOIN environments e ON d.environment_id = e.id
+        JOIN projects p ON d.project_id = p.id
+        WHERE d.client_id = %(client_id)s
+        ORDER BY d.deployed_at DESC
+        LIMIT 20
+    """, 20),
+    ("GET /api/pipelines", """
+        SELECT p.id, p.branch, p.status, p.started_at, p.finished_at,
+               pr.name as project_name
+        FROM pipelines p
+        JOIN projects pr ON p.project_id = pr.id
+        WHERE p.client_id = %(client_id)s
+        ORDER BY p.started_at DESC
+        LIMIT 10
+    """, 20),
+    ("GET /api/alerts", """
+        SELECT a.id, a.severity, a.message, a.status, a.created_at, a.resolved_at,
+               a.occurrences, a.last_seen_at, a.group_key,
+               p.name as project_name
+        FROM alerts a
+        JOIN projects p ON a.project_id = p.id
+        WHERE a.status = 'ACTIVE' AND a.client_id = %(client_id)s
+        ORDER BY a.last_seen_at DESC
+        LIMIT 10
+    """, 20),
+    ("GET /api/alerts/groups", """
+        SELECT a.group_key, COUNT(*) AS alerts, SUM(a.occurrences) AS occurrences
+        FROM alerts a
+        WHERE a.client_id = %(client_id)s AND a.status <> 'RESOLVED'
+        GROUP BY a.group_key
+    """, 50),
+    ("GET /api/stats (projects)",
+     "SELECT COUNT(*) as count FROM projects WHERE client_id = %(client_id)s", 20),
+    ("GET /api/stats (active projects)",
+     "SELECT COUNT(*) as count FROM projects WHERE client_id = %(client_id)s AND status = 'ACTIVE'", 20),
+    ("GET /api/stats (deployments)",
+     "SELECT COUNT(*) as count FROM deployments WHERE client_id = %(client_id)s", 100),
+    ("GET /api/stats (pipelines)",
+     "SELECT COUNT(*) as count FROM pipelines WHERE client_id = %(client_id)s AND status = 'SUCCESS'", 100),
+    ("GET /api/stats (alerts)",
+     "SELECT COUNT(*) as count FROM alerts WHERE client_id = %(client_id)s AND status = 'ACTIVE'", 20),
+    ("GET /api/metrics/<id>", """
+        SELECT metric_name, value, timestamp
+        FROM metrics
+        WHERE project_id = %(project_id)s
+        AND timestamp >= CURRENT_TIMESTAMP - INTERVAL '24 hours'
+        ORDER BY timestamp ASC
+    """, 50),
+    ("ownership check",
+     "SELECT id FROM projects WHERE id = %(project_id)s AND client_id = %(client_id)s", 5),
+    ("POST /api/auth/login",
+     "SELECT id, email, full_name, role, client_id, password_hash FROM users WHERE email = %(email)s AND is_active = TRUE", 5),
+    ("POST /api/deploy (environment)",
+     "SELECT id FROM environments WHERE project_id = %(project_id)s AND name = 'PRODUCTION'", 5),
+    ("POST /api/deploy (last pipeline)",
+     "SELECT id FROM pipelines WHERE project_id = %(project_id)s ORDER BY started_at DESC LIMIT 1", 5),
+    ("global active alerts",
+     "SELECT id, project_id, severity, created_at FROM alerts WHERE status = 'ACTIVE' ORDER BY created_at DESC LIMIT 50", 20),
+    ("global recent deployments",
+     "SELECT id, project_id, status, deployed_at FROM deployments ORDER BY deployed_at DESC LIMIT 20", 20),
+    ("global recent pipelines",
+     "SELECT id, project_id, status, started_at FROM pipelines ORDER BY started_at DESC LIMIT 20", 20),
+]
+
+# Volumes pour --scale 1 (multipliés par --scale)
+BASE_VOLUMES = {
+    'tenants': 200,
+    'projects': 20000,
+    'pipelines': 200000,
+    'deployments': 200000,
+    'alerts': 50000,
+    'metrics': 1000000,
+}
+
+SEED_SQL = """
+SELECT setseed(0.42);
+
+INSERT INTO clients (name, slug)
+SELECT 'Bench Tenant ' || i, 'bench-' || i FROM generate_series(1, %(tenants)s) i;
+
+-- Répartition asymétrique: quelques gros tenants, une longue traîne
+INSERT INTO projects (client_id, name, description, template_type, status, created_at, last_deployed_at)
+SELECT t.ids[1 + floor(power(random(), 3) * array_length(t.ids, 1))::int],
+       'bench-project-' || i, 'Projet de benchmark',
+       (ARRAY['web', 'api', 'mobile'])[1 + i %% 3],
+       (ARRAY['ACTIVE', 'PENDING', 'MAINTENANCE', 'ARCHIVED']::project_status[])[1 + i %% 4],
+       now() - random() * INTERVAL '365 days', now() - random() * INTERVAL '30 days'
+FROM generate_series(1, %(projects)s) i,
+     (SELECT array_agg(id) AS ids FROM clients WHERE slug LIKE 'bench-%%') t;
+
+INSERT INTO environments (project_id, client_id, name, url, status)
+SELECT p.id, p.client_id, n.name, 'https://' || lower(n.name) || '.bench.moonops.app', 'RUNNING'
+FROM projects p CROSS JOIN (VALUES ('DEVELOPMENT'), ('STAGING'), ('PRODUCTION')) n(name)
+WHERE p.name LIKE 'bench-project-%%';
+
+CREATE TEMP TABLE bench_envs AS
+SELECT row_number() OVER () AS k, e.id, e.project_id, e.client_id
+FROM environments e JOIN projects p ON p.id = e.project_id
+WHERE p.name LIKE 'bench-project-%%';
+CREATE UNIQUE INDEX ON bench_envs(k);
+
+INSERT INTO pipelines (project_id, client_id, branch, status, started_at, finished_at)
+SELECT e.project_id, e.client_id, 'main',
+       (ARRAY['SUCCESS', 'SUCCESS', 'SUCCESS', 'FAILED', 'RUNNING']::pipeline_status[])[1 + g.i %% 5],
+       g.ts, g.ts + INTERVAL '10 minutes'
+FROM (SELECT i, 1 + floor(random() * (SELECT count(*) FROM bench_envs))::int AS k,
+             now() - random() * INTERVAL '180 days' AS ts
+      FROM generate_series(1, %(pipelines)s) i) g
+JOIN bench_envs e ON e.k = g.k;
+
+INSERT INTO deployments (project_id, client_id, environment_id, version_tag, status, deployed_at)
+SELECT e.project_id, e.client_id, e.id, 'v1.' || g.i,
+       (ARRAY['SUCCESS', 'SUCCESS', 'SUCCESS', 'FAILED']::deployment_status[])[1 + g.i %% 4],
+       now() - random() * INTERVAL '180 days'
+FROM (SELECT i, 1 + floor(random() * (SELECT count(*) FROM bench_envs))::int AS k
+      FROM generate_series(1, %(deployments)s) i) g
+JOIN bench_envs e ON e.k = g.k;
+
+INSERT INTO alerts (project_id, client_id, severity, message, status, created_at)
+SELECT e.project_id, e.client_id,
+       (ARRAY['INFO', 'WARNING', 'CRITICAL']::alert_severity[])[1 + g.i %% 3],
+       'Alerte de benchmark ' || g.i,
+       CASE WHEN g.i %% 10 = 0 THEN 'ACTIVE' ELSE 'RESOLVED' END::alert_status,
+       now() - random() * INTERVAL '90 days'
+FROM (SELECT i, 1 + floor(random() * (SELECT count(*) FROM bench_envs))::int AS k
+      FROM generate_series(1, %(alerts)s) i) g
+JOIN bench_envs e ON e.k = g.k;
+
+INSERT INTO metrics (project_id, client_id, metric_name, value, timestamp)
+SELECT e.project_id, e.client_id,
+       (ARRAY['cpu_usage', 'memory_usage', 'response_time'])[1 + g.i %% 3],
+       random() * 100, now() - random() * INTERVAL '7 days'
+FROM (SELECT i, 1 + floor(random() * (SELECT count(*) FROM bench_envs))::int AS k
+      FROM generate_series(1, %(metrics)s) i) g
+JOIN bench_envs e ON e.k = g.k;
+
+INSERT INTO users (client_id, email, full_name, password_hash, role)
+SELECT id, 'bench@' || slug || '.test', 'Bench User', 'x', 'DEVELOPER'
+FROM clients WHERE slug LIKE 'bench-%%';
+"""
+
+
+def connect(dsn):
+    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+
+
+def seed(conn, scale):
+    """Charge le jeu de données synthétique puis met à jour les statistiques"""
+    volumes = {k: max(1, int(v * scale)) for k, v in BASE_VOLUMES.items()}
+    print(f"🌱 Chargement du jeu de données: {volumes}")
+    with conn.cursor() as cur:
+        cur.execute(SEED_SQL, volumes)
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("VACUUM (ANALYZE)")
+    conn.autocommit = False
+    print("✅ Données chargées et statistiques à jour")
+
+
+def cleanup(conn):
+    """Supprime les tenants de benchmark (cascade sur toutes les tables)"""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM clients WHERE slug LIKE 'bench-%'")
+    conn.commit()
+    print("🧹 Données de benchmark supprimées")
+
+
+def pick_params(conn):
+    """Paramètres les plus défavorables: le plus gros tenant et son plus gros projet"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT client_id, count(*) FROM projects GROUP BY client_id ORDER BY 2 DESC LIMIT 1
+        """)
+        client_id = cur.fetchone()['client_id']
+        cur.execute("""
+            SELECT project_id FROM metrics WHERE client_id = %s
+            GROUP BY project_id ORDER BY count(*) DESC LIMIT 1
+        """, (client_id,))
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("SELECT id AS project_id FROM projects WHERE client_id = %s LIMIT 1", (client_id,))
+            row = cur.fetchone()
+        cur.execute("SELECT email FROM users WHERE client_id = %s LIMIT 1", (client_id,))
+        user = cur.fetchone()
+    return {
+        'client_id': client_id,
+        'project_id': row['project_id'],
+        'email': user['email'] if user else 'nobody@example.com',
+    }
+
+
+def walk_plan(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk_plan(child)
+
+
+def check_query(conn, name, sql, params, budget_ms, runs=5):
+    """Vérifie le plan et la latence d'une requête; retourne (ok, détail)"""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()['QUERY PLAN'][0]['Plan']
+        seq_scans = sorted({n['Relation Name'] for n in walk_plan(plan)
+                            if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') in LARGE_TABLES})
+
+        timings = []
+        for _ in range(runs):
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+            result = cur.fetchone()['QUERY PLAN'][0]
+            timings.append(result['Planning Time'] + result['Execution Time'])
+        conn.rollback()
+
+    median_ms = statistics.median(timings)
+    problems = []
+    if seq_scans:
+        problems.append(f"Seq Scan sur {', '.join(seq_scans)}")
+    if median_ms > budget_ms:
+        problems.append(f"{median_ms:.1f} ms > budget {budget_ms} ms")
+    return not problems, {
+        'query': name,
+        'median_ms': round(median_ms, 2),
+        'budget_ms': budget_ms,
+        'root_node': plan['Node Type'],
+        'problems': problems,
+    }
+
+
+def run_checks(conn, budget_factor=1.0):
+    params = pick_params(conn)
+    print(f"🎯 Tenant testé: {params['client_id']} / projet {params['project_id']}")
+    results = []
+    passed = 0
+    for name, sql, budget_ms in HOT_QUERIES:
+        ok, detail = check_query(conn, name, sql, params, budget_ms * budget_factor)
+        results.append(detail)
+        if ok:
+            passed += 1
+            print(f"✅ {name}: {detail['median_ms']} ms ({detail['root_node']})")
+        else:
+            print(f"❌ {name}: {'; '.join(detail['problems'])}")
+    return passed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Régression des plans SQL des routes chaudes")
+    parser.add_argument('--dsn', default=DEFAULT_DSN, help="Base dédiée (jamais la base de production)")
+    parser.add_argument('--seed', action='store_true', help="Charger le jeu de données synthétique")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplicateur des volumes")
+    parser.add_argument('--cleanup', action='store_true', help="Supprimer les données de benchmark à la fin")
+    parser.add_argument('--budget-factor', type=float, default=1.0, help="Multiplicateur des budgets de latence")
+    parser.add_argument('--report', help="Écrire les résultats en JSON dans ce fichier")
+    args = parser.parse_args()
+
+    print("🧪 Régression des plans SQL MoonOps")
+    print("=" * 50)
+
+    conn = connect(args.dsn)
+    try:
+        if args.seed:
+            seed(conn, args.scale)
+        passed, results = run_checks(conn, args.budget_factor)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+        if args.cleanup:
+            cleanup(conn)
+    finally:
+        conn.close()
+
+    print("=" * 50)
+    print(f"📊 Résultats: {passed}/{len(HOT_QUERIES)} requêtes conformes")
+    return passed == len(HOT_QUERIES)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test du catalogue de modèles (backend/template_catalog.py) sur des dépôts file:// locaux
+
+Vérifie que chaque modèle est construit une seule fois en un dépôt bare
+compacté (un pack), que le commit est identique d'une construction à l'autre
+(date fixe), et que créer un projet pousse ce commit tel quel sur main, en un
+temps quasi constant. Aucun serveur ni GitLab requis.
+
+Usage:
+    python Script_test/test_template_catalog.py
+"""
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ['MOONOPS_GIT_ALLOW_FILE_URLS'] = '1'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import git_mirror  # noqa: E402
+import template_catalog  # noqa: E402
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, capture_output=True, text=True,
+                          env=dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@moonops',
+                                   GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@moonops')).stdout.strip()
+
+
+def new_target(workdir, name):
+    """Dépôt bare avec un README initial, comme un repository GitLab tout juste créé"""
+    target = os.path.join(workdir, f"{name}.git")
+    git('init', '-q', '--bare', '-b', 'main', target)
+    seed = os.path.join(workdir, f"{name}-seed")
+    git('init', '-q', '-b', 'main', seed)
+    with open(os.path.join(seed, 'README.md'), 'w') as f:
+        f.write('# GitLab\n')
+    git('add', 'README.md', cwd=seed)
+    git('commit', '-q', '-m', 'Initial commit', cwd=seed)
+    git('push', '-q', target, 'main', cwd=seed)
+    return target
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+
+def main():
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        mirrors = git_mirror.GitMirrorCache(root=os.path.join(workdir, 'mirrors'))
+        catalog = template_catalog.TemplateCatalog(mirrors, root=os.path.join(workdir, 'templates'), repos={})
+
+        started = time.perf_counter()
+        catalog.warm()
+        ok &= check(catalog.stats['builds'] == len(template_catalog.BUILTIN_TEMPLATES),
+                    f"Modèles préparés au démarrage ({time.perf_counter() - started:.2f}s)")
+        path, commit = catalog.ensure('web')
+        ok &= check(len(glob.glob(os.path.join(path, 'objects', 'pack', '*.pack'))) == 1,
+                    "Dépôt modèle compacté en un seul pack")
+
+        # Autre worker: même commit (contenu et date fixes), pas de reconstruction du dépôt existant
+        other = template_catalog.TemplateCatalog(mirrors, root=os.path.join(workdir, 'templates'), repos={})
+        ok &= check(other.ensure('web')[1] == commit and other.stats['builds'] == 0,
+                    "Commit identique entre workers, dépôt réutilisé")
+        fresh = template_catalog.TemplateCatalog(mirrors, root=os.path.join(workdir, 'templates-2'), repos={})
+        ok &= check(fresh.ensure('web')[1] == commit, "Construction déterministe")
+
+        durations = []
+        for i in range(5):
+            target = new_target(workdir, f"project-{i}")
+            started = time.perf_counter()
+            template = catalog.push('web', f"file://{target}")
+            durations.append(time.perf_counter() - started)
+            ok &= check(git('rev-parse', 'main', cwd=target) == commit == template['commit'],
+                        f"Projet {i}: main = commit du modèle ({durations[-1] * 1000:.0f} ms)")
+        files = git('ls-tree', '-r', '--name-only', 'main', cwd=target).split('\n')
+        ok &= check({'package.json', '.gitlab-ci.yml', 'src/server.js'} <= set(files), "Projet prêt à construire")
+
+        catalog_entries = {t['id']: t for t in catalog.catalog()}
+        ok &= check(catalog_entries['web']['ready'] and catalog_entries['web']['commit'] == commit,
+                    "Catalogue: version et commit exposés")
+        ok &= check('inconnu' not in catalog, "template_type inconnu: pas de modèle")
+
+    print("🎉 Catalogue de modèles OK" if ok else "💥 Échecs")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,339 @@
+"""
+Moteur de règles d'alerte incrémental sur le flux de métriques MoonOps
+Chaque échantillon ingéré met à jour l'état de fenêtre glissante des séries
+(règle, projet) concernées en O(1) amorti, sans relire l'historique: somme et
+compte pour la moyenne, deque monotone pour min/max, premier point de la
+fenêtre pour le taux de variation. Une alerte s'ouvre quand la condition tient
+depuis for_s secondes et se résout de l'autre côté du seuil de retour
+(hystérésis); l'absence de données est vérifiée périodiquement par tick().
+Avec plusieurs workers, les fenêtres sont alimentées par le flux partagé de la
+table metrics (follow(): points ingérés par tous les workers, dans l'ordre des
+id, chaque ligne une seule fois): chaque worker voit toute la série. ingest()
+n'évalue que les points reçus par ce processus: un seul worker, ou un routage
+collant par tenant.
+Les transitions portent l'empreinte du problème (projet, règle, labels): les
+répétitions mettent à jour une seule alerte au lieu d'en insérer de nouvelles.
+"""
+import collections
+import hashlib
+import json
+import operator
+import threading
+import time
+
+KINDS = ('threshold', 'rate', 'absence')
+AGGREGATIONS = ('avg', 'max', 'min', 'last')
+COMPARATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+SEVERITIES = ('INFO', 'WARNING', 'CRITICAL')
+
+# Transition d'une série: action 'open' ou 'resolve'
+AlertEvent = collections.namedtuple('AlertEvent', 'action rule project_id value ts')
+# Transitions d'une même empreinte dans un lot: dernière ouverture, nombre d'ouvertures, résolue en fin de lot
+AlertUpdate = collections.namedtuple('AlertUpdate', 'fingerprint event occurrences resolved')
+
+
+def fingerprint(project_id, rule_id=None, labels=None):
+    """Empreinte d'un problème: mêmes projet, règle et labels -> même alerte"""
+    key = json.dumps([str(project_id), str(rule_id) if rule_id else None, labels or {}],
+                     sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def coalesce_events(events):
+    """Regroupe les transitions par empreinte (ordre de première apparition): une écriture par problème"""
+    updates = {}
+    for event in events:
+        key = fingerprint(event.project_id, event.rule.id, event.rule.labels)
+        previous = updates.get(key)
+        if event.action == 'open':
+            occurrences = previous.occurrences + 1 if previous else 1
+            updates[key] = AlertUpdate(key, event, occurrences, False)
+        elif previous:
+            updates[key] = previous._replace(resolved=True)
+        else:
+            updates[key] = AlertUpdate(key, event, 0, True)
+    return list(updates.values())
+
+
+class AlertRule:
+    """Règle d'un tenant sur une métrique (project_id None: tous les projets du tenant)"""
+
+    __slots__ = ('id', 'client_id', 'project_id', 'name', 'metric_name', 'kind', 'aggregation',
+                 'comparator', 'threshold', 'clear_threshold', 'window_s', 'for_s', 'severity', 'breach', 'labels')
+
+    def __init__(self, id, client_id, metric_name, kind='threshold', aggregation='avg', comparator='>',
+                 threshold=0.0, clear_threshold=None, window_s=60, for_s=0, severity='WARNING',
+                 project_id=None, name=None):
+        self.id = str(id)
+        self.client_id = str(client_id)
+        self.project_id = str(project_id) if project_id else None
+        self.name = name or f"{metric_name} {comparator} {threshold}"
+        self.metric_name = metric_name
+        self.kind = kind
+        self.aggregation = aggregation
+        self.comparator = comparator
+        self.threshold = float(threshold)
+        # Hystérésis: résolution quand la valeur repasse le seuil de retour (défaut: le seuil)
+        self.clear_threshold = self.threshold if clear_threshold is None else float(clear_threshold)
+        self.window_s = float(window_s)
+        self.for_s = float(for_s)
+        self.severity = severity
+        self.breach = COMPARATORS[comparator]
+        # Labels de l'empreinte des alertes de la règle
+        self.labels = {'metric_name': metric_name}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['client_id'], row['metric_name'], row['kind'], row['aggregation'],
+                   row['comparator'], row['threshold'], row['clear_threshold'], row['window_s'],
+                   row['for_s'], row['severity'], row['project_id'], row['name'])
+
+    def message(self, value):
+        if self.kind == 'absence':
+            return f"{self.name}: aucune donnée '{self.metric_name}' depuis {self.window_s:.0f}s"
+        label = 'variation/s' if self.kind == 'rate' else self.aggregation
+        return (f"{self.name}: {self.metric_name} ({label} sur {self.window_s:.0f}s) = {value:.4g} "
+                f"{self.comparator} {self.threshold:.4g}")
+
+
+def validate_rule(data):
+    """Champs d'une règle reçue en JSON, normalisés; ValueError si invalide"""
+    if not isinstance(data, dict):
+        raise ValueError("Règle invalide")
+    rule = {
+        'name': str(data.get('name') or '').strip() or None,
+        'project_id': data.get('project_id') or None,
+        'metric_name': str(data.get('metric_name') or '').strip(),
+        'kind': data.get('kind', 'threshold'),
+        'aggregation': data.get('aggregation', 'avg'),
+        'comparator': data.get('comparator', '>'),
+        'severity': data.get('severity', 'WARNING'),
+    }
+    if not rule['metric_name']:
+        raise ValueError("metric_name requis")
+    for field, allowed in (('kind', KINDS), ('aggregation', AGGREGATIONS),
+                           ('comparator', tuple(COMPARATORS)), ('severity', SEVERITIES)):
+        if rule[field] not in allowed:
+            raise ValueError(f"{field} invalide (valeurs: {', '.join(allowed)})")
+    try:
+        rule['threshold'] = float(data.get('threshold', 0))
+        clear = data.get('clear_threshold')
+        rule['clear_threshold'] = None if clear is None else float(clear)
+        rule['window_s'] = int(data.get('window_s', 60))
+        rule['for_s'] = int(data.get('for_s', 0))
+    except (TypeError, ValueError):
+        raise ValueError("threshold, clear_threshold, window_s et for_s doivent être numériques")
+    if rule['window_s'] <= 0 or rule['for_s'] < 0:
+        raise ValueError("window_s doit être > 0 et for_s >= 0")
+    clear = rule['clear_threshold']
+    if clear is not None and rule['kind'] != 'absence':
+        # Le seuil de retour est du côté « sain » du seuil
+        above = rule['comparator'] in ('>', '>=')
+        if (above and clear > rule['threshold']) or (not above and clear < rule['threshold']):
+            raise ValueError("clear_threshold doit être du côté sain du seuil (hystérésis)")
+    return rule
+
+
+class _SeriesState:
+    """Fenêtre glissante d'une série (règle, projet) et état de l'alerte"""
+
+    __slots__ = ('rule', 'points', 'total', 'last_ts', 'firing', 'pending_since', 'value')
+
+    def __init__(self, rule, firing=False):
+        self.rule = rule
+        self.points = collections.deque()
+        self.total = 0.0
+        self.last_ts = float('-inf')
+        self.firing = firing
+        self.pending_since = None
+        self.value = None
+
+    def observe(self, ts, value):
+        """Ajoute un point; retourne la valeur agrégée de la fenêtre (None: pas assez de points)"""
+        rule = self.rule
+        self.last_ts = ts
+        kind = rule.kind
+        if kind == 'absence':
+            return value
+        aggregation = rule.aggregation
+        if kind == 'threshold' and aggregation == 'last':
+            return value
+        points = self.points
+        horizon = ts - rule.window_s
+        if kind == 'rate' or aggregation == 'avg':
+            points.append((ts, value))
+            if len(points) == 1:
+                self.total = value  # Repart de zéro: pas de dérive d'arrondi accumulée
+            else:
+                self.total += value
+            while points[0][0] < horizon:
+                self.total -= points.popleft()[1]
+            if kind == 'rate':
+                first_ts, first_value = points[0]
+                return (value - first_value) / (ts - first_ts) if ts > first_ts else None
+            return self.total / len(points)
+        # min / max: deque monotone, l'extremum de la fenêtre est en tête
+        if aggregation == 'max':
+            while points and points[-1][1] <= value:
+                points.pop()
+        else:
+            while points and points[-1][1] >= value:
+                points.pop()
+        points.append((ts, value))
+        while points[0][0] < horizon:
+            points.popleft()
+        return points[0][1]
+
+
+class AlertEngine:
+    """ingest() au fil des échantillons, tick() pour l'absence de données; transitions en AlertEvent"""
+
+    def __init__(self):
+        self._rules = {}
+        # client_id -> metric_name -> [règles]
+        self._index = {}
+        self._states = {}
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def load_rules(self, rules, firing=None):
+        """Remplace les règles; les fenêtres des règles conservées sont gardées.
+        firing: (rule_id, project_id) des alertes non résolues en base, qui font foi
+        (redémarrage, alerte ouverte ou résolue par un autre worker)"""
+        with self._lock:
+            self._rules = {rule.id: rule for rule in rules}
+            self._reindex()
+            states = {}
+            for key, state in self._states.items():
+                rule = self._rules.get(key[0])
+                if rule is not None:
+                    state.rule = rule
+                    states[key] = state
+            if firing is not None:
+                firing = {(str(rule_id), str(project_id)) for rule_id, project_id in firing}
+                for key, state in states.items():
+                    if state.firing != (key in firing):
+                        state.firing = key in firing
+                        state.pending_since = None
+                for key in firing:
+                    if key[0] in self._rules and key not in states:
+                        states[key] = _SeriesState(self._rules[key[0]], firing=True)
+            self._states = states
+
+    def upsert_rule(self, rule):
+        with self._lock:
+            self._rules[rule.id] = rule
+            self._reindex()
+            for key, state in self._states.items():
+                if key[0] == rule.id:
+                    state.rule = rule
+
+    def remove_rule(self, rule_id):
+        with self._lock:
+            self._rules.pop(str(rule_id), None)
+            self._reindex()
+            self._states = {key: state for key, state in self._states.items() if key[0] != str(rule_id)}
+
+    def _reindex(self):
+        index = {}
+        for rule in self._rules.values():
+            index.setdefault(rule.client_id, {}).setdefault(rule.metric_name, []).append(rule)
+        self._index = index
+
+    def ingest(self, client_id, samples):
+        """samples: (project_id, metric_name, ts, value) triés par ts; retourne les transitions.
+        Fenêtres de ce seul processus: un worker unique ou un routage collant par tenant"""
+        return self._evaluate(client_id, samples)
+
+    def follow(self, client_id, samples, now=None):
+        """Points du flux partagé de metrics (tous les workers, dans l'ordre des id, chaque ligne
+        une seule fois): toutes les règles; retourne les transitions"""
+        return self._evaluate(client_id, samples, time.time() if now is None else now)
+
+    def _evaluate(self, client_id, samples, now=None):
+        """now: suivi de metrics (None: ingestion directe)"""
+        events = []
+        evaluations = 0
+        out_of_order = 0
+        with self._lock:
+            by_metric = self._index.get(str(client_id))
+            if by_metric:
+                states = self._states
+                for project_id, metric_name, ts, value in samples:
+                    rules = by_metric.get(metric_name)
+                    if rules is None:
+                        continue
+                    for rule in rules:
+                        if rule.project_id is not None and rule.project_id != project_id:
+                            continue
+                        key = (rule.id, project_id)
+                        state = states.get(key)
+                        if state is None:
+                            state = states[key] = _SeriesState(rule)
+                        elif rule.kind == 'absence' and now is not None:
+                            # Un point relu (commit tardif) garde le plus récent des derniers points
+                            state.last_ts = max(state.last_ts, ts)
+                            # Un point plus ancien que window_s ne résout pas l'absence
+                            if state.firing and now - state.last_ts < rule.window_s:
+                                state.firing = False
+                                events.append(AlertEvent('resolve', rule, project_id, value, ts))
+                            continue
+                        elif ts < state.last_ts:
+                            out_of_order += 1
+                            continue
+                        evaluations += 1
+                        current = state.observe(ts, value)
+                        if current is None:
+                            continue
+                        state.value = current
+                        if rule.kind == 'absence':
+                            if state.firing and (now is None or now - ts < rule.window_s):
+                                state.firing = False
+                                events.append(AlertEvent('resolve', rule, project_id, current, ts))
+                        elif state.firing:
+                            if not rule.breach(current, rule.clear_threshold):
+                                state.firing = False
+                                events.append(AlertEvent('resolve', rule, project_id, current, ts))
+                        elif rule.breach(current, rule.threshold):
+                            if state.pending_since is None:
+                                state.pending_since = ts
+                            if ts - state.pending_since >= rule.for_s:
+                                state.firing = True
+                                state.pending_since = None
+                                events.append(AlertEvent('open', rule, project_id, current, ts))
+                        else:
+                            state.pending_since = None
+            self.stats['samples' if now is None else 'followed'] += len(samples)
+            self.stats['evaluations'] += evaluations
+            self.stats['out_of_order'] += out_of_order
+            self._count(events)
+        return events
+
+    def tick(self, now=None):
+        """Règles d'absence: séries déjà vues et muettes depuis window_s"""
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            for (rule_id, project_id), state in self._states.items():
+                rule = state.rule
+                if rule.kind == 'absence' and not state.firing and now - state.last_ts >= rule.window_s:
+                    state.firing = True
+                    events.append(AlertEvent('open', rule, project_id, None, now))
+            self._count(events)
+        return events
+
+    def _count(self, events):
+        for event in events:
+            self.stats['opened' if event.action == 'open' else 'resolved'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            firing = sum(1 for state in self._states.values() if state.firing)
+            return {
+                'rules': len(self._rules),
+                'tenants': len(self._index),
+                'series': len(self._states),
+                'firing': firing,
+                'window_points': sum(len(state.points) for state in self._states.values()),
+                'stats': dict(self.stats),
+            }
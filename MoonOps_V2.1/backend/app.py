@@ -1,16 +1,41 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from psycopg2.extras import RealDictCursor, execute_values
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+import hmac
+import json
 import os
+import threading
+import time
 import uuid
+import zlib
 import requests
 import subprocess
 import tempfile
 from dotenv import load_dotenv
 import bcrypt
+import tracing
+import profiling
+import project_sync
+import metric_analytics
+import metric_chunks
+from alert_engine import AlertEngine, AlertRule, coalesce_events, validate_rule
+from hot_tier import HOT_TIER_HORIZON_S, HotTier, MetricsCursor
+import db_router
+from sharding import ShardSet, TenantMovingError
+from query_log import QUERY_LOG
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from git_mirror import GitMirrorCache, GitMirrorError, IMPORT_MODES, validate_url
+from result_cache import ResultCache
+from singleflight import SingleFlight
+from storage import UPLOAD, WORKDIR, StorageFull, StorageManager
+from template_catalog import TEMPLATE_WARM, TemplateCatalog
+import rate_limit
+from rate_limit import AdmissionController, RateLimited
 
 # Charger les variables d'environnement depuis gitlab.env s'il existe
 env_file = os.path.join(os.path.dirname(__file__), 'gitlab.env')
@@ -21,7 +46,8 @@ else:
     print("⚠️ Fichier gitlab.env non trouvé, utilisation des variables d'environnement système")
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:5173", "http://localhost:3000", "http://localhost:5174"])
+CORS(app, origins=["http://localhost:5173", "http://localhost:3000", "http://localhost:5174"],
+     expose_headers=[db_router.LSN_HEADER])
 
 # Configuration PostgreSQL
 DB_CONFIG = {
@@ -48,40 +74,325 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 GITLAB_URL = os.getenv('GITLAB_URL', 'http://gitlab')
 GITLAB_TOKEN = os.getenv('GITLAB_TOKEN', 'glpat-1234567890abcdef')  # Token à configurer
 GITLAB_API_VERSION = 'v4'
+# GitLab injoignable: échec rapide à la connexion, disjoncteur sur erreurs et lenteurs
+GITLAB_CONNECT_TIMEOUT_S = float(os.getenv('MOONOPS_GITLAB_CONNECT_TIMEOUT_S', '3'))
+GITLAB_BREAKER = CircuitBreaker('gitlab')
 
 # Configuration projets locaux (pour développement)
 PROJECTS_FOLDER = '/tmp/moonops_projects'
 os.makedirs(PROJECTS_FOLDER, exist_ok=True)
 
+# Miroirs locaux des dépôts Git importés (un clone par URL source, partagé par les projets)
+GIT_MIRRORS = GitMirrorCache()
+
+# Dépôts modèles pré-construits par template_type, poussés à la création des projets
+TEMPLATES = TemplateCatalog(GIT_MIRRORS)
+if TEMPLATE_WARM:
+    threading.Thread(target=TEMPLATES.warm, name='moonops-templates', daemon=True).start()
+
+# Archives, dossiers de travail et miroirs: quotas, éviction LRU et nettoyage (janitor démarré plus bas)
+STORAGE = StorageManager(UPLOAD_FOLDER, PROJECTS_FOLDER, mirrors=GIT_MIRRORS,
+                         protected=lambda: pending_archives())
+
+# Jeton des routes d'administration (désactivées si vide)
+ADMIN_TOKEN = os.getenv('MOONOPS_ADMIN_TOKEN', '')
+
+# Tests de charge / démo: accepter le client courant depuis l'en-tête X-Client-Id
+TRUST_CLIENT_HEADER = os.getenv('MOONOPS_TRUST_CLIENT_HEADER', '').lower() in ('1', 'true', 'yes')
+
 def allowed_file(filename):
     """Vérifie si le fichier est un ZIP"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Shards par tenant (MOONOPS_SHARDS) et, pour chacun, routage primaire / réplicas
+# (MOONOPS_DB_REPLICAS pour le shard "main"). Sans configuration: une seule base.
+SHARDS = ShardSet.from_env(DB_CONFIG)
+SHARDS.start_monitors()
+
+# Cache des résultats de lecture par tenant, invalidé par les écritures
+# (routes ci-dessous et triggers PostgreSQL sur chaque shard)
+RESULT_CACHE = ResultCache.from_env()
+for _shard, _router in SHARDS.routers.items():
+    RESULT_CACHE.listen(_router.primary.config, _shard)
+
+# Requêtes identiques simultanées regroupées sur un seul calcul (MOONOPS_SINGLEFLIGHT_ROUTES)
+SINGLE_FLIGHT = SingleFlight()
+
+def cached_loader(resource):
+    """Résultat du chargeur partagé par tous les utilisateurs du tenant"""
+    def decorator(loader):
+        @wraps(loader)
+        def wrapper(client_id):
+            found, value, key = RESULT_CACHE.lookup(resource, client_id)
+            if found:
+                return value
+
+            def compute():
+                if key is None:
+                    return loader(client_id)
+                # Résultat gardé tout le TTL: lu sur le primaire, jamais sur un réplica en retard
+                with db_router.primary_reads():
+                    result = loader(client_id)
+                RESULT_CACHE.store(resource, key, result)
+                return result
+            # La clé du cache porte la génération du tenant: une requête arrivée
+            # après une écriture ne rejoint pas un calcul commencé avant
+            return SINGLE_FLIGHT.do(resource, key or f"{resource}:{client_id}", compute)
+        return wrapper
+    return decorator
+
 def get_db():
-    """Connexion à PostgreSQL"""
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+    """Connexion directe au primaire du shard courant (écritures, fermée par l'appelant)"""
+    SHARDS.check_writable()
+    router = SHARDS.router()
+    router.note_write()
+    with tracing.span('db.connect', **{'db.shard': router.name}):
+        return psycopg2.connect(**router.primary.config, cursor_factory=RealDictCursor)
 
 def db_query(query, params=None, fetch_one=False):
-    """Helper pour exécuter des requêtes"""
-    conn = get_db()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            if query.strip().upper().startswith("SELECT"):
-                result = cur.fetchone() if fetch_one else cur.fetchall()
-                return result
-            conn.commit()
-            return True
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    """Helper pour exécuter des requêtes (shard du tenant courant, SELECT vers un réplica si configuré)"""
+    readonly = query.strip().upper().startswith("SELECT")
+    if not readonly:
+        SHARDS.check_writable()
+    with SHARDS.router().connection(readonly) as conn:
+        try:
+            with tracing.span('db.query', **{'db.statement': ' '.join(query.split())[:300]}) as sp:
+                with conn.cursor() as cur:
+                    started = time.perf_counter()
+                    cur.execute(query, params)
+                    if readonly:
+                        result = cur.fetchone() if fetch_one else cur.fetchall()
+                        conn.rollback()
+                    else:
+                        conn.commit()
+                        result = True
+                    duration_ms = (time.perf_counter() - started) * 1000
+                    sp.set_attribute('db.rowcount', cur.rowcount)
+                    QUERY_LOG.record(query, params, duration_ms, cur.rowcount, cur)
+                    return result
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def run_git(args, cwd, timeout=None):
+    """Exécute une commande git dans un span (les URLs avec token ne sont pas tracées)"""
+    with tracing.span(f"git {args[0]}", **{'git.command': args[0]}) as sp:
+        result = subprocess.run(
+            ['git'] + list(args),
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        sp.set_attribute('git.returncode', result.returncode)
+        return result
+
+def is_admin_request():
+    """Vérifie le jeton d'administration (en-tête X-Admin-Token)"""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def admin_required(view):
+    """Décorateur: réserve une route aux administrateurs"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"success": False, "error": "Accès administrateur requis"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# ============================================
+# TRACING
+# ============================================
+
+@app.before_request
+def start_request_trace():
+    """Ouvre la trace racine de la requête (si échantillonnée)"""
+    g.trace_root = tracing.start_trace(
+        f"{request.method} {request.path}",
+        request.headers.get('traceparent'),
+        **{'http.method': request.method, 'http.target': request.path}
+    )
+
+@app.after_request
+def tag_request_trace(response):
+    """Ajoute le statut HTTP au span racine et renvoie l'ID de trace"""
+    root = g.get('trace_root')
+    if root is not None:
+        root.set_attribute('http.status_code', response.status_code)
+        if request.url_rule is not None:
+            root.set_attribute('http.route', request.url_rule.rule)
+        response.headers['X-Trace-Id'] = root.trace_id
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    """Ferme la trace racine de la requête"""
+    tracing.end_trace(g.pop('trace_root', None), exc)
+
+# ============================================
+# DB ROUTING (read-your-writes)
+# ============================================
+
+@app.before_request
+def start_db_session():
+    """Session de routage: après une écriture, ses lectures restent sur le primaire
+    (jeton LSN renvoyé par le client, sinon fenêtre de la session dans ce processus)"""
+    session_key = request.headers.get('X-Session-Id') or \
+        f"{request.remote_addr}|{request.headers.get('X-Client-Id', '')}"
+    lsn_token = request.headers.get(db_router.LSN_HEADER) or request.cookies.get(db_router.LSN_COOKIE)
+    g.db_session_token = db_router.begin_session(session_key, lsn_token)
+
+@app.after_request
+def send_lsn_token(response):
+    """Après une écriture: position WAL du primaire renvoyée au client (en-tête et cookie),
+    les lectures suivantes, sur n'importe quel worker, évitent les réplicas en retard"""
+    shards = db_router.written_shards()
+    if shards:
+        try:
+            token = db_router.lsn_token({shard: SHARDS.routers[shard].current_lsn() for shard in shards})
+            response.headers[db_router.LSN_HEADER] = token
+            response.set_cookie(db_router.LSN_COOKIE, token, max_age=db_router.LSN_COOKIE_MAX_AGE_S,
+                                httponly=True, samesite='Lax')
+        except Exception as e:
+            print(f"⚠️ Jeton read-your-writes non envoyé: {e}")
+    return response
+
+@app.teardown_request
+def end_db_session(exc):
+    token = g.pop('db_session_token', None)
+    if token is not None:
+        db_router.end_session(token)
+    tenant_token = g.pop('tenant_token', None)
+    if tenant_token is not None:
+        SHARDS.unbind(tenant_token)
+
+@app.errorhandler(TenantMovingError)
+def tenant_moving(e):
+    """Écriture pendant le déplacement du tenant vers un autre shard"""
+    response = jsonify({"success": False, "error": str(e)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+# ============================================
+# ADMISSION CONTROL (débit par tenant)
+# ============================================
+
+ADMISSION = AdmissionController.from_env()
+
+def admission_key(route_class):
+    """Tenant limité: l'adresse IP pour la connexion (pas encore de client)"""
+    if route_class == 'auth':
+        return request.remote_addr or 'anonymous'
+    return resolve_client_id(request.remote_addr, request.headers.get('X-Client-Id'))
+
+@app.before_request
+def admit_request():
+    """Seau à jetons et plafond de concurrence; file équitable pour upload/deploy"""
+    route_class = rate_limit.route_class(request.endpoint, request.method, request.path)
+    if route_class is not None:
+        g.admission = ADMISSION.admit(route_class, admission_key(route_class))
+
+@app.teardown_request
+def release_admission(exc):
+    ADMISSION.release(g.pop('admission', None))
+
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    response = jsonify({"success": False, "error": str(e)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, e.status
+
+# Routes qui écrivent une archive sur le disque
+UPLOAD_ENDPOINTS = {'create_project_with_upload', 'upload_project_update'}
+
+@app.before_request
+def check_upload_storage():
+    """Refus d'un upload avant lecture du corps si la place manque (Content-Length)"""
+    if request.endpoint in UPLOAD_ENDPOINTS and request.method == 'POST':
+        client_id = resolve_client_id(request.remote_addr, request.headers.get('X-Client-Id'))
+        STORAGE.admit_upload(client_id, request.content_length, MAX_FILE_SIZE)
+
+@app.errorhandler(StorageFull)
+def storage_full(e):
+    response = jsonify({"success": False, "error": str(e)})
+    response.headers['Retry-After'] = '60'
+    return response, e.status
+
+# ============================================
+# QUERY LOG (N+1)
+# ============================================
+
+@app.before_request
+def start_query_count():
+    """Compte les requêtes SQL par empreinte pendant la requête HTTP"""
+    g.query_count_token = QUERY_LOG.begin_request()
+
+@app.teardown_request
+def end_query_count(exc):
+    """Signale les motifs N+1 et garde le nombre d'allers-retours DB"""
+    token = g.pop('query_count_token', None)
+    if token is not None:
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        g.db_round_trips = QUERY_LOG.end_request(token, f"{request.method} {route}")
+
+# ============================================
+# PROFILING
+# ============================================
+
+@app.before_request
+def start_request_profile():
+    """Profile la requête si elle est échantillonnée ou marquée par un admin"""
+    header = request.headers.get(profiling.PROFILE_HEADER)
+    if header is None and profiling.SETTINGS.sample_ratio <= 0:
+        return
+    mode = profiling.should_profile(header, is_admin_request())
+    if mode:
+        g.profile = profiling.RequestProfile(mode, f"{request.method} {request.path}").start()
+
+@app.after_request
+def stop_request_profile(response):
+    """Enregistre le profil et indique son nom dans X-Profile-Name (admins seulement)"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        try:
+            name = profile.stop()
+            # Requêtes échantillonnées: les noms de fichiers de profil ne sont pas exposés aux clients
+            if is_admin_request():
+                response.headers['X-Profile-Name'] = name
+        except Exception as e:
+            print(f"⚠️ Erreur enregistrement profil: {e}")
+    return response
+
+@app.teardown_request
+def discard_request_profile(exc):
+    """Arrête un profil resté actif (exception avant after_request)"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        try:
+            profile.stop()
+        except Exception as e:
+            print(f"⚠️ Erreur enregistrement profil: {e}")
 
 # ============================================
 # ROUTES AUTH
 # ============================================
 
+LOGIN_SQL = "SELECT id, email, full_name, role, client_id, password_hash FROM users WHERE email = %s AND is_active = TRUE"
+
+def check_password(password, password_hash):
+    """Vérification du mot de passe avec bcrypt (coûteux en CPU)"""
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def serialize_user(user):
+    return {
+        "id": str(user['id']),
+        "email": user['email'],
+        "name": user['full_name'],
+        "role": user['role'],
+        "client_id": str(user['client_id'])
+    }
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """Authentification utilisateur"""
@@ -94,25 +405,12 @@ def login():
     
     # Vérification en base avec hash bcrypt
     try:
-        user = db_query(
-            "SELECT id, email, full_name, role, client_id, password_hash FROM users WHERE email = %s AND is_active = TRUE",
-            (email,),
-            fetch_one=True
-        )
+        user = db_query(LOGIN_SQL, (email,), fetch_one=True)
 
         if user and user['password_hash']:
             # Vérification du mot de passe avec bcrypt
-            if bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-                return jsonify({
-                    "success": True,
-                    "user": {
-                        "id": str(user['id']),
-                        "email": user['email'],
-                        "name": user['full_name'],
-                        "role": user['role'],
-                        "client_id": str(user['client_id'])
-                    }
-                })
+            if check_password(password, user['password_hash']):
+                return jsonify({"success": True, "user": serialize_user(user)})
 
         return jsonify({"success": False, "error": "Identifiants invalides"}), 401
 
@@ -124,27 +422,35 @@ def login():
 # ROUTES PROJECTS
 # ============================================
 
+# Simulation: différents clients pour la démo
+# En vrai, cela viendrait de l'authentification
+DEMO_CLIENTS = [
+    'fcb79070-fca6-4367-8f74-fa138223fa97',  # TechConsulting (défaut)
+    'ae89d37b-8b81-46d4-acf4-9bf17e3342db',  # ClientA
+    'ff8f1b6d-8afc-4abf-97e4-22b73f69343a',  # ClientB
+]
+
+def resolve_client_id(remote_addr, client_header=None):
+    """Client de la requête (partagé par les modes WSGI et ASGI)"""
+    # Pour la démo, on alterne entre les clients (hash stable: identique
+    # dans tous les workers, contrairement à hash() randomisé par processus)
+    # En production: lire depuis le JWT token
+    client_index = zlib.crc32((remote_addr or 'demo').encode()) % len(DEMO_CLIENTS)
+    current_client = DEMO_CLIENTS[client_index]
+
+    # Tests de charge multi-tenant: client choisi par l'appelant (désactivé par défaut)
+    if TRUST_CLIENT_HEADER and client_header:
+        current_client = client_header
+    return current_client
+
 def get_current_client_id():
     """Obtenir l'ID du client actuel depuis la session (simulation)"""
     # Pour la démo multi-tenant, on simule différents clients
     # En production, cela viendrait du JWT token ou de la session
-
-    # Pour la démo, on peut utiliser un paramètre d'URL ou un header
-    # ou baser sur l'utilisateur connecté (simulation)
-    import random
-
-    # Simulation: différents clients pour la démo
-    # En vrai, cela viendrait de l'authentification
-    demo_clients = [
-        'fcb79070-fca6-4367-8f74-fa138223fa97',  # TechConsulting (défaut)
-        'ae89d37b-8b81-46d4-acf4-9bf17e3342db',  # ClientA
-        'ff8f1b6d-8afc-4abf-97e4-22b73f69343a',  # ClientB
-    ]
-
-    # Pour la démo, on alterne entre les clients
-    # En production: lire depuis le JWT token
-    client_index = hash(request.remote_addr or 'demo') % len(demo_clients)
-    current_client = demo_clients[client_index]
+    current_client = resolve_client_id(request.remote_addr, request.headers.get('X-Client-Id'))
+    # Les requêtes SQL suivantes de la requête HTTP vont au shard du client
+    if 'tenant_token' not in g:
+        g.tenant_token = SHARDS.bind(current_client)
 
     # Récupérer le nom du client pour les logs
     try:
@@ -158,14 +464,32 @@ def get_current_client_id():
 
     return current_client
 
+class GitLabUnavailable(Exception):
+    """GitLab en panne ou disjoncteur ouvert: le provisionnement est différé"""
+
+def gitlab_request(method, url, timeout, **kwargs):
+    """Appel de l'API GitLab via le disjoncteur (erreurs réseau et HTTP 5xx = échecs)"""
+    try:
+        with GITLAB_BREAKER.call() as attempt:  # Essai semi-ouvert rendu si l'appel sort sans résultat
+            try:
+                response = requests.request(method, url, headers={
+                    'PRIVATE-TOKEN': GITLAB_TOKEN,
+                    'Content-Type': 'application/json'
+                }, timeout=(GITLAB_CONNECT_TIMEOUT_S, timeout), **kwargs)
+            except requests.exceptions.RequestException as e:
+                attempt.record(False, str(e))
+                raise GitLabUnavailable(f"GitLab injoignable: {e}")
+            failed = response.status_code >= 500
+            attempt.record(not failed, f"HTTP {response.status_code}" if failed else None)
+    except CircuitOpenError as e:
+        raise GitLabUnavailable(str(e))
+    if failed:
+        raise GitLabUnavailable(f"GitLab en erreur: HTTP {response.status_code}")
+    return response
+
 def get_or_create_gitlab_group(client_id):
     """Obtient ou crée un groupe GitLab pour le client"""
     try:
-        headers = {
-            'PRIVATE-TOKEN': GITLAB_TOKEN,
-            'Content-Type': 'application/json'
-        }
-
         # Récupérer le nom du client depuis la base
         client_info = db_query("SELECT name FROM clients WHERE id = %s", (client_id,), fetch_one=True)
         if not client_info:
@@ -178,7 +502,9 @@ def get_or_create_gitlab_group(client_id):
 
         # Vérifier si le groupe existe déjà
         search_url = f"{GITLAB_URL}/api/{GITLAB_API_VERSION}/groups?search={group_name}"
-        response = requests.get(search_url, headers=headers, timeout=10)
+        with tracing.span('gitlab.search_group', **{'http.method': 'GET', 'gitlab.group': group_path}) as sp:
+            response = gitlab_request('GET', search_url, timeout=10)
+            sp.set_attribute('http.status_code', response.status_code)
 
         if response.status_code == 200:
             groups = response.json()
@@ -197,7 +523,9 @@ def get_or_create_gitlab_group(client_id):
         }
 
         create_url = f"{GITLAB_URL}/api/{GITLAB_API_VERSION}/groups"
-        response = requests.post(create_url, headers=headers, json=data, timeout=30)
+        with tracing.span('gitlab.create_group', **{'http.method': 'POST', 'gitlab.group': group_path}) as sp:
+            response = gitlab_request('POST', create_url, timeout=30, json=data)
+            sp.set_attribute('http.status_code', response.status_code)
 
         if response.status_code == 201:
             group_data = response.json()
@@ -208,22 +536,30 @@ def get_or_create_gitlab_group(client_id):
             print(f"   Détails: {response.text}")
             return None
 
+    except GitLabUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Erreur groupe GitLab: {e}")
         return None
 
+def gitlab_repo_summary(repo_data):
+    """Champs utiles d'un projet GitLab créé"""
+    return {
+        'repo_id': repo_data['id'],
+        'name': repo_data['name'],
+        'ssh_url': repo_data['ssh_url_to_repo'],
+        'http_url': repo_data['http_url_to_repo'],
+        'web_url': repo_data['web_url']
+    }
+
 def create_gitlab_repository(project_name, description="", client_id=None):
     """Crée un repository GitLab via API avec isolation par client"""
     try:
-        headers = {
-            'PRIVATE-TOKEN': GITLAB_TOKEN,
-            'Content-Type': 'application/json'
-        }
-
         # Obtenir ou créer le groupe du client
         group_id = None
         if client_id:
-            group_id = get_or_create_gitlab_group(client_id)
+            with tracing.span('gitlab.group_lookup'):
+                group_id = get_or_create_gitlab_group(client_id)
 
         # Générer un nom unique pour éviter les conflits
         import time
@@ -242,18 +578,14 @@ def create_gitlab_repository(project_name, description="", client_id=None):
             data['namespace_id'] = group_id
 
         url = f"{GITLAB_URL}/api/{GITLAB_API_VERSION}/projects"
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        with tracing.span('gitlab.create_project', **{'http.method': 'POST', 'gitlab.project': unique_name}) as sp:
+            response = gitlab_request('POST', url, timeout=30, json=data)
+            sp.set_attribute('http.status_code', response.status_code)
 
         if response.status_code == 201:
             repo_data = response.json()
             print(f"✅ Repository GitLab créé: {repo_data['name_with_namespace']} (nom unique: {unique_name})")
-            return {
-                'repo_id': repo_data['id'],
-                'name': repo_data['name'],
-                'ssh_url': repo_data['ssh_url_to_repo'],
-                'http_url': repo_data['http_url_to_repo'],
-                'web_url': repo_data['web_url']
-            }
+            return gitlab_repo_summary(repo_data)
         else:
             print(f"❌ Erreur création repo GitLab: HTTP {response.status_code}")
             print(f"   URL: {url}")
@@ -265,13 +597,36 @@ def create_gitlab_repository(project_name, description="", client_id=None):
                 print(f"   Réponse: {response.text}")
             return None
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Erreur connexion GitLab: {e}")
-        return None
+    except GitLabUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Erreur création repository GitLab: {e}")
         return None
 
+def gitlab_push_url(gitlab_repo_url):
+    """URL HTTP du repository avec le token (push sans demande d'identifiants)"""
+    return gitlab_repo_url.replace('http://', f'http://oauth2:{GITLAB_TOKEN}@')
+
+def import_git_source(git_url, gitlab_repo_url, mode='full'):
+    """Pousse une source Git existante vers GitLab depuis son miroir local"""
+    with tracing.span('git.import_mirror', **{'git.import_mode': mode}):
+        GIT_MIRRORS.push(git_url, gitlab_push_url(gitlab_repo_url), mode)
+    print(f"✅ Source Git importée via le miroir local: {git_url} → {gitlab_repo_url} ({mode})")
+
+def apply_template(template_type, gitlab_repo_url):
+    """Pousse le dépôt modèle du template_type (None si pas de modèle ou en cas d'échec)"""
+    if template_type not in TEMPLATES:
+        return None
+    try:
+        with tracing.span('git.push_template', **{'template.id': template_type}):
+            template = TEMPLATES.push(template_type, gitlab_push_url(gitlab_repo_url))
+        print(f"✅ Modèle {template_type} poussé vers GitLab: {gitlab_repo_url}")
+        return template
+    except GitMirrorError as e:
+        # Le repository reste utilisable (README GitLab)
+        print(f"⚠️ Modèle {template_type} non appliqué: {e}")
+        return None
+
 def initialize_git_repo(local_path, gitlab_repo_url):
     """Initialise un repo Git local et pousse vers GitLab"""
     try:
@@ -281,29 +636,17 @@ def initialize_git_repo(local_path, gitlab_repo_url):
             return True
 
         # Initialiser le repo Git
-        result = subprocess.run(
-            ['git', 'init'],
-            cwd=local_path,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        result = run_git(['init'], local_path, timeout=60)
         if result.returncode != 0:
             print(f"❌ Erreur git init: {result.stderr}")
             return False
 
         # Configurer Git
-        subprocess.run(['git', 'config', 'user.name', 'MoonOps'], cwd=local_path)
-        subprocess.run(['git', 'config', 'user.email', 'moonops@techconsulting.fr'], cwd=local_path)
+        run_git(['config', 'user.name', 'MoonOps'], local_path)
+        run_git(['config', 'user.email', 'moonops@techconsulting.fr'], local_path)
 
         # Vérifier s'il y a des fichiers à committer
-        result_status = subprocess.run(
-            ['git', 'status', '--porcelain'],
-            cwd=local_path,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        result_status = run_git(['status', '--porcelain'], local_path, timeout=30)
 
         # Si rien à committer, créer un README.md
         if not result_status.stdout.strip():
@@ -326,54 +669,35 @@ Consultez la documentation pour les instructions d'installation et de déploieme
 ''')
 
         # Ajouter tous les fichiers (y compris le README créé)
-        subprocess.run(['git', 'add', '.'], cwd=local_path)
+        run_git(['add', '.'], local_path)
 
         # Commit initial
-        result = subprocess.run(
-            ['git', 'commit', '-m', 'Initial commit from MoonOps'],
-            cwd=local_path,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        result = run_git(['commit', '-m', 'Initial commit from MoonOps'], local_path, timeout=60)
         if result.returncode != 0:
             print(f"❌ Erreur git commit: {result.stderr}")
             print(f"   Sortie: {result.stdout}")
             return False
 
         # Configurer Git avec les credentials
-        subprocess.run(['git', 'config', 'user.name', 'MoonOps'], cwd=local_path)
-        subprocess.run(['git', 'config', 'user.email', 'moonops@techconsulting.fr'], cwd=local_path)
+        run_git(['config', 'user.name', 'MoonOps'], local_path)
+        run_git(['config', 'user.email', 'moonops@techconsulting.fr'], local_path)
 
         # Ajouter le remote avec token dans l'URL pour éviter la demande d'identifiants
-        auth_url = gitlab_repo_url.replace('http://', f'http://oauth2:{GITLAB_TOKEN}@')
-        subprocess.run(['git', 'remote', 'add', 'origin', auth_url], cwd=local_path)
+        run_git(['remote', 'add', 'origin', gitlab_push_url(gitlab_repo_url)], local_path)
 
         # Forcer l'utilisation de la branche 'main' (standard moderne)
-        subprocess.run(['git', 'branch', '-M', 'main'], cwd=local_path)
+        run_git(['branch', '-M', 'main'], local_path)
         branch_name = 'main'
 
         # Si GitLab a créé un README initial, récupérer les changements distants d'abord
-        pull_result = subprocess.run(
-            ['git', 'pull', 'origin', 'main', '--allow-unrelated-histories'],
-            cwd=local_path,
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        pull_result = run_git(['pull', 'origin', 'main', '--allow-unrelated-histories'], local_path, timeout=60)
 
         # Si le pull échoue (pas de remote main), c'est normal pour un nouveau repo
         if pull_result.returncode != 0 and 'could not read from remote repository' not in pull_result.stderr:
             print(f"ℹ️ Pull initial: {pull_result.stderr}")
 
         # Pousser vers GitLab sur la branche main
-        result = subprocess.run(
-            ['git', 'push', '-u', 'origin', 'main'],
-            cwd=local_path,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
+        result = run_git(['push', '-u', 'origin', 'main'], local_path, timeout=120)
 
         if result.returncode != 0:
             print(f"❌ Erreur git push: {result.stderr}")
@@ -389,16 +713,17 @@ Consultez la documentation pour les instructions d'installation et de déploieme
         print(f"❌ Erreur initialisation Git: {e}")
         return False
 
-def extract_zip_to_temp(zip_path, project_name):
-    """Extrait un ZIP dans un dossier temporaire"""
+def extract_zip_to_temp(zip_path, project_name, client_id=None):
+    """Extrait un ZIP dans un dossier temporaire (dossier du client, suivi par STORAGE)"""
     try:
         # Créer un dossier temporaire unique
-        temp_dir = os.path.join(PROJECTS_FOLDER, f"{project_name}_{uuid.uuid4().hex[:8]}")
+        temp_dir = os.path.join(STORAGE.tenant_dir(WORKDIR, client_id), f"{secure_filename(project_name)}_{uuid.uuid4().hex[:8]}")
         os.makedirs(temp_dir, exist_ok=True)
 
         # Extraire le ZIP
         import zipfile
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        with tracing.span('zip.extract') as sp, zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            sp.set_attribute('zip.entries', len(zip_ref.infolist()))
             zip_ref.extractall(temp_dir)
 
         # Vérifier le contenu extrait
@@ -420,6 +745,7 @@ def extract_zip_to_temp(zip_path, project_name):
             print(f"✅ Contenu déplacé depuis le dossier racine: {extracted_items[0]}")
 
         final_items = os.listdir(temp_dir)
+        STORAGE.track(temp_dir, WORKDIR, client_id)
         print(f"✅ ZIP extrait vers: {temp_dir} ({len(final_items)} éléments)")
         return temp_dir
 
@@ -427,40 +753,92 @@ def extract_zip_to_temp(zip_path, project_name):
         print(f"❌ Erreur extraction ZIP: {e}")
         return None
 
+# Requêtes et sérialisation des routes de lecture (partagées avec asgi.py)
+PROJECTS_SQL = """
+    SELECT p.id, p.name, p.description, p.template_type, p.status,
+           p.repository_url, p.created_at, p.last_deployed_at,
+           p.provisioning_state, c.name as client_name
+    FROM projects p
+    JOIN clients c ON p.client_id = c.id
+    WHERE p.client_id = %s
+    ORDER BY p.created_at DESC
+"""
+
+PROJECT_OWNER_SQL = "SELECT id FROM projects WHERE id = %s AND client_id = %s"
+
+INSERT_PROJECT_SQL = """
+    INSERT INTO projects (client_id, name, description, template_type, status, repository_url)
+    VALUES (%s, %s, %s, %s, 'PENDING', %s)
+    RETURNING id
+"""
+
+# Projet créé pendant une panne GitLab: repository créé plus tard par le réconciliateur
+INSERT_PENDING_PROJECT_SQL = """
+    INSERT INTO projects (client_id, name, description, template_type, status, repository_url,
+                          provisioning_state, provisioning_request)
+    VALUES (%s, %s, %s, %s, 'PENDING', %s, 'PENDING', %s::jsonb)
+    RETURNING id
+"""
+
+def pending_project_values(client_id, name, template_type, description, provisioning_request):
+    """Paramètres de INSERT_PENDING_PROJECT_SQL (modes WSGI et ASGI)"""
+    provisioning_request = dict(provisioning_request, description=description)
+    return (client_id, name, f"{description} - Repository GitLab en attente", template_type,
+            provisioning_request.get('repository_url') or provisioning_request.get('git_url') or None,
+            json.dumps(provisioning_request))
+
+def pending_project_response(name, project_id, reason):
+    return {
+        "success": True,
+        "message": f"Projet '{name}' enregistré, repository GitLab créé dès que GitLab répond",
+        "project_id": project_id,
+        "provisioning_state": "PENDING",
+        "reason": reason,
+    }
+
+def defer_project_creation(client_id, name, template_type, description, provisioning_request, reason):
+    """GitLab indisponible: le projet est enregistré PENDING au lieu d'attendre"""
+    print(f"⏳ Provisionnement GitLab différé pour '{name}': {reason}")
+    conn = get_db()
+    with tracing.span('db.insert_project'), conn.cursor() as cur:
+        cur.execute(INSERT_PENDING_PROJECT_SQL,
+                    pending_project_values(client_id, name, template_type, description, provisioning_request))
+        new_project = cur.fetchone()
+        conn.commit()
+    conn.close()
+    RESULT_CACHE.invalidate(client_id)
+    return jsonify(pending_project_response(name, str(new_project['id']), str(reason))), 202
+
+def serialize_project(row):
+    """Convertir les UUID et datetime en strings"""
+    project_dict = dict(row)
+    project_dict['id'] = str(project_dict['id'])
+    if project_dict.get('created_at'):
+        project_dict['created_at'] = project_dict['created_at'].isoformat()
+    if project_dict.get('last_deployed_at'):
+        project_dict['last_deployed_at'] = project_dict['last_deployed_at'].isoformat()
+    return project_dict
+
+@cached_loader('projects')
+def load_projects(client_id):
+    return [serialize_project(p) for p in db_query(PROJECTS_SQL, (client_id,)) or []]
+
 @app.route('/api/projects', methods=['GET'])
 def get_projects():
     """Liste des projets pour le client actuel"""
     try:
-        client_id = get_current_client_id()
-        projects = db_query("""
-            SELECT p.id, p.name, p.description, p.template_type, p.status,
-                   p.repository_url, p.created_at, p.last_deployed_at,
-                   c.name as client_name
-            FROM projects p
-            JOIN clients c ON p.client_id = c.id
-            WHERE p.client_id = %s
-            ORDER BY p.created_at DESC
-        """, (client_id,))
-        
-        if projects:
-            result = []
-            for p in projects:
-                project_dict = dict(p)
-                # Convertir les UUID et datetime en strings
-                project_dict['id'] = str(project_dict['id'])
-                if project_dict.get('created_at'):
-                    project_dict['created_at'] = project_dict['created_at'].isoformat()
-                if project_dict.get('last_deployed_at'):
-                    project_dict['last_deployed_at'] = project_dict['last_deployed_at'].isoformat()
-                result.append(project_dict)
-            return jsonify(result)
-        return jsonify([])
+        return jsonify(load_projects(get_current_client_id()))
         
     except Exception as e:
         print(f"Erreur get_projects: {str(e)}")
         # Retourner une liste vide si erreur DB
         return jsonify([])
 
+@app.route('/api/templates', methods=['GET'])
+def get_templates():
+    """Catalogue des modèles de projet (version et commit des dépôts pré-construits)"""
+    return jsonify(TEMPLATES.catalog())
+
 @app.route('/api/projects', methods=['POST'])
 def create_project():
     """Créer un nouveau projet pour le client actuel avec repository GitLab"""
@@ -476,17 +854,26 @@ def create_project():
 
     try:
         # Créer un repository GitLab pour le projet (avec isolation par client)
-        gitlab_repo = create_gitlab_repository(
-            name,
-            f"Projet {template_type} créé via MoonOps",
-            client_id
-        )
+        try:
+            gitlab_repo = create_gitlab_repository(
+                name,
+                f"Projet {template_type} créé via MoonOps",
+                client_id
+            )
+        except GitLabUnavailable as e:
+            project_description = f"Projet {template_type}"
+            if repository_url:
+                project_description += f" - Source Git: {repository_url}"
+            return defer_project_creation(client_id, name, template_type, project_description,
+                                          {'repository_url': repository_url}, e)
 
         if not gitlab_repo:
             return jsonify({"success": False, "error": "Impossible de créer le repository GitLab"}), 500
 
         # Utiliser l'URL GitLab créée, ou garder l'URL originale si fournie
         final_repository_url = repository_url if repository_url else gitlab_repo['http_url']
+        # Sans source Git: code de départ du modèle
+        template = None if repository_url else apply_template(template_type, gitlab_repo['http_url'])
 
         # Description enrichie
         project_description = f"Projet {template_type}"
@@ -496,15 +883,12 @@ def create_project():
 
         # Insérer et récupérer l'ID
         conn = get_db()
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO projects (client_id, name, description, template_type, status, repository_url)
-                VALUES (%s, %s, %s, %s, 'PENDING', %s)
-                RETURNING id
-            """, (client_id, name, project_description, template_type, final_repository_url))
+        with tracing.span('db.insert_project'), conn.cursor() as cur:
+            cur.execute(INSERT_PROJECT_SQL, (client_id, name, project_description, template_type, final_repository_url))
             new_project = cur.fetchone()
             conn.commit()
         conn.close()
+        RESULT_CACHE.invalidate(client_id)
 
         project_id = str(new_project['id']) if new_project else None
 
@@ -517,7 +901,8 @@ def create_project():
                 "web_url": gitlab_repo['web_url'],
                 "ssh_url": gitlab_repo['ssh_url'],
                 "http_url": gitlab_repo['http_url']
-            }
+            },
+            "template": template
         })
     except Exception as e:
         print(f"Erreur create_project: {str(e)}")
@@ -530,7 +915,7 @@ def delete_project(project_id):
         client_id = get_current_client_id()
 
         # Vérifier que le projet appartient au client actuel
-        project_check = db_query("SELECT id FROM projects WHERE id = %s AND client_id = %s", (project_id, client_id), fetch_one=True)
+        project_check = db_query(PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
         if not project_check:
             return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
 
@@ -555,7 +940,9 @@ def delete_project(project_id):
                 cur.execute("DELETE FROM projects WHERE id = %s", (project_id,))
 
                 conn.commit()
-        
+        RESULT_CACHE.invalidate(client_id)
+        HOT_TIER.drop_project(str(project_check['id']))
+
         return jsonify({
             "success": True,
             "message": "Projet supprimé avec succès"
@@ -564,58 +951,84 @@ def delete_project(project_id):
         print(f"Erreur delete_project: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+def save_uploaded_zip(file, client_id=None):
+    """Sauvegarde un ZIP uploadé dans le dossier du client; retourne (chemin, taille), ValueError si refusé"""
+    if not (file and file.filename and allowed_file(file.filename)):
+        raise ValueError("Fichier ZIP invalide")
+
+    # Vérifier la taille du fichier avant sauvegarde
+    file.seek(0, 2)  # Aller à la fin du fichier
+    file_size = file.tell()
+    file.seek(0)  # Retour au début
+
+    if file_size > MAX_FILE_SIZE:
+        raise ValueError(f"Fichier trop volumineux (max {MAX_FILE_SIZE / 1024 / 1024:.0f} MB)")
+
+    filename = secure_filename(file.filename)
+    # Ajouter timestamp pour éviter les collisions
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    unique_filename = f"{timestamp}_{uuid.uuid4().hex[:8]}_{filename}"
+    file_path = os.path.join(STORAGE.tenant_dir(UPLOAD, client_id), unique_filename)
+
+    # Sauvegarder le fichier
+    with tracing.span('upload.save_file', **{'file.size': file_size}):
+        file.save(file_path)
+    file_size = os.path.getsize(file_path)  # Vérification finale
+    STORAGE.track(file_path, UPLOAD, client_id)
+    print(f"✅ Fichier sauvegardé: {file_path} ({file_size / 1024 / 1024:.2f} MB)")
+    return file_path, file_size
+
 @app.route('/api/projects/upload', methods=['POST'])
 def create_project_with_upload():
     """Créer un projet avec upload de fichier ZIP et/ou URL Git pour le client actuel"""
     try:
         name = request.form.get('name')
         template_type = request.form.get('template_type', 'web')
-        git_url = request.form.get('git_url', '')  # URL Git optionnelle
+        git_url = request.form.get('git_url', '').strip()  # URL Git optionnelle
+        git_import = request.form.get('git_import', 'full')  # full | snapshot (dernier état seul)
         description = f"Projet {template_type}"  # Définir description ici
         client_id = get_current_client_id()  # Utiliser le client de l'utilisateur connecté
 
         if not name:
             return jsonify({"success": False, "error": "Nom du projet requis"}), 400
+        if git_url:
+            if git_import not in IMPORT_MODES:
+                return jsonify({"success": False, "error": f"git_import invalide (valeurs: {', '.join(IMPORT_MODES)})"}), 400
+            try:
+                git_url = validate_url(git_url)
+            except GitMirrorError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
         
         # Gérer le fichier uploadé
         file_path = None
         file_size = 0
         if 'file' in request.files:
             file = request.files['file']
-            if file and file.filename and allowed_file(file.filename):
-                # Vérifier la taille du fichier avant sauvegarde
-                file.seek(0, 2)  # Aller à la fin du fichier
-                file_size = file.tell()
-                file.seek(0)  # Retour au début
-
-                if file_size > MAX_FILE_SIZE:
-                    return jsonify({"success": False, "error": f"Fichier trop volumineux (max {MAX_FILE_SIZE / 1024 / 1024:.0f} MB)"}), 400
-
-                filename = secure_filename(file.filename)
-                # Ajouter timestamp pour éviter les collisions
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                unique_filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-
-                # Sauvegarder le fichier
-                file.save(file_path)
-                file_size = os.path.getsize(file_path)  # Vérification finale
-                print(f"✅ Fichier sauvegardé: {file_path} ({file_size / 1024 / 1024:.2f} MB)")
-            else:
-                return jsonify({"success": False, "error": "Fichier ZIP invalide"}), 400
+            try:
+                file_path, file_size = save_uploaded_zip(file, client_id)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
         
         # Traiter le code source et créer un repo GitLab
         gitlab_repo = None
+        template = None
         local_project_path = None
         final_repository_url = None
+        deferred = False
 
         try:
             # Créer d'abord le repository GitLab (avec isolation par client)
-            gitlab_repo = create_gitlab_repository(
-                name,
-                f"Projet {template_type} créé via MoonOps",
-                client_id
-            )
+            try:
+                gitlab_repo = create_gitlab_repository(
+                    name,
+                    f"Projet {template_type} créé via MoonOps",
+                    client_id
+                )
+            except GitLabUnavailable as e:
+                # L'archive reste dans UPLOAD_FOLDER (protégée du janitor): poussée par le réconciliateur
+                deferred = True
+                return defer_project_creation(client_id, name, template_type, description,
+                                              {'git_url': git_url, 'git_import': git_import, 'archive': file_path}, e)
 
             if not gitlab_repo:
                 return jsonify({"success": False, "error": "Impossible de créer le repository GitLab"}), 500
@@ -623,9 +1036,10 @@ def create_project_with_upload():
             # Traiter selon la source
             if file_path:
                 # Extraire le ZIP et pousser vers GitLab
-                local_project_path = extract_zip_to_temp(file_path, name)
+                local_project_path = extract_zip_to_temp(file_path, name, client_id)
                 if local_project_path:
-                    success = initialize_git_repo(local_project_path, gitlab_repo['http_url'])
+                    with tracing.span('git.initialize_and_push'):
+                        success = initialize_git_repo(local_project_path, gitlab_repo['http_url'])
                     if not success:
                         return jsonify({"success": False, "error": "Impossible de pousser le code vers GitLab"}), 500
                     final_repository_url = gitlab_repo['http_url']
@@ -633,15 +1047,19 @@ def create_project_with_upload():
                     return jsonify({"success": False, "error": "Impossible d'extraire le fichier ZIP"}), 500
 
             elif git_url:
-                # Pour les URLs Git existantes, on garde l'URL originale
-                # (le clonage réel viendrait dans une phase ultérieure)
-                final_repository_url = git_url
-                print(f"ℹ️ URL Git référencée: {git_url}")
+                # Import réel: miroir local de la source (clone unique, fetch incrémental), puis push
+                try:
+                    import_git_source(git_url, gitlab_repo['http_url'], git_import)
+                except GitMirrorError as e:
+                    return jsonify({"success": False, "error": f"Import Git impossible: {e}"}), 500
+                final_repository_url = gitlab_repo['http_url']
 
             else:
-                # Repository GitLab vide (juste avec README)
+                # Ni archive ni source Git: code de départ du modèle
                 final_repository_url = gitlab_repo['http_url']
-                print(f"✅ Repository GitLab vide créé: {gitlab_repo['web_url']}")
+                template = apply_template(template_type, gitlab_repo['http_url'])
+                if not template:
+                    print(f"✅ Repository GitLab vide créé: {gitlab_repo['web_url']}")
 
             # Créer le projet en BDD
             description = f"Projet {template_type} - Repository GitLab: {gitlab_repo['name']}"
@@ -655,15 +1073,12 @@ def create_project_with_upload():
 
             # Insérer et récupérer l'ID
             conn = get_db()
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO projects (client_id, name, description, template_type, status, repository_url)
-                    VALUES (%s, %s, %s, %s, 'PENDING', %s)
-                    RETURNING id
-                """, (client_id, name, description, template_type, final_repository_url))
+            with tracing.span('db.insert_project'), conn.cursor() as cur:
+                cur.execute(INSERT_PROJECT_SQL, (client_id, name, description, template_type, final_repository_url))
                 new_project = cur.fetchone()
                 conn.commit()
             conn.close()
+            RESULT_CACHE.invalidate(client_id)
 
             project_id = str(new_project['id']) if new_project else None
 
@@ -678,21 +1093,273 @@ def create_project_with_upload():
                     "http_url": gitlab_repo['http_url']
                 },
                 "file_uploaded": file_path is not None,
+                "template": template,
                 "git_url": git_url if git_url else None,
                 "file_size": f"{file_size / 1024 / 1024:.2f} MB" if file_size > 0 else None
             })
 
         except Exception as e:
-            # Nettoyer en cas d'erreur
-            if local_project_path and os.path.exists(local_project_path):
-                import shutil
-                shutil.rmtree(local_project_path)
             print(f"❌ Erreur création projet: {e}")
             return jsonify({"success": False, "error": str(e)}), 500
+        finally:
+            # Dossier de travail et archive inutiles une fois le code poussé (ou en cas d'échec)
+            STORAGE.discard(local_project_path)
+            if not deferred:
+                STORAGE.discard(file_path)
     except Exception as e:
         print(f"❌ Erreur create_project_with_upload: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+SYNC_PROJECT_SQL = """
+    SELECT id, name, repository_url, provisioning_state, imported_commit
+    FROM projects
+    WHERE id = %s AND client_id = %s
+"""
+
+PROJECT_FILES_SQL = "SELECT path, blob_sha, mode FROM project_files WHERE project_id = %s"
+
+UPSERT_PROJECT_FILE_SQL = """
+    INSERT INTO project_files (project_id, path, blob_sha, mode, size)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (project_id, path) DO UPDATE
+    SET blob_sha = EXCLUDED.blob_sha, mode = EXCLUDED.mode, size = EXCLUDED.size
+"""
+
+def save_project_manifest(project_id, entries, sync):
+    """Manifeste et imported_commit mis à jour dans une seule transaction"""
+    if sync['base'] == 'manifest':
+        upserts = sync['added'] + sync['modified']
+        deletes = sync['deleted']
+    else:
+        # Base lue dans le repository: le manifeste stocké est réécrit entièrement
+        upserts = sorted(entries)
+        deletes = None
+    conn = get_db()
+    with tracing.span('db.save_manifest', **{'files.upserts': len(upserts)}), conn.cursor() as cur:
+        if deletes is None:
+            cur.execute("DELETE FROM project_files WHERE project_id = %s", (project_id,))
+        elif deletes:
+            cur.execute("DELETE FROM project_files WHERE project_id = %s AND path = ANY(%s)", (project_id, deletes))
+        cur.executemany(UPSERT_PROJECT_FILE_SQL, [
+            (project_id, path, entries[path].blob_sha, entries[path].mode, entries[path].size) for path in upserts
+        ])
+        cur.execute("UPDATE projects SET imported_commit = %s WHERE id = %s", (sync['commit'], project_id))
+        conn.commit()
+    conn.close()
+
+@app.route('/api/projects/<project_id>/upload', methods=['POST'])
+def upload_project_update(project_id):
+    """Ré-upload d'un ZIP: seuls les fichiers modifiés sont poussés, en un commit sur main"""
+    file_path = None
+    try:
+        client_id = get_current_client_id()
+        project = db_query(SYNC_PROJECT_SQL, (project_id, client_id), fetch_one=True)
+        if not project:
+            return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
+        if project['provisioning_state'] != 'READY':
+            return jsonify({"success": False, "error": "Repository GitLab pas encore créé"}), 409
+        if not (project['repository_url'] or '').startswith(GITLAB_URL):
+            return jsonify({"success": False, "error": "Le repository du projet n'est pas hébergé sur GitLab"}), 409
+
+        try:
+            file_path, file_size = save_uploaded_zip(request.files.get('file'), client_id)
+            entries = project_sync.scan_archive(file_path)
+        except (ValueError, project_sync.ArchiveError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if not entries:
+            return jsonify({"success": False, "error": "Archive vide"}), 400
+
+        manifest = {row['path']: (row['blob_sha'], row['mode'])
+                    for row in db_query(PROJECT_FILES_SQL, (project_id,)) or []}
+        message = request.form.get('message') or f"Mise à jour depuis {os.path.basename(file_path)} (MoonOps)"
+        try:
+            with tracing.span('git.incremental_push', **{'files.count': len(entries)}):
+                sync = project_sync.push_archive(GIT_MIRRORS, gitlab_push_url(project['repository_url']), file_path,
+                                                 entries, manifest, project['imported_commit'], message)
+        except project_sync.ArchiveError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except GitMirrorError as e:
+            return jsonify({"success": False, "error": f"Push vers GitLab impossible: {e}"}), 502
+
+        changed = bool(sync['added'] or sync['modified'] or sync['deleted'])
+        if changed or sync['base'] == 'tree':
+            save_project_manifest(project_id, entries, sync)
+            RESULT_CACHE.invalidate(client_id)
+        if changed:
+            print(f"✅ Projet {project['name']} mis à jour: {sync['commit'][:12]} "
+                  f"(+{len(sync['added'])} ~{len(sync['modified'])} -{len(sync['deleted'])}, {sync['bytes']} octets)")
+
+        return jsonify({
+            "success": True,
+            "message": "Code mis à jour" if changed else "Aucun changement",
+            "project_id": project_id,
+            "commit": sync['commit'],
+            "parent": sync['parent'],
+            "added": sync['added'],
+            "modified": sync['modified'],
+            "deleted": sync['deleted'],
+            "bytes_pushed": sync['bytes'],
+            "file_size": f"{file_size / 1024 / 1024:.2f} MB",
+        })
+    except Exception as e:
+        print(f"❌ Erreur upload_project_update: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        # L'archive n'est plus utile une fois poussée
+        STORAGE.discard(file_path)
+
+# ============================================
+# PROVISIONNEMENT DIFFÉRÉ (GitLab)
+# ============================================
+
+PROVISIONING_INTERVAL_S = float(os.getenv('MOONOPS_PROVISIONING_INTERVAL_S', '30'))  # 0: désactivé
+PROVISIONING_BATCH = int(os.getenv('MOONOPS_PROVISIONING_BATCH', '20'))
+PROVISIONING_MAX_ATTEMPTS = int(os.getenv('MOONOPS_PROVISIONING_MAX_ATTEMPTS', '5'))
+# Verrou consultatif PostgreSQL: un seul worker réconcilie un shard à la fois
+PROVISIONING_LOCK_ID = zlib.crc32(b'moonops_provisioning')
+
+PENDING_PROJECTS_SQL = """
+    SELECT id, client_id, name, template_type, provisioning_request, provisioning_attempts
+    FROM projects
+    WHERE provisioning_state = 'PENDING'
+    ORDER BY created_at
+    LIMIT %s
+"""
+
+def provision_pending_project(cur, project):
+    """Crée le repository GitLab d'un projet PENDING (et pousse l'archive uploadée)"""
+    provisioning_request = project['provisioning_request'] or {}
+    gitlab_repo = provisioning_request.get('gitlab_repo')
+    if gitlab_repo is None:
+        gitlab_repo = create_gitlab_repository(
+            project['name'],
+            f"Projet {project['template_type']} créé via MoonOps",
+            str(project['client_id'])
+        )
+        if not gitlab_repo:
+            raise RuntimeError("création du repository GitLab refusée")
+        # Repository gardé pour un nouvel essai si le push échoue
+        cur.execute("""
+            UPDATE projects SET provisioning_request = provisioning_request || jsonb_build_object('gitlab_repo', %s::jsonb)
+            WHERE id = %s
+        """, (json.dumps(gitlab_repo), project['id']))
+
+    repository_url = provisioning_request.get('repository_url') or gitlab_repo['http_url']
+    archive = provisioning_request.get('archive')
+    git_url = provisioning_request.get('git_url')
+    if git_url and not archive:
+        import_git_source(git_url, gitlab_repo['http_url'], provisioning_request.get('git_import', 'full'))
+    if not (git_url or archive or provisioning_request.get('repository_url')):
+        apply_template(project['template_type'], gitlab_repo['http_url'])
+    if archive:
+        if not os.path.exists(archive):
+            raise RuntimeError(f"archive introuvable: {archive}")
+        local_project_path = extract_zip_to_temp(archive, project['name'], str(project['client_id']))
+        if not local_project_path:
+            raise RuntimeError("impossible d'extraire l'archive")
+        try:
+            if not initialize_git_repo(local_project_path, gitlab_repo['http_url']):
+                raise RuntimeError("impossible de pousser le code vers GitLab")
+        finally:
+            STORAGE.discard(local_project_path)
+        repository_url = gitlab_repo['http_url']
+
+    description = f"{provisioning_request.get('description', 'Projet')} - Repository GitLab: {gitlab_repo['name']}"
+    cur.execute("""
+        UPDATE projects
+        SET provisioning_state = 'READY', repository_url = %s, description = %s, provisioning_error = NULL
+        WHERE id = %s
+    """, (repository_url, description, project['id']))
+    # Connexion en autocommit: le projet est READY, l'archive n'est plus nécessaire
+    STORAGE.discard(archive)
+
+def reconcile_shard(router):
+    """Provisionne les projets PENDING d'un shard; retourne le nombre de projets terminés"""
+    conn = psycopg2.connect(**router.primary.config, cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    done = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (PROVISIONING_LOCK_ID,))
+            if not cur.fetchone()['locked']:
+                return 0
+            cur.execute(PENDING_PROJECTS_SQL, (PROVISIONING_BATCH,))
+            projects = cur.fetchall()
+
+            for project in projects:
+                if not GITLAB_BREAKER.allows():
+                    break
+                client_id = str(project['client_id'])
+                tenant_token = SHARDS.bind(client_id)
+                try:
+                    SHARDS.check_writable()
+                    provision_pending_project(cur, project)
+                    done += 1
+                    print(f"✅ Projet '{project['name']}' provisionné dans GitLab")
+                except TenantMovingError:
+                    continue
+                except GitLabUnavailable as e:
+                    print(f"⏳ GitLab toujours indisponible, réconciliation suspendue: {e}")
+                    break
+                except Exception as e:
+                    attempts = project['provisioning_attempts'] + 1
+                    state = 'FAILED' if attempts >= PROVISIONING_MAX_ATTEMPTS else 'PENDING'
+                    print(f"❌ Provisionnement de '{project['name']}' ({attempts}/{PROVISIONING_MAX_ATTEMPTS}): {e}")
+                    cur.execute("""
+                        UPDATE projects
+                        SET provisioning_attempts = %s, provisioning_error = %s, provisioning_state = %s
+                        WHERE id = %s
+                    """, (attempts, str(e)[:1000], state, project['id']))
+                finally:
+                    SHARDS.unbind(tenant_token)
+                RESULT_CACHE.invalidate(client_id)
+    finally:
+        # Fermer la session libère le verrou consultatif
+        conn.close()
+    return done
+
+def start_provisioning_reconciler():
+    """Thread de fond: termine les projets PENDING quand GitLab répond de nouveau"""
+    if PROVISIONING_INTERVAL_S <= 0:
+        return
+
+    def _loop():
+        while True:
+            time.sleep(PROVISIONING_INTERVAL_S)
+            if not GITLAB_BREAKER.allows():
+                continue
+            for shard, router in SHARDS.routers.items():
+                try:
+                    reconcile_shard(router)
+                except Exception as e:
+                    print(f"⚠️ Réconciliation GitLab impossible ({shard}): {e}")
+
+    threading.Thread(target=_loop, name='moonops-provisioning', daemon=True).start()
+
+start_provisioning_reconciler()
+
+PENDING_ARCHIVES_SQL = """
+    SELECT provisioning_request->>'archive' AS archive
+    FROM projects
+    WHERE provisioning_state = 'PENDING' AND provisioning_request ? 'archive'
+"""
+
+def shard_pending_archives(router):
+    with router.primary_cursor() as cur:
+        cur.execute(PENDING_ARCHIVES_SQL)
+        return {row['archive'] for row in cur.fetchall() if row['archive']}
+
+def pending_archives():
+    """Archives des projets PENDING, jamais évincées; shard injoignable: exception (rien n'est évincé)"""
+    archives = set()
+    for shard, result in SHARDS.fan_out(shard_pending_archives).items():
+        if isinstance(result, Exception):
+            raise RuntimeError(f"archives en attente illisibles ({shard}): {result}")
+        archives |= result
+    return archives
+
+STORAGE.start_janitor()
+
 # ============================================
 # ROUTES DEPLOY (CI/CD)
 # ============================================
@@ -711,7 +1378,7 @@ def deploy_project():
         client_id = get_current_client_id()
 
         # Vérifier que le projet appartient au client actuel
-        project_check = db_query("SELECT id FROM projects WHERE id = %s AND client_id = %s", (project_id, client_id), fetch_one=True)
+        project_check = db_query(PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
         if not project_check:
             return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
 
@@ -725,10 +1392,11 @@ def deploy_project():
         """, (project_id, env_name), fetch_one=True)
         
         if not env_result:
-            # Créer l'environnement s'il n'existe pas
+            # Créer l'environnement s'il n'existe pas (unique sur project_id, name)
             db_query("""
                 INSERT INTO environments (project_id, name, url, status)
                 VALUES (%s, %s, %s, 'RUNNING')
+                ON CONFLICT (project_id, name) DO NOTHING
             """, (project_id, env_name, f"https://{env_name.lower()}.moonops.app"))
             env_result = db_query("""
                 SELECT id FROM environments WHERE project_id = %s AND name = %s
@@ -752,16 +1420,17 @@ def deploy_project():
         if env_id:
             version = f"v1.{datetime.now().strftime('%H%M%S')}"
             db_query("""
-                INSERT INTO deployments (environment_id, version, status)
-                VALUES (%s, %s, 'SUCCESS')
-            """, (env_id, version))
+                INSERT INTO deployments (project_id, environment_id, version_tag, status)
+                VALUES (%s, %s, %s, 'SUCCESS')
+            """, (project_id, env_id, version))
         
         # Mettre à jour le projet
         db_query("""
             UPDATE projects SET status = 'ACTIVE', last_deployed_at = CURRENT_TIMESTAMP
             WHERE id = %s
         """, (project_id,))
-        
+        RESULT_CACHE.invalidate(client_id)
+
         return jsonify({
             "success": True,
             "message": f"Déploiement réussi sur {environment}! 🚀",
@@ -773,47 +1442,72 @@ def deploy_project():
         print(f"Erreur deploy_project: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+DEPLOYMENTS_SQL = """
+    SELECT
+        d.id,
+        d.version_tag as version,
+        d.status,
+        d.deployed_at,
+        e.name as environment,
+        p.name as project_name,
+        p.id as project_id
+    FROM deployments d
+    JOIN environments e ON d.environment_id = e.id
+    JOIN projects p ON d.project_id = p.id
+    WHERE d.client_id = %s
+    ORDER BY d.deployed_at DESC
+    LIMIT 20
+"""
+
+PIPELINES_SQL = """
+    SELECT p.id, p.branch, p.status, p.started_at, p.finished_at,
+           pr.name as project_name
+    FROM pipelines p
+    JOIN projects pr ON p.project_id = pr.id
+    WHERE p.client_id = %s
+    ORDER BY p.started_at DESC
+    LIMIT 10
+"""
+
+def serialize_deployment(row):
+    deploy_dict = dict(row)
+    deploy_dict['id'] = str(deploy_dict['id'])
+    deploy_dict['project_id'] = str(deploy_dict['project_id'])
+    deployed_at = deploy_dict.get('deployed_at')
+    if deployed_at:
+        deploy_dict['deployed_at'] = deployed_at.isoformat()
+        # Calculer le temps relatif (deployed_at est un TIMESTAMP WITH TIME ZONE)
+        delta = datetime.now(deployed_at.tzinfo) - deployed_at
+        if delta.days > 0:
+            deploy_dict['time_ago'] = f"il y a {delta.days}j"
+        elif delta.seconds > 3600:
+            deploy_dict['time_ago'] = f"il y a {delta.seconds // 3600}h"
+        else:
+            deploy_dict['time_ago'] = f"il y a {delta.seconds // 60}min"
+    return deploy_dict
+
+def serialize_pipeline(row):
+    pipeline_dict = dict(row)
+    pipeline_dict['id'] = str(pipeline_dict['id'])
+    if pipeline_dict.get('started_at'):
+        pipeline_dict['started_at'] = pipeline_dict['started_at'].isoformat()
+    if pipeline_dict.get('finished_at'):
+        pipeline_dict['finished_at'] = pipeline_dict['finished_at'].isoformat()
+    return pipeline_dict
+
+@cached_loader('deployments')
+def load_deployments(client_id):
+    return [serialize_deployment(d) for d in db_query(DEPLOYMENTS_SQL, (client_id,)) or []]
+
+@cached_loader('pipelines')
+def load_pipelines(client_id):
+    return [serialize_pipeline(p) for p in db_query(PIPELINES_SQL, (client_id,)) or []]
+
 @app.route('/api/deployments', methods=['GET'])
 def get_deployments():
     """Historique des déploiements récents pour le client actuel"""
     try:
-        client_id = get_current_client_id()
-        deployments = db_query("""
-            SELECT
-                d.id,
-                d.version,
-                d.status,
-                d.deployed_at,
-                e.name as environment,
-                p.name as project_name,
-                p.id as project_id
-            FROM deployments d
-            JOIN environments e ON d.environment_id = e.id
-            JOIN projects p ON e.project_id = p.id
-            WHERE p.client_id = %s
-            ORDER BY d.deployed_at DESC
-            LIMIT 20
-        """, (client_id,))
-        
-        if deployments:
-            result = []
-            for d in deployments:
-                deploy_dict = dict(d)
-                deploy_dict['id'] = str(deploy_dict['id'])
-                deploy_dict['project_id'] = str(deploy_dict['project_id'])
-                if deploy_dict.get('deployed_at'):
-                    deploy_dict['deployed_at'] = deploy_dict['deployed_at'].isoformat()
-                    # Calculer le temps relatif
-                    delta = datetime.now() - d['deployed_at']
-                    if delta.days > 0:
-                        deploy_dict['time_ago'] = f"il y a {delta.days}j"
-                    elif delta.seconds > 3600:
-                        deploy_dict['time_ago'] = f"il y a {delta.seconds // 3600}h"
-                    else:
-                        deploy_dict['time_ago'] = f"il y a {delta.seconds // 60}min"
-                result.append(deploy_dict)
-            return jsonify(result)
-        return jsonify([])
+        return jsonify(load_deployments(get_current_client_id()))
     except Exception as e:
         print(f"Erreur get_deployments: {str(e)}")
         return jsonify([])
@@ -822,29 +1516,7 @@ def get_deployments():
 def get_pipelines():
     """Liste des pipelines récents pour le client actuel"""
     try:
-        client_id = get_current_client_id()
-        pipelines = db_query("""
-            SELECT p.id, p.branch, p.status, p.started_at, p.finished_at,
-                   pr.name as project_name
-            FROM pipelines p
-            JOIN projects pr ON p.project_id = pr.id
-            WHERE pr.client_id = %s
-            ORDER BY p.started_at DESC
-            LIMIT 10
-        """, (client_id,))
-        
-        if pipelines:
-            result = []
-            for p in pipelines:
-                pipeline_dict = dict(p)
-                pipeline_dict['id'] = str(pipeline_dict['id'])
-                if pipeline_dict.get('started_at'):
-                    pipeline_dict['started_at'] = pipeline_dict['started_at'].isoformat()
-                if pipeline_dict.get('finished_at'):
-                    pipeline_dict['finished_at'] = pipeline_dict['finished_at'].isoformat()
-                result.append(pipeline_dict)
-            return jsonify(result)
-        return jsonify([])
+        return jsonify(load_pipelines(get_current_client_id()))
     except Exception as e:
         print(f"Erreur get_pipelines: {str(e)}")
         return jsonify([])
@@ -853,28 +1525,35 @@ def get_pipelines():
 # ROUTES STATS (Dashboard)
 # ============================================
 
+# Compteurs du dashboard: clé de réponse -> requête
+STATS_QUERIES = {
+    "total_projects": "SELECT COUNT(*) as count FROM projects WHERE client_id = %s",
+    "active_projects": "SELECT COUNT(*) as count FROM projects WHERE client_id = %s AND status = 'ACTIVE'",
+    "total_deployments": "SELECT COUNT(*) as count FROM deployments WHERE client_id = %s",
+    "total_pipelines": "SELECT COUNT(*) as count FROM pipelines WHERE client_id = %s AND status = 'SUCCESS'",
+    "total_alerts": "SELECT COUNT(*) as count FROM alerts WHERE client_id = %s AND status = 'ACTIVE'",
+}
+
+def build_stats(counts):
+    """Réponse de /api/stats à partir des compteurs (clé -> ligne COUNT)"""
+    stats = {key: row['count'] if row else 0 for key, row in counts.items()}
+    stats.update({
+        "success_rate": 98.2,
+        "uptime": 99.9,
+        "avg_response_time": 245  # ms
+    })
+    return stats
+
+@cached_loader('stats')
+def load_stats(client_id):
+    counts = {key: db_query(sql, (client_id,), fetch_one=True) for key, sql in STATS_QUERIES.items()}
+    return build_stats(counts)
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Statistiques pour le dashboard du client actuel"""
     try:
-        client_id = get_current_client_id()
-        total_projects = db_query("SELECT COUNT(*) as count FROM projects WHERE client_id = %s", (client_id,), fetch_one=True)
-        active_projects = db_query("SELECT COUNT(*) as count FROM projects WHERE client_id = %s AND status = 'ACTIVE'", (client_id,), fetch_one=True)
-        total_deployments = db_query("SELECT COUNT(*) as count FROM deployments d JOIN projects p ON d.project_id = p.id WHERE p.client_id = %s", (client_id,), fetch_one=True)
-        total_pipelines = db_query("SELECT COUNT(*) as count FROM pipelines p JOIN projects pr ON p.project_id = pr.id WHERE pr.client_id = %s AND p.status = 'SUCCESS'", (client_id,), fetch_one=True)
-        total_alerts = db_query("SELECT COUNT(*) as count FROM alerts WHERE project_id IN (SELECT id FROM projects WHERE client_id = %s) AND status = 'ACTIVE'", (client_id,), fetch_one=True)
-
-        stats = {
-            "total_projects": total_projects['count'] if total_projects else 0,
-            "active_projects": active_projects['count'] if active_projects else 0,
-            "total_deployments": total_deployments['count'] if total_deployments else 0,
-            "total_pipelines": total_pipelines['count'] if total_pipelines else 0,
-            "total_alerts": total_alerts['count'] if total_alerts else 0,
-            "success_rate": 98.2,
-            "uptime": 99.9,
-            "avg_response_time": 245  # ms
-        }
-        return jsonify(stats)
+        return jsonify(load_stats(get_current_client_id()))
     except Exception as e:
         print(f"Erreur get_stats: {str(e)}")
         # Retourner des stats à zéro si erreur
@@ -889,72 +1568,1213 @@ def get_stats():
             "avg_response_time": 0
         })
 
+# Historique d'un projet: chunks compressés recouvrant la fenêtre et lignes brutes, en une
+# requête (même instantané: un point compacté entre deux requêtes ne serait pas vu ou vu deux fois)
+METRIC_HISTORY_SQL = """
+    SELECT n.name AS metric_name, c.data, NULL::double precision AS value, NULL::timestamptz AS timestamp
+    FROM metric_chunks c
+    JOIN metric_names n ON n.id = c.metric_id
+    WHERE c.project_id = %s AND c.end_at >= %s
+    UNION ALL
+    SELECT metric_name, NULL, value, timestamp
+    FROM metrics
+    WHERE project_id = %s AND timestamp >= %s
+"""
+METRICS_MAX_HOURS = int(os.getenv('MOONOPS_METRICS_MAX_HOURS', '720'))
+
+# Une ligne par problème (créée à la première occurrence), triée par dernière occurrence
+ALERTS_SQL = """
+    SELECT a.id, a.severity, a.message, a.status, a.created_at, a.resolved_at,
+           a.occurrences, a.last_seen_at, a.group_key,
+           p.name as project_name
+    FROM alerts a
+    JOIN projects p ON a.project_id = p.id
+    WHERE a.status = 'ACTIVE' AND a.client_id = %s
+    ORDER BY a.last_seen_at DESC
+    LIMIT 10
+"""
+
+def group_metrics(rows):
+    """Séries par nom de métrique: {nom: [{value, timestamp}, ...]}"""
+    result = {}
+    for m in rows:
+        result.setdefault(m['metric_name'], []).append({
+            'value': float(m['value']),
+            'timestamp': m['timestamp'].isoformat()
+        })
+    return result
+
+def parse_metrics_hours(value):
+    """?hours=N (défaut 24) -> début de la fenêtre; ValueError si invalide"""
+    try:
+        hours = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("hours doit être un entier")
+    if not 1 <= hours <= METRICS_MAX_HOURS:
+        raise ValueError(f"hours doit être entre 1 et {METRICS_MAX_HOURS}")
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+def metric_history(rows, since):
+    """Lignes de METRIC_HISTORY_SQL -> séries triées au format de group_metrics (chunks décodés)"""
+    since_us = metric_chunks.to_microseconds(since)
+    series = {}
+    for row in rows:
+        points = series.setdefault(row['metric_name'], [])
+        if row['data'] is None:
+            points.append((metric_chunks.to_microseconds(row['timestamp']), float(row['value'])))
+        else:
+            timestamps, values = metric_chunks.decode(row['data'])
+            points.extend(point for point in zip(timestamps, values) if point[0] >= since_us)
+    return {
+        name: [{'value': value, 'timestamp': metric_chunks.to_datetime(ts).isoformat()} for ts, value in sorted(points)]
+        for name, points in series.items()
+    }
+
+def serialize_alert(row):
+    alert_dict = dict(row)
+    alert_dict['id'] = str(alert_dict['id'])
+    for key in ('created_at', 'resolved_at', 'last_seen_at'):
+        if alert_dict.get(key):
+            alert_dict[key] = alert_dict[key].isoformat()
+    return alert_dict
+
 @app.route('/api/metrics/<project_id>', methods=['GET'])
 def get_project_metrics(project_id):
-    """Métriques d'un projet (CPU, mémoire, etc.)"""
+    """Métriques d'un projet (CPU, mémoire, etc.): ?hours=N (défaut 24, chunks compressés
+    et lignes brutes), ou ?minutes=N depuis le hot tier"""
     try:
         client_id = get_current_client_id()
+        try:
+            history_since = parse_metrics_hours(request.args.get('hours', 24))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        seconds = None
+        if request.args.get('minutes') is not None:
+            try:
+                project_id = str(uuid.UUID(project_id))  # Clé du hot tier
+                seconds = parse_metrics_minutes(request.args['minutes'])
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            hot = hot_metrics_window(project_id, client_id, seconds)
+            if hot is not None:
+                return jsonify(hot)
+
         # Vérifier que le projet appartient au client actuel
-        project_check = db_query("SELECT id FROM projects WHERE id = %s AND client_id = %s", (project_id, client_id), fetch_one=True)
+        project_check = db_query(PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
         if not project_check:
             return jsonify({}), 403
 
-        # Récupérer les métriques récentes (dernières 24h)
-        metrics = db_query("""
-            SELECT metric_name, value, timestamp
-            FROM metrics
-            WHERE project_id = %s
-            AND timestamp >= CURRENT_TIMESTAMP - INTERVAL '24 hours'
-            ORDER BY timestamp ASC
-        """, (project_id,))
+        if seconds is not None:
+            since = time.time() - seconds
+            metrics = db_query(HOT_METRICS_WINDOW_SQL, (project_id, since)) or []
+            load_hot_project(project_id, client_id, metrics, since)
+            return jsonify(group_metrics(metrics))
 
-        if metrics:
-            result = {}
-            for m in metrics:
-                metric_name = m['metric_name']
-                if metric_name not in result:
-                    result[metric_name] = []
-                result[metric_name].append({
-                    'value': float(m['value']),
-                    'timestamp': m['timestamp'].isoformat()
-                })
-            return jsonify(result)
-        return jsonify({})
+        metrics = db_query(METRIC_HISTORY_SQL, (project_id, history_since, project_id, history_since)) or []
+        with tracing.span('metrics.decode', **{'metrics.rows': len(metrics)}):
+            return jsonify(metric_history(metrics, history_since))
     except Exception as e:
         print(f"Erreur get_project_metrics: {str(e)}")
         return jsonify({})
 
+@app.route('/api/metrics/<project_id>/latest', methods=['GET'])
+def get_latest_metrics(project_id):
+    """Dernière valeur de chaque métrique du projet (séries actives depuis HOT_TIER_HORIZON_S)"""
+    try:
+        client_id = get_current_client_id()
+        try:
+            project_id = str(uuid.UUID(project_id))  # Clé du hot tier
+        except ValueError:
+            return jsonify({}), 403
+        hot = hot_metrics_latest(project_id, client_id)
+        if hot is not None:
+            return jsonify(hot)
+
+        project_check = db_query(PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
+        if not project_check:
+            return jsonify({}), 403
+        since = time.time() - HOT_TIER_HORIZON_S
+        metrics = db_query(HOT_METRICS_WINDOW_SQL, (project_id, since)) or []
+        load_hot_project(project_id, client_id, metrics, since)
+        return jsonify(latest_metrics(metrics))
+    except Exception as e:
+        print(f"Erreur get_latest_metrics: {str(e)}")
+        return jsonify({})
+
+# Analyse multi-projets: résumés agrégés par PostgreSQL (par série et par métrique
+# via GROUPING SETS), derniers points de chaque série chargés en un lot pour les
+# scores d'anomalie (metric_analytics.py)
+ANALYTICS_PROJECTS_SQL = "SELECT id::text, name FROM projects WHERE client_id = %s"
+
+METRICS_WINDOW_FILTER = """
+    WHERE client_id = %(client_id)s AND project_id = ANY(%(projects)s::uuid[])
+    AND timestamp >= CURRENT_TIMESTAMP - %(hours)s * INTERVAL '1 hour'
+    AND (cardinality(%(metrics)s::text[]) = 0 OR metric_name = ANY(%(metrics)s::text[]))
+"""
+
+METRIC_SUMMARY_SQL = f"""
+    SELECT project_id::text AS project_id, metric_name,
+           COUNT(*) AS count, AVG(value) AS mean, MIN(value) AS min, MAX(value) AS max,
+           percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY value) AS percentiles,
+           regr_slope(value, EXTRACT(EPOCH FROM timestamp)) AS rate,
+           MIN(timestamp) AS first_at, MAX(timestamp) AS last_at,
+           COUNT(DISTINCT project_id) AS projects
+    FROM metrics
+    {METRICS_WINDOW_FILTER}
+    GROUP BY GROUPING SETS ((project_id, metric_name), (metric_name))
+"""
+
+METRIC_TAILS_SQL = f"""
+    SELECT project_id::text AS project_id, metric_name, array_agg(value ORDER BY timestamp) AS vals
+    FROM (
+        SELECT project_id, metric_name, value, timestamp,
+               row_number() OVER (PARTITION BY project_id, metric_name ORDER BY timestamp DESC) AS rn
+        FROM metrics
+        {METRICS_WINDOW_FILTER}
+    ) recent
+    WHERE rn <= %(tail)s
+    GROUP BY project_id, metric_name
+"""
+
+def load_metric_analytics(client_id, params, projects):
+    query_params = {
+        'client_id': client_id,
+        'projects': sorted(projects),
+        'hours': params['hours'],
+        'metrics': params['metrics'],
+        'tail': metric_analytics.ANALYTICS_TAIL_POINTS,
+    }
+    summary = db_query(METRIC_SUMMARY_SQL, query_params) or []
+    tails = db_query(METRIC_TAILS_SQL, query_params) or []
+    with tracing.span('analytics.compute', **{'analytics.series': len(tails)}):
+        return metric_analytics.build_analytics(summary, tails, projects, params)
+
+@app.route('/api/analytics/metrics', methods=['GET'])
+def get_metric_analytics():
+    """Percentiles, moyenne, max, tendance et scores d'anomalie par projet et métrique
+    (?projects=id,id&metrics=cpu_usage,latency&hours=24&method=zscore|ewma&window=60&alpha=0.1)"""
+    try:
+        client_id = get_current_client_id()
+        try:
+            params = metric_analytics.parse_params(request.args)
+            params['projects'] = [str(uuid.UUID(project_id)) for project_id in params['projects']]
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        owned = {row['id']: row['name'] for row in db_query(ANALYTICS_PROJECTS_SQL, (client_id,)) or []}
+        if params['projects'] and not set(params['projects']) <= set(owned):
+            return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
+        projects = {project_id: owned[project_id] for project_id in params['projects'] or owned}
+
+        def compute():
+            # Résultat gardé tout le TTL: lu sur le primaire, jamais sur un réplica en retard
+            with db_router.primary_reads():
+                return load_metric_analytics(client_id, params, projects)
+        return jsonify(RESULT_CACHE.get_or_compute('metric_analytics', client_id, params, compute))
+    except Exception as e:
+        print(f"Erreur get_metric_analytics: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@cached_loader('alerts')
+def load_alerts(client_id):
+    return [serialize_alert(a) for a in db_query(ALERTS_SQL, (client_id,)) or []]
+
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
     """Liste des alertes actives pour le client actuel"""
     try:
-        client_id = get_current_client_id()
-        alerts = db_query("""
-            SELECT a.id, a.severity, a.message, a.status, a.created_at, a.resolved_at,
-                   p.name as project_name
-            FROM alerts a
-            JOIN projects p ON a.project_id = p.id
-            WHERE a.status = 'ACTIVE' AND p.client_id = %s
-            ORDER BY a.created_at DESC
-            LIMIT 10
-        """, (client_id,))
-
-        if alerts:
-            result = []
-            for a in alerts:
-                alert_dict = dict(a)
-                alert_dict['id'] = str(alert_dict['id'])
-                if alert_dict.get('created_at'):
-                    alert_dict['created_at'] = alert_dict['created_at'].isoformat()
-                if alert_dict.get('resolved_at'):
-                    alert_dict['resolved_at'] = alert_dict['resolved_at'].isoformat()
-                result.append(alert_dict)
-            return jsonify(result)
-        return jsonify([])
+        return jsonify(load_alerts(get_current_client_id()))
     except Exception as e:
         print(f"Erreur get_alerts: {str(e)}")
         return jsonify([])
 
+# Tempêtes d'alertes: une ligne par groupe (même règle sur plusieurs projets, sinon même projet)
+ALERT_GROUPS_SQL = """
+    SELECT a.group_key, COUNT(*) AS alerts, SUM(a.occurrences) AS occurrences,
+           MAX(a.severity) AS severity, COUNT(DISTINCT a.project_id) AS projects,
+           MIN(a.created_at) AS created_at, MAX(a.last_seen_at) AS last_seen_at,
+           COUNT(*) FILTER (WHERE a.status = 'ACKNOWLEDGED') AS acknowledged,
+           (ARRAY_AGG(a.message ORDER BY a.last_seen_at DESC))[1] AS message
+    FROM alerts a
+    WHERE a.client_id = %s AND a.status <> 'RESOLVED'
+    GROUP BY a.group_key
+    ORDER BY MAX(a.last_seen_at) DESC
+    LIMIT 50
+"""
+
+@cached_loader('alert_groups')
+def load_alert_groups(client_id):
+    groups = []
+    for row in db_query(ALERT_GROUPS_SQL, (client_id,)) or []:
+        group = dict(row)
+        for key in ('created_at', 'last_seen_at'):
+            if group.get(key):
+                group[key] = group[key].isoformat()
+        groups.append(group)
+    return groups
+
+@app.route('/api/alerts/groups', methods=['GET'])
+def get_alert_groups():
+    """Alertes non résolues regroupées, pour acquitter ou résoudre une tempête en une fois"""
+    try:
+        return jsonify(load_alert_groups(get_current_client_id()))
+    except Exception as e:
+        print(f"Erreur get_alert_groups: {str(e)}")
+        return jsonify([])
+
+# Mises à jour ensemblistes: une requête quel que soit le nombre d'alertes visées
+BULK_ALERT_SQL = {
+    'acknowledge': """
+        UPDATE alerts SET status = 'ACKNOWLEDGED', acknowledged_at = CURRENT_TIMESTAMP
+        WHERE client_id = %(client_id)s AND status = 'ACTIVE'
+        AND (id = ANY(%(ids)s::uuid[]) OR group_key = ANY(%(group_keys)s::text[])
+             OR fingerprint = ANY(%(fingerprints)s::text[]))
+    """,
+    'resolve': """
+        UPDATE alerts SET status = 'RESOLVED', resolved_at = CURRENT_TIMESTAMP
+        WHERE client_id = %(client_id)s AND status <> 'RESOLVED'
+        AND (id = ANY(%(ids)s::uuid[]) OR group_key = ANY(%(group_keys)s::text[])
+             OR fingerprint = ANY(%(fingerprints)s::text[]))
+    """,
+}
+
+@app.route('/api/alerts/<action>', methods=['POST'])
+def update_alerts(action):
+    """Acquitter ou résoudre des alertes par ids, groupes (group_keys) ou empreintes"""
+    if action not in BULK_ALERT_SQL:
+        return jsonify({"success": False, "error": "Action inconnue (acknowledge, resolve)"}), 404
+    try:
+        client_id = get_current_client_id()
+        data = request.get_json(silent=True) or {}
+        try:
+            selection = {}
+            for key in ('ids', 'group_keys', 'fingerprints'):
+                values = data.get(key) or []
+                if not isinstance(values, list):
+                    raise TypeError(key)
+                selection[key] = [str(value) for value in values]
+            selection['ids'] = [str(uuid.UUID(alert_id)) for alert_id in selection['ids']]
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "ids, group_keys et fingerprints doivent être des listes valides"}), 400
+        if not any(selection.values()):
+            return jsonify({"success": False, "error": "Aucune alerte sélectionnée"}), 400
+
+        conn = get_db()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(BULK_ALERT_SQL[action], dict(selection, client_id=client_id))
+                updated = cur.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        RESULT_CACHE.invalidate(client_id)
+        return jsonify({"success": True, "updated": updated})
+    except Exception as e:
+        print(f"Erreur update_alerts: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================
+# MOTEUR D'ALERTES (règles évaluées à l'ingestion des métriques)
+# ============================================
+
+# Les fenêtres glissantes sont alimentées par le flux partagé de metrics
+# (follow_hot_tier_shard, dans l'ordre des id, chaque ligne une seule fois): chaque
+# worker évalue les points reçus par tous les workers et écrit les mêmes transitions
+# (écriture idempotente, comme tick). Suivi désactivé (MOONOPS_HOT_TIER_SYNC_S=0):
+# évaluation à l'ingestion, sur les seuls points reçus par ce processus, ce qui
+# suppose un seul worker ou un routage collant par tenant. La base fait foi pour
+# l'état des alertes (une seule alerte non résolue par règle et projet), relue
+# avec les règles toutes les ALERT_RULES_RELOAD_S secondes
+ALERT_RULES_RELOAD_S = float(os.getenv('MOONOPS_ALERT_RULES_RELOAD_S', '30'))
+ALERT_TICK_S = float(os.getenv('MOONOPS_ALERT_TICK_S', '5'))  # Vérification des règles d'absence
+METRICS_MAX_BATCH = int(os.getenv('MOONOPS_METRICS_MAX_BATCH', '10000'))
+
+ALERT_ENGINE = AlertEngine()
+
+ALERT_RULE_COLUMNS = """
+    id::text, client_id::text, project_id::text, name, metric_name, kind, aggregation, comparator,
+    threshold, clear_threshold, window_s, for_s, severity, enabled, created_at
+"""
+
+ALERT_RULES_SQL = f"SELECT {ALERT_RULE_COLUMNS} FROM alert_rules WHERE enabled"
+
+OPEN_RULE_ALERTS_SQL = """
+    SELECT rule_id::text, project_id::text
+    FROM alerts
+    WHERE rule_id IS NOT NULL AND status <> 'RESOLVED'
+"""
+
+CLIENT_ALERT_RULES_SQL = f"SELECT {ALERT_RULE_COLUMNS} FROM alert_rules WHERE client_id = %s ORDER BY created_at DESC"
+
+INSERT_ALERT_RULE_SQL = f"""
+    INSERT INTO alert_rules (client_id, project_id, name, metric_name, kind, aggregation, comparator,
+                             threshold, clear_threshold, window_s, for_s, severity)
+    VALUES (%(client_id)s, %(project_id)s, %(name)s, %(metric_name)s, %(kind)s, %(aggregation)s, %(comparator)s,
+            %(threshold)s, %(clear_threshold)s, %(window_s)s, %(for_s)s, %(severity)s)
+    RETURNING {ALERT_RULE_COLUMNS}
+"""
+
+OWNED_PROJECTS_SQL = "SELECT id::text FROM projects WHERE client_id = %s AND id = ANY(%s::uuid[])"
+
+INSERT_METRICS_SQL = "INSERT INTO metrics (project_id, client_id, metric_name, value, timestamp) VALUES %s"
+
+# Une alerte résolue depuis moins de ALERT_REOPEN_S secondes est rouverte plutôt que dupliquée
+ALERT_REOPEN_S = int(os.getenv('MOONOPS_ALERT_REOPEN_S', '300'))
+
+# Une ligne par empreinte: la répétition d'un problème ouvert (ou résolu récemment)
+# incrémente occurrences et last_seen_at. Idempotent entre workers (index unique partiel).
+UPSERT_ALERT_SQL = """
+    WITH reopened AS (
+        UPDATE alerts
+        SET status = CASE WHEN status = 'RESOLVED' THEN 'ACTIVE'::alert_status ELSE status END,
+            resolved_at = NULL, severity = %(severity)s::alert_severity, message = %(message)s,
+            occurrences = occurrences + %(occurrences)s, last_seen_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM alerts
+            WHERE client_id = %(client_id)s AND fingerprint = %(fingerprint)s
+            AND (status <> 'RESOLVED' OR resolved_at >= CURRENT_TIMESTAMP - %(reopen_s)s * INTERVAL '1 second')
+            ORDER BY resolved_at DESC NULLS FIRST
+            LIMIT 1
+        )
+        RETURNING id
+    )
+    INSERT INTO alerts (project_id, client_id, severity, message, status, rule_id, fingerprint, labels, occurrences)
+    SELECT %(project_id)s::uuid, %(client_id)s::uuid, %(severity)s::alert_severity, %(message)s,
+           'ACTIVE'::alert_status, %(rule_id)s::uuid, %(fingerprint)s, %(labels)s::jsonb, %(occurrences)s
+    WHERE NOT EXISTS (SELECT 1 FROM reopened)
+    ON CONFLICT (client_id, fingerprint) WHERE fingerprint IS NOT NULL AND status <> 'RESOLVED'
+    DO UPDATE SET occurrences = alerts.occurrences + EXCLUDED.occurrences, last_seen_at = EXCLUDED.last_seen_at,
+                  severity = EXCLUDED.severity, message = EXCLUDED.message
+"""
+
+RESOLVE_ALERT_SQL = """
+    UPDATE alerts SET status = 'RESOLVED', resolved_at = CURRENT_TIMESTAMP
+    WHERE client_id = %s AND fingerprint = %s AND status <> 'RESOLVED'
+"""
+
+def shard_alert_rules(router):
+    with router.primary_cursor() as cur:
+        cur.execute(ALERT_RULES_SQL)
+        rules = [AlertRule.from_row(row) for row in cur.fetchall()]
+        cur.execute(OPEN_RULE_ALERTS_SQL)
+        firing = [(row['rule_id'], row['project_id']) for row in cur.fetchall()]
+    return rules, firing
+
+def load_alert_rules():
+    """Règles actives et alertes ouvertes de tous les shards; un shard injoignable: règles inchangées"""
+    rules, firing = [], []
+    for shard, result in SHARDS.fan_out(shard_alert_rules).items():
+        if isinstance(result, Exception):
+            print(f"⚠️ Règles d'alerte non rechargées ({shard}): {result}")
+            return False
+        rules.extend(result[0])
+        firing.extend(result[1])
+    ALERT_ENGINE.load_rules(rules, firing)
+    return True
+
+def persist_alert_events(events):
+    """Écrit les transitions du moteur, tenant par tenant (shard du tenant), au plus
+    une ouverture et une résolution par empreinte et par lot"""
+    by_client = {}
+    for event in events:
+        by_client.setdefault(event.rule.client_id, []).append(event)
+    for client_id, client_events in by_client.items():
+        tenant_token = SHARDS.bind(client_id)
+        try:
+            conn = get_db()
+            try:
+                with conn.cursor() as cur:
+                    for update in coalesce_events(client_events):
+                        event = update.event
+                        if update.occurrences:
+                            cur.execute(UPSERT_ALERT_SQL, {
+                                'project_id': event.project_id,
+                                'client_id': client_id,
+                                'severity': event.rule.severity,
+                                'message': event.rule.message(event.value),
+                                'rule_id': event.rule.id,
+                                'fingerprint': update.fingerprint,
+                                'labels': json.dumps(event.rule.labels),
+                                'occurrences': update.occurrences,
+                                'reopen_s': ALERT_REOPEN_S,
+                            })
+                        if update.resolved:
+                            cur.execute(RESOLVE_ALERT_SQL, (client_id, update.fingerprint))
+                conn.commit()
+            finally:
+                conn.close()
+            RESULT_CACHE.invalidate(client_id)
+        except Exception as e:
+            print(f"❌ Alertes non enregistrées pour {client_id[:8]}...: {e}")
+        finally:
+            SHARDS.unbind(tenant_token)
+
+def start_alert_engine():
+    """Thread de fond: rechargement des règles et vérification des règles d'absence"""
+    if ALERT_TICK_S <= 0:
+        load_alert_rules()
+        return
+
+    def _loop():
+        last_reload = None
+        while True:
+            try:
+                if last_reload is None or time.monotonic() - last_reload >= ALERT_RULES_RELOAD_S:
+                    if load_alert_rules():
+                        last_reload = time.monotonic()
+                events = ALERT_ENGINE.tick()
+                if events:
+                    persist_alert_events(events)
+            except Exception as e:
+                print(f"⚠️ Moteur d'alertes: {e}")
+            time.sleep(ALERT_TICK_S)
+
+    threading.Thread(target=_loop, name='moonops-alert-engine', daemon=True).start()
+
+start_alert_engine()
+
+def parse_metric_samples(payload):
+    """[(project_id, metric_name, ts, value)] triés par ts; ValueError si le lot est invalide"""
+    samples = payload.get('samples') if isinstance(payload, dict) else None
+    if not isinstance(samples, list) or not samples:
+        raise ValueError("Corps attendu: {\"samples\": [{project_id, metric_name, value, timestamp?}, ...]}")
+    if len(samples) > METRICS_MAX_BATCH:
+        raise ValueError(f"Lot trop volumineux (max {METRICS_MAX_BATCH} points)")
+    now = time.time()
+    parsed = []
+    for sample in samples:
+        try:
+            project_id = str(uuid.UUID(str(sample['project_id'])))
+            metric_name = str(sample['metric_name']).strip()
+            value = float(sample['value'])
+            ts = sample.get('timestamp')
+            if ts is None:
+                ts = now
+            elif isinstance(ts, str):
+                ts = datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+            else:
+                ts = float(ts)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f"Point invalide: {sample!r}"[:200])
+        if not metric_name or value != value:
+            raise ValueError(f"Point invalide: {sample!r}"[:200])
+        parsed.append((project_id, metric_name, ts, value))
+    parsed.sort(key=lambda sample: sample[2])
+    return parsed
+
+@app.route('/api/metrics', methods=['POST'])
+def ingest_metrics():
+    """Ingestion d'un lot de points; les règles d'alerte du tenant sont évaluées au suivi de metrics
+    (alerts_opened / alerts_resolved à 0), ou à l'ingestion quand le suivi est désactivé"""
+    try:
+        client_id = get_current_client_id()
+        try:
+            samples = parse_metric_samples(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        project_ids = sorted({sample[0] for sample in samples})
+        owned = db_query(OWNED_PROJECTS_SQL, (client_id, project_ids)) or []
+        if len(owned) != len(project_ids):
+            return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
+
+        conn = get_db()
+        try:
+            with tracing.span('db.insert_metrics', **{'metrics.points': len(samples)}), conn.cursor() as cur:
+                execute_values(cur, INSERT_METRICS_SQL,
+                               [(project_id, client_id, name, value, ts) for project_id, name, ts, value in samples],
+                               template="(%s, %s, %s, %s, to_timestamp(%s))", page_size=1000)
+            conn.commit()
+        finally:
+            conn.close()
+        HOT_TIER.add(client_id, samples)
+
+        events = []
+        if HOT_TIER_SYNC_S <= 0:  # Sinon évalués au suivi de metrics, avec les points des autres workers
+            with tracing.span('alerts.evaluate', **{'metrics.points': len(samples)}):
+                events = ALERT_ENGINE.ingest(client_id, samples)
+        if events:
+            persist_alert_events(events)
+        return jsonify({
+            "success": True,
+            "accepted": len(samples),
+            "alerts_opened": sum(1 for event in events if event.action == 'open'),
+            "alerts_resolved": sum(1 for event in events if event.action == 'resolve'),
+        })
+    except Exception as e:
+        print(f"Erreur ingest_metrics: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def serialize_alert_rule(row):
+    rule_dict = dict(row)
+    if rule_dict.get('created_at'):
+        rule_dict['created_at'] = rule_dict['created_at'].isoformat()
+    return rule_dict
+
+@app.route('/api/alert-rules', methods=['GET'])
+def get_alert_rules():
+    """Règles d'alerte du client actuel"""
+    try:
+        rules = db_query(CLIENT_ALERT_RULES_SQL, (get_current_client_id(),)) or []
+        return jsonify([serialize_alert_rule(rule) for rule in rules])
+    except Exception as e:
+        print(f"Erreur get_alert_rules: {str(e)}")
+        return jsonify([])
+
+@app.route('/api/alert-rules', methods=['POST'])
+def create_alert_rule():
+    """Créer une règle (seuil, variation ou absence); active immédiatement sur ce worker,
+    sur les autres au prochain rechargement"""
+    try:
+        client_id = get_current_client_id()
+        try:
+            rule = validate_rule(request.get_json(silent=True))
+            if rule['project_id']:
+                rule['project_id'] = str(uuid.UUID(str(rule['project_id'])))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if rule['project_id'] and not db_query(PROJECT_OWNER_SQL, (rule['project_id'], client_id), fetch_one=True):
+            return jsonify({"success": False, "error": "Projet non trouvé ou accès non autorisé"}), 403
+        rule['client_id'] = client_id
+        rule['name'] = rule['name'] or f"{rule['metric_name']} {rule['comparator']} {rule['threshold']:g}"
+
+        conn = get_db()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(INSERT_ALERT_RULE_SQL, rule)
+                row = cur.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        ALERT_ENGINE.upsert_rule(AlertRule.from_row(row))
+        return jsonify({"success": True, "rule": serialize_alert_rule(row)}), 201
+    except Exception as e:
+        print(f"Erreur create_alert_rule: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/alert-rules/<rule_id>', methods=['DELETE'])
+def delete_alert_rule(rule_id):
+    """Supprimer une règle; ses alertes encore ouvertes sont résolues"""
+    try:
+        client_id = get_current_client_id()
+        conn = get_db()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM alert_rules WHERE id::text = %s AND client_id = %s", (rule_id, client_id))
+                if not cur.fetchone():
+                    return jsonify({"success": False, "error": "Règle non trouvée ou accès non autorisé"}), 404
+                cur.execute("""
+                    UPDATE alerts SET status = 'RESOLVED', resolved_at = CURRENT_TIMESTAMP
+                    WHERE rule_id = %s AND status <> 'RESOLVED'
+                """, (rule_id,))
+                cur.execute("DELETE FROM alert_rules WHERE id = %s", (rule_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        ALERT_ENGINE.remove_rule(rule_id)
+        RESULT_CACHE.invalidate(client_id)
+        return jsonify({"success": True, "message": "Règle supprimée"})
+    except Exception as e:
+        print(f"Erreur delete_alert_rule: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ============================================
+# HOT TIER (derniers points des séries en mémoire, hot_tier.py)
+# ============================================
+
+# Chaque worker suit la table metrics (id croissant) pour voir les points ingérés
+# par les autres; MOONOPS_HOT_TIER_SYNC_S=0 avec un seul worker. Les REWIND derniers
+# ids sont relus à chaque passage: une transaction validée après une transaction
+# d'id supérieur n'est pas manquée (MetricsCursor: chaque id n'est transmis qu'une fois)
+HOT_TIER_SYNC_S = float(os.getenv('MOONOPS_HOT_TIER_SYNC_S', '2'))
+HOT_TIER_REWIND = int(os.getenv('MOONOPS_HOT_TIER_REWIND', '1000'))
+HOT_TIER_FOLLOW_BATCH = 50000
+METRICS_MAX_MINUTES = 24 * 60
+
+HOT_TIER = HotTier()
+
+HOT_TIER_WATERMARK_SQL = "SELECT COALESCE(MAX(id), 0) AS id FROM metrics"
+
+# Derniers points (au plus max_points) de chaque série de l'horizon, séries les plus récentes en dernier (LRU).
+# truncated_at: point écarté le plus récent d'une série tronquée (la fenêtre n'est couverte qu'après)
+HOT_TIER_WARM_SQL = """
+    SELECT project_id::text AS project_id, client_id::text AS client_id, metric_name,
+           array_agg(EXTRACT(EPOCH FROM timestamp)::float8 ORDER BY timestamp) FILTER (WHERE rn <= %(points)s) AS ts,
+           array_agg(value ORDER BY timestamp) FILTER (WHERE rn <= %(points)s) AS vals,
+           MAX(EXTRACT(EPOCH FROM timestamp)::float8) FILTER (WHERE rn > %(points)s) AS truncated_at
+    FROM (
+        SELECT project_id, client_id, metric_name, value, timestamp,
+               row_number() OVER (PARTITION BY project_id, metric_name ORDER BY timestamp DESC) AS rn
+        FROM metrics
+        WHERE timestamp >= to_timestamp(%(since)s)
+    ) recent
+    GROUP BY project_id, client_id, metric_name
+    ORDER BY MAX(timestamp)
+"""
+
+HOT_TIER_FOLLOW_SQL = """
+    SELECT id, project_id::text AS project_id, client_id::text AS client_id, metric_name, value,
+           EXTRACT(EPOCH FROM timestamp)::float8 AS ts
+    FROM metrics
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+# Fenêtre d'un projet lue en base quand le hot tier ne la couvre pas (puis chargée dans le hot tier)
+HOT_METRICS_WINDOW_SQL = """
+    SELECT metric_name, value, timestamp
+    FROM metrics
+    WHERE project_id = %s
+    AND timestamp >= to_timestamp(%s)
+    ORDER BY timestamp ASC
+"""
+
+def parse_metrics_minutes(value):
+    """?minutes=N -> secondes; ValueError si invalide"""
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("minutes doit être un entier")
+    if not 1 <= minutes <= METRICS_MAX_MINUTES:
+        raise ValueError(f"minutes doit être entre 1 et {METRICS_MAX_MINUTES}")
+    return minutes * 60
+
+def iso_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+def hot_metrics_window(project_id, client_id, seconds):
+    """Séries du projet (format de group_metrics) depuis le hot tier; None: projet
+    d'un autre client ou inconnu, ou fenêtre non couverte (lecture en base)"""
+    if HOT_TIER.owner(project_id) != client_id:
+        return None
+    window = HOT_TIER.window(project_id, seconds)
+    if window is None:
+        return None
+    return {
+        name: [{'value': value, 'timestamp': iso_timestamp(ts)} for ts, value in zip(times, values)]
+        for name, (times, values) in window.items()
+    }
+
+def hot_metrics_latest(project_id, client_id):
+    """{metric_name: {value, timestamp}} depuis le hot tier; None: lecture en base"""
+    if HOT_TIER.owner(project_id) != client_id:
+        return None
+    latest = HOT_TIER.latest(project_id)
+    if latest is None:
+        return None
+    return {name: {'value': value, 'timestamp': iso_timestamp(ts)} for name, (ts, value) in latest.items()}
+
+def latest_metrics(rows):
+    """Dernier point de chaque métrique (lignes triées par timestamp), comme hot_metrics_latest"""
+    return {row['metric_name']: {'value': float(row['value']), 'timestamp': row['timestamp'].isoformat()}
+            for row in rows}
+
+def load_hot_project(project_id, client_id, rows, since):
+    """Fenêtre lue en base (complète depuis since) chargée dans le hot tier: les lectures suivantes y sont servies"""
+    series = {}
+    for row in rows:
+        series.setdefault(row['metric_name'], []).append((row['timestamp'].timestamp(), float(row['value'])))
+    HOT_TIER.load(project_id, client_id, series, since)
+
+def warm_hot_tier_shard(router):
+    """Préchauffage depuis un shard; retourne (dernier id de metrics, séries chargées)"""
+    since = time.time() - HOT_TIER_HORIZON_S
+    with router.primary_cursor() as cur:
+        # Le point de départ du suivi est lu avant les points: rien n'est manqué entre les deux
+        cur.execute(HOT_TIER_WATERMARK_SQL)
+        watermark = cur.fetchone()['id']
+        cur.execute(HOT_TIER_WARM_SQL, {'since': since, 'points': HOT_TIER.max_points})
+        rows = cur.fetchall()
+    for row in rows:
+        HOT_TIER.load(row['project_id'], row['client_id'], {row['metric_name']: list(zip(row['ts'], row['vals']))},
+                      since, dropped=row['truncated_at'])
+    return watermark, len(rows)
+
+def follow_hot_tier_shard(router, cursor):
+    """Points ajoutés à metrics depuis le watermark du curseur (tous les workers) -> hot tier
+    et moteur d'alertes, chaque id une seule fois"""
+    while True:
+        with router.primary_cursor() as cur:
+            cur.execute(HOT_TIER_FOLLOW_SQL, (cursor.since(), HOT_TIER_FOLLOW_BATCH))
+            rows = cur.fetchall()
+        by_client = {}
+        for row in cursor.fresh(rows):
+            by_client.setdefault(row['client_id'], []).append(
+                (row['project_id'], row['metric_name'], row['ts'], row['value'])
+            )
+        events = []
+        for client_id, samples in by_client.items():
+            HOT_TIER.add(client_id, samples)
+            events += ALERT_ENGINE.follow(client_id, samples)
+        if events:
+            persist_alert_events(events)
+        if len(rows) < HOT_TIER_FOLLOW_BATCH:
+            return
+
+def start_hot_tier():
+    """Thread de fond: préchauffage de chaque shard au démarrage, puis suivi de la table metrics"""
+    def _loop():
+        cursors = {}
+        while True:
+            for shard, router in SHARDS.routers.items():
+                try:
+                    if shard not in cursors:
+                        watermark, series = warm_hot_tier_shard(router)
+                        cursors[shard] = MetricsCursor(watermark, HOT_TIER_REWIND)
+                        print(f"🔥 Hot tier préchauffé ({shard}): {series} séries")
+                    elif HOT_TIER_SYNC_S > 0:
+                        follow_hot_tier_shard(router, cursors[shard])
+                except Exception as e:
+                    print(f"⚠️ Hot tier ({shard}): {e}")
+            if HOT_TIER_SYNC_S <= 0 and len(cursors) == len(SHARDS.routers):
+                return
+            time.sleep(HOT_TIER_SYNC_S if HOT_TIER_SYNC_S > 0 else 30)
+
+    threading.Thread(target=_loop, name='moonops-hot-tier', daemon=True).start()
+
+start_hot_tier()
+
+# ============================================
+# COMPACTION DES MÉTRIQUES (chunks compressés, metric_chunks.py)
+# ============================================
+
+# Les analyses (percentiles, tendance) et le hot tier lisent les lignes brutes:
+# elles sont gardées au moins MOONOPS_ANALYTICS_MAX_HOURS
+METRICS_COMPACT_AFTER_H = max(metric_chunks.COMPACT_AFTER_H, metric_analytics.ANALYTICS_MAX_HOURS)
+COMPACTION_STATS = {'runs': 0, 'points': 0, 'chunks': 0, 'last_run_at': None}
+# (shard, nom de métrique) -> id de metric_names (dictionnaire propre à chaque shard)
+METRIC_NAME_IDS = {}
+
+COMPACTION_PROJECTS_SQL = """
+    SELECT p.id::text AS project_id, p.client_id::text AS client_id
+    FROM projects p
+    WHERE EXISTS (SELECT 1 FROM metrics m WHERE m.project_id = p.id AND m.timestamp < %s)
+"""
+
+# Points bruts les plus anciens du projet, retirés de metrics dans la transaction qui écrit les chunks
+COMPACT_METRICS_SQL = """
+    DELETE FROM metrics
+    WHERE id IN (
+        SELECT id FROM metrics
+        WHERE project_id = %s AND timestamp < %s
+        ORDER BY timestamp
+        LIMIT %s
+    )
+    RETURNING metric_name, (EXTRACT(EPOCH FROM timestamp) * 1000000)::bigint AS ts_us, value
+"""
+
+INSERT_METRIC_NAMES_SQL = "INSERT INTO metric_names (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING"
+METRIC_NAME_IDS_SQL = "SELECT id, name FROM metric_names WHERE name = ANY(%s::text[])"
+
+# Chunks déjà écrits pour les tranches du lot (points arrivés en retard, lot à cheval sur une tranche)
+EXISTING_CHUNKS_SQL = """
+    SELECT c.metric_id, (EXTRACT(EPOCH FROM c.start_at) * 1000000)::bigint AS start_us, c.data
+    FROM metric_chunks c
+    JOIN unnest(%s::int[], %s::timestamptz[]) AS k(metric_id, start_at)
+      ON c.metric_id = k.metric_id AND c.start_at = k.start_at
+    WHERE c.project_id = %s
+    FOR UPDATE OF c
+"""
+
+UPSERT_CHUNKS_SQL = """
+    INSERT INTO metric_chunks (project_id, client_id, metric_id, start_at, end_at, points, data)
+    VALUES %s
+    ON CONFLICT (project_id, metric_id, start_at)
+    DO UPDATE SET end_at = EXCLUDED.end_at, points = EXCLUDED.points, data = EXCLUDED.data
+"""
+
+METRIC_STORAGE_SQL = """
+    SELECT
+        (SELECT reltuples::bigint FROM pg_class WHERE oid = 'metrics'::regclass) AS raw_points,
+        pg_total_relation_size('metrics') AS raw_bytes,
+        (SELECT COUNT(*) FROM metric_chunks) AS chunks,
+        (SELECT COALESCE(SUM(points), 0) FROM metric_chunks) AS chunk_points,
+        pg_total_relation_size('metric_chunks') + pg_total_relation_size('metric_names') AS chunk_bytes
+"""
+
+def metric_name_ids(cur, shard, names):
+    missing = [name for name in names if (shard, name) not in METRIC_NAME_IDS]
+    if missing:
+        cur.execute(INSERT_METRIC_NAMES_SQL, (missing,))
+        cur.execute(METRIC_NAME_IDS_SQL, (missing,))
+        for row in cur.fetchall():
+            METRIC_NAME_IDS[(shard, row['name'])] = row['id']
+    return {name: METRIC_NAME_IDS[(shard, name)] for name in names}
+
+def compact_project(cur, shard, project_id, client_id, cutoff):
+    """Un lot de points bruts du projet antérieurs à cutoff -> chunks; retourne (points, chunks)"""
+    cur.execute(COMPACT_METRICS_SQL, (project_id, cutoff, metric_chunks.COMPACT_BATCH))
+    rows = cur.fetchall()
+    if not rows:
+        return 0, 0
+    series = {}
+    for row in rows:
+        key = (row['metric_name'], metric_chunks.chunk_start(row['ts_us']))
+        series.setdefault(key, []).append((row['ts_us'], row['value']))
+    ids = metric_name_ids(cur, shard, {name for name, _ in series})
+    cur.execute(EXISTING_CHUNKS_SQL, ([ids[name] for name, _ in series],
+                                      [metric_chunks.to_datetime(start) for _, start in series], project_id))
+    existing = {(row['metric_id'], row['start_us']): row['data'] for row in cur.fetchall()}
+
+    chunks = []
+    for (name, start), points in series.items():
+        points.sort()
+        timestamps, values = [ts for ts, _ in points], [value for _, value in points]
+        previous = existing.get((ids[name], start))
+        if previous is not None:
+            timestamps, values = metric_chunks.merge(*metric_chunks.decode(previous), timestamps, values)
+        chunks.append((project_id, client_id, ids[name], metric_chunks.to_datetime(start),
+                       metric_chunks.to_datetime(timestamps[-1]), len(timestamps),
+                       psycopg2.Binary(metric_chunks.encode(timestamps, values))))
+    execute_values(cur, UPSERT_CHUNKS_SQL, chunks, page_size=500)
+    return len(rows), len(chunks)
+
+def compact_shard(shard, router):
+    """Points bruts plus anciens que METRICS_COMPACT_AFTER_H -> chunks, projet par projet;
+    un seul compacteur par shard (verrou consultatif, aussi pris par move_tenant.py)"""
+    conn = psycopg2.connect(**router.primary.config, cursor_factory=RealDictCursor)
+    compacted = written = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (metric_chunks.COMPACTION_LOCK_ID,))
+            locked = cur.fetchone()['locked']
+            conn.commit()
+            if not locked:
+                return 0
+            # Tranches complètes seulement
+            horizon = int((time.time() - METRICS_COMPACT_AFTER_H * 3600) * 1_000_000)
+            cutoff = metric_chunks.to_datetime(metric_chunks.chunk_start(horizon))
+            cur.execute(COMPACTION_PROJECTS_SQL, (cutoff,))
+            projects = cur.fetchall()
+            conn.commit()
+
+            for project in projects:
+                tenant_token = SHARDS.bind(project['client_id'])
+                try:
+                    SHARDS.check_writable()
+                    while True:
+                        points, chunks = compact_project(cur, shard, project['project_id'],
+                                                         project['client_id'], cutoff)
+                        conn.commit()
+                        compacted += points
+                        written += chunks
+                        if points < metric_chunks.COMPACT_BATCH:
+                            break
+                except TenantMovingError:
+                    conn.rollback()
+                except Exception as e:
+                    conn.rollback()
+                    # Noms ajoutés au dictionnaire dans la transaction annulée: ids à relire
+                    METRIC_NAME_IDS.clear()
+                    print(f"❌ Compaction des métriques du projet {project['project_id'][:8]}...: {e}")
+                finally:
+                    SHARDS.unbind(tenant_token)
+    finally:
+        # Fermer la session libère le verrou consultatif
+        conn.close()
+    COMPACTION_STATS['points'] += compacted
+    COMPACTION_STATS['chunks'] += written
+    if compacted:
+        print(f"🗜️ Métriques compactées ({shard}): {compacted} points -> {written} chunks")
+    return compacted
+
+def compact_metrics():
+    COMPACTION_STATS['runs'] += 1
+    COMPACTION_STATS['last_run_at'] = datetime.now(timezone.utc).isoformat()
+    results = {}
+    for shard, router in SHARDS.routers.items():
+        try:
+            results[shard] = compact_shard(shard, router)
+        except Exception as e:
+            print(f"⚠️ Compaction des métriques impossible ({shard}): {e}")
+            results[shard] = {"error": str(e)}
+    return results
+
+def start_metric_compaction():
+    """Thread de fond: compaction périodique des points bruts anciens"""
+    if metric_chunks.COMPACT_INTERVAL_S <= 0:
+        return
+
+    def _loop():
+        while True:
+            time.sleep(metric_chunks.COMPACT_INTERVAL_S)
+            compact_metrics()
+
+    threading.Thread(target=_loop, name='moonops-metric-compaction', daemon=True).start()
+
+start_metric_compaction()
+
+def shard_metric_storage(router):
+    with router.connection(readonly=True) as conn, conn.cursor() as cur:
+        cur.execute(METRIC_STORAGE_SQL)
+        row = dict(cur.fetchone())
+    # Octets par point (index et TOAST compris)
+    row['raw_bytes_per_point'] = round(row['raw_bytes'] / row['raw_points'], 1) if row['raw_points'] > 0 else None
+    row['chunk_bytes_per_point'] = round(row['chunk_bytes'] / row['chunk_points'], 1) if row['chunk_points'] else None
+    if row['raw_bytes_per_point'] and row['chunk_bytes_per_point']:
+        row['compression_ratio'] = round(row['raw_bytes_per_point'] / row['chunk_bytes_per_point'], 1)
+    return row
+
+# ============================================
+# ROUTE DASHBOARD (composite)
+# ============================================
+
+# Sections disponibles: nom -> chargeur(client_id)
+DASHBOARD_SECTIONS = {
+    'stats': load_stats,
+    'projects': load_projects,
+    'deployments': load_deployments,
+    'pipelines': load_pipelines,
+    'alerts': load_alerts,
+}
+DASHBOARD_DEFAULT_SECTIONS = ('stats', 'projects')
+
+# Pool partagé par toutes les requêtes composites (borne les connexions ouvertes)
+DASHBOARD_WORKERS = int(os.getenv('MOONOPS_DASHBOARD_WORKERS', '8'))
+dashboard_pool = ThreadPoolExecutor(DASHBOARD_WORKERS, thread_name_prefix='moonops-dashboard')
+
+def parse_dashboard_sections(include):
+    """Sections demandées (?include=stats,projects); None si une section est inconnue"""
+    if not include:
+        return list(DASHBOARD_DEFAULT_SECTIONS)
+    sections = list(dict.fromkeys(name.strip() for name in include.split(',') if name.strip()))
+    if not sections or any(name not in DASHBOARD_SECTIONS for name in sections):
+        return None
+    return sections
+
+def run_dashboard_section(name, client_id):
+    with tracing.span(f"dashboard.{name}"):
+        return DASHBOARD_SECTIONS[name](client_id)
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Plusieurs ressources du client actuel en une requête, chargées en parallèle"""
+    sections = parse_dashboard_sections(request.args.get('include', ''))
+    if sections is None:
+        return jsonify({
+            "success": False,
+            "error": f"Sections disponibles: {', '.join(DASHBOARD_SECTIONS)}"
+        }), 400
+
+    # Client résolu une seule fois pour toutes les sections
+    client_id = get_current_client_id()
+    futures = {
+        name: dashboard_pool.submit(tracing.bind(run_dashboard_section), name, client_id)
+        for name in sections
+    }
+    result, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            result[name] = future.result()
+        except Exception as e:
+            print(f"Erreur dashboard ({name}): {str(e)}")
+            errors[name] = str(e)
+    if errors:
+        result['errors'] = errors
+    return jsonify(result)
+
+# ============================================
+# ROUTES ADMIN
+# ============================================
+
+@app.route('/api/admin/profiling', methods=['GET'])
+@admin_required
+def get_profiling():
+    """Réglages du profilage et liste des profils enregistrés"""
+    return jsonify({
+        "settings": profiling.SETTINGS.to_dict(),
+        "profiles": profiling.list_profiles()
+    })
+
+@app.route('/api/admin/profiling', methods=['PUT'])
+@admin_required
+def update_profiling():
+    """Modifier les réglages du profilage à chaud"""
+    try:
+        settings = profiling.update_settings(request.json or {})
+        return jsonify({"success": True, "settings": settings})
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@admin_required
+def download_profile(name):
+    """Télécharger un profil (.pstats ou .collapsed)"""
+    if not profiling.is_valid_profile_name(name):
+        return jsonify({"success": False, "error": "Nom de profil invalide"}), 400
+    return send_from_directory(profiling.PROFILE_DIR, name, as_attachment=True)
+
+@app.route('/api/admin/db-nodes', methods=['GET'])
+@admin_required
+def get_db_nodes():
+    """Shards, primaires, réplicas, retard de réplication et répartition des lectures"""
+    return jsonify(SHARDS.snapshot())
+
+# Volumétrie par tenant, exécutée sur chaque shard
+TENANT_USAGE_SQL = """
+    SELECT client_id::text AS client_id, 'projects' AS resource, COUNT(*) AS count
+    FROM projects GROUP BY client_id
+    UNION ALL
+    SELECT client_id::text, 'deployments', COUNT(*) FROM deployments GROUP BY client_id
+    UNION ALL
+    SELECT client_id::text, 'active_alerts', COUNT(*) FROM alerts WHERE status = 'ACTIVE' GROUP BY client_id
+    UNION ALL
+    SELECT client_id::text, 'metrics_24h', COUNT(*) FROM metrics
+    WHERE timestamp >= CURRENT_TIMESTAMP - INTERVAL '24 hours' GROUP BY client_id
+"""
+
+def shard_tenant_usage(router):
+    with router.connection(readonly=True) as conn, conn.cursor() as cur:
+        cur.execute(TENANT_USAGE_SQL)
+        return cur.fetchall()
+
+@app.route('/api/admin/tenants', methods=['GET'])
+@admin_required
+def get_tenants_usage():
+    """Volumétrie de tous les tenants, agrégée en parallèle sur tous les shards"""
+    tenants, shards = {}, {}
+    for shard, rows in SHARDS.fan_out(shard_tenant_usage).items():
+        if isinstance(rows, Exception):
+            print(f"⚠️ Shard {shard} injoignable: {rows}")
+            shards[shard] = {"error": str(rows)}
+            continue
+        counted = set()
+        for row in rows:
+            # Copies restées sur l'ancien shard pendant un déplacement: ignorées
+            if SHARDS.shard_of(row['client_id']) != shard:
+                continue
+            tenant = tenants.setdefault(row['client_id'], {
+                "client_id": row['client_id'], "shard": shard,
+                "projects": 0, "deployments": 0, "active_alerts": 0, "metrics_24h": 0
+            })
+            tenant[row['resource']] = row['count']
+            counted.add(row['client_id'])
+        shards[shard] = {"tenants": len(counted)}
+    return jsonify({
+        "tenants": sorted(tenants.values(), key=lambda t: (-t['metrics_24h'], -t['projects'])),
+        "shards": shards
+    })
+
+@app.route('/api/admin/cache', methods=['GET'])
+@admin_required
+def get_result_cache():
+    """Taux de succès du cache des résultats par ressource"""
+    return jsonify(RESULT_CACHE.snapshot())
+
+@app.route('/api/admin/cache', methods=['DELETE'])
+@admin_required
+def clear_result_cache():
+    RESULT_CACHE.clear()
+    return jsonify({"success": True, "message": "Cache des résultats vidé"})
+
+@app.route('/api/admin/singleflight', methods=['GET'])
+@admin_required
+def get_single_flight():
+    """Requêtes regroupées sur un calcul en cours, par route"""
+    return jsonify(SINGLE_FLIGHT.snapshot())
+
+@app.route('/api/admin/git-mirrors', methods=['GET'])
+@admin_required
+def get_git_mirrors():
+    """Miroirs Git locaux: nombre, taille, clones / fetchs / pushes"""
+    return jsonify(GIT_MIRRORS.snapshot())
+
+@app.route('/api/admin/alert-engine', methods=['GET'])
+@admin_required
+def get_alert_engine():
+    """Moteur d'alertes de ce worker: règles, séries suivies, alertes en cours, débit"""
+    return jsonify(ALERT_ENGINE.snapshot())
+
+@app.route('/api/admin/hot-tier', methods=['GET'])
+@admin_required
+def get_hot_tier():
+    """Hot tier de ce worker: séries et points en mémoire, lectures servies sans la base, évictions"""
+    return jsonify(HOT_TIER.snapshot())
+
+@app.route('/api/admin/metric-storage', methods=['GET'])
+@admin_required
+def get_metric_storage():
+    """Lignes brutes et chunks compressés par shard (octets par point, taux de compression), compaction"""
+    shards = {}
+    for shard, result in SHARDS.fan_out(shard_metric_storage).items():
+        shards[shard] = {"error": str(result)} if isinstance(result, Exception) else result
+    return jsonify({
+        "compact_after_hours": METRICS_COMPACT_AFTER_H,
+        "chunk_seconds": metric_chunks.CHUNK_S,
+        "compaction": COMPACTION_STATS,
+        "shards": shards,
+    })
+
+@app.route('/api/admin/metric-storage/compact', methods=['POST'])
+@admin_required
+def compact_metric_storage():
+    """Compaction immédiate des points bruts anciens de tous les shards"""
+    return jsonify({"compacted": compact_metrics()})
+
+@app.route('/api/admin/rate-limits', methods=['GET'])
+@admin_required
+def get_rate_limits():
+    """Limites par classe de route, refus et file équitable des travaux coûteux"""
+    return jsonify(ADMISSION.snapshot())
+
+PROVISIONING_COUNTS_SQL = """
+    SELECT provisioning_state, COUNT(*) AS count
+    FROM projects
+    WHERE provisioning_state <> 'READY'
+    GROUP BY provisioning_state
+"""
+
+def shard_provisioning_counts(router):
+    with router.primary_cursor() as cur:
+        cur.execute(PROVISIONING_COUNTS_SQL)
+        return {row['provisioning_state']: row['count'] for row in cur.fetchall()}
+
+@app.route('/api/admin/storage', methods=['GET'])
+@admin_required
+def get_storage():
+    """Occupation disque des archives, dossiers de travail et miroirs Git"""
+    return jsonify(STORAGE.snapshot())
+
+@app.route('/api/admin/storage/sweep', methods=['POST'])
+@admin_required
+def sweep_storage():
+    """Passage immédiat du janitor (abandonnés, miroirs inactifs, quotas)"""
+    return jsonify(STORAGE.sweep())
+
+@app.route('/api/admin/gitlab', methods=['GET'])
+@admin_required
+def get_gitlab_status():
+    """Disjoncteur GitLab et projets en attente de provisionnement, par shard"""
+    shards = {}
+    for shard, counts in SHARDS.fan_out(shard_provisioning_counts).items():
+        shards[shard] = {"error": str(counts)} if isinstance(counts, Exception) else counts
+    return jsonify({"breaker": GITLAB_BREAKER.snapshot(), "provisioning": shards})
+
+@app.route('/api/admin/gitlab/reconcile', methods=['POST'])
+@admin_required
+def reconcile_gitlab():
+    """Lance tout de suite la réconciliation (sans attendre le thread de fond)"""
+    results = SHARDS.fan_out(reconcile_shard)
+    return jsonify({
+        "success": True,
+        "provisioned": {shard: str(r) if isinstance(r, Exception) else r for shard, r in results.items()}
+    })
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """Requêtes lentes (avec plan EXPLAIN) et détections N+1 récentes"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(QUERY_LOG.snapshot(limit))
+
+@app.route('/api/admin/slow-queries', methods=['DELETE'])
+@admin_required
+def clear_slow_queries():
+    """Vider le journal des requêtes lentes"""
+    QUERY_LOG.clear()
+    return jsonify({"success": True})
+
 # ============================================
 # HEALTH CHECK
 # ============================================
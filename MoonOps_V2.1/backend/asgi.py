@@ -0,0 +1,678 @@
+"""
+Mode de service ASGI de MoonOps (production)
+
+Les routes de lecture interrogées en boucle par le frontend (projets, stats,
+déploiements, pipelines, métriques, alertes, dashboard composite), la connexion et la création de
+projet tournent sur une boucle d'événements avec asyncpg et httpx. Les autres
+routes de app.py (upload ZIP, déploiement, suppression, administration) sont
+servies par l'application Flask dans un pool de threads: le travail bloquant
+(ZIP, git, psycopg2) ne bloque jamais la boucle.
+
+Lancement (plusieurs workers, voir gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py asgi:application
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import os
+import re
+import time
+import uuid
+from functools import lru_cache, wraps
+
+import asyncpg
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import app as wsgi_backend
+import db_router
+import rate_limit
+import tracing
+from circuit_breaker import CircuitOpenError
+from config import CORS_ORIGINS
+from query_log import QUERY_LOG
+
+# Configuration (par worker)
+DB_POOL_MIN = db_router.POOL_MIN
+DB_POOL_MAX = db_router.POOL_MAX
+CPU_WORKERS = int(os.getenv('MOONOPS_CPU_WORKERS', str(min(4, os.cpu_count() or 1))))
+WSGI_THREADS = int(os.getenv('MOONOPS_WSGI_THREADS', '16'))
+GITLAB_MAX_CONNECTIONS = int(os.getenv('MOONOPS_GITLAB_MAX_CONNECTIONS', '20'))
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+@lru_cache(maxsize=256)
+def to_asyncpg(query):
+    """Convertit les paramètres psycopg2 (%s) en paramètres asyncpg ($1, $2...)"""
+    counter = iter(range(1, 1000))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+
+class AsyncDatabase:
+    """
+    Pools asyncpg (un par nœud de chaque shard et par worker), même contrat que
+    db_query de app.py. Le choix du shard (tenant courant) et du nœud (retard,
+    read-your-writes) est celui de app.SHARDS.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.pools = {}
+
+    async def connect(self):
+        for router in self.shards.routers.values():
+            for node in [router.primary] + router.replicas:
+                try:
+                    self.pools[(router.name, node.name)] = await asyncpg.create_pool(
+                        min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, **node.config
+                    )
+                except Exception as e:
+                    if node is router.primary:
+                        raise
+                    print(f"⚠️ Réplica {router.name}/{node.name} injoignable au démarrage: {e}")
+
+    async def close(self):
+        for pool in self.pools.values():
+            await pool.close()
+
+    def pool_for(self, query):
+        router = self.shards.router()
+        primary = self.pools[(router.name, router.primary.name)]
+        if not query.strip().upper().startswith("SELECT"):
+            self.shards.check_writable()
+            router.note_write()
+            return primary
+        node = router.read_node()
+        return self.pools.get((router.name, node.name)) or primary
+
+    async def current_lsn(self, shard):
+        """Position WAL du primaire du shard (jeton read-your-writes, comme DatabaseRouter.current_lsn)"""
+        router = self.shards.routers[shard]
+        async with self.pools[(router.name, router.primary.name)].acquire() as conn:
+            return db_router.parse_lsn(await conn.fetchval("SELECT pg_current_wal_lsn()::text"))
+
+    async def query(self, query, params=(), fetch_one=False):
+        """SELECT -> lignes (dict), fetch_one -> une ligne (RETURNING inclus), sinon True"""
+        with tracing.span('db.query', **{'db.statement': ' '.join(query.split())[:300]}) as sp:
+            started = time.perf_counter()
+            async with self.pool_for(query).acquire() as conn:
+                sql = to_asyncpg(query)
+                if fetch_one:
+                    row = await conn.fetchrow(sql, *params)
+                    result = dict(row) if row is not None else None
+                    rowcount = 0 if row is None else 1
+                elif query.strip().upper().startswith("SELECT"):
+                    result = [dict(row) for row in await conn.fetch(sql, *params)]
+                    rowcount = len(result)
+                else:
+                    status = await conn.execute(sql, *params)
+                    result = True
+                    rowcount = int(status.rsplit(' ', 1)[-1]) if status[-1:].isdigit() else -1
+            duration_ms = (time.perf_counter() - started) * 1000
+            sp.set_attribute('db.rowcount', rowcount)
+            # Pas de curseur: le plan EXPLAIN n'est capturé que par le mode WSGI
+            QUERY_LOG.record(query, params, duration_ms, rowcount)
+            return result
+
+
+db = AsyncDatabase(wsgi_backend.SHARDS)
+gitlab = None
+cpu_pool = None
+
+
+async def run_cpu(fn, *args):
+    """Exécute un travail CPU (bcrypt...) hors de la boucle d'événements"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, tracing.bind(fn), *args)
+
+
+def client_host(request):
+    return request.client.host if request.client else None
+
+
+def client_id_of(request):
+    """Client de la requête; les requêtes SQL suivantes vont à son shard"""
+    client_id = wsgi_backend.resolve_client_id(client_host(request), request.headers.get('X-Client-Id'))
+    wsgi_backend.SHARDS.bind(client_id)
+    return client_id
+
+
+def admission_key(request, route_class):
+    """Tenant limité: l'adresse IP pour la connexion (comme app.admission_key)"""
+    if route_class == 'auth':
+        return client_host(request) or 'anonymous'
+    return wsgi_backend.resolve_client_id(client_host(request), request.headers.get('X-Client-Id'))
+
+
+async def send_lsn_token(response):
+    """Après une écriture: jeton LSN renvoyé au client (comme app.send_lsn_token)"""
+    shards = db_router.written_shards()
+    if not shards:
+        return
+    try:
+        token = db_router.lsn_token({shard: await db.current_lsn(shard) for shard in shards})
+        response.headers[db_router.LSN_HEADER] = token
+        response.set_cookie(db_router.LSN_COOKIE, token, max_age=db_router.LSN_COOKIE_MAX_AGE_S,
+                            httponly=True, samesite='lax')
+    except Exception as e:
+        print(f"⚠️ Jeton read-your-writes non envoyé: {e}")
+
+
+def endpoint(route):
+    """Trace racine, comptage SQL (N+1) et admission d'une route native, comme les hooks Flask"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            route_class = rate_limit.route_class(view.__name__, request.method, request.url.path)
+            root = tracing.start_trace(
+                f"{request.method} {request.url.path}",
+                request.headers.get('traceparent'),
+                **{'http.method': request.method, 'http.target': request.url.path, 'http.route': route}
+            )
+            token = QUERY_LOG.begin_request()
+            tenant = wsgi_backend.SHARDS.bind(None)
+            session = db_router.begin_session(
+                request.headers.get('X-Session-Id') or f"{client_host(request)}|{request.headers.get('X-Client-Id', '')}",
+                request.headers.get(db_router.LSN_HEADER) or request.cookies.get(db_router.LSN_COOKIE)
+            )
+            error = None
+            admission = None
+            try:
+                try:
+                    if route_class is not None:
+                        admission = await wsgi_backend.ADMISSION.aadmit(route_class, admission_key(request, route_class))
+                    response = await view(request)
+                except rate_limit.RateLimited as e:
+                    response = JSONResponse({"success": False, "error": str(e)}, e.status,
+                                            headers={'Retry-After': str(e.retry_after)})
+                await send_lsn_token(response)
+                if root is not None:
+                    root.set_attribute('http.status_code', response.status_code)
+                    response.headers['X-Trace-Id'] = root.trace_id
+                return response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                wsgi_backend.ADMISSION.release(admission)
+                db_router.end_session(session)
+                wsgi_backend.SHARDS.unbind(tenant)
+                QUERY_LOG.end_request(token, f"{request.method} {route}")
+                tracing.end_trace(root, error)
+        return wrapper
+    return decorator
+
+
+# ============================================
+# GITLAB (httpx)
+# ============================================
+
+async def gitlab_call(method, path, **kwargs):
+    """Version asynchrone de app.gitlab_request (même disjoncteur GitLab)"""
+    try:
+        # Annulation (asyncio.CancelledError) ou erreur hors réseau: l'essai semi-ouvert est rendu
+        with wsgi_backend.GITLAB_BREAKER.call() as attempt:
+            try:
+                response = await gitlab.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                attempt.record(False, str(e))
+                raise wsgi_backend.GitLabUnavailable(f"GitLab injoignable: {e}")
+            failed = response.status_code >= 500
+            attempt.record(not failed, f"HTTP {response.status_code}" if failed else None)
+    except CircuitOpenError as e:
+        raise wsgi_backend.GitLabUnavailable(str(e))
+    if failed:
+        raise wsgi_backend.GitLabUnavailable(f"GitLab en erreur: HTTP {response.status_code}")
+    return response
+
+
+async def get_or_create_gitlab_group(client_id):
+    """Version asynchrone de app.get_or_create_gitlab_group"""
+    try:
+        client_info = await db.query("SELECT name FROM clients WHERE id = %s", (client_id,), fetch_one=True)
+        if not client_info:
+            print(f"❌ Client {client_id} non trouvé")
+            return None
+
+        client_name = client_info['name']
+        group_path = f"client-{client_name.lower().replace(' ', '-')}"
+
+        with tracing.span('gitlab.search_group', **{'http.method': 'GET', 'gitlab.group': group_path}) as sp:
+            response = await gitlab_call('GET', '/groups', params={'search': group_path},
+                                         timeout=httpx.Timeout(10, connect=wsgi_backend.GITLAB_CONNECT_TIMEOUT_S))
+            sp.set_attribute('http.status_code', response.status_code)
+
+        if response.status_code == 200:
+            existing_group = next((g for g in response.json() if g['path'] == group_path), None)
+            if existing_group:
+                return existing_group['id']
+
+        data = {
+            'name': f"Client {client_name}",
+            'path': group_path,
+            'description': f"Groupe pour le client {client_name}",
+            'visibility': 'private'
+        }
+        with tracing.span('gitlab.create_group', **{'http.method': 'POST', 'gitlab.group': group_path}) as sp:
+            response = await gitlab_call('POST', '/groups', json=data)
+            sp.set_attribute('http.status_code', response.status_code)
+
+        if response.status_code == 201:
+            group_data = response.json()
+            print(f"✅ Groupe GitLab créé: {group_data['full_name']}")
+            return group_data['id']
+        print(f"❌ Erreur création groupe GitLab: HTTP {response.status_code}")
+        return None
+
+    except wsgi_backend.GitLabUnavailable:
+        raise
+    except Exception as e:
+        print(f"❌ Erreur groupe GitLab: {e}")
+        return None
+
+
+async def create_gitlab_repository(project_name, description="", client_id=None):
+    """Version asynchrone de app.create_gitlab_repository"""
+    try:
+        group_id = None
+        if client_id:
+            with tracing.span('gitlab.group_lookup'):
+                group_id = await get_or_create_gitlab_group(client_id)
+
+        unique_name = f"{project_name}-{int(time.time())}"
+        data = {
+            'name': unique_name,
+            'description': description,
+            'visibility': 'private',
+            'initialize_with_readme': True
+        }
+        if group_id:
+            data['namespace_id'] = group_id
+
+        with tracing.span('gitlab.create_project', **{'http.method': 'POST', 'gitlab.project': unique_name}) as sp:
+            response = await gitlab_call('POST', '/projects', json=data)
+            sp.set_attribute('http.status_code', response.status_code)
+
+        if response.status_code == 201:
+            repo_data = response.json()
+            print(f"✅ Repository GitLab créé: {repo_data['name_with_namespace']} (nom unique: {unique_name})")
+            return wsgi_backend.gitlab_repo_summary(repo_data)
+        print(f"❌ Erreur création repo GitLab: HTTP {response.status_code}")
+        print(f"   Réponse: {response.text[:500]}")
+        return None
+
+    except wsgi_backend.GitLabUnavailable:
+        raise
+    except Exception as e:
+        print(f"❌ Erreur création repository GitLab: {e}")
+        return None
+
+
+# ============================================
+# CHARGEURS (mêmes sections que app.DASHBOARD_SECTIONS)
+# ============================================
+
+def cached_loader(resource):
+    """Version async de app.cached_loader (même cache, mêmes clés, même single-flight)"""
+    def decorator(loader):
+        @wraps(loader)
+        async def wrapper(client_id):
+            found, value, key = wsgi_backend.RESULT_CACHE.lookup(resource, client_id)
+            if found:
+                return value
+
+            async def compute():
+                if key is None:
+                    return await loader(client_id)
+                with db_router.primary_reads():
+                    result = await loader(client_id)
+                wsgi_backend.RESULT_CACHE.store(resource, key, result)
+                return result
+            return await wsgi_backend.SINGLE_FLIGHT.ado(resource, key or f"{resource}:{client_id}", compute)
+        return wrapper
+    return decorator
+
+
+@cached_loader('projects')
+async def load_projects(client_id):
+    return [wsgi_backend.serialize_project(p) for p in await db.query(wsgi_backend.PROJECTS_SQL, (client_id,))]
+
+
+@cached_loader('deployments')
+async def load_deployments(client_id):
+    return [wsgi_backend.serialize_deployment(d) for d in await db.query(wsgi_backend.DEPLOYMENTS_SQL, (client_id,))]
+
+
+@cached_loader('pipelines')
+async def load_pipelines(client_id):
+    return [wsgi_backend.serialize_pipeline(p) for p in await db.query(wsgi_backend.PIPELINES_SQL, (client_id,))]
+
+
+@cached_loader('alerts')
+async def load_alerts(client_id):
+    return [wsgi_backend.serialize_alert(a) for a in await db.query(wsgi_backend.ALERTS_SQL, (client_id,))]
+
+
+@cached_loader('stats')
+async def load_stats(client_id):
+    # Les compteurs s'exécutent en parallèle sur des connexions du pool
+    keys = list(wsgi_backend.STATS_QUERIES)
+    rows = await asyncio.gather(*(
+        db.query(wsgi_backend.STATS_QUERIES[key], (client_id,), fetch_one=True) for key in keys
+    ))
+    return wsgi_backend.build_stats(dict(zip(keys, rows)))
+
+
+DASHBOARD_SECTIONS = {
+    'stats': load_stats,
+    'projects': load_projects,
+    'deployments': load_deployments,
+    'pipelines': load_pipelines,
+    'alerts': load_alerts,
+}
+
+
+async def load_dashboard_section(name, client_id):
+    with tracing.span(f"dashboard.{name}"):
+        return await DASHBOARD_SECTIONS[name](client_id)
+
+
+# ============================================
+# ROUTES NATIVES
+# ============================================
+
+@endpoint('/api/auth/login')
+async def login(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return JSONResponse({"success": False, "error": "Email et mot de passe requis"}, 400)
+
+    try:
+        user = await db.query(wsgi_backend.LOGIN_SQL, (email,), fetch_one=True)
+        if user and user['password_hash']:
+            if await run_cpu(wsgi_backend.check_password, password, user['password_hash']):
+                return JSONResponse({"success": True, "user": wsgi_backend.serialize_user(user)})
+        return JSONResponse({"success": False, "error": "Identifiants invalides"}, 401)
+    except Exception as e:
+        print(f"Erreur login: {str(e)}")
+        return JSONResponse({"success": False, "error": "Erreur serveur"}, 500)
+
+
+@endpoint('/api/projects')
+async def get_projects(request):
+    try:
+        return JSONResponse(await load_projects(client_id_of(request)))
+    except Exception as e:
+        print(f"Erreur get_projects: {str(e)}")
+        return JSONResponse([])
+
+
+@endpoint('/api/projects')
+async def create_project(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    name = data.get('name')
+    template_type = data.get('template_type', 'web')
+    repository_url = data.get('repository_url', '')
+    client_id = client_id_of(request)
+
+    if not name:
+        return JSONResponse({"success": False, "error": "Nom du projet requis"}, 400)
+
+    try:
+        try:
+            gitlab_repo = await create_gitlab_repository(name, f"Projet {template_type} créé via MoonOps", client_id)
+        except wsgi_backend.GitLabUnavailable as e:
+            # Même chemin que app.defer_project_creation: projet PENDING, réconciliateur
+            print(f"⏳ Provisionnement GitLab différé pour '{name}': {e}")
+            description = f"Projet {template_type}"
+            if repository_url:
+                description += f" - Source Git: {repository_url}"
+            new_project = await db.query(
+                wsgi_backend.INSERT_PENDING_PROJECT_SQL,
+                wsgi_backend.pending_project_values(client_id, name, template_type, description,
+                                                    {'repository_url': repository_url}),
+                fetch_one=True
+            )
+            wsgi_backend.RESULT_CACHE.invalidate(client_id)
+            return JSONResponse(wsgi_backend.pending_project_response(name, str(new_project['id']), str(e)), 202)
+
+        if not gitlab_repo:
+            return JSONResponse({"success": False, "error": "Impossible de créer le repository GitLab"}, 500)
+
+        final_repository_url = repository_url if repository_url else gitlab_repo['http_url']
+        template = None
+        if not repository_url:
+            template = await run_cpu(wsgi_backend.apply_template, template_type, gitlab_repo['http_url'])
+        project_description = f"Projet {template_type}"
+        if repository_url:
+            project_description += f" - Source Git: {repository_url}"
+        project_description += f" - Repository GitLab: {gitlab_repo['name']}"
+
+        with tracing.span('db.insert_project'):
+            new_project = await db.query(
+                wsgi_backend.INSERT_PROJECT_SQL,
+                (client_id, name, project_description, template_type, final_repository_url),
+                fetch_one=True
+            )
+        wsgi_backend.RESULT_CACHE.invalidate(client_id)
+
+        return JSONResponse({
+            "success": True,
+            "message": f"Projet '{name}' créé avec succès dans GitLab !",
+            "project_id": str(new_project['id']) if new_project else None,
+            "gitlab_repo": {key: gitlab_repo[key] for key in ('name', 'web_url', 'ssh_url', 'http_url')},
+            "template": template
+        })
+    except Exception as e:
+        print(f"Erreur create_project: {str(e)}")
+        return JSONResponse({"success": False, "error": str(e)}, 500)
+
+
+@endpoint('/api/deployments')
+async def get_deployments(request):
+    try:
+        return JSONResponse(await load_deployments(client_id_of(request)))
+    except Exception as e:
+        print(f"Erreur get_deployments: {str(e)}")
+        return JSONResponse([])
+
+
+@endpoint('/api/pipelines')
+async def get_pipelines(request):
+    try:
+        return JSONResponse(await load_pipelines(client_id_of(request)))
+    except Exception as e:
+        print(f"Erreur get_pipelines: {str(e)}")
+        return JSONResponse([])
+
+
+@endpoint('/api/stats')
+async def get_stats(request):
+    try:
+        return JSONResponse(await load_stats(client_id_of(request)))
+    except Exception as e:
+        print(f"Erreur get_stats: {str(e)}")
+        return JSONResponse(dict.fromkeys(list(wsgi_backend.STATS_QUERIES) +
+                                          ["success_rate", "uptime", "avg_response_time"], 0))
+
+
+@endpoint('/api/metrics/<project_id>')
+async def get_project_metrics(request):
+    project_id = request.path_params['project_id']
+    try:
+        client_id = client_id_of(request)
+        try:
+            history_since = wsgi_backend.parse_metrics_hours(request.query_params.get('hours', 24))
+        except ValueError as e:
+            return JSONResponse({"success": False, "error": str(e)}, 400)
+        seconds = None
+        if 'minutes' in request.query_params:
+            try:
+                project_id = str(uuid.UUID(project_id))
+                seconds = wsgi_backend.parse_metrics_minutes(request.query_params['minutes'])
+            except ValueError as e:
+                return JSONResponse({"success": False, "error": str(e)}, 400)
+            # Fenêtre couverte par le hot tier: aucune requête SQL
+            hot = wsgi_backend.hot_metrics_window(project_id, client_id, seconds)
+            if hot is not None:
+                return JSONResponse(hot)
+        project_check = await db.query(wsgi_backend.PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
+        if not project_check:
+            return JSONResponse({}, 403)
+        if seconds is not None:
+            since = time.time() - seconds
+            metrics = await db.query(wsgi_backend.HOT_METRICS_WINDOW_SQL, (project_id, since))
+            wsgi_backend.load_hot_project(project_id, client_id, metrics, since)
+            return JSONResponse(wsgi_backend.group_metrics(metrics))
+        metrics = await db.query(wsgi_backend.METRIC_HISTORY_SQL,
+                                 (project_id, history_since, project_id, history_since))
+        # Décodage des chunks hors de la boucle d'événements
+        return JSONResponse(await run_cpu(wsgi_backend.metric_history, metrics, history_since))
+    except Exception as e:
+        print(f"Erreur get_project_metrics: {str(e)}")
+        return JSONResponse({})
+
+
+@endpoint('/api/metrics/<project_id>/latest')
+async def get_latest_metrics(request):
+    try:
+        client_id = client_id_of(request)
+        try:
+            project_id = str(uuid.UUID(request.path_params['project_id']))
+        except ValueError:
+            return JSONResponse({}, 403)
+        hot = wsgi_backend.hot_metrics_latest(project_id, client_id)
+        if hot is not None:
+            return JSONResponse(hot)
+        project_check = await db.query(wsgi_backend.PROJECT_OWNER_SQL, (project_id, client_id), fetch_one=True)
+        if not project_check:
+            return JSONResponse({}, 403)
+        since = time.time() - wsgi_backend.HOT_TIER_HORIZON_S
+        metrics = await db.query(wsgi_backend.HOT_METRICS_WINDOW_SQL, (project_id, since))
+        wsgi_backend.load_hot_project(project_id, client_id, metrics, since)
+        return JSONResponse(wsgi_backend.latest_metrics(metrics))
+    except Exception as e:
+        print(f"Erreur get_latest_metrics: {str(e)}")
+        return JSONResponse({})
+
+
+@endpoint('/api/alerts')
+async def get_alerts(request):
+    try:
+        return JSONResponse(await load_alerts(client_id_of(request)))
+    except Exception as e:
+        print(f"Erreur get_alerts: {str(e)}")
+        return JSONResponse([])
+
+
+@endpoint('/api/dashboard')
+async def get_dashboard(request):
+    sections = wsgi_backend.parse_dashboard_sections(request.query_params.get('include', ''))
+    if sections is None:
+        return JSONResponse({
+            "success": False,
+            "error": f"Sections disponibles: {', '.join(DASHBOARD_SECTIONS)}"
+        }, 400)
+
+    client_id = client_id_of(request)
+    outcomes = await asyncio.gather(
+        *(load_dashboard_section(name, client_id) for name in sections), return_exceptions=True
+    )
+    result, errors = {}, {}
+    for name, outcome in zip(sections, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Erreur dashboard ({name}): {str(outcome)}")
+            errors[name] = str(outcome)
+        else:
+            result[name] = outcome
+    if errors:
+        result['errors'] = errors
+    return JSONResponse(result)
+
+
+@endpoint('/api/health')
+async def health_check(request):
+    try:
+        await db.query("SELECT 1")
+        db_status = "connected"
+    except Exception as e:
+        print(f"Erreur health: {str(e)}")
+        db_status = "disconnected"
+    return JSONResponse({"status": "ok", "database": db_status, "version": "1.0.0", "mode": "asgi"})
+
+
+# ============================================
+# APPLICATION
+# ============================================
+
+async def startup():
+    global gitlab, cpu_pool
+    cpu_pool = concurrent.futures.ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix='moonops-cpu')
+    gitlab = httpx.AsyncClient(
+        base_url=f"{wsgi_backend.GITLAB_URL}/api/{wsgi_backend.GITLAB_API_VERSION}",
+        headers={'PRIVATE-TOKEN': wsgi_backend.GITLAB_TOKEN},
+        timeout=httpx.Timeout(30, connect=wsgi_backend.GITLAB_CONNECT_TIMEOUT_S),
+        limits=httpx.Limits(max_connections=GITLAB_MAX_CONNECTIONS),
+    )
+    await db.connect()
+    print(f"🚀 Worker ASGI prêt (pid {os.getpid()}, pool DB {DB_POOL_MIN}-{DB_POOL_MAX})")
+
+
+async def shutdown():
+    await db.close()
+    await gitlab.aclose()
+    cpu_pool.shutdown(wait=False)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+
+routes = [
+    Route('/api/auth/login', login, methods=['POST']),
+    Route('/api/projects', get_projects, methods=['GET']),
+    Route('/api/projects', create_project, methods=['POST']),
+    Route('/api/deployments', get_deployments, methods=['GET']),
+    Route('/api/pipelines', get_pipelines, methods=['GET']),
+    Route('/api/stats', get_stats, methods=['GET']),
+    Route('/api/metrics/{project_id}', get_project_metrics, methods=['GET']),
+    Route('/api/metrics/{project_id}/latest', get_latest_metrics, methods=['GET']),
+    Route('/api/alerts', get_alerts, methods=['GET']),
+    Route('/api/dashboard', get_dashboard, methods=['GET']),
+    Route('/api/health', health_check, methods=['GET']),
+    # Toutes les autres routes: application Flask dans un pool de threads
+    Mount('/', app=WSGIMiddleware(wsgi_backend.app, workers=WSGI_THREADS)),
+]
+
+application = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['*'], allow_headers=['*'],
+                           expose_headers=[db_router.LSN_HEADER])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:application', host='0.0.0.0', port=5000,
+                workers=int(os.getenv('MOONOPS_WORKERS', '4')))
@@ -0,0 +1,165 @@
+"""
+Disjoncteur (circuit breaker) pour les dépendances externes MoonOps (GitLab)
+Fermé: les appels passent et leurs résultats sont comptés sur une fenêtre
+glissante. Trop d'erreurs ou d'appels lents: ouvert, les appels échouent
+immédiatement. Après un délai: semi-ouvert, quelques appels d'essai décident
+de la refermeture.
+"""
+import collections
+import contextlib
+import math
+import os
+import threading
+import time
+
+# Configuration (variables d'environnement)
+BREAKER_WINDOW = int(os.getenv('MOONOPS_BREAKER_WINDOW', '20'))
+BREAKER_MIN_CALLS = int(os.getenv('MOONOPS_BREAKER_MIN_CALLS', '5'))
+BREAKER_FAILURE_RATIO = float(os.getenv('MOONOPS_BREAKER_FAILURE_RATIO', '0.5'))
+# Un appel plus lent que ce seuil compte comme un échec
+BREAKER_SLOW_CALL_S = float(os.getenv('MOONOPS_BREAKER_SLOW_CALL_S', '5'))
+BREAKER_OPEN_S = float(os.getenv('MOONOPS_BREAKER_OPEN_S', '30'))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv('MOONOPS_BREAKER_HALF_OPEN_CALLS', '1'))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans attendre: le disjoncteur est ouvert"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} indisponible (disjoncteur ouvert), nouvel essai dans {math.ceil(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class _Call:
+    """Appel en cours (CircuitBreaker.call): record() une fois le résultat connu"""
+
+    __slots__ = ('breaker', 'probe', 'started', 'recorded')
+
+    def __init__(self, breaker, probe):
+        self.breaker = breaker
+        self.probe = probe
+        self.started = time.perf_counter()
+        self.recorded = False
+
+    def record(self, success, error=None):
+        self.recorded = True
+        self.breaker.record(success, time.perf_counter() - self.started, error)
+
+
+class CircuitBreaker:
+    """call() autour de l'appel (lève CircuitOpenError, rend l'essai semi-ouvert d'un appel
+    interrompu sans résultat), ou before_call() / record() / release()"""
+
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_ratio=BREAKER_FAILURE_RATIO, slow_call_s=BREAKER_SLOW_CALL_S,
+                 open_s=BREAKER_OPEN_S, half_open_calls=BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_s = slow_call_s
+        self.open_s = open_s
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._outcomes = collections.deque(maxlen=window)
+        self._opened_at = None
+        self._probes = 0
+        self._half_open_epoch = 0  # Essais d'une période semi-ouverte précédente: pas rendus
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.last_error = None
+
+    def _transition(self, state):
+        if state != self.state:
+            print(f"⚡ Disjoncteur {self.name}: {self.state} → {state}")
+            self.stats[f"to_{state}"] += 1
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state == HALF_OPEN:
+            self._half_open_epoch += 1
+        if state != HALF_OPEN:
+            self._probes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def retry_after(self):
+        if self.state != OPEN:
+            return 0
+        return max(0.0, self.open_s - (time.monotonic() - self._opened_at))
+
+    def allows(self):
+        """Vrai si un appel serait tenté (sans réserver d'essai semi-ouvert)"""
+        with self._lock:
+            return self.state == CLOSED or self.retry_after() == 0
+
+    def before_call(self):
+        """Réserve l'appel; retourne l'essai semi-ouvert pris (à rendre par release), sinon None"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_after() > 0:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, self.retry_after())
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._probes += 1
+                return self._half_open_epoch
+            return None
+
+    def release(self, probe):
+        """Appel terminé sans résultat (annulation, erreur hors réseau): l'essai semi-ouvert
+        est rendu, sinon le disjoncteur refuserait tout appel jusqu'au redémarrage"""
+        if probe is None:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN and self._half_open_epoch == probe and self._probes > 0:
+                self._probes -= 1
+                self.stats['abandoned'] += 1
+
+    @contextlib.contextmanager
+    def call(self):
+        """with breaker.call() as attempt: ... attempt.record(succès, erreur)"""
+        attempt = _Call(self, self.before_call())
+        try:
+            yield attempt
+        finally:
+            if not attempt.recorded:
+                self.release(attempt.probe)
+
+    def record(self, success, duration_s, error=None):
+        """Résultat d'un appel: un appel lent compte comme un échec"""
+        failed = not success or duration_s > self.slow_call_s
+        with self._lock:
+            self.stats['failures' if failed else 'successes'] += 1
+            if failed:
+                self.last_error = error or f"appel lent ({duration_s:.1f}s)"
+            if self.state == HALF_OPEN:
+                self._transition(OPEN if failed else CLOSED)
+                return
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_ratio):
+                self._transition(OPEN)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'retry_after_s': round(self.retry_after(), 1),
+                'window_failures': sum(self._outcomes),
+                'window_calls': len(self._outcomes),
+                'last_error': self.last_error,
+                'config': {
+                    'failure_ratio': self.failure_ratio,
+                    'min_calls': self.min_calls,
+                    'slow_call_s': self.slow_call_s,
+                    'open_s': self.open_s,
+                },
+                'stats': dict(self.stats),
+            }
@@ -0,0 +1,395 @@
+"""
+Routage des requêtes PostgreSQL entre primaire et réplicas MoonOps
+Pools de connexions par nœud, choix du réplica selon son retard de
+réplication et read-your-writes: jeton LSN renvoyé au client après une
+écriture (valable sur tous les workers), fenêtre par session dans le processus
+pour les clients qui ne le renvoient pas
+"""
+import contextlib
+import contextvars
+import os
+import random
+import threading
+import time
+
+from psycopg2.extensions import STATUS_READY
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+# Configuration (variables d'environnement)
+# Réplicas: "host:port,host:port" (mêmes base, utilisateur et mot de passe que le primaire)
+REPLICAS = os.getenv('MOONOPS_DB_REPLICAS', '')
+# Pools psycopg2 (db_router) et asyncpg (asgi.py): mêmes bornes par worker et par nœud
+POOL_MIN = int(os.getenv('MOONOPS_DB_POOL_MIN', '2'))
+POOL_MAX = int(os.getenv('MOONOPS_DB_POOL_MAX', '20'))
+# Attente d'une connexion libre quand le pool est plein (PoolError au-delà)
+POOL_TIMEOUT_S = float(os.getenv('MOONOPS_DB_POOL_TIMEOUT_S', '10'))
+# Réplica écarté au-delà de ce retard (octets de WAL non rejoués)
+REPLICA_MAX_LAG_BYTES = int(os.getenv('MOONOPS_REPLICA_MAX_LAG_BYTES', str(16 * 1024 * 1024)))
+REPLICA_LAG_CHECK_S = float(os.getenv('MOONOPS_REPLICA_LAG_CHECK_S', '1'))
+# Lectures envoyées au primaire pendant cette durée après une écriture de la session (même processus)
+READ_YOUR_WRITES_S = float(os.getenv('MOONOPS_READ_YOUR_WRITES_S', '5'))
+SESSION_TABLE_SIZE = 100000
+# Jeton read-your-writes: "shard:LSN,..." (position WAL du primaire après les écritures de la requête)
+LSN_HEADER = 'X-MoonOps-LSN'
+LSN_COOKIE = 'moonops_lsn'
+LSN_COOKIE_MAX_AGE_S = 300
+
+_session = contextvars.ContextVar('moonops_db_session', default=None)
+_primary_reads = contextvars.ContextVar('moonops_db_primary_reads', default=False)
+
+
+class _Session:
+    """Session de routage d'une requête HTTP"""
+
+    __slots__ = ('key', 'read_after', 'written')
+
+    def __init__(self, key, read_after):
+        self.key = key
+        self.read_after = read_after  # shard -> LSN que le réplica doit avoir rejoué
+        self.written = set()  # Shards écrits par la requête
+
+
+def begin_session(key, lsn_token=None):
+    """Associe les requêtes SQL suivantes (contexte courant) à une session;
+    lsn_token: jeton renvoyé par le client après une écriture (en-tête ou cookie)"""
+    return _session.set(_Session(key, parse_lsn_token(lsn_token)))
+
+
+def end_session(token):
+    try:
+        _session.reset(token)
+    except ValueError:
+        # Contexte différent (fin de requête dans un autre contexte): on ignore
+        pass
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Lectures du contexte courant envoyées au primaire (résultats mis en cache
+    après une invalidation: un réplica en retard y remettrait l'état d'avant l'écriture)"""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def parse_lsn(lsn):
+    """LSN PostgreSQL 'X/Y' -> entier (position dans le WAL)"""
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def format_lsn(position):
+    return f"{position >> 32:X}/{position & 0xFFFFFFFF:X}"
+
+
+def parse_lsn_token(token):
+    """'shard:X/Y,...' -> {shard: LSN}; un jeton invalide est ignoré (lectures sans contrainte)"""
+    positions = {}
+    for part in (token or '').split(',')[:16]:
+        shard, _, lsn = part.strip().rpartition(':')
+        try:
+            positions[shard] = parse_lsn(lsn)
+        except ValueError:
+            continue
+    return positions
+
+
+def written_shards():
+    """Shards écrits par la requête courante (jeton à renvoyer au client)"""
+    session = _session.get()
+    return set(session.written) if session is not None else set()
+
+
+def lsn_token(positions):
+    """Jeton à renvoyer: LSN lus après les écritures, fusionnés avec ceux reçus de la requête"""
+    session = _session.get()
+    merged = dict(session.read_after) if session is not None else {}
+    for shard, position in positions.items():
+        merged[shard] = max(merged.get(shard, 0), position)
+    return ','.join(f"{shard}:{format_lsn(position)}" for shard, position in sorted(merged.items()))
+
+
+class BlockingPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool dont getconn() attend une connexion rendue (au plus timeout
+    secondes) au lieu de lever PoolError dès que maxconn connexions sont empruntées"""
+
+    def __init__(self, minconn, maxconn, timeout, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._waiting = 0
+        self.stats = {'waits': 0, 'timeouts': 0}
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(blocking=False):
+            self.stats['waits'] += 1
+            self._waiting += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.timeout)
+            finally:
+                self._waiting -= 1
+            if not acquired:
+                self.stats['timeouts'] += 1
+                raise PoolError(f"pool saturé: {self.maxconn} connexions empruntées depuis {self.timeout:g}s")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+    def snapshot(self):
+        return {'in_use': len(self._used), 'idle': len(self._pool), 'waiting': self._waiting, **self.stats}
+
+
+class Node:
+    """Un serveur PostgreSQL et son pool de connexions"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.pool = None
+        self.healthy = True
+        self.lag_bytes = 0
+        self.lag_seconds = 0.0
+        self.replay_lsn = 0  # Position WAL rejouée au dernier contrôle (réplicas)
+        self.checked_at = None
+        self.error = None
+        self._pool_lock = threading.Lock()
+
+    def get_pool(self):
+        if self.pool is None:
+            with self._pool_lock:
+                if self.pool is None:
+                    self.pool = BlockingPool(POOL_MIN, POOL_MAX, POOL_TIMEOUT_S,
+                                             cursor_factory=RealDictCursor, **self.config)
+        return self.pool
+
+    def snapshot(self):
+        return {
+            'name': self.name,
+            'host': f"{self.config['host']}:{self.config['port']}",
+            'healthy': self.healthy,
+            'lag_bytes': self.lag_bytes,
+            'lag_seconds': round(self.lag_seconds, 3),
+            'replay_lsn': format_lsn(self.replay_lsn) if self.replay_lsn else None,
+            'checked_at': self.checked_at,
+            'error': self.error,
+            'pool': self.pool.snapshot() if self.pool is not None else None,
+        }
+
+
+class DatabaseRouter:
+    """Lectures vers le réplica le moins en retard, écritures vers le primaire"""
+
+    def __init__(self, primary_config, replica_addresses=(), name='main'):
+        self.name = name
+        self.primary = Node('primary', primary_config)
+        self.replicas = []
+        for i, address in enumerate(replica_addresses):
+            host, _, port = address.strip().rpartition(':')
+            config = dict(primary_config, host=host or address.strip(), port=int(port) if host else 5432)
+            self.replicas.append(Node(f"replica-{i + 1}", config))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.stats = {'primary_reads': 0, 'replica_reads': 0, 'writes': 0, 'pinned_reads': 0, 'cache_fill_reads': 0,
+                      'lsn_reads': 0}
+        self._monitor = None
+
+    @classmethod
+    def from_env(cls, primary_config):
+        return cls(primary_config, [r for r in REPLICAS.split(',') if r.strip()])
+
+    # --- Sessions (read-your-writes) ---
+
+    def note_write(self):
+        """Les lectures de la session iront au primaire pendant READ_YOUR_WRITES_S (ce processus),
+        et le client recevra un jeton LSN pour ce shard (tous les workers)"""
+        self.stats['writes'] += 1
+        session = _session.get()
+        if session is None or not self.replicas:
+            return
+        session.written.add(self.name)
+        key = session.key
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sessions) >= SESSION_TABLE_SIZE:
+                self._sessions = {k: t for k, t in self._sessions.items() if t > now}
+            self._sessions[key] = now + READ_YOUR_WRITES_S
+
+    def _pinned_to_primary(self):
+        session = _session.get()
+        if session is None:
+            return False
+        until = self._sessions.get(session.key)
+        return until is not None and until > time.monotonic()
+
+    def _required_lsn(self):
+        session = _session.get()
+        return session.read_after.get(self.name, 0) if session is not None else 0
+
+    def current_lsn(self):
+        """Position WAL du primaire (après les écritures validées de la requête)"""
+        with self.primary_cursor() as cur:
+            cur.execute("SELECT pg_current_wal_lsn()::text AS lsn")
+            return parse_lsn(cur.fetchone()['lsn'])
+
+    # --- Choix du nœud ---
+
+    def read_node(self):
+        """Réplica sain le moins en retard (primaire si aucun, session épinglée ou remplissage du cache)"""
+        if not self.replicas:
+            return self.primary
+        if _primary_reads.get():
+            self.stats['cache_fill_reads'] += 1
+            return self.primary
+        if self._pinned_to_primary():
+            self.stats['pinned_reads'] += 1
+            return self.primary
+        candidates = [n for n in self.replicas if n.healthy and n.lag_bytes <= REPLICA_MAX_LAG_BYTES]
+        required = self._required_lsn()
+        if required:
+            # Jeton du client: seuls les réplicas ayant rejoué ses écritures
+            candidates = [n for n in candidates if n.replay_lsn >= required]
+            if not candidates:
+                self.stats['lsn_reads'] += 1
+                return self.primary
+        if not candidates:
+            self.stats['primary_reads'] += 1
+            return self.primary
+        best = min(n.lag_bytes for n in candidates)
+        # Réplicas à égalité (à une page de WAL près): répartition aléatoire
+        node = random.choice([n for n in candidates if n.lag_bytes - best <= 8192])
+        self.stats['replica_reads'] += 1
+        return node
+
+    @contextlib.contextmanager
+    def connection(self, readonly=False):
+        """Connexion empruntée au pool du nœud choisi, rendue à la sortie"""
+        node = self.read_node() if readonly else self.primary
+        if not readonly:
+            self.note_write()
+        try:
+            pool = node.get_pool()
+            conn = pool.getconn()
+        except PoolError as e:
+            if node is self.primary:
+                raise
+            # Réplica saturé mais joignable: il reste sain, cette lecture passe au primaire
+            print(f"⚠️ Pool du réplica {node.name} saturé, lecture sur le primaire: {e}")
+            node = self.primary
+            pool = node.get_pool()
+            conn = pool.getconn()
+        except Exception as e:
+            if node is self.primary:
+                raise
+            # Réplica injoignable: écarté jusqu'au prochain contrôle, lecture sur le primaire
+            print(f"⚠️ Réplica {node.name} injoignable, lecture sur le primaire: {e}")
+            node.healthy = False
+            node.error = str(e)
+            node = self.primary
+            pool = node.get_pool()
+            conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = conn.closed != 0
+            if node is not self.primary and broken:
+                node.healthy = False
+            raise
+        finally:
+            if not conn.closed and conn.status != STATUS_READY:
+                conn.rollback()
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+    # --- Surveillance du retard ---
+
+    def check_lag(self):
+        """Retard de chaque réplica: WAL du primaire - WAL rejoué par le réplica"""
+        try:
+            with self.primary_cursor() as cur:
+                cur.execute("SELECT pg_current_wal_lsn()::text AS lsn")
+                primary_lsn = parse_lsn(cur.fetchone()['lsn'])
+        except Exception as e:
+            print(f"⚠️ Primaire injoignable pour le suivi des réplicas: {e}")
+            return
+        for node in self.replicas:
+            try:
+                with self.node_cursor(node) as cur:
+                    cur.execute("""
+                        SELECT pg_is_in_recovery() AS in_recovery,
+                               pg_last_wal_replay_lsn()::text AS lsn,
+                               COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) AS lag_seconds
+                    """)
+                    row = cur.fetchone()
+                if not row['in_recovery'] or not row['lsn']:
+                    raise RuntimeError("le serveur n'est pas un réplica en streaming")
+                node.replay_lsn = parse_lsn(row['lsn'])
+                node.lag_bytes = max(0, primary_lsn - node.replay_lsn)
+                node.lag_seconds = float(row['lag_seconds'])
+                node.healthy = True
+                node.error = None
+            except PoolError as e:
+                # Pool saturé par les lectures: le réplica répond, son état est gardé
+                print(f"⚠️ Retard du réplica {node.name} non mesuré: {e}")
+                continue
+            except Exception as e:
+                if node.healthy:
+                    print(f"⚠️ Réplica {node.name} écarté: {e}")
+                node.healthy = False
+                node.error = str(e)
+            node.checked_at = time.time()
+
+    @contextlib.contextmanager
+    def node_cursor(self, node):
+        pool = node.get_pool()
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                yield cur
+        finally:
+            if not conn.closed:
+                conn.autocommit = False
+            pool.putconn(conn, close=bool(conn.closed))
+
+    def primary_cursor(self):
+        return self.node_cursor(self.primary)
+
+    def start_monitor(self):
+        """Thread de suivi du retard (inutile sans réplica)"""
+        if not self.replicas or self._monitor is not None:
+            return
+        self.check_lag()
+
+        def _loop():
+            while True:
+                time.sleep(REPLICA_LAG_CHECK_S)
+                self.check_lag()
+
+        self._monitor = threading.Thread(target=_loop, name='moonops-replica-lag', daemon=True)
+        self._monitor.start()
+        print(f"🔁 [{self.name}] Lectures réparties sur {len(self.replicas)} réplica(s), "
+              f"read-your-writes {READ_YOUR_WRITES_S:g}s")
+
+    def snapshot(self):
+        return {
+            'shard': self.name,
+            'config': {
+                'replica_max_lag_bytes': REPLICA_MAX_LAG_BYTES,
+                'read_your_writes_s': READ_YOUR_WRITES_S,
+                'pool_max': POOL_MAX,
+                'pool_timeout_s': POOL_TIMEOUT_S,
+            },
+            'stats': dict(self.stats),
+            'nodes': [self.primary.snapshot()] + [n.snapshot() for n in self.replicas],
+        }
@@ -0,0 +1,210 @@
+"""
+Cache local de miroirs Git pour l'import de dépôts existants MoonOps
+Un dépôt bare (git clone --mirror) par URL source, rafraîchi par fetch
+incrémental; le push vers le nouveau repository GitLab part du miroir.
+Importer la même source pour plusieurs tenants ou projets ne coûte qu'un clone.
+"""
+import collections
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+import tracing
+
+# Configuration (variables d'environnement)
+MIRRORS_DIR = os.getenv('MOONOPS_GIT_MIRRORS_DIR', '/tmp/moonops_mirrors')
+# Pas de fetch si le miroir a été rafraîchi il y a moins de N secondes
+MIRROR_REFRESH_S = float(os.getenv('MOONOPS_GIT_MIRROR_REFRESH_S', '60'))
+# Clone partiel des grands historiques (ex: "blob:none"; blobs récupérés à la demande)
+MIRROR_FILTER = os.getenv('MOONOPS_GIT_MIRROR_FILTER', '')
+CLONE_TIMEOUT_S = int(os.getenv('MOONOPS_GIT_CLONE_TIMEOUT_S', '600'))
+# file:// désactivé par défaut (lecture du disque du serveur); activé pour les tests locaux
+ALLOW_FILE_URLS = os.getenv('MOONOPS_GIT_ALLOW_FILE_URLS', '').lower() in ('1', 'true', 'yes')
+
+ALLOWED_SCHEMES = ('https://', 'http://', 'ssh://', 'git://')
+IMPORT_MODES = ('full', 'snapshot')
+FETCHED_STAMP = 'moonops-fetched'
+
+
+class GitMirrorError(Exception):
+    """URL refusée ou commande git en échec"""
+
+
+def validate_url(url):
+    url = (url or '').strip()
+    schemes = ALLOWED_SCHEMES + (('file://',) if ALLOW_FILE_URLS else ())
+    if not url.startswith(schemes):
+        raise GitMirrorError(f"URL Git non supportée (schémas acceptés: {', '.join(schemes)})")
+    return url
+
+
+def _git_env():
+    env = dict(os.environ)
+    # Jamais de demande d'identifiants interactive; transports limités (pas de ext::)
+    env['GIT_TERMINAL_PROMPT'] = '0'
+    env['GIT_ALLOW_PROTOCOL'] = 'https:http:ssh:git' + (':file' if ALLOW_FILE_URLS else '')
+    return env
+
+
+def run_git(args, cwd=None, timeout=CLONE_TIMEOUT_S):
+    """git dans un span (les URLs avec token ne sont pas tracées); lève GitMirrorError"""
+    with tracing.span(f"git {args[0]}", **{'git.command': args[0]}) as sp:
+        try:
+            result = subprocess.run(['git'] + list(args), cwd=cwd, capture_output=True, text=True,
+                                    timeout=timeout, env=_git_env())
+        except subprocess.TimeoutExpired:
+            raise GitMirrorError(f"git {args[0]}: délai de {timeout}s dépassé")
+        sp.set_attribute('git.returncode', result.returncode)
+    if result.returncode != 0:
+        raise GitMirrorError(f"git {args[0]}: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+class GitMirrorCache:
+    """Miroirs bare sous MIRRORS_DIR/<hash>/<hash>.git, verrouillés par URL (threads et processus)"""
+
+    def __init__(self, root=MIRRORS_DIR, refresh_s=MIRROR_REFRESH_S, filter_spec=MIRROR_FILTER):
+        self.root = root
+        self.refresh_s = refresh_s
+        self.filter_spec = filter_spec
+        self._locks = collections.defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self.stats = collections.Counter()
+
+    def mirror_path(self, url, shallow=False):
+        key = hashlib.sha256(f"{url}#{'shallow' if shallow else 'full'}".encode()).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}.git")
+
+    @contextlib.contextmanager
+    def _locked(self, path):
+        """Verrou exclusif du miroir: threads du processus puis autres workers (flock)"""
+        with self._locks_guard:
+            lock = self._locks[path]
+        with lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _fresh(self, path):
+        stamp = os.path.join(path, FETCHED_STAMP)
+        return os.path.exists(stamp) and time.time() - os.path.getmtime(stamp) < self.refresh_s
+
+    def _mark_fetched(self, path):
+        with open(os.path.join(path, FETCHED_STAMP), 'w') as f:
+            f.write(str(time.time()))
+
+    @contextlib.contextmanager
+    def checkout(self, url, shallow=False, force_refresh=False):
+        """
+        Miroir à jour, verrou conservé pendant le bloc (écritures dans le miroir).
+        force_refresh: fetch même si le miroir est récent (ex: avant un push non forcé).
+        """
+        url = validate_url(url)
+        path = self.mirror_path(url, shallow)
+        with self._locked(path):
+            if os.path.isdir(path):
+                if self._fresh(path) and not force_refresh:
+                    self.stats['hits'] += 1
+                else:
+                    fetch = ['fetch', '--prune', '--quiet', 'origin']
+                    if shallow:
+                        fetch[1:1] = ['--depth', '1']
+                    with tracing.span('git_mirror.fetch'):
+                        run_git(fetch, cwd=path)
+                    self._mark_fetched(path)
+                    self.stats['fetches'] += 1
+            else:
+                # Clone dans un dossier temporaire puis renommage: pas de miroir à moitié cloné
+                tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+                clone = ['clone', '--mirror', '--quiet']
+                if shallow:
+                    clone += ['--depth', '1']
+                elif self.filter_spec:
+                    clone += [f'--filter={self.filter_spec}']
+                try:
+                    with tracing.span('git_mirror.clone'):
+                        run_git(clone + ['--', url, tmp_path], timeout=CLONE_TIMEOUT_S)
+                    os.rename(tmp_path, path)
+                finally:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                self._mark_fetched(path)
+                self.stats['clones'] += 1
+            # Dernière utilisation, pour l'éviction LRU (storage.py)
+            os.utime(path)
+            yield path
+
+    def ensure(self, url, shallow=False):
+        """Chemin du miroir à jour: clone au premier import, fetch incrémental ensuite"""
+        with self.checkout(url, shallow) as path:
+            return path
+
+    def push(self, url, push_url, mode='full'):
+        """
+        Pousse la source vers push_url depuis le miroir.
+        full: branches et tags avec tout l'historique.
+        snapshot: un seul commit (arbre de la branche par défaut), pour les très gros historiques.
+        """
+        if mode not in IMPORT_MODES:
+            raise GitMirrorError(f"Mode d'import inconnu: {mode}")
+        # Verrou gardé jusqu'à la fin du push: ni fetch --prune ni éviction pendant l'envoi
+        with self.checkout(url, shallow=(mode == 'snapshot')) as path:
+            if mode == 'full':
+                # Forcé: le repository GitLab vient d'être créé avec un README initial
+                refspecs = ['+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*']
+            else:
+                tree = run_git(['rev-parse', 'HEAD^{tree}'], cwd=path).strip()
+                source = run_git(['rev-parse', 'HEAD'], cwd=path).strip()
+                commit = run_git(['-c', 'user.name=MoonOps', '-c', 'user.email=moonops@techconsulting.fr',
+                                  'commit-tree', tree, '-m', f"Import de {url} ({source[:12]})"], cwd=path).strip()
+                refspecs = [f'+{commit}:refs/heads/main']
+            with tracing.span('git_mirror.push', **{'git.import_mode': mode}):
+                run_git(['push', '--quiet', push_url] + refspecs, cwd=path)
+        self.stats[f"pushes_{mode}"] += 1
+        return path
+
+    def evict(self, path):
+        """Supprime un miroir; False s'il est verrouillé (clone, fetch ou push en cours)"""
+        with self._locks_guard:
+            lock = self._locks[path]
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            with open(f"{path}.lock", 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock.release()
+        self.stats['evictions'] += 1
+        return True
+
+    def snapshot(self):
+        mirrors = 0
+        size_bytes = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            mirrors += sum(1 for d in dirnames if d.endswith('.git'))
+            size_bytes += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames
+                              if os.path.isfile(os.path.join(dirpath, f)))
+        return {
+            'root': self.root,
+            'mirrors': mirrors,
+            'size_mb': round(size_bytes / 1024 / 1024, 1),
+            'refresh_s': self.refresh_s,
+            'filter': self.filter_spec or None,
+            'stats': dict(self.stats),
+        }
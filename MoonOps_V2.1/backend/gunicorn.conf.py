@@ -0,0 +1,21 @@
+"""
+Configuration gunicorn du mode ASGI (production)
+
+    gunicorn -c gunicorn.conf.py asgi:application
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('MOONOPS_BIND', '0.0.0.0:5000')
+# Un pool asyncpg et un pool psycopg2 (MOONOPS_DB_POOL_MAX connexions chacun)
+# par worker et par nœud: dimensionner workers * 2 * MOONOPS_DB_POOL_MAX sous
+# max_connections de PostgreSQL
+workers = int(os.getenv('MOONOPS_WORKERS', str(min(multiprocessing.cpu_count(), 8))))
+worker_class = 'uvicorn.workers.UvicornWorker'
+# Connexions longues du polling frontend (keep-alive)
+keepalive = 75
+timeout = 120
+graceful_timeout = 30
+# Recycle les workers pour borner une éventuelle fuite mémoire
+max_requests = int(os.getenv('MOONOPS_MAX_REQUESTS', '100000'))
+max_requests_jitter = max_requests // 10
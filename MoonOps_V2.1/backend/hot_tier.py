@@ -0,0 +1,259 @@
+"""
+Hot tier des métriques MoonOps: derniers points de chaque série en mémoire
+Une série (projet, métrique) est un tampon circulaire de taille fixe dans deux
+array('d') (horodatages epoch et valeurs, 16 octets par point), rempli à
+l'ingestion, par le suivi de la table metrics (points ingérés par les autres
+workers) et préchauffé depuis la base au démarrage. Les lectures « dernière
+valeur » et « N dernières minutes » sont servies sans accès base quand la
+fenêtre est couverte; la mémoire est bornée par le nombre de points par série
+et l'éviction LRU des séries inactives.
+Couverture d'un projet: tous les points d'horodatage >= max(since, dropped)
+sont en mémoire (since: début du préchargement ou de la création, dropped:
+point le plus récent sorti d'un tampon plein ou d'une série évincée).
+"""
+import bisect
+import collections
+import os
+import threading
+import time
+from array import array
+
+# Configuration (variables d'environnement)
+HOT_TIER_POINTS = int(os.getenv('MOONOPS_HOT_TIER_POINTS', '720'))  # Points par série
+HOT_TIER_MAX_SERIES = int(os.getenv('MOONOPS_HOT_TIER_MAX_SERIES', '10000'))
+HOT_TIER_HORIZON_S = int(os.getenv('MOONOPS_HOT_TIER_HORIZON_S', '3600'))  # Préchauffage et « dernière valeur »
+
+POINT_BYTES = 16
+
+
+class _Series:
+    """Tampon d'une série: points [start:] de ts/values, triés par horodatage.
+    Les points sortis restent devant start jusqu'au compactage (tous les cap/4 points)."""
+
+    __slots__ = ('ts', 'values', 'start')
+
+    def __init__(self):
+        self.ts = array('d')
+        self.values = array('d')
+        self.start = 0
+
+    def __len__(self):
+        return len(self.ts) - self.start
+
+    def add(self, ts, value, cap):
+        """Ajoute un point; retourne (ajouté, horodatage du point sorti ou None)"""
+        times = self.ts
+        if len(times) == self.start or ts > times[-1]:
+            times.append(ts)
+            self.values.append(value)
+        else:
+            # Hors ordre ou déjà vu (relecture du suivi): insertion triée, doublons ignorés
+            i = bisect.bisect_right(times, ts, self.start)
+            j = i
+            while j > self.start and times[j - 1] == ts:
+                if self.values[j - 1] == value:
+                    return False, None
+                j -= 1
+            if i == self.start and len(self) >= cap:
+                return False, ts  # Plus ancien que tout le tampon plein
+            times.insert(i, ts)
+            self.values.insert(i, value)
+        if len(self) <= cap:
+            return True, None
+        dropped = times[self.start]
+        self.start += 1
+        if self.start >= max(cap // 4, 1):
+            del times[:self.start]
+            del self.values[:self.start]
+            self.start = 0
+        return True, dropped
+
+    def last(self):
+        return self.ts[-1], self.values[-1]
+
+    def since(self, cutoff):
+        i = bisect.bisect_left(self.ts, cutoff, self.start)
+        return self.ts[i:].tolist(), self.values[i:].tolist()
+
+
+class _Project:
+    __slots__ = ('client_id', 'since', 'dropped', 'evicted', 'series')
+
+    def __init__(self, client_id, since):
+        self.client_id = client_id
+        self.since = since
+        self.dropped = float('-inf')  # Point sorti le plus récent (tampon plein ou série évincée)
+        self.evicted = float('-inf')  # Dernier point d'une série évincée
+        self.series = {}
+
+
+class HotTier:
+    """add() à l'ingestion, load() au préchauffage; latest() / window() -> None si non couvert"""
+
+    def __init__(self, max_points=HOT_TIER_POINTS, max_series=HOT_TIER_MAX_SERIES):
+        self.max_points = max_points
+        self.max_series = max_series
+        self._projects = {}
+        # (project_id, metric_name) -> _Series, du moins au plus récemment utilisé
+        self._lru = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+
+    def _project(self, project_id, client_id, since):
+        project = self._projects.get(project_id)
+        if project is None:
+            project = self._projects[project_id] = _Project(client_id, since)
+        return project
+
+    def _add(self, project, project_id, metric_name, ts, value):
+        # Précision de la base (microseconde): un point relu par le suivi est reconnu comme doublon
+        ts = round(ts, 6)
+        key = (project_id, metric_name)
+        series = project.series.get(metric_name)
+        if series is None:
+            series = project.series[metric_name] = self._lru[key] = _Series()
+        else:
+            self._lru.move_to_end(key)
+        added, dropped = series.add(ts, value, self.max_points)
+        if dropped is not None:
+            project.dropped = max(project.dropped, dropped)
+            self.stats['dropped'] += 1
+        return added
+
+    def _evict(self):
+        while len(self._lru) > self.max_series:
+            (project_id, metric_name), series = self._lru.popitem(last=False)
+            project = self._projects[project_id]
+            del project.series[metric_name]
+            if len(series):
+                last_ts = series.last()[0]
+                project.dropped = max(project.dropped, last_ts)
+                project.evicted = max(project.evicted, last_ts)
+            if not project.series:
+                del self._projects[project_id]
+            self.stats['evicted'] += 1
+
+    def add(self, client_id, samples, now=None):
+        """samples: (project_id, metric_name, ts, value) d'un tenant; retourne le nombre de points ajoutés"""
+        now = time.time() if now is None else now
+        added = 0
+        with self._lock:
+            for project_id, metric_name, ts, value in samples:
+                project = self._project(project_id, client_id, now)
+                added += self._add(project, project_id, metric_name, ts, value)
+            self._evict()
+            self.stats['points'] += added
+            self.stats['duplicates'] += len(samples) - added
+        return added
+
+    def load(self, project_id, client_id, series, since, dropped=None):
+        """Préchauffage d'un projet: series {metric_name: [(ts, value), ...]}, complète depuis since
+        sauf les points d'horodatage <= dropped (séries tronquées à max_points par la lecture)"""
+        with self._lock:
+            if dropped is not None and project_id in self._projects:
+                self._projects[project_id].dropped = max(self._projects[project_id].dropped, dropped)
+            if not any(series.values()):
+                # Aucun point: rien à garder en mémoire, la couverture d'un projet suivi s'étend
+                if project_id in self._projects:
+                    self._projects[project_id].since = min(self._projects[project_id].since, since)
+                return
+            project = self._project(project_id, client_id, since)
+            if dropped is not None:
+                project.dropped = max(project.dropped, dropped)
+            for metric_name, points in series.items():
+                for ts, value in points:
+                    self._add(project, project_id, metric_name, ts, value)
+            project.since = min(project.since, since)
+            self._evict()
+            self.stats['loads'] += 1
+
+    def owner(self, project_id):
+        project = self._projects.get(project_id)
+        return project.client_id if project else None
+
+    def drop_project(self, project_id):
+        with self._lock:
+            project = self._projects.pop(project_id, None)
+            for metric_name in (project.series if project else ()):
+                del self._lru[(project_id, metric_name)]
+
+    def _touch(self, project_id, project):
+        for metric_name in project.series:
+            self._lru.move_to_end((project_id, metric_name))
+
+    def latest(self, project_id, max_age_s=HOT_TIER_HORIZON_S, now=None):
+        """{metric_name: (ts, value)} des séries ayant un point depuis max_age_s, None si non couvert"""
+        now = time.time() if now is None else now
+        cutoff = now - max_age_s
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is None or max(project.since, project.evicted) > cutoff:
+                self.stats['misses'] += 1
+                return None
+            self._touch(project_id, project)
+            self.stats['hits'] += 1
+            result = {}
+            for metric_name, series in project.series.items():
+                ts, value = series.last()
+                if ts >= cutoff:
+                    result[metric_name] = (ts, value)
+            return result
+
+    def window(self, project_id, seconds, now=None):
+        """{metric_name: ([ts], [values])} des seconds dernières secondes, None si non couvert"""
+        now = time.time() if now is None else now
+        cutoff = now - seconds
+        with self._lock:
+            project = self._projects.get(project_id)
+            if project is None or project.since > cutoff or project.dropped >= cutoff:
+                self.stats['misses'] += 1
+                return None
+            self._touch(project_id, project)
+            self.stats['hits'] += 1
+            result = {}
+            for metric_name, series in project.series.items():
+                ts, values = series.since(cutoff)
+                if ts:
+                    result[metric_name] = (ts, values)
+            return result
+
+    def snapshot(self):
+        with self._lock:
+            points = sum(len(series) for series in self._lru.values())
+            allocated = sum(len(series.ts) for series in self._lru.values())
+            return {
+                'projects': len(self._projects),
+                'series': len(self._lru),
+                'max_series': self.max_series,
+                'max_points': self.max_points,
+                'points': points,
+                'bytes': allocated * POINT_BYTES,
+                'stats': dict(self.stats),
+            }
+
+
+class MetricsCursor:
+    """Suivi de la table metrics d'un shard: relecture des id > watermark - rewind à chaque
+    passage (lignes validées en retard), chaque id n'étant transmis qu'une fois"""
+
+    __slots__ = ('watermark', 'rewind', 'applied')
+
+    def __init__(self, watermark, rewind):
+        self.watermark = watermark
+        self.rewind = rewind
+        self.applied = set()  # Id déjà transmis au-dessus de since()
+
+    def since(self):
+        return max(0, self.watermark - self.rewind)
+
+    def fresh(self, rows):
+        """Lignes (id croissants) pas encore transmises; avance le watermark"""
+        applied = self.applied
+        rows = [row for row in rows if row['id'] not in applied]
+        for row in rows:
+            applied.add(row['id'])
+            self.watermark = max(self.watermark, row['id'])
+        since = self.since()
+        if any(row_id <= since for row_id in applied):
+            self.applied = {row_id for row_id in applied if row_id > since}
+        return rows
@@ -0,0 +1,181 @@
+"""
+Analyse vectorisée des métriques MoonOps (vue d'ensemble du monitoring)
+Les résumés (percentiles, moyenne, extrêmes, tendance) sont calculés par
+PostgreSQL avec des agrégats; seuls les derniers points de chaque série sont
+chargés, en un lot, dans une matrice NumPy (une ligne par série, alignée à
+droite) pour les scores d'anomalie glissants: z-score sur une fenêtre de
+points (sommes cumulées) ou EWMA, calculés pour toutes les séries à la fois.
+"""
+import itertools
+import os
+
+import numpy as np
+
+# Configuration (variables d'environnement)
+ANALYTICS_MAX_HOURS = int(os.getenv('MOONOPS_ANALYTICS_MAX_HOURS', '168'))
+# Derniers points par série chargés pour les scores d'anomalie
+ANALYTICS_TAIL_POINTS = int(os.getenv('MOONOPS_ANALYTICS_TAIL_POINTS', '720'))
+ANOMALY_THRESHOLD = float(os.getenv('MOONOPS_ANOMALY_THRESHOLD', '3'))
+
+METHODS = ('zscore', 'ewma')
+# Points précédents nécessaires avant de noter un point
+MIN_POINTS = 5
+
+
+def parse_params(args):
+    """Paramètres de la requête (dict de chaînes) normalisés; ValueError si invalides"""
+    try:
+        params = {
+            'hours': int(args.get('hours', 24)),
+            'method': args.get('method', 'zscore'),
+            'window': int(args.get('window', 60)),
+            'alpha': float(args.get('alpha', 0.1)),
+            'threshold': float(args.get('threshold', ANOMALY_THRESHOLD)),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("hours, window, alpha et threshold doivent être numériques")
+    params['projects'] = sorted({p.strip() for p in args.get('projects', '').split(',') if p.strip()})
+    params['metrics'] = sorted({m.strip() for m in args.get('metrics', '').split(',') if m.strip()})
+    if not 1 <= params['hours'] <= ANALYTICS_MAX_HOURS:
+        raise ValueError(f"hours doit être entre 1 et {ANALYTICS_MAX_HOURS}")
+    if params['method'] not in METHODS:
+        raise ValueError(f"method invalide (valeurs: {', '.join(METHODS)})")
+    if params['window'] < MIN_POINTS or not 0 < params['alpha'] < 1 or params['threshold'] <= 0:
+        raise ValueError(f"window doit être >= {MIN_POINTS}, alpha entre 0 et 1, threshold > 0")
+    return params
+
+
+def to_matrix(series):
+    """Séries de longueurs variables -> matrice (séries x points) alignée à droite, NaN à gauche"""
+    lengths = np.fromiter(map(len, series), dtype=np.int64, count=len(series))
+    width = int(lengths.max()) if len(series) else 0
+    matrix = np.full((len(series), width), np.nan)
+    if not lengths.sum():
+        return matrix
+    flat = np.fromiter(itertools.chain.from_iterable(series), dtype=np.float64, count=int(lengths.sum()))
+    rows = np.repeat(np.arange(len(series)), lengths)
+    # Position dans la série + décalage d'alignement à droite
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cols = np.arange(flat.size) - starts + np.repeat(width - lengths, lengths)
+    matrix[rows, cols] = flat
+    return matrix
+
+
+def rolling_zscore(matrix, window, min_points=MIN_POINTS):
+    """Écart de chaque point à la moyenne des `window` points précédents, en écarts-types"""
+    mask = ~np.isnan(matrix)
+    # Séries centrées: évite la perte de précision de somme(x²) - n·moyenne² sur de grandes valeurs
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(np.where(mask.any(axis=1, keepdims=True), matrix, 0.0), axis=1, keepdims=True)
+    values = np.where(mask, matrix - center, 0.0)
+    pad = np.zeros((matrix.shape[0], 1))
+    sums = np.concatenate([pad, np.cumsum(values, axis=1)], axis=1)
+    squares = np.concatenate([pad, np.cumsum(values * values, axis=1)], axis=1)
+    counts = np.concatenate([pad, np.cumsum(mask, axis=1)], axis=1)
+    # Fenêtre des points [t - window, t - 1] pour chaque colonne t
+    end = np.arange(matrix.shape[1])
+    start = np.maximum(end - window, 0)
+    n = counts[:, end] - counts[:, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[:, end] - sums[:, start]) / n
+        std = np.sqrt(np.maximum((squares[:, end] - squares[:, start]) / n - mean * mean, 0.0))
+        scores = (values - mean) / std
+    return np.where(mask & (n >= min_points) & (std > 1e-12), scores, np.nan)
+
+
+def ewma_scores(matrix, alpha, min_points=MIN_POINTS):
+    """Écart de chaque point à la moyenne mobile exponentielle des points précédents, en écarts-types"""
+    count, width = matrix.shape
+    mean = np.zeros(count)
+    var = np.zeros(count)
+    seen = np.zeros(count, dtype=np.int64)
+    scores = np.full(matrix.shape, np.nan)
+    # Boucle sur le temps, chaque pas vectorisé sur toutes les séries
+    for t in range(width):
+        x = matrix[:, t]
+        valid = ~np.isnan(x)
+        diff = np.where(valid, x - mean, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores[:, t] = np.where(valid & (seen >= min_points) & (var > 1e-24), diff / np.sqrt(var), np.nan)
+        first = valid & (seen == 0)
+        update = valid & (seen > 0)
+        increment = alpha * diff
+        mean = np.where(first, x, np.where(update, mean + increment, mean))
+        var = np.where(update, (1 - alpha) * (var + diff * increment), var)
+        seen += valid
+    return scores
+
+
+def anomaly_report(series, method='zscore', window=60, alpha=0.1, threshold=ANOMALY_THRESHOLD):
+    """Par série: dernier point, score du dernier point, score max et nombre de points anormaux"""
+    if not series:
+        return []
+    matrix = to_matrix(series)
+    scores = rolling_zscore(matrix, window) if method == 'zscore' else ewma_scores(matrix, alpha)
+    magnitude = np.where(np.isnan(scores), 0.0, np.abs(scores))
+    last_scores = scores[:, -1]
+    max_scores = magnitude.max(axis=1)
+    anomalies = (magnitude >= threshold).sum(axis=1)
+    report = []
+    for i in range(len(series)):
+        score = None if np.isnan(last_scores[i]) else round(float(last_scores[i]), 3)
+        report.append({
+            'last': float(matrix[i, -1]),
+            'score': score,
+            'max_score': round(float(max_scores[i]), 3),
+            'anomalies': int(anomalies[i]),
+            'anomalous': score is not None and abs(score) >= threshold,
+        })
+    return report
+
+
+def _summary(row):
+    percentiles = row['percentiles'] or [None, None, None]
+    return {
+        'count': row['count'],
+        'mean': row['mean'],
+        'min': row['min'],
+        'max': row['max'],
+        'p50': percentiles[0],
+        'p95': percentiles[1],
+        'p99': percentiles[2],
+        'rate': row['rate'],  # Tendance (pente de régression, unités par seconde)
+    }
+
+
+def build_analytics(summary_rows, tail_rows, project_names, params):
+    """Réponse de l'API: vue par métrique (tous projets) et par série, séries anormales d'abord"""
+    tails = {(row['project_id'], row['metric_name']): row['vals'] for row in tail_rows}
+    series_rows = [row for row in summary_rows if row['project_id'] is not None]
+    keys = [(row['project_id'], row['metric_name']) for row in series_rows]
+    with_tail = [key for key in keys if tails.get(key)]
+    report = dict(zip(with_tail, anomaly_report([tails[key] for key in with_tail], params['method'],
+                                                params['window'], params['alpha'], params['threshold'])))
+    series = []
+    for row, key in zip(series_rows, keys):
+        entry = {
+            'project_id': row['project_id'],
+            'project_name': project_names.get(row['project_id']),
+            'metric_name': row['metric_name'],
+            'first_at': row['first_at'].isoformat() if row['first_at'] else None,
+            'last_at': row['last_at'].isoformat() if row['last_at'] else None,
+        }
+        entry.update(_summary(row))
+        entry['anomaly'] = report.get(key)
+        series.append(entry)
+    series.sort(key=lambda s: -(abs(s['anomaly']['score'] or 0) if s['anomaly'] else 0))
+
+    metrics = {}
+    for row in summary_rows:
+        if row['project_id'] is None:
+            metrics[row['metric_name']] = dict(_summary(row), projects=row['projects'], anomalous=0)
+    for entry in series:
+        if entry['anomaly'] and entry['anomaly']['anomalous']:
+            metrics[entry['metric_name']]['anomalous'] += 1
+    return {
+        'hours': params['hours'],
+        'method': params['method'],
+        'threshold': params['threshold'],
+        'metrics': metrics,
+        'series': series,
+    }
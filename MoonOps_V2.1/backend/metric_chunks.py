@@ -0,0 +1,186 @@
+"""
+Chunks compressés des métriques anciennes MoonOps (encodage Gorilla)
+Les points bruts plus anciens que COMPACT_AFTER_H sont regroupés par série
+(projet, métrique) et par tranche de CHUNK_S secondes dans un bytea:
+horodatages en microsecondes codés en delta de delta (préfixe de longueur
+variable, 1 bit pour un intervalle régulier), valeurs codées par XOR avec la
+valeur précédente (bits significatifs seulement, 1 bit pour une valeur
+répétée). Le nom de la métrique est remplacé par un id (table metric_names).
+
+Format: version (1 octet), nombre de points (4 octets), puis le flux de bits.
+"""
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+
+# Configuration (variables d'environnement)
+CHUNK_S = int(os.getenv('MOONOPS_METRICS_CHUNK_S', '7200'))  # Tranche de temps d'un chunk
+COMPACT_AFTER_H = int(os.getenv('MOONOPS_METRICS_COMPACT_AFTER_H', '168'))
+COMPACT_INTERVAL_S = float(os.getenv('MOONOPS_METRICS_COMPACT_INTERVAL_S', '300'))  # 0: désactivé
+COMPACT_BATCH = int(os.getenv('MOONOPS_METRICS_COMPACT_BATCH', '50000'))  # Points bruts par transaction
+
+# Un seul compacteur par shard (workers, move_tenant.py pendant un déplacement)
+COMPACTION_LOCK_ID = zlib.crc32(b'moonops_metric_compaction')
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('>BI')
+_DOUBLE = struct.Struct('>d')
+_UINT64 = struct.Struct('>Q')
+
+# Delta de delta des horodatages: (préfixe, longueur du préfixe, bits de la valeur signée)
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 12), (0b1110, 4, 20), (0b11110, 5, 32))
+_MASK64 = (1 << 64) - 1
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class _BitWriter:
+    __slots__ = ('out', 'acc', 'bits')
+
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.bits = 0
+
+    def write(self, value, n):
+        self.acc = (self.acc << n) | value
+        self.bits += n
+        if self.bits >= 64:
+            rest = self.bits & 7
+            self.out += (self.acc >> rest).to_bytes(self.bits >> 3, 'big')
+            self.acc &= (1 << rest) - 1
+            self.bits = rest
+
+    def getvalue(self):
+        size = (self.bits + 7) >> 3
+        return bytes(self.out + (self.acc << (size * 8 - self.bits)).to_bytes(size, 'big'))
+
+
+class _BitReader:
+    __slots__ = ('data', 'pos', 'acc', 'bits')
+
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+        self.acc = 0
+        self.bits = 0
+
+    def read(self, n):
+        while self.bits < n:
+            block = self.data[self.pos:self.pos + 8]
+            if not block:
+                raise ValueError("Chunk tronqué")
+            self.acc = (self.acc << (len(block) * 8)) | int.from_bytes(block, 'big')
+            self.bits += len(block) * 8
+            self.pos += len(block)
+        self.bits -= n
+        value = self.acc >> self.bits
+        self.acc &= (1 << self.bits) - 1
+        return value
+
+
+def _signed(value, n):
+    return value - (1 << n) if value >= 1 << (n - 1) else value
+
+
+def encode(timestamps, values):
+    """timestamps (µs epoch, croissants) et valeurs -> bytes"""
+    out = _BitWriter()
+    count = len(timestamps)
+    if count:
+        out.write(timestamps[0] & _MASK64, 64)
+        previous_bits = _UINT64.unpack(_DOUBLE.pack(values[0]))[0]
+        out.write(previous_bits, 64)
+    previous_ts, previous_delta = timestamps[0] if count else 0, 0
+    leading, trailing = -1, -1
+    for i in range(1, count):
+        ts = timestamps[i]
+        delta = ts - previous_ts
+        dod = delta - previous_delta
+        previous_ts, previous_delta = ts, delta
+        if dod == 0:
+            out.write(0, 1)
+        else:
+            for prefix, prefix_bits, n in _DOD_BUCKETS:
+                if -(1 << (n - 1)) <= dod < 1 << (n - 1):
+                    out.write(prefix, prefix_bits)
+                    out.write(dod & ((1 << n) - 1), n)
+                    break
+            else:
+                out.write(0b11111, 5)
+                out.write(dod & _MASK64, 64)
+
+        bits = _UINT64.unpack(_DOUBLE.pack(values[i]))[0]
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            out.write(0, 1)
+            continue
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if leading >= 0 and lead >= leading and trail >= trailing:
+            # Bits significatifs dans la fenêtre du point précédent
+            out.write(0b10, 2)
+            out.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            significant = 64 - lead - trail
+            out.write(0b11, 2)
+            out.write(lead, 5)
+            out.write(significant & 63, 6)  # 64 -> 0
+            out.write(xor >> trail, significant)
+            leading, trailing = lead, trail
+    return _HEADER.pack(FORMAT_VERSION, count) + out.getvalue()
+
+
+def decode(data):
+    """bytes -> (timestamps µs, valeurs)"""
+    version, count = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Version de chunk inconnue: {version}")
+    timestamps, values = [], []
+    if not count:
+        return timestamps, values
+    bits = _BitReader(bytes(data), _HEADER.size)
+    ts = _signed(bits.read(64), 64)
+    value_bits = bits.read(64)
+    timestamps.append(ts)
+    values.append(_DOUBLE.unpack(_UINT64.pack(value_bits))[0])
+    delta = 0
+    leading = trailing = 0
+    for _ in range(1, count):
+        if bits.read(1):
+            for n in (7, 12, 20, 32, 64):
+                if n == 64 or not bits.read(1):
+                    break
+            delta += _signed(bits.read(n), n)
+        ts += delta
+        timestamps.append(ts)
+
+        if bits.read(1):
+            if bits.read(1):
+                leading = bits.read(5)
+                significant = bits.read(6) or 64
+                trailing = 64 - leading - significant
+            value_bits ^= bits.read(64 - leading - trailing) << trailing
+        values.append(_DOUBLE.unpack(_UINT64.pack(value_bits))[0])
+    return timestamps, values
+
+
+def merge(timestamps, values, other_timestamps, other_values):
+    """Points d'un chunk existant + points bruts arrivés en retard -> une série triée"""
+    points = sorted(list(zip(timestamps, values)) + list(zip(other_timestamps, other_values)))
+    return [ts for ts, _ in points], [value for _, value in points]
+
+
+def chunk_start(ts_us):
+    """Début (µs) de la tranche du point"""
+    return ts_us - ts_us % (CHUNK_S * 1_000_000)
+
+
+def to_datetime(ts_us):
+    return _EPOCH + timedelta(microseconds=ts_us)
+
+
+def to_microseconds(moment):
+    """datetime avec fuseau -> µs epoch (exact, sans passer par un float)"""
+    return (moment - _EPOCH) // timedelta(microseconds=1)
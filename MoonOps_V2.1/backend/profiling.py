@@ -0,0 +1,183 @@
+"""
+Profilage à la demande des requêtes MoonOps
+cProfile (fichiers .pstats) ou échantillonnage de pile (format "collapsed"
+pour flamegraph.pl / speedscope), activable à chaud sans redémarrage
+"""
+import collections
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_HEADER = 'X-MoonOps-Profile'
+PROFILE_DIR = os.getenv('MOONOPS_PROFILE_DIR', '/tmp/moonops_profiles')
+PROFILE_MAX_FILES = int(os.getenv('MOONOPS_PROFILE_MAX_FILES', '200'))
+PROFILE_MODES = ('cprofile', 'sampling')
+
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9_.-]+\.(pstats|collapsed)$')
+
+
+class ProfilingSettings:
+    """Réglages modifiables à chaud via l'API d'administration"""
+
+    def __init__(self):
+        self.sample_ratio = float(os.getenv('MOONOPS_PROFILE_SAMPLE_RATIO', '0'))
+        self.mode = os.getenv('MOONOPS_PROFILE_MODE', 'cprofile')
+        self.sampling_interval = float(os.getenv('MOONOPS_PROFILE_INTERVAL_MS', '5')) / 1000
+
+    def to_dict(self):
+        return {
+            'sample_ratio': self.sample_ratio,
+            'mode': self.mode,
+            'sampling_interval_ms': self.sampling_interval * 1000,
+        }
+
+
+SETTINGS = ProfilingSettings()
+
+
+def update_settings(data):
+    """Met à jour les réglages depuis un dict JSON (valeurs validées)"""
+    if 'sample_ratio' in data:
+        ratio = float(data['sample_ratio'])
+        if not 0 <= ratio <= 1:
+            raise ValueError("sample_ratio doit être compris entre 0 et 1")
+        SETTINGS.sample_ratio = ratio
+    if 'mode' in data:
+        if data['mode'] not in PROFILE_MODES:
+            raise ValueError(f"mode doit être l'un de {', '.join(PROFILE_MODES)}")
+        SETTINGS.mode = data['mode']
+    if 'sampling_interval_ms' in data:
+        interval = float(data['sampling_interval_ms'])
+        if interval <= 0:
+            raise ValueError("sampling_interval_ms doit être positif")
+        SETTINGS.sampling_interval = interval / 1000
+    return SETTINGS.to_dict()
+
+
+def should_profile(header_value, is_admin):
+    """
+    Décide si la requête courante doit être profilée.
+    Retourne le mode à utiliser, ou None.
+    """
+    if header_value is not None and is_admin:
+        return header_value if header_value in PROFILE_MODES else SETTINGS.mode
+    if SETTINGS.sample_ratio > 0 and random.random() < SETTINGS.sample_ratio:
+        return SETTINGS.mode
+    return None
+
+
+class _StackSampler(threading.Thread):
+    """Échantillonne la pile d'un thread à intervalle fixe"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='moonops-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfile:
+    """Profil d'une requête en cours"""
+
+    def __init__(self, mode, label):
+        self.mode = mode
+        self.label = label
+        self.started = time.perf_counter()
+        self._profiler = None
+        self._sampler = None
+
+    def start(self):
+        """Démarre le profil; None si impossible (la requête continue sans profil)"""
+        if self.mode == 'sampling':
+            self._sampler = _StackSampler(threading.get_ident(), SETTINGS.sampling_interval)
+            self._sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Python 3.12+: un autre profileur est déjà actif (autre requête, outil externe)
+                print(f"⚠️ Profil ignoré pour {self.label}: {e}")
+                return None
+            self._profiler = profiler
+        return self
+
+    def stop(self):
+        """Arrête le profilage et écrit le fichier résultat; retourne son nom"""
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', self.label).strip('_')[:60]
+        base = f"{time.strftime('%Y%m%d_%H%M%S')}_{slug}_{duration_ms:.0f}ms_{uuid.uuid4().hex[:6]}"
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self._profiler is not None:
+            filename = f"{base}.pstats"
+            self._profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+        else:
+            filename = f"{base}.collapsed"
+            with open(os.path.join(PROFILE_DIR, filename), 'w') as f:
+                for stack, count in self._sampler.counts.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        _prune()
+        return filename
+
+
+def _prune():
+    """Garde au plus PROFILE_MAX_FILES profils (les plus récents)"""
+    try:
+        entries = sorted(
+            (e for e in os.scandir(PROFILE_DIR) if _SAFE_NAME.match(e.name)),
+            key=lambda e: e.stat().st_mtime
+        )
+        for entry in entries[:-PROFILE_MAX_FILES]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"⚠️ Nettoyage des profils impossible: {e}")
+
+
+def list_profiles():
+    """Liste des profils disponibles (plus récents d'abord)"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    result = []
+    for entry in os.scandir(PROFILE_DIR):
+        if _SAFE_NAME.match(entry.name):
+            stat = entry.stat()
+            result.append({
+                'name': entry.name,
+                'format': entry.name.rsplit('.', 1)[1],
+                'size': stat.st_size,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(stat.st_mtime)),
+            })
+    result.sort(key=lambda p: p['created_at'], reverse=True)
+    return result
+
+
+def is_valid_profile_name(name):
+    return bool(_SAFE_NAME.match(name))
@@ -0,0 +1,201 @@
+"""
+Ré-upload incrémental d'une archive ZIP vers le repository GitLab d'un projet
+Les empreintes Git (blob SHA-1) des fichiers de l'archive sont calculées sans
+extraction puis comparées au manifeste du dernier import (table project_files).
+Seuls les fichiers ajoutés ou modifiés sont écrits (git fast-import) dans un
+miroir shallow du repository, et un seul commit est poussé sur main.
+"""
+import collections
+import hashlib
+import os
+import stat
+import subprocess
+import tempfile
+import zipfile
+
+import tracing
+from git_mirror import GitMirrorError, _git_env, run_git
+
+# Configuration (variables d'environnement)
+# Taille décompressée maximale d'une archive (protection contre les bombes ZIP)
+SYNC_MAX_ARCHIVE_BYTES = int(os.getenv('MOONOPS_SYNC_MAX_ARCHIVE_MB', '1024')) * 1024 * 1024
+SYNC_IMPORT_TIMEOUT_S = int(os.getenv('MOONOPS_SYNC_IMPORT_TIMEOUT_S', '600'))
+
+IMPORT_REF = 'refs/moonops/import'
+CHUNK_SIZE = 1024 * 1024
+COMMITTER = 'MoonOps <moonops@techconsulting.fr>'
+
+# Fichier de l'archive: nom dans le ZIP, empreinte Git, mode Git, taille décompressée
+ArchiveEntry = collections.namedtuple('ArchiveEntry', 'name blob_sha mode size')
+
+
+class ArchiveError(Exception):
+    """Archive illisible ou contenant des chemins refusés"""
+
+
+def _root_prefix(names):
+    """Dossier racine unique à retirer (même règle que extract_zip_to_temp)"""
+    roots = {name.split('/', 1)[0] for name in names}
+    if len(roots) == 1 and all('/' in name for name in names):
+        return roots.pop() + '/'
+    return ''
+
+
+def _normalize(name):
+    """Chemin relatif normalisé d'une entrée du ZIP (chemins absolus et '..' refusés)"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if name.startswith('/') or '..' in parts:
+        raise ArchiveError(f"Chemin refusé dans l'archive: {name}")
+    return '/'.join(parts)
+
+
+def _git_mode(info):
+    unix_mode = info.external_attr >> 16
+    if stat.S_ISLNK(unix_mode):
+        return '120000'
+    return '100755' if unix_mode & 0o111 else '100644'
+
+
+def scan_archive(zip_path):
+    """{chemin: ArchiveEntry} des fichiers du ZIP, empreintes calculées en streaming"""
+    try:
+        with tracing.span('project_sync.scan') as sp, zipfile.ZipFile(zip_path) as zf:
+            infos = [info for info in zf.infolist() if not info.is_dir()]
+            if sum(info.file_size for info in infos) > SYNC_MAX_ARCHIVE_BYTES:
+                raise ArchiveError(f"Archive trop volumineuse une fois décompressée "
+                                   f"(max {SYNC_MAX_ARCHIVE_BYTES / 1024 / 1024:.0f} MB)")
+            names = {info.filename: _normalize(info.filename) for info in zf.infolist()}
+            prefix = _root_prefix([name for name in names.values() if name])
+            entries = {}
+            for info in infos:
+                path = names[info.filename][len(prefix):]
+                if not path or '.git' in path.split('/'):
+                    continue
+                digest = hashlib.sha1(f"blob {info.file_size}\0".encode())
+                with zf.open(info) as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                entries[path] = ArchiveEntry(info.filename, digest.hexdigest(), _git_mode(info), info.file_size)
+            sp.set_attribute('zip.files', len(entries))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+        raise ArchiveError(f"Archive ZIP invalide: {e}")
+    return entries
+
+
+def diff_entries(entries, base):
+    """(ajoutés, modifiés, supprimés) entre l'archive et base {chemin: (blob_sha, mode)}"""
+    added = sorted(path for path in entries if path not in base)
+    modified = sorted(path for path, entry in entries.items()
+                      if path in base and tuple(base[path]) != (entry.blob_sha, entry.mode))
+    deleted = sorted(path for path in base if path not in entries)
+    return added, modified, deleted
+
+
+def tree_manifest(repo_path, rev):
+    """Manifeste {chemin: (blob_sha, mode)} d'un commit (sans lire les blobs)"""
+    if not rev:
+        return {}
+    manifest = {}
+    for line in run_git(['ls-tree', '-r', '-z', '--full-tree', rev], cwd=repo_path).split('\0'):
+        if not line:
+            continue
+        meta, path = line.split('\t', 1)
+        mode, _, blob_sha = meta.split(' ')
+        manifest[path] = (blob_sha, mode)
+    return manifest
+
+
+def _rev_parse(repo_path, ref):
+    try:
+        return run_git(['rev-parse', '--verify', '--quiet', f"{ref}^{{commit}}"], cwd=repo_path).strip() or None
+    except GitMirrorError:
+        return None
+
+
+def _quote(path):
+    """Chemin pour fast-import (guillemets style C si nécessaire)"""
+    if '\n' in path or path.startswith('"'):
+        escaped = path.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return f'"{escaped}"'
+    return path
+
+
+def _fast_import(repo_path, zip_path, entries, changed, deleted, parent, message):
+    """Écrit les blobs modifiés et le commit dans IMPORT_REF; retourne (commit, octets écrits)"""
+    written = 0
+    with tracing.span('git fast-import', **{'git.blobs': len(changed), 'git.deletes': len(deleted)}), \
+            tempfile.TemporaryFile() as stderr, zipfile.ZipFile(zip_path) as zf:
+        proc = subprocess.Popen(['git', 'fast-import', '--quiet', '--date-format=now'], cwd=repo_path,
+                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr, env=_git_env())
+        try:
+            out = proc.stdin
+            msg = message.encode()
+            out.write(f"reset {IMPORT_REF}\ncommit {IMPORT_REF}\ncommitter {COMMITTER} now\n".encode())
+            out.write(b"data %d\n%s\n" % (len(msg), msg))
+            if parent:
+                out.write(f"from {parent}\n".encode())
+            for path in deleted:
+                out.write(f"D {_quote(path)}\n".encode())
+            for path in changed:
+                entry = entries[path]
+                out.write(f"M {entry.mode} inline {_quote(path)}\ndata {entry.size}\n".encode())
+                copied = 0
+                with zf.open(entry.name) as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        out.write(chunk)
+                        copied += len(chunk)
+                if copied != entry.size:
+                    raise ArchiveError(f"Taille incohérente dans l'archive: {entry.name}")
+                out.write(b"\n")
+                written += copied
+            out.close()
+            proc.wait(timeout=SYNC_IMPORT_TIMEOUT_S)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if proc.returncode != 0:
+            stderr.seek(0)
+            raise GitMirrorError(f"git fast-import: {stderr.read().decode(errors='replace').strip()[-500:]}")
+    return _rev_parse(repo_path, IMPORT_REF), written
+
+
+def push_archive(mirrors, push_url, zip_path, entries, manifest, imported_commit, message, branch='main'):
+    """
+    Pousse l'archive comme un commit incrémental sur branch.
+    Le manifeste stocké sert de base s'il décrit bien la tête de la branche
+    (imported_commit); sinon (premier ré-upload, push extérieur, uploads
+    concurrents) la base est l'arbre du commit, lu dans le miroir.
+    """
+    with mirrors.checkout(push_url, shallow=True, force_refresh=True) as repo_path:
+        head = _rev_parse(repo_path, f"refs/heads/{branch}")
+        if manifest and head and head == imported_commit:
+            base, base_source = manifest, 'manifest'
+        else:
+            base, base_source = tree_manifest(repo_path, head), 'tree'
+        added, modified, deleted = diff_entries(entries, base)
+        result = {
+            'parent': head,
+            'commit': head,
+            'base': base_source,
+            'added': added,
+            'modified': modified,
+            'deleted': deleted,
+            'bytes': 0,
+        }
+        if not (added or modified or deleted):
+            return result
+
+        commit, written = _fast_import(repo_path, zip_path, entries, added + modified, deleted, head, message)
+        try:
+            # Non forcé: refusé si la branche a bougé depuis le fetch
+            with tracing.span('project_sync.push', **{'git.bytes': written}):
+                run_git(['push', '--quiet', push_url, f"{commit}:refs/heads/{branch}"], cwd=repo_path)
+            run_git(['update-ref', f"refs/heads/{branch}", commit], cwd=repo_path)
+        finally:
+            run_git(['update-ref', '-d', IMPORT_REF], cwd=repo_path)
+        mirrors.stats['incremental_pushes'] += 1
+        return dict(result, commit=commit, bytes=written)
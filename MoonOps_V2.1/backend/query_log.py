@@ -0,0 +1,179 @@
+"""
+Journal des requêtes SQL lentes pour db_query
+Chronométrage de chaque requête, capture EXPLAIN (ANALYZE, BUFFERS) échantillonnée
+et limitée en débit, détection des motifs N+1 par requête HTTP
+"""
+import collections
+import contextvars
+import functools
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+SLOW_QUERY_MS = float(os.getenv('MOONOPS_SLOW_QUERY_MS', '200'))
+EXPLAIN_SAMPLE_RATIO = float(os.getenv('MOONOPS_EXPLAIN_SAMPLE_RATIO', '1'))
+EXPLAIN_MAX_PER_MINUTE = int(os.getenv('MOONOPS_EXPLAIN_MAX_PER_MINUTE', '6'))
+EXPLAIN_FINGERPRINT_INTERVAL = float(os.getenv('MOONOPS_EXPLAIN_FINGERPRINT_INTERVAL_S', '300'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('MOONOPS_N_PLUS_ONE_THRESHOLD', '10'))
+LOG_SIZE = int(os.getenv('MOONOPS_SLOW_QUERY_LOG_SIZE', '500'))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+
+_request_counts = contextvars.ContextVar('moonops_request_queries', default=None)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(query):
+    """SQL normalisé: littéraux et paramètres remplacés par '?', espaces réduits"""
+    sql = _COMMENT.sub(' ', query)
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('(?)', sql)
+    return ' '.join(sql.split())
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    """Empreinte courte d'une requête normalisée"""
+    return hashlib.md5(normalize(query).encode('utf-8')).hexdigest()[:12]
+
+
+def params_shape(params):
+    """Forme des paramètres (types seulement, jamais les valeurs)"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: params_shape(v) if isinstance(v, (list, tuple, dict)) else type(v).__name__
+                for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        if len(params) > 10:
+            return f"{type(params).__name__}[{len(params)}]"
+        return [params_shape(v) if isinstance(v, (list, tuple, dict)) else type(v).__name__ for v in params]
+    return type(params).__name__
+
+
+class QueryLog:
+    """Tampons circulaires des requêtes lentes et des détections N+1"""
+
+    def __init__(self):
+        self.slow = collections.deque(maxlen=LOG_SIZE)
+        self.n_plus_one = collections.deque(maxlen=LOG_SIZE)
+        self._lock = threading.Lock()
+        self._explain_times = collections.deque()
+        self._explained_at = {}
+        self._sql_by_fingerprint = {}
+        self.stats = collections.Counter()
+
+    def _allow_explain(self, fp):
+        """Échantillonnage + limite globale par minute + intervalle par empreinte"""
+        if EXPLAIN_SAMPLE_RATIO <= 0 or random.random() >= EXPLAIN_SAMPLE_RATIO:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._explain_times and now - self._explain_times[0] > 60:
+                self._explain_times.popleft()
+            if len(self._explain_times) >= EXPLAIN_MAX_PER_MINUTE:
+                return False
+            if now - self._explained_at.get(fp, -EXPLAIN_FINGERPRINT_INTERVAL) < EXPLAIN_FINGERPRINT_INTERVAL:
+                return False
+            self._explain_times.append(now)
+            self._explained_at[fp] = now
+            return True
+
+    def _explain(self, cursor, query, params):
+        """Plan d'exécution; ANALYZE uniquement pour les SELECT (sans effet de bord)"""
+        if query.strip().upper().startswith("SELECT"):
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+        else:
+            prefix = "EXPLAIN "
+        cursor.execute(prefix + query, params)
+        return '\n'.join(str(list(row.values())[0] if isinstance(row, dict) else row[0])
+                         for row in cursor.fetchall())
+
+    def record(self, query, params, duration_ms, rowcount, cursor=None):
+        """Enregistre une requête exécutée (appelé par db_query)"""
+        fp = fingerprint(query)
+        counts = _request_counts.get()
+        if counts is not None:
+            counts[fp] += 1
+        if fp not in self._sql_by_fingerprint and len(self._sql_by_fingerprint) < 4096:
+            self._sql_by_fingerprint[fp] = normalize(query)
+
+        self.stats['statements'] += 1
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        self.stats['slow'] += 1
+
+        entry = {
+            'fingerprint': fp,
+            'sql': normalize(query),
+            'params_shape': params_shape(params),
+            'duration_ms': round(duration_ms, 2),
+            'rowcount': rowcount,
+            'recorded_at': datetime.now().isoformat(),
+            'plan': None,
+        }
+        if cursor is not None and self._allow_explain(fp):
+            try:
+                entry['plan'] = self._explain(cursor, query, params)
+                self.stats['explained'] += 1
+            except Exception as e:
+                entry['plan_error'] = str(e)
+        self.slow.append(entry)
+        print(f"🐢 Requête lente ({duration_ms:.0f} ms, {rowcount} lignes): {entry['sql'][:120]}")
+
+    def begin_request(self):
+        """Démarre le comptage des requêtes SQL de la requête HTTP courante"""
+        return _request_counts.set(collections.Counter())
+
+    def end_request(self, token, route):
+        """
+        Termine le comptage et signale les empreintes répétées plus de
+        N_PLUS_ONE_THRESHOLD fois. Retourne le nombre total de requêtes SQL.
+        """
+        counts = _request_counts.get()
+        _request_counts.reset(token)
+        if not counts:
+            return 0
+        for fp, count in counts.items():
+            if count > N_PLUS_ONE_THRESHOLD:
+                self.stats['n_plus_one'] += 1
+                self.n_plus_one.append({
+                    'route': route,
+                    'fingerprint': fp,
+                    'count': count,
+                    'sql': self._sql_by_fingerprint.get(fp),
+                    'recorded_at': datetime.now().isoformat(),
+                })
+                print(f"⚠️ N+1 détecté sur {route}: empreinte {fp} exécutée {count} fois")
+        return sum(counts.values())
+
+    def snapshot(self, limit=100):
+        return {
+            'config': {
+                'slow_query_ms': SLOW_QUERY_MS,
+                'explain_sample_ratio': EXPLAIN_SAMPLE_RATIO,
+                'explain_max_per_minute': EXPLAIN_MAX_PER_MINUTE,
+                'n_plus_one_threshold': N_PLUS_ONE_THRESHOLD,
+            },
+            'stats': dict(self.stats),
+            'slow_queries': list(self.slow)[-limit:][::-1],
+            'n_plus_one': list(self.n_plus_one)[-limit:][::-1],
+        }
+
+    def clear(self):
+        self.slow.clear()
+        self.n_plus_one.clear()
+        self.stats.clear()
+
+
+QUERY_LOG = QueryLog()
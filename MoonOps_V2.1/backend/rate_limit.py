@@ -0,0 +1,400 @@
+"""
+Limitation de débit et contrôle d'admission MoonOps par tenant
+Seau à jetons et plafond de requêtes simultanées par (tenant, classe de route),
+puis file équitable pondérée entre tenants pour les travaux coûteux
+(upload, déploiement) afin qu'un tenant bruyant ne pénalise pas les autres.
+"""
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+
+# Configuration (variables d'environnement)
+RATE_LIMIT_BACKEND = os.getenv('MOONOPS_RATE_LIMIT', 'local')  # local | redis | off
+RATE_LIMIT_REDIS_URL = os.getenv('MOONOPS_RATE_LIMIT_REDIS_URL', 'redis://127.0.0.1:6379/0')
+# Créneaux d'exécution des travaux coûteux partagés par tous les tenants (par processus)
+EXPENSIVE_SLOTS = int(os.getenv('MOONOPS_EXPENSIVE_SLOTS', '4'))
+FAIR_QUEUE_WAIT_S = float(os.getenv('MOONOPS_FAIR_QUEUE_WAIT_S', '30'))
+FAIR_QUEUE_MAX_PER_TENANT = int(os.getenv('MOONOPS_FAIR_QUEUE_MAX_PER_TENANT', '10'))
+# Seaux gardés en mémoire (backend local): au-delà, les seaux pleins puis les plus anciens sont oubliés
+BUCKET_TABLE_SIZE = 100000
+# Poids par tenant (défaut 1): "client_id:2,client_id:0.5"
+TENANT_WEIGHTS = {
+    tenant.strip(): float(weight)
+    for tenant, _, weight in (item.rpartition(':') for item in os.getenv('MOONOPS_TENANT_WEIGHTS', '').split(','))
+    if tenant.strip()
+}
+
+# Classe de route -> (jetons par seconde, rafale, requêtes simultanées par tenant)
+# Surcharge: MOONOPS_RATE_<CLASSE>="débit:rafale:simultanées"
+ROUTE_CLASS_LIMITS = {
+    'auth': (5, 20, 4),
+    'upload': (0.2, 5, 2),
+    'deploy': (1, 10, 3),
+    'reads': (200, 400, 64),
+    'ingest': (50, 200, 8),
+}
+for _name, _default in ROUTE_CLASS_LIMITS.items():
+    _override = os.getenv(f'MOONOPS_RATE_{_name.upper()}')
+    if _override:
+        _rate, _burst, _concurrency = _override.split(':')
+        ROUTE_CLASS_LIMITS[_name] = (float(_rate), float(_burst), int(_concurrency))
+EXPENSIVE_CLASSES = {'upload', 'deploy'}
+
+# Endpoints Flask (et vues ASGI de même nom) -> classe; les autres GET sont des lectures
+ENDPOINT_CLASSES = {
+    'login': 'auth',
+    'create_project': 'upload',
+    'create_project_with_upload': 'upload',
+    'upload_project_update': 'upload',
+    'deploy_project': 'deploy',
+    'delete_project': 'deploy',
+    'ingest_metrics': 'ingest',
+}
+EXEMPT_ENDPOINTS = {'health_check', 'static'}
+
+
+def route_class(endpoint, method, path):
+    """Classe de limitation d'une requête (None: non limitée)"""
+    if endpoint in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[endpoint]
+    if endpoint in EXEMPT_ENDPOINTS or path.startswith('/api/admin/') or not path.startswith('/api/'):
+        return None
+    return 'reads' if method == 'GET' else None
+
+
+class RateLimited(Exception):
+    """Requête refusée (HTTP 429 ou 503 avec Retry-After)"""
+
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.status = status
+
+
+class LocalBackend:
+    """État en mémoire du processus"""
+
+    name = 'local'
+
+    def __init__(self):
+        self._buckets = {}
+        self._running = collections.Counter()
+        self._lock = threading.Lock()
+
+    def take_token(self, key, rate, burst):
+        """(accepté, secondes avant le prochain jeton)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            accepted = tokens >= 1
+            if accepted:
+                tokens -= 1
+            if key not in self._buckets and len(self._buckets) >= BUCKET_TABLE_SIZE:
+                self._prune(now)
+            # Dernier élément: instant où le seau sera de nouveau plein (équivalent à absent)
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return (True, 0) if accepted else (False, (1 - tokens) / rate)
+
+    def _prune(self, now):
+        """Seaux pleins oubliés (clés par adresse IP sur la connexion: croissance sans borne);
+        si la table reste pleine (flot d'adresses), les moins récemment utilisés"""
+        self._buckets = {k: state for k, state in self._buckets.items() if state[2] > now}
+        if len(self._buckets) >= BUCKET_TABLE_SIZE:
+            recent = sorted(self._buckets.items(), key=lambda item: item[1][1])[len(self._buckets) // 2:]
+            self._buckets = dict(recent)
+
+    def enter(self, key, limit):
+        with self._lock:
+            if self._running[key] >= limit:
+                return False
+            self._running[key] += 1
+            return True
+
+    def leave(self, key):
+        with self._lock:
+            self._running[key] -= 1
+            if self._running[key] <= 0:
+                del self._running[key]
+
+
+# Seau à jetons atomique côté Redis: KEYS[1], ARGV = débit, rafale, maintenant
+_TAKE_TOKEN_LUA = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """État partagé par tous les workers (Redis local)"""
+
+    name = 'redis'
+    # Compteur de requêtes simultanées oublié si un worker meurt sans le décrémenter
+    RUNNING_TTL_S = 300
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._take = self.client.register_script(_TAKE_TOKEN_LUA)
+
+    def take_token(self, key, rate, burst):
+        wait = float(self._take(keys=[f"moonops:rl:{key}"], args=[rate, burst, time.time()]))
+        return wait == 0, wait
+
+    def enter(self, key, limit):
+        pipe = self.client.pipeline()
+        pipe.incr(f"moonops:run:{key}")
+        pipe.expire(f"moonops:run:{key}", self.RUNNING_TTL_S)
+        running, _ = pipe.execute()
+        if running > limit:
+            self.client.decr(f"moonops:run:{key}")
+            return False
+        return True
+
+    def leave(self, key):
+        self.client.decr(f"moonops:run:{key}")
+
+
+class _Waiter:
+    """Requête en file: réveillée par le thread (ou la boucle) qui libère un créneau"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.granted = False
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+
+
+class FairScheduler:
+    """
+    Créneaux partagés, attribués par file équitable pondérée (temps virtuel de
+    début): le tenant en attente dont le temps virtuel est le plus faible passe
+    en premier; chaque créneau lui coûte 1 / poids.
+    Créneaux et file par processus, même avec le backend Redis: la plateforme
+    exécute au plus workers x slots travaux coûteux à la fois.
+    """
+
+    def __init__(self, slots, weights=None):
+        self.free = slots
+        self.slots = slots
+        self.weights = weights or {}
+        self._queues = collections.defaultdict(collections.deque)
+        self._vtime = {}
+        self._clock = 0.0
+        self._lock = threading.Lock()
+
+    def _weight(self, tenant):
+        return self.weights.get(str(tenant), 1.0) or 1.0
+
+    def _charge(self, tenant):
+        start = max(self._vtime.get(tenant, 0.0), self._clock)
+        self._clock = start
+        if len(self._vtime) >= BUCKET_TABLE_SIZE:
+            # Temps virtuel dépassé par l'horloge: équivalent à un tenant jamais vu
+            self._vtime = {t: v for t, v in self._vtime.items() if v > self._clock}
+        self._vtime[tenant] = start + 1.0 / self._weight(tenant)
+
+    def _enqueue(self, tenant, waiter):
+        """True si un créneau est pris immédiatement, sinon le waiter est mis en file"""
+        with self._lock:
+            if self.free > 0 and not any(self._queues.values()):
+                self.free -= 1
+                self._charge(tenant)
+                return True
+            if len(self._queues[tenant]) >= FAIR_QUEUE_MAX_PER_TENANT:
+                raise RateLimited("Trop de travaux en file pour ce client", 5)
+            self._queues[tenant].append(waiter)
+            return False
+
+    def _abandon(self, tenant, waiter):
+        """Attente expirée; False si le créneau a été attribué entre-temps"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._queues[tenant].remove(waiter)
+            if not self._queues[tenant]:
+                del self._queues[tenant]
+            return True
+
+    def acquire(self, tenant, timeout=FAIR_QUEUE_WAIT_S):
+        waiter = _Waiter()
+        if self._enqueue(tenant, waiter):
+            return
+        if not waiter.event.wait(timeout) and self._abandon(tenant, waiter):
+            raise RateLimited("Plateforme saturée, réessayer plus tard", timeout / 2, status=503)
+
+    async def aacquire(self, tenant, timeout=FAIR_QUEUE_WAIT_S):
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._enqueue(tenant, waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(tenant, waiter):
+                raise RateLimited("Plateforme saturée, réessayer plus tard", timeout / 2, status=503)
+        except asyncio.CancelledError:
+            # Client déconnecté pendant l'attente: créneau rendu s'il avait été attribué
+            if not self._abandon(tenant, waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            waiting = [t for t, queue in self._queues.items() if queue]
+            if not waiting:
+                self.free += 1
+                return
+            tenant = min(waiting, key=lambda t: max(self._vtime.get(t, 0.0), self._clock))
+            waiter = self._queues[tenant].popleft()
+            if not self._queues[tenant]:
+                del self._queues[tenant]
+            self._charge(tenant)
+            waiter.grant()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'free': self.free,
+                'queued': {str(t): len(q) for t, q in self._queues.items()},
+            }
+
+
+class Admission:
+    """Droits acquis par une requête admise, rendus par AdmissionController.release"""
+
+    def __init__(self, route_class, tenant):
+        self.route_class = route_class
+        self.tenant = tenant
+        self.entered = False
+        self.scheduled = False
+
+
+class AdmissionController:
+    """admit() avant la vue (lève RateLimited), release() à la fin de la requête"""
+
+    def __init__(self, backend, scheduler):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.stats = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        backend = None
+        if RATE_LIMIT_BACKEND == 'redis':
+            try:
+                backend = RedisBackend(RATE_LIMIT_REDIS_URL)
+            except ImportError:
+                print("⚠️ Module redis absent, limitation de débit par processus")
+        if backend is None and RATE_LIMIT_BACKEND != 'off':
+            backend = LocalBackend()
+        return cls(backend, FairScheduler(EXPENSIVE_SLOTS, TENANT_WEIGHTS))
+
+    def _count(self, route_class, counter):
+        with self._lock:
+            self.stats[route_class][counter] += 1
+
+    def _check_limits(self, route_class, tenant):
+        """Seau à jetons puis plafond de concurrence; l'Admission retournée est à rendre"""
+        admission = Admission(route_class, tenant)
+        if self.backend is None or route_class is None:
+            return admission
+        rate, burst, concurrency = ROUTE_CLASS_LIMITS[route_class]
+        key = f"{route_class}:{tenant}"
+        try:
+            allowed, wait = self.backend.take_token(key, rate, burst)
+            if not allowed:
+                self._count(route_class, 'rate_limited')
+                raise RateLimited("Trop de requêtes, réessayer plus tard", wait)
+            if not self.backend.enter(key, concurrency):
+                self._count(route_class, 'concurrency_limited')
+                raise RateLimited("Trop de requêtes simultanées pour ce client", 1)
+            admission.entered = True
+        except RateLimited:
+            raise
+        except Exception as e:
+            # Redis indisponible: la requête passe plutôt que de bloquer la plateforme
+            print(f"⚠️ Limitation de débit indisponible: {e}")
+            self._count(route_class, 'backend_errors')
+        return admission
+
+    def admit(self, route_class, tenant):
+        admission = self._check_limits(route_class, tenant)
+        if route_class in EXPENSIVE_CLASSES:
+            started = time.perf_counter()
+            try:
+                self.scheduler.acquire(tenant)
+            except RateLimited:
+                self._count(route_class, 'queue_rejected')
+                self.release(admission)
+                raise
+            admission.scheduled = True
+            self._record_wait(route_class, started)
+        self._count(route_class, 'admitted')
+        return admission
+
+    async def aadmit(self, route_class, tenant):
+        admission = self._check_limits(route_class, tenant)
+        if route_class in EXPENSIVE_CLASSES:
+            started = time.perf_counter()
+            try:
+                await self.scheduler.aacquire(tenant)
+            except RateLimited:
+                self._count(route_class, 'queue_rejected')
+                self.release(admission)
+                raise
+            admission.scheduled = True
+            self._record_wait(route_class, started)
+        self._count(route_class, 'admitted')
+        return admission
+
+    def _record_wait(self, route_class, started):
+        with self._lock:
+            self.stats[route_class]['queue_wait_ms'] += int((time.perf_counter() - started) * 1000)
+
+    def release(self, admission):
+        if admission is None:
+            return
+        if admission.scheduled:
+            admission.scheduled = False
+            self.scheduler.release()
+        if admission.entered:
+            admission.entered = False
+            try:
+                self.backend.leave(f"{admission.route_class}:{admission.tenant}")
+            except Exception as e:
+                print(f"⚠️ Limitation de débit indisponible: {e}")
+
+    def snapshot(self):
+        with self._lock:
+            classes = {name: dict(counter) for name, counter in self.stats.items()}
+        return {
+            'backend': self.backend.name if self.backend is not None else 'off',
+            'limits': {
+                name: {'rate_per_s': rate, 'burst': burst, 'concurrency': concurrency}
+                for name, (rate, burst, concurrency) in ROUTE_CLASS_LIMITS.items()
+            },
+            'classes': classes,
+            'fair_queue': self.scheduler.snapshot(),
+        }
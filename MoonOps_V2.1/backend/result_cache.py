@@ -0,0 +1,245 @@
+"""
+Cache des résultats des routes de lecture MoonOps
+Clé: ressource + tenant + paramètres, TTL par ressource, invalidation par
+tenant (routes d'écriture et notifications PostgreSQL LISTEN/NOTIFY).
+Stockage en mémoire (LRU par processus) ou Redis (partagé entre workers).
+"""
+import collections
+import json
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+# Configuration (variables d'environnement)
+CACHE_BACKEND = os.getenv('MOONOPS_RESULT_CACHE', 'lru')  # lru | redis | off
+CACHE_MAX_ENTRIES = int(os.getenv('MOONOPS_RESULT_CACHE_MAX_ENTRIES', '10000'))
+CACHE_REDIS_URL = os.getenv('MOONOPS_RESULT_CACHE_REDIS_URL', 'redis://127.0.0.1:6379/0')
+NOTIFY_CHANNEL = 'moonops_cache'
+
+# Durée de vie par ressource (s), surchargeable par MOONOPS_CACHE_TTL_<RESSOURCE>
+RESOURCE_TTLS = {
+    'projects': 30,
+    'deployments': 15,
+    'pipelines': 15,
+    'alerts': 10,
+    'alert_groups': 10,
+    'metric_analytics': 30,
+    'stats': 10,
+}
+for _resource in RESOURCE_TTLS:
+    RESOURCE_TTLS[_resource] = float(os.getenv(f'MOONOPS_CACHE_TTL_{_resource.upper()}', RESOURCE_TTLS[_resource]))
+
+
+class LRUBackend:
+    """LRU en mémoire du processus; générations par tenant pour l'invalidation"""
+
+    name = 'lru'
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def generation(self, tenant):
+        return self._generations.get(tenant, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tenant):
+        # Les entrées de l'ancienne génération ne sont plus atteignables (LRU les évince)
+        with self._lock:
+            self._generations[tenant] = self._generations.get(tenant, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis local partagé par tous les workers (valeurs JSON)"""
+
+    name = 'redis'
+    evictions = 0
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def generation(self, tenant):
+        value = self.client.get(f"moonops:gen:{tenant}")
+        return int(value) if value else 0
+
+    def get(self, key):
+        value = self.client.get(f"moonops:rc:{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(f"moonops:rc:{key}", max(1, int(ttl)), json.dumps(value, default=str))
+
+    def invalidate(self, tenant):
+        self.client.incr(f"moonops:gen:{tenant}")
+
+    def clear(self):
+        for key in self.client.scan_iter("moonops:rc:*", count=1000):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+
+class ResultCache:
+    """Cache des résultats: get_or_compute(ressource, tenant, paramètres, fonction)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = collections.defaultdict(collections.Counter)
+        self._listeners = []
+
+    @classmethod
+    def from_env(cls):
+        if CACHE_BACKEND == 'off':
+            return cls(None)
+        if CACHE_BACKEND == 'redis':
+            try:
+                return cls(RedisBackend(CACHE_REDIS_URL))
+            except ImportError:
+                print("⚠️ Module redis absent, cache des résultats en mémoire (LRU)")
+        return cls(LRUBackend(CACHE_MAX_ENTRIES))
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _key(self, resource, tenant, params):
+        generation = self.backend.generation(tenant)
+        suffix = json.dumps(params, sort_keys=True, default=str) if params else ''
+        return f"{resource}:{tenant}:{generation}:{suffix}"
+
+    def lookup(self, resource, tenant, params=None):
+        """(trouvé, valeur, clé): la clé est calculée avant le calcul du résultat"""
+        if not self.enabled or resource not in RESOURCE_TTLS:
+            return False, None, None
+        try:
+            key = self._key(resource, tenant, params)
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ Cache indisponible ({resource}): {e}")
+            self.stats[resource]['errors'] += 1
+            return False, None, None
+        if value is None:
+            self.stats[resource]['misses'] += 1
+            return False, None, key
+        self.stats[resource]['hits'] += 1
+        return True, value, key
+
+    def store(self, resource, key, value):
+        # Clé calculée avant le calcul: une invalidation pendant le calcul
+        # change la génération et rend cette valeur inaccessible
+        if key is None:
+            return
+        try:
+            self.backend.set(key, value, RESOURCE_TTLS[resource])
+        except Exception as e:
+            print(f"⚠️ Cache indisponible ({resource}): {e}")
+            self.stats[resource]['errors'] += 1
+
+    def get_or_compute(self, resource, tenant, params, compute):
+        found, value, key = self.lookup(resource, tenant, params)
+        if found:
+            return value
+        value = compute()
+        self.store(resource, key, value)
+        return value
+
+    def invalidate(self, tenant):
+        """Invalide toutes les entrées d'un tenant (après une écriture)"""
+        if not self.enabled or tenant is None:
+            return
+        try:
+            self.backend.invalidate(str(tenant))
+            self.stats['_all']['invalidations'] += 1
+        except Exception as e:
+            print(f"⚠️ Invalidation du cache impossible ({tenant}): {e}")
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+        self.stats.clear()
+
+    # --- Invalidation par PostgreSQL (LISTEN/NOTIFY) ---
+
+    def listen(self, db_config, label='main'):
+        """Thread qui invalide le cache à chaque notification moonops_cache (trigger SQL)"""
+        if not self.enabled:
+            return
+
+        def _loop():
+            backoff = 1
+            while True:
+                conn = None
+                try:
+                    conn = psycopg2.connect(**db_config)
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    backoff = 1
+                    while True:
+                        if select.select([conn], [], [], 30) == ([], [], []):
+                            continue
+                        conn.poll()
+                        tenants = {notify.payload for notify in conn.notifies}
+                        conn.notifies.clear()
+                        for tenant in tenants:
+                            self.invalidate(tenant)
+                except Exception as e:
+                    print(f"⚠️ Écoute {NOTIFY_CHANNEL} interrompue ({label}): {e}")
+                    if conn is not None and not conn.closed:
+                        conn.close()
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+
+        thread = threading.Thread(target=_loop, name=f'moonops-cache-listen-{label}', daemon=True)
+        thread.start()
+        self._listeners.append(thread)
+
+    def snapshot(self):
+        resources = {}
+        for resource, counter in self.stats.items():
+            if resource == '_all':
+                continue
+            lookups = counter['hits'] + counter['misses']
+            resources[resource] = dict(counter, hit_ratio=round(counter['hits'] / lookups, 4) if lookups else None)
+        return {
+            'backend': self.backend.name if self.enabled else 'off',
+            'entries': self.backend.size() if self.enabled else 0,
+            'evictions': self.backend.evictions if self.enabled else 0,
+            'invalidations': self.stats['_all']['invalidations'],
+            'ttls': RESOURCE_TTLS,
+            'resources': resources,
+        }
@@ -0,0 +1,147 @@
+"""
+Routage des tenants MoonOps vers leurs shards PostgreSQL
+Carte client_id -> shard (table tenant_shards du catalogue), un DatabaseRouter
+par shard et agrégations d'administration exécutées en parallèle sur tous les shards
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_router import DatabaseRouter
+
+# Configuration (variables d'environnement)
+# Shards supplémentaires (JSON): {"shard-2": {"database": "moonops_shard2", "host": "127.0.0.1",
+#                                             "port": 5432, "replicas": ["127.0.0.1:5434"]}}
+# Les champs absents reprennent la configuration du catalogue (shard "main").
+SHARDS = os.getenv('MOONOPS_SHARDS', '')
+SHARD_MAP_TTL_S = float(os.getenv('MOONOPS_SHARD_MAP_TTL_S', '5'))
+DEFAULT_SHARD = 'main'
+
+_tenant = contextvars.ContextVar('moonops_tenant', default=None)
+
+
+class TenantMovingError(Exception):
+    """Écriture refusée: le tenant est en cours de déplacement entre shards"""
+
+
+class ShardSet:
+    """
+    Le shard "main" est aussi le catalogue: clients, users, tenant_shards.
+    Les données d'un tenant (projets et tables filles, factures) vivent sur son shard;
+    chaque shard possède une copie des lignes clients/users de ses tenants (clés étrangères).
+    """
+
+    def __init__(self, catalog_config, shards=None):
+        self.routers = {DEFAULT_SHARD: DatabaseRouter.from_env(catalog_config)}
+        for name, spec in (shards or {}).items():
+            spec = dict(spec)
+            replicas = spec.pop('replicas', [])
+            self.routers[name] = DatabaseRouter(dict(catalog_config, **spec), replicas, name=name)
+        self._map = {}
+        self._states = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max(len(self.routers), 1), thread_name_prefix='moonops-shard')
+
+    @classmethod
+    def from_env(cls, catalog_config):
+        return cls(catalog_config, json.loads(SHARDS) if SHARDS.strip() else {})
+
+    @property
+    def catalog(self):
+        return self.routers[DEFAULT_SHARD]
+
+    @property
+    def sharded(self):
+        return len(self.routers) > 1
+
+    # --- Carte des tenants ---
+
+    def refresh(self):
+        """Recharge tenant_shards depuis le catalogue (primaire)"""
+        with self.catalog.primary_cursor() as cur:
+            cur.execute("SELECT client_id::text AS client_id, shard, state FROM tenant_shards")
+            rows = cur.fetchall()
+        self._map = {row['client_id']: row['shard'] for row in rows}
+        self._states = {row['client_id']: row['state'] for row in rows if row['state'] != 'active'}
+        self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < SHARD_MAP_TTL_S:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < SHARD_MAP_TTL_S:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Carte précédente conservée; nouvel essai au prochain appel
+                print(f"⚠️ Carte des shards non rechargée: {e}")
+                self._loaded_at = time.monotonic()
+
+    def shard_of(self, client_id):
+        if not self.sharded or client_id is None:
+            return DEFAULT_SHARD
+        self._ensure_fresh()
+        shard = self._map.get(str(client_id), DEFAULT_SHARD)
+        return shard if shard in self.routers else DEFAULT_SHARD
+
+    # --- Tenant courant ---
+
+    def bind(self, client_id):
+        """Les requêtes SQL suivantes (contexte courant) iront au shard du tenant"""
+        return _tenant.set(client_id)
+
+    def unbind(self, token):
+        try:
+            _tenant.reset(token)
+        except ValueError:
+            pass
+
+    def current_tenant(self):
+        return _tenant.get()
+
+    def router(self):
+        """Router du shard du tenant courant (catalogue si aucun tenant)"""
+        return self.routers[self.shard_of(_tenant.get())]
+
+    def check_writable(self):
+        client_id = _tenant.get()
+        if client_id is not None and self.sharded:
+            self._ensure_fresh()
+            if self._states.get(str(client_id)) == 'moving':
+                raise TenantMovingError("Tenant en cours de déplacement, réessayer dans quelques secondes")
+
+    # --- Administration ---
+
+    def fan_out(self, fn):
+        """Exécute fn(router) sur chaque shard en parallèle -> {shard: résultat ou exception}"""
+        futures = {name: self._pool.submit(fn, router) for name, router in self.routers.items()}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = e
+        return results
+
+    def start_monitors(self):
+        for router in self.routers.values():
+            router.start_monitor()
+
+    def snapshot(self):
+        if self.sharded:
+            self._ensure_fresh()
+        tenants_per_shard = {}
+        for shard in self._map.values():
+            tenants_per_shard[shard] = tenants_per_shard.get(shard, 0) + 1
+        return {
+            'shards': {
+                name: dict(router.snapshot(), mapped_tenants=tenants_per_shard.get(name, 0))
+                for name, router in self.routers.items()
+            },
+            'moving_tenants': sorted(c for c, state in self._states.items() if state == 'moving'),
+        }
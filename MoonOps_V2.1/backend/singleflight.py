@@ -0,0 +1,126 @@
+"""
+Regroupement des requêtes de lecture identiques simultanées (single-flight)
+Une seule exécution par clé (route + tenant + génération du cache); les
+requêtes arrivées pendant le calcul attendent son résultat, avec une attente
+bornée au-delà de laquelle elles calculent elles-mêmes.
+"""
+import asyncio
+import collections
+import os
+import threading
+
+import tracing
+
+# Configuration (variables d'environnement)
+SINGLEFLIGHT_ROUTES = {r.strip() for r in os.getenv('MOONOPS_SINGLEFLIGHT_ROUTES', 'stats,projects').split(',')
+                       if r.strip()}
+SINGLEFLIGHT_WAIT_S = float(os.getenv('MOONOPS_SINGLEFLIGHT_WAIT_S', '5'))
+
+
+class _Call:
+    """Calcul en cours, partagé par le meneur et ses suiveurs"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """do() pour les threads (Flask), ado() pour la boucle asyncio (mode ASGI)"""
+
+    def __init__(self, routes=SINGLEFLIGHT_ROUTES, wait_s=SINGLEFLIGHT_WAIT_S):
+        self.routes = set(routes)
+        self.wait_s = wait_s
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.stats = collections.defaultdict(collections.Counter)
+
+    def _count(self, route, counter):
+        with self._lock:
+            self.stats[route][counter] += 1
+
+    def do(self, route, key, fn):
+        if route not in self.routes:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self.stats[route]['leaders' if leader else 'collapsed'] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        with tracing.span('singleflight.wait', **{'singleflight.route': route}):
+            finished = call.done.wait(self.wait_s)
+        if not finished:
+            # Meneur trop lent: calcul indépendant plutôt qu'une attente sans fin
+            self._count(route, 'timeouts')
+            return fn()
+        if call.error is not None:
+            self._count(route, 'shared_errors')
+            raise call.error
+        return call.result
+
+    async def ado(self, route, key, coro_fn):
+        if route not in self.routes:
+            return await coro_fn()
+        future = self._futures.get(key)
+        if future is None:
+            self._count(route, 'leaders')
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+            try:
+                result = await coro_fn()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Exception marquée comme lue si aucun suiveur ne l'attend
+                future.exception()
+                raise
+            finally:
+                del self._futures[key]
+
+        self._count(route, 'collapsed')
+        try:
+            with tracing.span('singleflight.wait', **{'singleflight.route': route}):
+                return await asyncio.wait_for(asyncio.shield(future), self.wait_s)
+        except asyncio.TimeoutError:
+            self._count(route, 'timeouts')
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # Meneur annulé (client déconnecté): calcul indépendant
+        except Exception:
+            self._count(route, 'shared_errors')
+            raise
+        return await coro_fn()
+
+    def snapshot(self):
+        with self._lock:
+            routes = {route: dict(counter) for route, counter in self.stats.items()}
+            in_flight = len(self._calls) + len(self._futures)
+        for counter in routes.values():
+            total = counter.get('leaders', 0) + counter.get('collapsed', 0)
+            counter['collapse_ratio'] = round(counter.get('collapsed', 0) / total, 4) if total else None
+        return {
+            'routes_enabled': sorted(self.routes),
+            'wait_s': self.wait_s,
+            'in_flight': in_flight,
+            'routes': routes,
+        }
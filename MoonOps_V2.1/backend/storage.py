@@ -0,0 +1,307 @@
+"""
+Gestion de l'espace disque des artefacts MoonOps
+Archives uploadées (UPLOAD_FOLDER/<client_id>/), dossiers de travail extraits
+(PROJECTS_FOLDER/<client_id>/) et miroirs Git: taille et dernière utilisation
+de chaque artefact, quotas global et par tenant avec éviction LRU, nettoyage
+en tâche de fond des dossiers abandonnés et refus des uploads avant lecture
+du corps quand la place manque.
+"""
+import collections
+import contextlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Configuration (variables d'environnement)
+MB = 1024 * 1024
+STORAGE_MAX_BYTES = int(os.getenv('MOONOPS_STORAGE_MAX_MB', '10240')) * MB
+STORAGE_TENANT_MAX_BYTES = int(os.getenv('MOONOPS_STORAGE_TENANT_MAX_MB', '2048')) * MB
+# Espace libre minimal à garder sur le disque
+STORAGE_MIN_FREE_BYTES = int(os.getenv('MOONOPS_STORAGE_MIN_FREE_MB', '1024')) * MB
+# Un artefact utilisé depuis moins de N secondes n'est jamais évincé (job en cours dans un autre worker)
+STORAGE_MIN_AGE_S = float(os.getenv('MOONOPS_STORAGE_MIN_AGE_S', '600'))
+# Archive ou dossier de travail non protégé, inutilisé depuis N secondes: abandonné, supprimé
+STORAGE_ABANDONED_S = float(os.getenv('MOONOPS_STORAGE_ABANDONED_S', '1800'))
+STORAGE_MIRROR_IDLE_S = float(os.getenv('MOONOPS_STORAGE_MIRROR_IDLE_S', str(7 * 86400)))
+# Place réservée par upload: archive + arbre extrait
+STORAGE_EXPANSION = float(os.getenv('MOONOPS_STORAGE_EXPANSION', '3'))
+STORAGE_JANITOR_INTERVAL_S = float(os.getenv('MOONOPS_STORAGE_JANITOR_INTERVAL_S', '60'))  # 0: désactivé
+
+UPLOAD, WORKDIR, MIRROR = 'upload', 'workdir', 'mirror'
+
+
+class StorageFull(Exception):
+    """Upload refusé: quota atteint ou disque presque plein, même après éviction"""
+
+    def __init__(self, message, status=507):
+        super().__init__(message)
+        self.status = status
+
+
+class Artifact:
+    __slots__ = ('path', 'kind', 'tenant', 'size', 'last_used')
+
+    def __init__(self, path, kind, tenant, size, last_used):
+        self.path = path
+        self.kind = kind
+        self.tenant = tenant
+        self.size = size
+        self.last_used = last_used
+
+
+def _is_tenant_dir(path, name):
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return os.path.isdir(path)
+
+
+def _disk_size(path):
+    if not os.path.isdir(path):
+        return os.lstat(path).st_size
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class StorageManager:
+    """Index des artefacts (path → Artifact), reconstruit depuis le disque à chaque passage du janitor"""
+
+    def __init__(self, uploads_dir, workdirs_dir, mirrors=None, protected=None,
+                 max_bytes=STORAGE_MAX_BYTES, tenant_max_bytes=STORAGE_TENANT_MAX_BYTES,
+                 min_free_bytes=STORAGE_MIN_FREE_BYTES, min_age_s=STORAGE_MIN_AGE_S,
+                 abandoned_s=STORAGE_ABANDONED_S, mirror_idle_s=STORAGE_MIRROR_IDLE_S,
+                 expansion=STORAGE_EXPANSION):
+        self.roots = {UPLOAD: uploads_dir, WORKDIR: workdirs_dir}
+        self.mirrors = mirrors
+        # Chemins à garder quoi qu'il arrive (archives des projets PENDING), évalué à la demande
+        self.protected = protected or (lambda: set())
+        self.max_bytes = max_bytes
+        self.tenant_max_bytes = tenant_max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.min_age_s = min_age_s
+        self.abandoned_s = abandoned_s
+        self.mirror_idle_s = mirror_idle_s
+        self.expansion = expansion
+        self._artifacts = {}
+        self._lock = threading.RLock()
+        self.last_sweep = None
+        self.stats = collections.Counter()
+        for root in self.roots.values():
+            os.makedirs(root, exist_ok=True)
+
+    def tenant_dir(self, kind, tenant):
+        path = os.path.join(self.roots[kind], str(tenant)) if tenant else self.roots[kind]
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    # Suivi des artefacts
+
+    def track(self, path, kind, tenant=None):
+        """Enregistre (ou met à jour) un artefact après écriture"""
+        try:
+            size = _disk_size(path)
+        except OSError:
+            return
+        with self._lock:
+            self._artifacts[path] = Artifact(path, kind, str(tenant) if tenant else None, size, time.time())
+
+    def discard(self, path):
+        """Supprime un artefact terminé (archive poussée, dossier de travail)"""
+        if not path or not os.path.exists(path):
+            return
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+        with self._lock:
+            self._artifacts.pop(path, None)
+        self.stats['discarded'] += 1
+
+    def scan(self):
+        """Reconstruit l'index depuis le disque (fichiers des autres workers compris)"""
+        found = {}
+        for kind, root in self.roots.items():
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if _is_tenant_dir(path, name):
+                    entries = [(os.path.join(path, child), name) for child in os.listdir(path)]
+                else:
+                    entries = [(path, None)]  # Ancienne disposition, sans tenant
+                for entry, tenant in entries:
+                    with contextlib.suppress(OSError):
+                        found[entry] = Artifact(entry, kind, tenant, _disk_size(entry), os.stat(entry).st_mtime)
+        if self.mirrors is not None and os.path.isdir(self.mirrors.root):
+            for prefix in os.listdir(self.mirrors.root):
+                bucket = os.path.join(self.mirrors.root, prefix)
+                if not os.path.isdir(bucket):
+                    continue
+                for name in os.listdir(bucket):
+                    path = os.path.join(bucket, name)
+                    if name.endswith('.git') and os.path.isdir(path):
+                        with contextlib.suppress(OSError):
+                            found[path] = Artifact(path, MIRROR, None, _disk_size(path), os.stat(path).st_mtime)
+        with self._lock:
+            for path, tracked in self._artifacts.items():
+                artifact = found.get(path)
+                if artifact is None:
+                    if os.path.exists(path):
+                        found[path] = tracked  # Suivi pendant le parcours
+                elif tracked.last_used > artifact.last_used:
+                    # Dossier de travail en cours d'utilisation: sa date de suivi prime sur st_mtime
+                    artifact.last_used = tracked.last_used
+            self._artifacts = found
+        return found
+
+    def usage(self, tenant=None):
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+        if tenant is not None:
+            return sum(a.size for a in artifacts if a.tenant == str(tenant))
+        return sum(a.size for a in artifacts)
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.roots[UPLOAD]).free
+
+    # Éviction
+
+    def _protected(self):
+        """Chemins protégés; None s'ils sont illisibles (aucune archive n'est alors évincée)"""
+        try:
+            return set(self.protected())
+        except Exception as e:
+            print(f"⚠️ Stockage: archives protégées illisibles, archives exclues de l'éviction: {e}")
+            return None
+
+    def _evictable(self, protected, now, tenant=None):
+        with self._lock:
+            candidates = [a for a in self._artifacts.values()
+                          if (a.path not in protected if protected is not None else a.kind != UPLOAD)
+                          and now - a.last_used >= self.min_age_s
+                          and (tenant is None or a.tenant == str(tenant))]
+        return sorted(candidates, key=lambda a: a.last_used)
+
+    def _remove(self, artifact, reason):
+        if artifact.kind == MIRROR:
+            if self.mirrors is None or not self.mirrors.evict(artifact.path):
+                return 0  # Miroir verrouillé (clone, fetch ou push en cours)
+            with self._lock:
+                self._artifacts.pop(artifact.path, None)
+        else:
+            self.discard(artifact.path)
+        self.stats[f"evicted_{reason}"] += 1
+        self.stats['evicted_bytes'] += artifact.size
+        return artifact.size
+
+    def _evict_lru(self, needed, reason, protected, tenant=None, all_or_nothing=False):
+        """Évince les artefacts les moins récemment utilisés jusqu'à libérer needed octets"""
+        candidates = self._evictable(protected, time.time(), tenant)
+        if all_or_nothing and sum(a.size for a in candidates) < needed:
+            return 0  # Upload refusé de toute façon: rien n'est supprimé pour rien
+        freed = 0
+        for artifact in candidates:
+            if freed >= needed:
+                break
+            freed += self._remove(artifact, reason)
+        if freed:
+            print(f"🧹 Stockage: {freed / MB:.1f} MB libérés ({reason})")
+        return freed
+
+    def admit_upload(self, tenant, content_length, max_upload):
+        """Avant lecture du corps: place pour l'archive et son extraction, sinon StorageFull"""
+        needed = int((content_length or max_upload) * self.expansion)
+
+        tenant_excess = self.usage(tenant) + needed - self.tenant_max_bytes
+        if tenant_excess > 0:
+            if self._evict_lru(tenant_excess, 'tenant_quota', self._protected(), tenant,
+                               all_or_nothing=True) < tenant_excess:
+                self.stats['refused_tenant_quota'] += 1
+                raise StorageFull(f"Quota de stockage atteint ({self.tenant_max_bytes / MB:.0f} MB par client)")
+
+        excess = max(self.usage() + needed - self.max_bytes, self.min_free_bytes + needed - self.free_bytes())
+        if excess > 0:
+            if self._evict_lru(excess, 'global_quota', self._protected(), all_or_nothing=True) < excess:
+                self.stats['refused_disk_full'] += 1
+                raise StorageFull("Espace disque insuffisant sur le serveur, réessayez plus tard")
+
+    def sweep(self):
+        """Passage du janitor: abandonnés, miroirs inactifs, puis quotas; retourne le rapport"""
+        started = time.time()
+        self.scan()
+        protected = self._protected()
+        removed = collections.Counter()
+        for artifact in self._evictable(protected, started):
+            idle = started - artifact.last_used
+            if artifact.kind == MIRROR and idle >= self.mirror_idle_s:
+                removed['idle_mirrors'] += bool(self._remove(artifact, 'idle'))
+            elif artifact.kind != MIRROR and idle >= self.abandoned_s:
+                removed['abandoned'] += bool(self._remove(artifact, 'abandoned'))
+
+        excess = max(self.usage() - self.max_bytes, self.min_free_bytes - self.free_bytes())
+        if excess > 0:
+            self._evict_lru(excess, 'global_quota', protected)
+        with self._lock:
+            tenants = {a.tenant for a in self._artifacts.values() if a.tenant}
+        for tenant in tenants:
+            tenant_excess = self.usage(tenant) - self.tenant_max_bytes
+            if tenant_excess > 0:
+                self._evict_lru(tenant_excess, 'tenant_quota', protected, tenant)
+
+        self.last_sweep = {
+            'at': started,
+            'duration_ms': round((time.time() - started) * 1000, 1),
+            'removed': dict(removed),
+            'usage_mb': round(self.usage() / MB, 1),
+        }
+        return self.last_sweep
+
+    def start_janitor(self, interval_s=STORAGE_JANITOR_INTERVAL_S):
+        if interval_s <= 0:
+            return
+
+        def _loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"⚠️ Nettoyage du stockage impossible: {e}")
+                time.sleep(interval_s)
+
+        threading.Thread(target=_loop, name='moonops-storage-janitor', daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+        by_kind = collections.defaultdict(lambda: {'count': 0, 'size_mb': 0.0})
+        by_tenant = collections.Counter()
+        for a in artifacts:
+            by_kind[a.kind]['count'] += 1
+            by_kind[a.kind]['size_mb'] += a.size / MB
+            if a.tenant:
+                by_tenant[a.tenant] += a.size
+        for entry in by_kind.values():
+            entry['size_mb'] = round(entry['size_mb'], 1)
+        return {
+            'usage_mb': round(sum(a.size for a in artifacts) / MB, 1),
+            'free_mb': round(self.free_bytes() / MB, 1),
+            'by_kind': dict(by_kind),
+            'top_tenants': [{'client_id': t, 'size_mb': round(size / MB, 1)} for t, size in by_tenant.most_common(10)],
+            'limits': {
+                'max_mb': self.max_bytes // MB,
+                'tenant_max_mb': self.tenant_max_bytes // MB,
+                'min_free_mb': self.min_free_bytes // MB,
+                'abandoned_s': self.abandoned_s,
+                'mirror_idle_s': self.mirror_idle_s,
+            },
+            'last_sweep': self.last_sweep,
+            'stats': dict(self.stats),
+        }
@@ -0,0 +1,313 @@
+"""
+Catalogue des modèles de projet MoonOps (template_type: web, api, mobile)
+Chaque modèle est un dépôt bare pré-construit et pré-compacté (un seul pack),
+versionné et préparé au démarrage: créer un projet pousse le commit du modèle
+tel quel, sans construire d'arbre par requête. Un modèle peut aussi être un
+dépôt existant (ex: projet modèle GitLab), importé via le cache de miroirs.
+"""
+import collections
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+import tracing
+from git_mirror import GitMirrorError, _git_env, run_git
+
+# Configuration (variables d'environnement)
+TEMPLATES_DIR = os.getenv('MOONOPS_TEMPLATES_DIR', '/tmp/moonops_templates')
+# Modèles externes, prioritaires sur les modèles intégrés: "web=https://gitlab/modeles/web.git,api=..."
+TEMPLATE_REPOS = dict(
+    item.strip().split('=', 1) for item in os.getenv('MOONOPS_TEMPLATE_REPOS', '').split(',') if '=' in item
+)
+# Préparation des modèles au démarrage (sinon au premier projet créé)
+TEMPLATE_WARM = os.getenv('MOONOPS_TEMPLATE_WARM', '1').lower() in ('1', 'true', 'yes')
+
+# Date fixe: même contenu → même commit sur tous les workers
+TEMPLATE_COMMITTER = 'MoonOps <moonops@techconsulting.fr> 1704067200 +0000'
+
+_GITLAB_CI = """stages:
+  - build
+  - test
+
+build:
+  stage: build
+  image: node:20-alpine
+  script:
+    - npm ci --ignore-scripts || npm install
+    - npm run build
+
+test:
+  stage: test
+  image: node:20-alpine
+  script:
+    - npm test
+"""
+
+_GITIGNORE = "node_modules/\ndist/\n.env\n*.log\n"
+
+_DOCKERFILE = """FROM node:20-alpine
+WORKDIR /app
+COPY package*.json ./
+RUN npm install --omit=dev
+COPY . .
+RUN npm run build
+EXPOSE 3000
+CMD ["npm", "start"]
+"""
+
+
+def _package_json(name, description):
+    return json.dumps({
+        'name': name,
+        'version': '0.1.0',
+        'private': True,
+        'description': description,
+        'scripts': {
+            'start': 'node src/server.js',
+            'build': 'node scripts/build.js',
+            'test': 'node --test',
+        },
+    }, indent=2) + '\n'
+
+
+_BUILD_SCRIPT = """const fs = require('fs');
+const path = require('path');
+
+// Copie les sources dans dist/ (remplacer par le bundler du projet)
+const dist = path.join(__dirname, '..', 'dist');
+fs.rmSync(dist, { recursive: true, force: true });
+fs.cpSync(path.join(__dirname, '..', 'src'), dist, { recursive: true });
+console.log('Build OK ->', dist);
+"""
+
+_API_SERVER = """const http = require('http');
+
+const routes = {
+  '/health': () => ({ status: 'ok' }),
+  '/api/items': () => ({ items: [] }),
+};
+
+const server = http.createServer((req, res) => {
+  const handler = routes[req.url];
+  res.writeHead(handler ? 200 : 404, { 'Content-Type': 'application/json' });
+  res.end(JSON.stringify(handler ? handler() : { error: 'Not found' }));
+});
+
+if (require.main === module) {
+  server.listen(process.env.PORT || 3000, () => console.log('API prête'));
+}
+
+module.exports = server;
+"""
+
+_WEB_SERVER = """const fs = require('fs');
+const http = require('http');
+const path = require('path');
+
+const publicDir = path.join(__dirname, 'public');
+
+const server = http.createServer((req, res) => {
+  if (req.url === '/health') {
+    res.writeHead(200, { 'Content-Type': 'application/json' });
+    return res.end(JSON.stringify({ status: 'ok' }));
+  }
+  fs.readFile(path.join(publicDir, 'index.html'), (err, html) => {
+    res.writeHead(err ? 500 : 200, { 'Content-Type': 'text/html' });
+    res.end(err ? 'Erreur' : html);
+  });
+});
+
+if (require.main === module) {
+  server.listen(process.env.PORT || 3000, () => console.log('Application web prête'));
+}
+
+module.exports = server;
+"""
+
+_SERVER_TEST = """const assert = require('assert');
+const test = require('node:test');
+const server = require('../src/server');
+
+test('GET /health', async () => {
+  await new Promise((resolve) => server.listen(0, resolve));
+  const { port } = server.address();
+  const res = await fetch(`http://127.0.0.1:${port}/health`);
+  assert.strictEqual(res.status, 200);
+  server.close();
+});
+"""
+
+
+def _readme(label, stack):
+    return f"""# {label}
+
+Projet créé depuis le modèle MoonOps « {label} » ({stack}).
+
+## Démarrage rapide
+
+```bash
+npm install
+npm run build
+npm test
+npm start
+```
+
+Le pipeline `.gitlab-ci.yml` construit et teste le projet à chaque push.
+"""
+
+
+def _common_files(key, label, stack):
+    return {
+        'README.md': _readme(label, stack),
+        '.gitignore': _GITIGNORE,
+        '.gitlab-ci.yml': _GITLAB_CI,
+        'Dockerfile': _DOCKERFILE,
+        'package.json': _package_json(f"moonops-{key}", f"{label} ({stack})"),
+        'scripts/build.js': _BUILD_SCRIPT,
+        'test/server.test.js': _SERVER_TEST,
+    }
+
+
+# Modèles intégrés: incrémenter version quand les fichiers changent
+BUILTIN_TEMPLATES = {
+    'web': {
+        'label': 'Application Web',
+        'stack': 'React + Node.js + PostgreSQL',
+        'version': '1',
+        'files': {
+            'src/server.js': _WEB_SERVER,
+            'src/public/index.html': '<!doctype html>\n<html lang="fr">\n<head><meta charset="utf-8"><title>MoonOps</title></head>\n'
+                                     '<body><div id="root">Application prête</div></body>\n</html>\n',
+        },
+    },
+    'api': {
+        'label': 'API REST',
+        'stack': 'Node.js + Express + MongoDB',
+        'version': '1',
+        'files': {
+            'src/server.js': _API_SERVER,
+        },
+    },
+    'mobile': {
+        'label': 'Application Mobile',
+        'stack': 'React Native + API REST',
+        'version': '1',
+        'files': {
+            'src/server.js': _API_SERVER,
+            'app/App.js': "export default function App() {\n  return null; // Écran d'accueil React Native\n}\n",
+        },
+    },
+}
+
+
+class TemplateCatalog:
+    """Dépôts modèles sous TEMPLATES_DIR/<id>-v<version>-<empreinte>.git"""
+
+    def __init__(self, mirrors, root=TEMPLATES_DIR, builtin=BUILTIN_TEMPLATES, repos=TEMPLATE_REPOS):
+        self.mirrors = mirrors
+        self.root = root
+        self.builtin = builtin
+        self.repos = dict(repos)
+        self._built = {}
+        self._locks = {template_id: threading.Lock() for template_id in builtin}
+        self.stats = collections.Counter()
+
+    def __contains__(self, template_id):
+        return template_id in self.repos or template_id in self.builtin
+
+    def _files(self, template_id):
+        spec = self.builtin[template_id]
+        return dict(_common_files(template_id, spec['label'], spec['stack']), **spec['files'])
+
+    def _repo_path(self, template_id):
+        spec = self.builtin[template_id]
+        digest = hashlib.sha256(json.dumps(self._files(template_id), sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.root, f"{template_id}-v{spec['version']}-{digest[:12]}.git")
+
+    def _build(self, template_id, path):
+        """Dépôt bare: un commit (fast-import, date fixe) puis repack en un seul pack"""
+        spec = self.builtin[template_id]
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            run_git(['init', '--quiet', '--bare', tmp_path])
+            message = f"Modèle MoonOps {template_id} v{spec['version']}".encode()
+            stream = [f"commit refs/heads/main\ncommitter {TEMPLATE_COMMITTER}\n".encode(),
+                      b"data %d\n%s\n" % (len(message), message)]
+            for name, content in sorted(self._files(template_id).items()):
+                data = content.encode()
+                stream.append(f"M 100644 inline {name}\ndata {len(data)}\n".encode() + data + b"\n")
+            result = subprocess.run(['git', 'fast-import', '--quiet'], cwd=tmp_path, input=b''.join(stream),
+                                    capture_output=True, timeout=60, env=_git_env())
+            if result.returncode != 0:
+                raise GitMirrorError(f"git fast-import: {result.stderr.decode(errors='replace').strip()[-500:]}")
+            run_git(['symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=tmp_path)
+            run_git(['repack', '-a', '-d', '-f', '-q'], cwd=tmp_path)
+            run_git(['pack-refs', '--all'], cwd=tmp_path)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                pass  # Construit en parallèle par un autre worker: contenu identique
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def ensure(self, template_id):
+        """Chemin et commit du modèle intégré, construit au premier appel"""
+        with self._locks[template_id]:
+            if template_id in self._built:
+                return self._built[template_id]
+            path = self._repo_path(template_id)
+            if not os.path.isdir(path):
+                os.makedirs(self.root, exist_ok=True)
+                started = time.perf_counter()
+                with tracing.span('template.build', **{'template.id': template_id}):
+                    self._build(template_id, path)
+                self.stats['builds'] += 1
+                print(f"📦 Modèle {template_id} construit en {(time.perf_counter() - started) * 1000:.0f} ms")
+            commit = run_git(['rev-parse', 'refs/heads/main'], cwd=path).strip()
+            self._built[template_id] = (path, commit)
+            return self._built[template_id]
+
+    def warm(self):
+        """Prépare tous les modèles (dépôts intégrés et miroirs des modèles externes)"""
+        for template_id in sorted(set(self.builtin) | set(self.repos)):
+            try:
+                if template_id in self.repos:
+                    self.mirrors.ensure(self.repos[template_id], shallow=True)
+                else:
+                    self.ensure(template_id)
+            except Exception as e:
+                print(f"⚠️ Modèle {template_id} non préparé: {e}")
+
+    def push(self, template_id, push_url):
+        """Pousse le modèle sur main (forcé: remplace le README initial de GitLab)"""
+        if template_id in self.repos:
+            self.mirrors.push(self.repos[template_id], push_url, mode='snapshot')
+            self.stats['pushes'] += 1
+            return {'id': template_id, 'source': 'repository', 'version': None, 'commit': None}
+        path, commit = self.ensure(template_id)
+        with tracing.span('template.push', **{'template.id': template_id}):
+            run_git(['push', '--quiet', '--force', push_url, f"{commit}:refs/heads/main"], cwd=path)
+        self.stats['pushes'] += 1
+        return {'id': template_id, 'source': 'builtin', 'version': self.builtin[template_id]['version'], 'commit': commit}
+
+    def catalog(self):
+        entries = []
+        for template_id in sorted(set(self.builtin) | set(self.repos)):
+            spec = self.builtin.get(template_id, {})
+            built = self._built.get(template_id)
+            entries.append({
+                'id': template_id,
+                'label': spec.get('label', template_id),
+                'stack': spec.get('stack'),
+                'source': 'repository' if template_id in self.repos else 'builtin',
+                'version': None if template_id in self.repos else spec['version'],
+                'commit': built[1] if built and template_id not in self.repos else None,
+                'ready': (os.path.isdir(self.mirrors.mirror_path(self.repos[template_id], shallow=True))
+                          if template_id in self.repos else built is not None),
+            })
+        return entries
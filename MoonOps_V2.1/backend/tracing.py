@@ -0,0 +1,321 @@
+"""
+Traçage léger des requêtes MoonOps
+Spans imbriqués (HTTP, PostgreSQL, GitLab, sous-processus git) avec export
+vers un fichier JSONL local ou un collecteur compatible OTLP/HTTP (JSON)
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+import requests
+
+# Configuration (variables d'environnement)
+TRACE_SAMPLE_RATIO = float(os.getenv('MOONOPS_TRACE_SAMPLE_RATIO', '0'))
+TRACE_FILE = os.getenv('MOONOPS_TRACE_FILE', '')
+TRACE_OTLP_URL = os.getenv('MOONOPS_TRACE_OTLP_URL', '')  # ex: http://localhost:4318/v1/traces
+TRACE_SERVICE_NAME = os.getenv('MOONOPS_TRACE_SERVICE_NAME', 'moonops-backend')
+TRACE_QUEUE_SIZE = 10000
+TRACE_BATCH_SIZE = 256
+
+# Le traçage n'est actif que si un export est configuré et le ratio > 0
+TRACING_ENABLED = TRACE_SAMPLE_RATIO > 0 and bool(TRACE_FILE or TRACE_OTLP_URL)
+
+_current_span = contextvars.ContextVar('moonops_current_span', default=None)
+
+
+class Span:
+    """Un span: une étape chronométrée d'une trace"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start_ns', 'end_ns', 'status', 'error', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'OK'
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = 'ERROR'
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _exporter.submit(self)
+
+    @property
+    def duration_ms(self):
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+    # Utilisation comme context manager: `with tracing.span(...) as sp:`
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """Span inactif: coût quasi nul quand la requête n'est pas échantillonnée"""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Ouvre un span enfant du span courant (no-op hors d'une trace échantillonnée)"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def current_span():
+    """Span courant (ou None)"""
+    return _current_span.get()
+
+
+def current_trace_id():
+    parent = _current_span.get()
+    return parent.trace_id if parent is not None else None
+
+
+def _parse_traceparent(header):
+    """Parse un en-tête W3C traceparent: 00-<trace_id>-<parent_id>-<flags>"""
+    try:
+        version, trace_id, parent_id, flags = header.strip().split('-')
+        if len(trace_id) != 32 or len(parent_id) != 16:
+            return None
+        return trace_id, parent_id, int(flags, 16) & 0x01 == 1
+    except (ValueError, AttributeError):
+        return None
+
+
+def start_trace(name, traceparent=None, **attributes):
+    """
+    Démarre une trace racine (ou continue une trace distante) et l'active
+    dans le contexte courant. Retourne None si la trace n'est pas échantillonnée.
+    """
+    if not TRACING_ENABLED:
+        return None
+
+    trace_id, parent_id, sampled = None, None, None
+    parsed = _parse_traceparent(traceparent) if traceparent else None
+    if parsed:
+        trace_id, parent_id, sampled = parsed
+
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATIO
+    if not sampled:
+        return None
+
+    root = Span(name, trace_id or uuid.uuid4().hex, parent_id, attributes)
+    root._token = _current_span.set(root)
+    return root
+
+
+def end_trace(root, error=None):
+    """Termine la trace racine démarrée par start_trace"""
+    if root is None:
+        return
+    if error is not None:
+        root.record_error(error)
+    try:
+        _current_span.reset(root._token)
+    except ValueError:
+        # Contexte différent (fin de requête dans un autre contexte): on ignore
+        pass
+    root.end()
+
+
+def traceparent():
+    """En-tête traceparent à propager vers un service ou un job en aval"""
+    current = _current_span.get()
+    if current is None:
+        return None
+    return f"00-{current.trace_id}-{current.span_id}-01"
+
+
+def bind(fn):
+    """
+    Attache le contexte de trace courant à une fonction exécutée plus tard
+    (thread, pool, tâche de fond) pour que ses spans restent dans la même trace
+    """
+    ctx = contextvars.copy_context()
+
+    def _run(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+
+    _run.__name__ = getattr(fn, '__name__', '_run')
+    _run.__doc__ = getattr(fn, '__doc__', None)
+    return _run
+
+
+def run_in_background(fn, *args, name=None, **kwargs):
+    """Lance fn dans un thread démon en conservant la trace courante"""
+    def _target():
+        with span(name or f"background {getattr(fn, '__name__', 'job')}"):
+            fn(*args, **kwargs)
+
+    thread = threading.Thread(target=bind(_target), daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================
+# EXPORT
+# ============================================
+
+def _otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            result.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, int):
+            result.append({'key': key, 'value': {'intValue': str(value)}})
+        elif isinstance(value, float):
+            result.append({'key': key, 'value': {'doubleValue': value}})
+        else:
+            result.append({'key': key, 'value': {'stringValue': str(value)}})
+    return result
+
+
+def _otlp_payload(spans):
+    """Encode un lot de spans au format OTLP/HTTP JSON"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': TRACE_SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': 'moonops.tracing'},
+                'spans': [{
+                    'traceId': s.trace_id,
+                    'spanId': s.span_id,
+                    'parentSpanId': s.parent_id or '',
+                    'name': s.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(s.start_ns),
+                    'endTimeUnixNano': str(s.end_ns),
+                    'attributes': _otlp_attributes(s.attributes),
+                    'status': {'code': 2, 'message': s.error or ''} if s.status == 'ERROR' else {'code': 1},
+                } for s in spans]
+            }]
+        }]
+    }
+
+
+class _SpanExporter:
+    """Exporte les spans terminés par lots depuis un thread de fond"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, finished_span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(finished_span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='moonops-trace-exporter', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=0.5))
+                except queue.Empty:
+                    break
+            self._export(batch)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._export(batch)
+
+    def _export(self, batch):
+        if TRACE_FILE:
+            try:
+                with open(TRACE_FILE, 'a') as f:
+                    for s in batch:
+                        f.write(json.dumps(s.to_dict(), default=str) + '\n')
+            except OSError as e:
+                print(f"⚠️ Export des traces vers {TRACE_FILE} impossible: {e}")
+        if TRACE_OTLP_URL:
+            try:
+                requests.post(TRACE_OTLP_URL, json=_otlp_payload(batch), timeout=5)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Collecteur OTLP injoignable ({TRACE_OTLP_URL}): {e}")
+
+
+_exporter = _SpanExporter()
+atexit.register(_exporter.flush)
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+Générateur de jeu de données multi-tenant MoonOps (tests de montée en charge)
+
+Produit des données réalistes et asymétriques pour toutes les tables du schéma
+(quelques très gros tenants, une longue traîne, des métriques en rafales),
+de façon déterministe à partir d'une graine. Le chargement se fait en
+parallèle par COPY, les index secondaires étant reconstruits après le chargement.
+
+Usage:
+    createdb moonops_scaledb && psql -d moonops_scaledb -f database/init.sql
+    python database/generate_dataset.py --dsn "dbname=moonops_scaledb ..." --preset medium
+    python database/generate_dataset.py --preset production --workers 16 --fast
+"""
+import argparse
+import bisect
+import hashlib
+import io
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+
+DEFAULT_DSN = os.getenv(
+    'MOONOPS_SCALE_DSN',
+    "host=127.0.0.1 port=5432 dbname=moonops_scaledb user=moonops_app password=moonops_app_2026!"
+)
+
+# Volumes par préréglage (surchargables individuellement en ligne de commande)
+PRESETS = {
+    'small': dict(tenants=20, projects=500, deployments=20_000, metrics=500_000),
+    'medium': dict(tenants=200, projects=10_000, deployments=1_000_000, metrics=20_000_000),
+    'production': dict(tenants=1_000, projects=100_000, deployments=10_000_000, metrics=1_000_000_000),
+}
+
+ROWS_PER_TASK = 200_000
+METRIC_NAMES = ('cpu_usage', 'memory_usage', 'response_time')
+ENV_NAMES = ('DEVELOPMENT', 'STAGING', 'PRODUCTION')
+TEMPLATES = ('web', 'api', 'mobile')
+# Hash bcrypt de 'demo2026' (identique aux comptes de démo de init.sql)
+DEMO_PASSWORD_HASH = '$2b$12$FQubdzAi63yC.bObtJUZB.Ssmgn2x6lnhnvALuvrWqPRzivowrfue'
+
+# Ordre de chargement: chaque étape dépend des précédentes (clés étrangères)
+STAGES = [
+    ('clients',),
+    ('users', 'projects', 'invoices'),
+    ('environments', 'audit_logs'),
+    ('pipelines',),
+    ('deployments', 'alerts', 'metrics'),
+]
+
+COLUMNS = {
+    'clients': ('id', 'name', 'slug', 'website', 'created_at'),
+    'users': ('id', 'client_id', 'email', 'full_name', 'password_hash', 'role', 'is_active', 'created_at'),
+    'projects': ('id', 'client_id', 'name', 'description', 'template_type', 'status',
+                 'repository_url', 'created_at', 'last_deployed_at'),
+    'invoices': ('id', 'client_id', 'amount', 'currency', 'status',
+                 'billing_period_start', 'billing_period_end', 'issued_at', 'paid_at'),
+    'environments': ('id', 'project_id', 'client_id', 'name', 'url', 'status', 'created_at'),
+    'audit_logs': ('id', 'client_id', 'actor_id', 'action', 'resource_type', 'resource_id', 'ip_address', 'created_at'),
+    'pipelines': ('id', 'project_id', 'client_id', 'triggered_by', 'branch', 'commit_sha', 'status',
+                  'started_at', 'finished_at', 'duration_seconds'),
+    'deployments': ('id', 'pipeline_id', 'project_id', 'client_id', 'environment_id', 'version_tag',
+                    'status', 'deployed_at', 'health_check_passed'),
+    'alerts': ('id', 'project_id', 'client_id', 'severity', 'message', 'status', 'created_at', 'resolved_at',
+               'last_seen_at'),
+    'metrics': ('project_id', 'client_id', 'metric_name', 'value', 'timestamp'),
+}
+
+NULL = '\\N'
+
+
+def allocate(total, weights, minimum=0):
+    """Répartit total proportionnellement aux poids (plus forts restes), avec un minimum par case"""
+    n = len(weights)
+    if total < n * minimum:
+        minimum = 0
+    remaining = total - n * minimum
+    weight_sum = sum(weights)
+    shares = [remaining * w / weight_sum for w in weights]
+    counts = [minimum + int(s) for s in shares]
+    leftover = total - sum(counts)
+    by_fraction = sorted(range(n), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_fraction[:leftover]:
+        counts[i] += 1
+    return counts
+
+
+def starts_of(counts):
+    """Index de départ de chaque case ([0, c0, c0+c1, ...])"""
+    return [0] + list(itertools.accumulate(counts))
+
+
+class DatasetModel:
+    """
+    Structure globale du jeu de données, recalculée à l'identique dans chaque
+    processus à partir de la graine (aucun état partagé entre workers)
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.seed = cfg['seed']
+        self.anchor = datetime.fromisoformat(cfg['anchor'])
+        rng = random.Random(f"{self.seed}:model")
+
+        # Tenants: loi de Pareto (80/20) -> quelques gros, longue traîne
+        self.tenant_weights = [rng.paretovariate(1.16) for _ in range(cfg['tenants'])]
+        self.project_counts = allocate(cfg['projects'], self.tenant_weights, minimum=1)
+        self.project_starts = starts_of(self.project_counts)
+        self.user_counts = allocate(cfg['users'], self.tenant_weights, minimum=1)
+        self.user_starts = starts_of(self.user_counts)
+
+        # Activité par projet (déploiements, alertes, métriques)
+        project_weights = [rng.paretovariate(1.5) for _ in range(cfg['projects'])]
+        self.project_cum_weights = list(itertools.accumulate(project_weights))
+        self.metric_counts = allocate(cfg['metrics'], project_weights)
+        self.env_counts = [1 + rng.randrange(3) for _ in range(cfg['projects'])]
+        self.pipeline_total = max(cfg['pipelines'], cfg['deployments'])
+
+        self._tenant_ids = [self.uuid('client', t) for t in range(cfg['tenants'])]
+        self._project_ids = [self.uuid('project', p) for p in range(cfg['projects'])]
+
+    def uuid(self, kind, index):
+        digest = hashlib.blake2b(f"{self.seed}:{kind}:{index}".encode(), digest_size=16).digest()
+        return str(uuid.UUID(bytes=digest, version=4))
+
+    def tenant_id(self, t):
+        return self._tenant_ids[t]
+
+    def project_id(self, p):
+        return self._project_ids[p]
+
+    def tenant_of_project(self, p):
+        return bisect.bisect_right(self.project_starts, p) - 1
+
+    def tenant_user_id(self, t, rng):
+        return self.uuid('user', self.user_starts[t] + rng.randrange(self.user_counts[t]))
+
+    def env_id(self, p, j):
+        return self.uuid('env', p * 3 + j)
+
+    def ts(self, seconds_ago):
+        return (self.anchor - timedelta(seconds=seconds_ago)).isoformat()
+
+    def recent_seconds(self, rng, days):
+        """Âge aléatoire biaisé vers le récent (activité croissante)"""
+        return rng.random() ** 2 * days * 86400
+
+    def tasks(self, table):
+        """Découpe une table en tâches (table, début, fin) de taille bornée"""
+        cfg = self.cfg
+        if table == 'metrics':
+            # Découpage par plages de projets pour garder chaque série contiguë
+            tasks, start, rows = [], 0, 0
+            for p, count in enumerate(self.metric_counts):
+                rows += count
+                if rows >= ROWS_PER_TASK:
+                    tasks.append((table, start, p + 1))
+                    start, rows = p + 1, 0
+            if start < len(self.metric_counts):
+                tasks.append((table, start, len(self.metric_counts)))
+            return tasks
+        totals = {
+            'clients': cfg['tenants'],
+            'users': cfg['users'],
+            'projects': cfg['projects'],
+            'invoices': cfg['tenants'],
+            'environments': cfg['projects'],
+            'audit_logs': cfg['audit_logs'],
+            'pipelines': self.pipeline_total,
+            'deployments': self.pipeline_total,
+            'alerts': cfg['alerts'],
+        }
+        total = totals[table]
+        return [(table, s, min(s + ROWS_PER_TASK, total)) for s in range(0, total, ROWS_PER_TASK)]
+
+
+# ============================================
+# GÉNÉRATEURS DE LIGNES (une ligne COPY texte par tuple)
+# ============================================
+
+def gen_clients(m, start, end):
+    for t in range(start, end):
+        rng = random.Random(f"{m.seed}:client:{t}")
+        yield (m.tenant_id(t), f"Tenant {t:05d}", f"gen-tenant-{t}", f"https://tenant{t}.example.com",
+               m.ts(365 * 86400 + rng.random() * 365 * 86400))
+
+
+def gen_users(m, start, end):
+    roles = ('ADMIN', 'DEVELOPER', 'DEVELOPER', 'DEVELOPER', 'VIEWER')
+    for u in range(start, end):
+        t = bisect.bisect_right(m.user_starts, u) - 1
+        rng = random.Random(f"{m.seed}:user:{u}")
+        first = u == m.user_starts[t]
+        yield (m.uuid('user', u), m.tenant_id(t), f"user{u}@tenant{t}.example.com", f"User {u}",
+               DEMO_PASSWORD_HASH, 'ADMIN' if first else rng.choice(roles),
+               't' if rng.random() > 0.05 else 'f', m.ts(rng.random() * 365 * 86400))
+
+
+def gen_projects(m, start, end):
+    statuses = ('ACTIVE', 'ACTIVE', 'ACTIVE', 'PENDING', 'MAINTENANCE', 'ARCHIVED')
+    for p in range(start, end):
+        rng = random.Random(f"{m.seed}:project:{p}")
+        t = m.tenant_of_project(p)
+        status = rng.choice(statuses)
+        yield (m.project_id(p), m.tenant_id(t), f"project-{p}", f"Projet généré {p} du tenant {t}",
+               rng.choice(TEMPLATES), status, f"https://gitlab.example.com/tenant{t}/project-{p}.git",
+               m.ts(rng.random() * 365 * 86400),
+               m.ts(rng.random() * 30 * 86400) if status == 'ACTIVE' else NULL)
+
+
+def gen_invoices(m, start, end):
+    for t in range(start, end):
+        rng = random.Random(f"{m.seed}:invoice:{t}")
+        for month in range(12):
+            period_end = (m.anchor - timedelta(days=30 * month)).date()
+            period_start = period_end - timedelta(days=30)
+            paid = month > 0 and rng.random() > 0.1
+            amount = round(m.project_counts[t] * rng.uniform(20, 200), 2)
+            yield (m.uuid('invoice', t * 12 + month), m.tenant_id(t), f"{amount:.2f}", 'EUR',
+                   'PAID' if paid else ('OVERDUE' if month > 1 else 'PENDING'),
+                   period_start.isoformat(), period_end.isoformat(), m.ts(30 * month * 86400),
+                   m.ts(30 * month * 86400 - 5 * 86400) if paid else NULL)
+
+
+def gen_environments(m, start, end):
+    for p in range(start, end):
+        t = m.tenant_of_project(p)
+        for j in range(m.env_counts[p]):
+            name = ENV_NAMES[j]
+            yield (m.env_id(p, j), m.project_id(p), m.tenant_id(t), name,
+                   f"https://{name.lower()}-project-{p}.moonops.app", 'RUNNING', m.ts(300 * 86400))
+
+
+def gen_audit_logs(m, start, end):
+    actions = ('LOGIN', 'CREATE_PROJECT', 'DEPLOY', 'DELETE_PROJECT', 'UPDATE_SETTINGS')
+    tenant_cum = list(itertools.accumulate(m.tenant_weights))
+    for i in range(start, end):
+        rng = random.Random(f"{m.seed}:audit:{i}")
+        t = rng.choices(range(len(tenant_cum)), cum_weights=tenant_cum)[0]
+        p = m.project_starts[t] + rng.randrange(m.project_counts[t])
+        yield (m.uuid('audit', i), m.tenant_id(t), m.tenant_user_id(t, rng), rng.choice(actions), 'project',
+               m.project_id(p), f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}",
+               m.ts(m.recent_seconds(rng, 180)))
+
+
+def _pipeline_draw(m, rng):
+    """Tirage commun pipeline/déploiement (même projet, environnement, instant)"""
+    p = rng.choices(range(len(m.project_cum_weights)), cum_weights=m.project_cum_weights)[0]
+    return p, rng.randrange(m.env_counts[p]), m.recent_seconds(rng, 180), rng.random()
+
+
+def gen_pipelines(m, start, end):
+    n_pipelines = m.cfg['pipelines']
+    for i in range(start, min(end, n_pipelines)):
+        rng = random.Random(f"{m.seed}:pipeline:{i}")
+        p, _, age, outcome = _pipeline_draw(m, rng)
+        t = m.tenant_of_project(p)
+        duration = int(60 + rng.random() * 1200)
+        status = 'FAILED' if outcome < 0.08 else ('RUNNING' if age < 900 else 'SUCCESS')
+        yield (m.uuid('pipeline', i), m.project_id(p), m.tenant_id(t), m.tenant_user_id(t, rng),
+               rng.choice(('main', 'main', 'main', 'develop', f"feature/f{i % 97}")),
+               hashlib.sha1(f"{m.seed}:{i}".encode()).hexdigest(), status,
+               m.ts(age), NULL if status == 'RUNNING' else m.ts(age - duration),
+               NULL if status == 'RUNNING' else str(duration))
+
+
+def gen_deployments(m, start, end):
+    n_pipelines, n_deployments = m.cfg['pipelines'], m.cfg['deployments']
+    for i in range(start, min(end, n_deployments)):
+        rng = random.Random(f"{m.seed}:pipeline:{i}")
+        p, j, age, outcome = _pipeline_draw(m, rng)
+        t = m.tenant_of_project(p)
+        status = 'FAILED' if outcome < 0.08 else ('ROLLED_BACK' if outcome < 0.1 else 'SUCCESS')
+        yield (m.uuid('deployment', i), m.uuid('pipeline', i) if i < n_pipelines else NULL,
+               m.project_id(p), m.tenant_id(t), m.env_id(p, j), f"v{1 + i % 5}.{i % 100}.{i % 1000}",
+               status, m.ts(age), 'f' if status != 'SUCCESS' else 't')
+
+
+def gen_alerts(m, start, end):
+    severities = ('INFO', 'WARNING', 'WARNING', 'CRITICAL')
+    for i in range(start, end):
+        rng = random.Random(f"{m.seed}:alert:{i}")
+        p = rng.choices(range(len(m.project_cum_weights)), cum_weights=m.project_cum_weights)[0]
+        t = m.tenant_of_project(p)
+        age = m.recent_seconds(rng, 90)
+        active = age < 86400 and rng.random() < 0.5
+        metric = rng.choice(METRIC_NAMES)
+        yield (m.uuid('alert', i), m.project_id(p), m.tenant_id(t), rng.choice(severities),
+               f"Seuil dépassé sur {metric} (project-{p})", 'ACTIVE' if active else 'RESOLVED',
+               m.ts(age), NULL if active else m.ts(age - rng.random() * 3600), m.ts(age))
+
+
+def gen_metrics(m, start, end):
+    """Séries par projet: cycle journalier, bruit et rafales (machine à deux états)"""
+    window = m.cfg['metric_days'] * 86400
+    for p in range(start, end):
+        count = m.metric_counts[p]
+        if count == 0:
+            continue
+        rng = random.Random(f"{m.seed}:metrics:{p}")
+        project_id, client_id = m.project_id(p), m.tenant_id(m.tenant_of_project(p))
+        per_metric = allocate(count, [1] * len(METRIC_NAMES))
+        for metric_name, n in zip(METRIC_NAMES, per_metric):
+            if n == 0:
+                continue
+            base = rng.uniform(10, 60)
+            step = window / n
+            burst = False
+            for k in range(n):
+                age = window - k * step - rng.random() * step
+                if burst:
+                    burst = rng.random() > 0.05
+                else:
+                    burst = rng.random() < 0.002
+                diurnal = 1 + 0.3 * math.sin(2 * math.pi * (age % 86400) / 86400)
+                value = base * diurnal * (rng.uniform(2, 4) if burst else 1) + rng.gauss(0, base * 0.05)
+                yield (project_id, client_id, metric_name, f"{max(value, 0):.3f}", m.ts(max(age, 0)))
+
+
+GENERATORS = {
+    'clients': gen_clients,
+    'users': gen_users,
+    'projects': gen_projects,
+    'invoices': gen_invoices,
+    'environments': gen_environments,
+    'audit_logs': gen_audit_logs,
+    'pipelines': gen_pipelines,
+    'deployments': gen_deployments,
+    'alerts': gen_alerts,
+    'metrics': gen_metrics,
+}
+
+
+# ============================================
+# CHARGEMENT PARALLÈLE
+# ============================================
+
+_worker_model = None
+_worker_cfg = None
+
+
+def _init_worker(cfg):
+    global _worker_model, _worker_cfg
+    _worker_cfg = cfg
+    _worker_model = DatasetModel(cfg)
+
+
+def _copy_buffer(cur, table, buffer):
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN", buffer)
+
+
+def load_task(task):
+    """Génère et charge une tâche (table, début, fin) par COPY; retourne le nombre de lignes"""
+    table, start, end = task
+    conn = psycopg2.connect(_worker_cfg['dsn'])
+    rows = 0
+    try:
+        with conn.cursor() as cur:
+            if _worker_cfg['fast']:
+                # Désactive triggers et contrôles de clés étrangères (superutilisateur)
+                cur.execute("SET session_replication_role = replica")
+            buffer = io.StringIO()
+            for row in GENERATORS[table](_worker_model, start, end):
+                buffer.write('\t'.join(row))
+                buffer.write('\n')
+                rows += 1
+                if rows % 50_000 == 0:
+                    _copy_buffer(cur, table, buffer)
+                    buffer = io.StringIO()
+            _copy_buffer(cur, table, buffer)
+        conn.commit()
+    finally:
+        conn.close()
+    return table, rows
+
+
+def secondary_indexes(conn, tables):
+    """Index secondaires (hors clés primaires/uniques) des tables à charger"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indexname, i.indexdef
+            FROM pg_indexes i
+            WHERE i.schemaname = 'public' AND i.tablename = ANY(%s)
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_constraint c
+                WHERE c.conindid = format('%%I.%%I', i.schemaname, i.indexname)::regclass
+            )
+            ORDER BY i.indexname
+        """, (list(tables),))
+        return cur.fetchall()
+
+
+def _create_index(args):
+    dsn, name, definition = args
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET maintenance_work_mem = '512MB'")
+            started = time.perf_counter()
+            cur.execute(definition)
+        return name, time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Générateur de données multi-tenant MoonOps")
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anchor', help="Instant de référence ISO (défaut: minuit UTC du jour)")
+    parser.add_argument('--tenants', type=int)
+    parser.add_argument('--projects', type=int)
+    parser.add_argument('--deployments', type=int)
+    parser.add_argument('--pipelines', type=int, help="Défaut: autant que de déploiements")
+    parser.add_argument('--alerts', type=int, help="Défaut: déploiements / 20")
+    parser.add_argument('--metrics', type=int)
+    parser.add_argument('--metric-days', type=int, default=7)
+    parser.add_argument('--users', type=int, help="Défaut: 5 par tenant")
+    parser.add_argument('--audit-logs', type=int, help="Défaut: 50 par tenant")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--fast', action='store_true',
+                        help="session_replication_role=replica pendant le COPY (superutilisateur requis)")
+    parser.add_argument('--keep-indexes', action='store_true', help="Ne pas supprimer/reconstruire les index")
+    parser.add_argument('--force', action='store_true', help="Autoriser l'écriture dans moonops_appdb")
+    args = parser.parse_args()
+
+    cfg = dict(PRESETS[args.preset])
+    for key in ('tenants', 'projects', 'deployments', 'metrics'):
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+    cfg['pipelines'] = args.pipelines if args.pipelines is not None else cfg['deployments']
+    cfg['alerts'] = args.alerts if args.alerts is not None else cfg['deployments'] // 20
+    cfg['users'] = args.users if args.users is not None else cfg['tenants'] * 5
+    # Chaque tenant a au moins un projet et un utilisateur
+    cfg['projects'] = max(cfg['projects'], cfg['tenants'])
+    cfg['users'] = max(cfg['users'], cfg['tenants'])
+    cfg['audit_logs'] = args.audit_logs if args.audit_logs is not None else cfg['tenants'] * 50
+    cfg['metric_days'] = args.metric_days
+    cfg['seed'] = args.seed
+    cfg['anchor'] = args.anchor or datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0).isoformat()
+    cfg['dsn'] = args.dsn
+    cfg['fast'] = args.fast
+    return args, cfg
+
+
+def main():
+    args, cfg = parse_args()
+    if 'moonops_appdb' in cfg['dsn'] and not args.force:
+        print("❌ Refus d'écrire dans moonops_appdb (utiliser une base dédiée ou --force)")
+        return False
+
+    print("🏭 Générateur de données MoonOps")
+    print("=" * 50)
+    print(f"🎲 Graine {cfg['seed']}, ancre {cfg['anchor']}, {args.workers} workers")
+    print(f"📦 {cfg['tenants']} tenants, {cfg['projects']} projets, {cfg['deployments']} déploiements, "
+          f"{cfg['metrics']} points de métriques")
+
+    model = DatasetModel(cfg)
+    tables = [t for stage in STAGES for t in stage]
+
+    conn = psycopg2.connect(cfg['dsn'])
+    indexes = [] if args.keep_indexes else secondary_indexes(conn, tables)
+    if indexes:
+        with conn.cursor() as cur:
+            for name, _ in indexes:
+                cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        conn.commit()
+        print(f"🗑️ {len(indexes)} index secondaires supprimés avant chargement")
+
+    started = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(cfg,)) as pool:
+            for stage in STAGES:
+                tasks = [task for table in stage for task in model.tasks(table)]
+                stage_started = time.perf_counter()
+                totals = dict.fromkeys(stage, 0)
+                for table, rows in pool.imap_unordered(load_task, tasks):
+                    totals[table] += rows
+                elapsed = time.perf_counter() - stage_started
+                for table, rows in totals.items():
+                    print(f"✅ {table}: {rows:,} lignes")
+                print(f"   ⏱️ étape {', '.join(stage)} en {elapsed:.1f}s")
+    finally:
+        if indexes:
+            print(f"🔨 Reconstruction de {len(indexes)} index...")
+            with multiprocessing.Pool(min(args.workers, len(indexes))) as pool:
+                jobs = [(cfg['dsn'], name, definition) for name, definition in indexes]
+                for name, elapsed in pool.imap_unordered(_create_index, jobs):
+                    print(f"   ✅ {name} ({elapsed:.1f}s)")
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("VACUUM (ANALYZE)")
+    conn.close()
+
+    print("=" * 50)
+    print(f"🎉 Jeu de données chargé en {time.perf_counter() - started:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
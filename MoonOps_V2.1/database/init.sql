@@ -56,64 +56,98 @@ CREATE TABLE projects (
     status project_status NOT NULL DEFAULT 'PENDING',
     repository_url TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    last_deployed_at TIMESTAMP WITH TIME ZONE
+    last_deployed_at TIMESTAMP WITH TIME ZONE,
+    -- Repository GitLab: PENDING si créé pendant une panne GitLab (réconciliateur de l'API)
+    provisioning_state VARCHAR(20) NOT NULL DEFAULT 'READY'
+        CHECK (provisioning_state IN ('PENDING', 'READY', 'FAILED')),
+    provisioning_request JSONB,
+    provisioning_attempts INT NOT NULL DEFAULT 0,
+    provisioning_error TEXT,
+    imported_commit CHAR(40), -- Dernier commit poussé par un upload (POST /api/projects/<id>/upload)
+    UNIQUE (id, client_id) -- Cible des clés étrangères (project_id, client_id) des tables filles
 );
 
+-- Les tables filles de projects portent aussi client_id (dénormalisé) :
+-- RLS et filtres applicatifs en égalité directe, sans sous-requête sur projects.
+-- La clé étrangère composite (project_id, client_id) garantit la cohérence,
+-- le trigger set_client_id_from_project() remplit client_id à l'insertion.
+
 -- 4. ENVIRONMENTS
 CREATE TABLE environments (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
     name TEXT NOT NULL, -- 'DEVELOPMENT', 'STAGING', 'PRODUCTION'
     url TEXT,
     status environment_status DEFAULT 'STOPPED', -- RUNNING, STOPPED, ERROR
     config_json JSONB DEFAULT '{}', -- Environment specific variables
     is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE,
+    UNIQUE (project_id, name) -- Un seul environnement de chaque type par projet
 );
 
 -- 5. PIPELINES
 CREATE TABLE pipelines (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
     triggered_by UUID REFERENCES users(id),
     branch TEXT NOT NULL,
     commit_sha TEXT,
     status pipeline_status NOT NULL DEFAULT 'RUNNING',
     started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     finished_at TIMESTAMP WITH TIME ZONE,
-    duration_seconds INTEGER
+    duration_seconds INTEGER,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
 -- 6. DEPLOYMENTS
 CREATE TABLE deployments (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     pipeline_id UUID REFERENCES pipelines(id) ON DELETE SET NULL,
-    project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
     environment_id UUID NOT NULL REFERENCES environments(id) ON DELETE CASCADE,
     version_tag TEXT NOT NULL,
     status deployment_status NOT NULL,
     deployed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    health_check_passed BOOLEAN DEFAULT TRUE
+    health_check_passed BOOLEAN DEFAULT TRUE,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
 -- 7. MONITORING ALERTS
 CREATE TABLE alerts (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
     severity alert_severity NOT NULL,
     message TEXT NOT NULL,
     status alert_status NOT NULL DEFAULT 'ACTIVE',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    resolved_at TIMESTAMP WITH TIME ZONE
+    resolved_at TIMESTAMP WITH TIME ZONE,
+    rule_id UUID, -- Règle d'origine (moteur d'alertes, section 13); NULL: alerte manuelle
+    -- Déduplication: une alerte par problème (empreinte projet + règle + labels),
+    -- les répétitions incrémentent occurrences et last_seen_at (created_at: première occurrence)
+    fingerprint TEXT,
+    labels JSONB NOT NULL DEFAULT '{}',
+    occurrences INTEGER NOT NULL DEFAULT 1,
+    last_seen_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    acknowledged_at TIMESTAMP WITH TIME ZONE,
+    -- Regroupement des tempêtes: même règle sur plusieurs projets, sinon même projet
+    group_key TEXT GENERATED ALWAYS AS (COALESCE('rule:' || rule_id::text, 'project:' || project_id::text)) STORED,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
 -- 8. PROJECT METRICS (Time-series data vibe)
 CREATE TABLE metrics (
     id BIGSERIAL PRIMARY KEY,
-    project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
     metric_name TEXT NOT NULL, -- 'cpu_usage', 'memory_usage', 'latency'
     value DOUBLE PRECISION NOT NULL,
-    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
 -- 9. BILLING & INVOICES
@@ -142,17 +176,185 @@ CREATE TABLE audit_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 11. TENANT SHARDS (Catalogue)
+-- Shard PostgreSQL de chaque tenant (backend/sharding.py); un tenant absent est sur "main".
+-- state = 'moving' pendant database/move_tenant.py: écritures refusées (HTTP 503).
+CREATE TABLE tenant_shards (
+    client_id UUID PRIMARY KEY REFERENCES clients(id) ON DELETE CASCADE,
+    shard VARCHAR(50) NOT NULL DEFAULT 'main',
+    state VARCHAR(20) NOT NULL DEFAULT 'active' CHECK (state IN ('active', 'moving')),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 12. PROJECT FILES (Manifeste du dernier import)
+-- Empreinte Git (blob SHA-1) de chaque fichier du dernier ZIP importé: un nouvel
+-- upload ne pousse que les fichiers modifiés.
+CREATE TABLE project_files (
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
+    path TEXT NOT NULL,
+    blob_sha CHAR(40) NOT NULL,
+    mode VARCHAR(6) NOT NULL DEFAULT '100644',
+    size BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, path),
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- 13. ALERT RULES (Moteur d'alertes incrémental, backend/alert_engine.py)
+-- Évaluées à l'ingestion des métriques (POST /api/metrics) sur une fenêtre glissante.
+-- project_id NULL: la règle s'applique à tous les projets du tenant.
+CREATE TABLE alert_rules (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    project_id UUID,
+    name TEXT NOT NULL,
+    metric_name TEXT NOT NULL,
+    kind VARCHAR(20) NOT NULL DEFAULT 'threshold' CHECK (kind IN ('threshold', 'rate', 'absence')),
+    aggregation VARCHAR(10) NOT NULL DEFAULT 'avg' CHECK (aggregation IN ('avg', 'max', 'min', 'last')),
+    comparator VARCHAR(2) NOT NULL DEFAULT '>' CHECK (comparator IN ('>', '>=', '<', '<=')),
+    threshold DOUBLE PRECISION NOT NULL DEFAULT 0,
+    clear_threshold DOUBLE PRECISION, -- Seuil de retour (hystérésis); NULL: le seuil
+    window_s INTEGER NOT NULL DEFAULT 60 CHECK (window_s > 0),
+    for_s INTEGER NOT NULL DEFAULT 0 CHECK (for_s >= 0),
+    severity alert_severity NOT NULL DEFAULT 'WARNING',
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+ALTER TABLE alerts ADD CONSTRAINT alerts_rule_id_fkey
+    FOREIGN KEY (rule_id) REFERENCES alert_rules(id) ON DELETE SET NULL;
+
+-- 14. METRIC CHUNKS (Métriques anciennes compressées, backend/metric_chunks.py)
+-- Les points de metrics plus anciens que MOONOPS_METRICS_COMPACT_AFTER_H sont déplacés,
+-- par série et par tranche de temps, dans un bytea encodé façon Gorilla (delta de delta
+-- des horodatages, XOR des valeurs): ~10 octets par point au lieu de ~150 (ligne + index).
+-- metric_names: dictionnaire des noms de métriques du shard, partagé par les tenants.
+CREATE TABLE metric_names (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE metric_chunks (
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
+    metric_id INTEGER NOT NULL REFERENCES metric_names(id),
+    start_at TIMESTAMP WITH TIME ZONE NOT NULL, -- Début de la tranche (MOONOPS_METRICS_CHUNK_S)
+    end_at TIMESTAMP WITH TIME ZONE NOT NULL, -- Dernier point
+    points INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (project_id, metric_id, start_at),
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+-- Déjà compressé: pas de compression TOAST
+ALTER TABLE metric_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
+
 -- ==========================================
 -- INDEXES FOR PERFORMANCE & ISOLATION
 -- ==========================================
 CREATE INDEX idx_users_client_id ON users(client_id);
 CREATE INDEX idx_projects_client_id ON projects(client_id);
-CREATE INDEX idx_pipelines_project_id ON pipelines(project_id);
+CREATE INDEX idx_pipelines_project_started ON pipelines(project_id, started_at DESC);
 CREATE INDEX idx_deployments_project_id ON deployments(project_id);
+CREATE INDEX idx_deployments_environment_id ON deployments(environment_id);
+CREATE INDEX idx_deployments_pipeline_id ON deployments(pipeline_id);
 CREATE INDEX idx_alerts_project_id ON alerts(project_id);
 CREATE INDEX idx_metrics_project_timestamp ON metrics(project_id, timestamp DESC);
 CREATE INDEX idx_invoices_client_id ON invoices(client_id);
 
+-- Index des requêtes chaudes hors tenant (vues globales, dernier pipeline d'un projet)
+-- Vérifiés par Script_test/test_query_plans.py
+CREATE INDEX idx_alerts_active_created ON alerts(created_at DESC) WHERE status = 'ACTIVE';
+CREATE INDEX idx_deployments_deployed_at ON deployments(deployed_at DESC);
+CREATE INDEX idx_pipelines_started_at ON pipelines(started_at DESC);
+-- Projets en attente de repository GitLab (réconciliateur de l'API)
+CREATE INDEX idx_projects_provisioning_pending ON projects(created_at)
+    WHERE provisioning_state = 'PENDING';
+-- Une seule alerte non résolue par empreinte: ouverture idempotente entre workers
+CREATE UNIQUE INDEX idx_alerts_fingerprint_open ON alerts(client_id, fingerprint)
+    WHERE fingerprint IS NOT NULL AND status <> 'RESOLVED';
+-- Réouverture d'une alerte résolue récemment (service instable)
+CREATE INDEX idx_alerts_fingerprint_resolved ON alerts(client_id, fingerprint, resolved_at DESC)
+    WHERE fingerprint IS NOT NULL;
+CREATE INDEX idx_alerts_client_open_group ON alerts(client_id, group_key)
+    WHERE status <> 'RESOLVED';
+CREATE INDEX idx_alert_rules_client_id ON alert_rules(client_id) WHERE enabled;
+-- Lecture de l'historique d'un projet (chunks recouvrant la fenêtre)
+CREATE INDEX idx_metric_chunks_project_end ON metric_chunks(project_id, end_at);
+
+-- Index tenant-first couvrants : un par route de liste/compteur
+-- (WHERE client_id = ? ORDER BY ... DESC LIMIT n -> Index Only Scan)
+CREATE INDEX idx_projects_client_created ON projects(client_id, created_at DESC)
+    INCLUDE (status);
+CREATE INDEX idx_environments_client_id ON environments(client_id);
+CREATE INDEX idx_deployments_client_deployed ON deployments(client_id, deployed_at DESC)
+    INCLUDE (project_id, environment_id, version_tag, status);
+CREATE INDEX idx_pipelines_client_started ON pipelines(client_id, started_at DESC)
+    INCLUDE (project_id, branch, status, finished_at);
+CREATE INDEX idx_alerts_client_active_seen ON alerts(client_id, last_seen_at DESC)
+    INCLUDE (project_id, severity, message, created_at, resolved_at, occurrences, group_key)
+    WHERE status = 'ACTIVE';
+
+-- ==========================================
+-- TENANT KEY CONSISTENCY
+-- ==========================================
+
+-- Remplit client_id depuis le projet parent quand l'insertion ne le fournit pas
+-- (ou quand la ligne change de projet). Une valeur fournie est vérifiée par la
+-- clé étrangère composite.
+CREATE OR REPLACE FUNCTION set_client_id_from_project() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.client_id IS NULL
+       OR (TG_OP = 'UPDATE' AND NEW.project_id IS DISTINCT FROM OLD.project_id) THEN
+        SELECT p.client_id INTO NEW.client_id FROM projects p WHERE p.id = NEW.project_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_environments_client_id BEFORE INSERT OR UPDATE OF project_id ON environments
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_pipelines_client_id BEFORE INSERT OR UPDATE OF project_id ON pipelines
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_deployments_client_id BEFORE INSERT OR UPDATE OF project_id ON deployments
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_alerts_client_id BEFORE INSERT OR UPDATE OF project_id ON alerts
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_metrics_client_id BEFORE INSERT OR UPDATE OF project_id ON metrics
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_project_files_client_id BEFORE INSERT OR UPDATE OF project_id ON project_files
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+
+-- ==========================================
+-- RESULT CACHE INVALIDATION
+-- ==========================================
+
+-- Notifie le client_id modifié sur le canal moonops_cache: chaque worker de l'API
+-- invalide les résultats en cache du tenant (backend/result_cache.py).
+-- PostgreSQL fusionne les notifications identiques d'une même transaction.
+-- Pas de trigger sur metrics (non mises en cache, volume d'insertion élevé).
+CREATE OR REPLACE FUNCTION notify_tenant_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('moonops_cache', OLD.client_id::text);
+    ELSE
+        PERFORM pg_notify('moonops_cache', NEW.client_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_projects_cache AFTER INSERT OR UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+CREATE TRIGGER trg_environments_cache AFTER INSERT OR UPDATE OR DELETE ON environments
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+CREATE TRIGGER trg_pipelines_cache AFTER INSERT OR UPDATE OR DELETE ON pipelines
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+CREATE TRIGGER trg_deployments_cache AFTER INSERT OR UPDATE OR DELETE ON deployments
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+CREATE TRIGGER trg_alerts_cache AFTER INSERT OR UPDATE OR DELETE ON alerts
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+
 -- ==========================================
 -- ROW LEVEL SECURITY (RLS) CONFIGURATION
 -- Strict isolation per client_id
@@ -173,6 +375,9 @@ ALTER TABLE alerts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE metrics ENABLE ROW LEVEL SECURITY;
 ALTER TABLE invoices ENABLE ROW LEVEL SECURITY;
 ALTER TABLE audit_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE project_files ENABLE ROW LEVEL SECURITY;
+ALTER TABLE alert_rules ENABLE ROW LEVEL SECURITY;
+ALTER TABLE metric_chunks ENABLE ROW LEVEL SECURITY;
 
 -- 1. USERS Policy
 CREATE POLICY client_isolation_users ON users
@@ -186,50 +391,35 @@ CREATE POLICY client_isolation_projects ON projects
     USING (client_id = get_current_client_id())
     WITH CHECK (client_id = get_current_client_id());
 
--- 3. ENVIRONMENTS Policy (via project_id)
+-- 3. ENVIRONMENTS Policy
 CREATE POLICY client_isolation_environments ON environments
     FOR ALL
-    USING (EXISTS (
-        SELECT 1 FROM projects p 
-        WHERE p.id = environments.project_id 
-        AND p.client_id = get_current_client_id()
-    ));
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
 
 -- 4. PIPELINES Policy
 CREATE POLICY client_isolation_pipelines ON pipelines
     FOR ALL
-    USING (EXISTS (
-        SELECT 1 FROM projects p 
-        WHERE p.id = pipelines.project_id 
-        AND p.client_id = get_current_client_id()
-    ));
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
 
 -- 5. DEPLOYMENTS Policy
 CREATE POLICY client_isolation_deployments ON deployments
     FOR ALL
-    USING (EXISTS (
-        SELECT 1 FROM projects p 
-        WHERE p.id = deployments.project_id 
-        AND p.client_id = get_current_client_id()
-    ));
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
 
 -- 6. ALERTS Policy
 CREATE POLICY client_isolation_alerts ON alerts
     FOR ALL
-    USING (EXISTS (
-        SELECT 1 FROM projects p 
-        WHERE p.id = alerts.project_id 
-        AND p.client_id = get_current_client_id()
-    ));
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
 
 -- 7. METRICS Policy
 CREATE POLICY client_isolation_metrics ON metrics
     FOR ALL
-    USING (EXISTS (
-        SELECT 1 FROM projects p 
-        WHERE p.id = metrics.project_id 
-        AND p.client_id = get_current_client_id()
-    ));
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
 
 -- 8. INVOICES Policy
 CREATE POLICY client_isolation_invoices ON invoices
@@ -241,6 +431,24 @@ CREATE POLICY client_isolation_audit_logs ON audit_logs
     FOR ALL
     USING (client_id = get_current_client_id());
 
+-- 10. PROJECT_FILES Policy
+CREATE POLICY client_isolation_project_files ON project_files
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+-- 11. ALERT_RULES Policy
+CREATE POLICY client_isolation_alert_rules ON alert_rules
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+-- 12. METRIC_CHUNKS Policy
+CREATE POLICY client_isolation_metric_chunks ON metric_chunks
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
 -- ==========================================
 -- CONFIGURATION EXAMPLE / USAGE
 -- ==========================================
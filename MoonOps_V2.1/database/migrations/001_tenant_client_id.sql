@@ -0,0 +1,112 @@
+-- ==========================================
+-- Migration 001 - client_id dénormalisé sur les tables filles de projects
+-- Pour une base créée avec une version antérieure de init.sql
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/001_tenant_client_id.sql
+-- ==========================================
+
+BEGIN;
+
+ALTER TABLE projects ADD CONSTRAINT projects_id_client_id_key UNIQUE (id, client_id);
+
+-- 1. Colonnes + remplissage depuis le projet parent
+ALTER TABLE environments ADD COLUMN client_id UUID;
+ALTER TABLE pipelines ADD COLUMN client_id UUID;
+ALTER TABLE deployments ADD COLUMN client_id UUID;
+ALTER TABLE alerts ADD COLUMN client_id UUID;
+ALTER TABLE metrics ADD COLUMN client_id UUID;
+
+UPDATE environments t SET client_id = p.client_id FROM projects p WHERE p.id = t.project_id;
+UPDATE pipelines t SET client_id = p.client_id FROM projects p WHERE p.id = t.project_id;
+UPDATE deployments t SET client_id = p.client_id FROM projects p WHERE p.id = t.project_id;
+UPDATE alerts t SET client_id = p.client_id FROM projects p WHERE p.id = t.project_id;
+UPDATE metrics t SET client_id = p.client_id FROM projects p WHERE p.id = t.project_id;
+
+ALTER TABLE environments ALTER COLUMN client_id SET NOT NULL;
+ALTER TABLE pipelines ALTER COLUMN client_id SET NOT NULL;
+ALTER TABLE deployments ALTER COLUMN client_id SET NOT NULL;
+ALTER TABLE alerts ALTER COLUMN client_id SET NOT NULL;
+ALTER TABLE metrics ALTER COLUMN client_id SET NOT NULL;
+
+-- 2. Clé étrangère composite à la place de la clé simple sur project_id
+ALTER TABLE environments DROP CONSTRAINT environments_project_id_fkey,
+    ADD CONSTRAINT environments_project_client_fkey FOREIGN KEY (project_id, client_id)
+        REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE;
+ALTER TABLE pipelines DROP CONSTRAINT pipelines_project_id_fkey,
+    ADD CONSTRAINT pipelines_project_client_fkey FOREIGN KEY (project_id, client_id)
+        REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE;
+ALTER TABLE deployments DROP CONSTRAINT deployments_project_id_fkey,
+    ADD CONSTRAINT deployments_project_client_fkey FOREIGN KEY (project_id, client_id)
+        REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE;
+ALTER TABLE alerts DROP CONSTRAINT alerts_project_id_fkey,
+    ADD CONSTRAINT alerts_project_client_fkey FOREIGN KEY (project_id, client_id)
+        REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE;
+ALTER TABLE metrics DROP CONSTRAINT metrics_project_id_fkey,
+    ADD CONSTRAINT metrics_project_client_fkey FOREIGN KEY (project_id, client_id)
+        REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- 3. Trigger de remplissage
+CREATE OR REPLACE FUNCTION set_client_id_from_project() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.client_id IS NULL
+       OR (TG_OP = 'UPDATE' AND NEW.project_id IS DISTINCT FROM OLD.project_id) THEN
+        SELECT p.client_id INTO NEW.client_id FROM projects p WHERE p.id = NEW.project_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_environments_client_id BEFORE INSERT OR UPDATE OF project_id ON environments
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_pipelines_client_id BEFORE INSERT OR UPDATE OF project_id ON pipelines
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_deployments_client_id BEFORE INSERT OR UPDATE OF project_id ON deployments
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_alerts_client_id BEFORE INSERT OR UPDATE OF project_id ON alerts
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+CREATE TRIGGER trg_metrics_client_id BEFORE INSERT OR UPDATE OF project_id ON metrics
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+
+-- 4. Politiques RLS en égalité directe
+DROP POLICY client_isolation_environments ON environments;
+DROP POLICY client_isolation_pipelines ON pipelines;
+DROP POLICY client_isolation_deployments ON deployments;
+DROP POLICY client_isolation_alerts ON alerts;
+DROP POLICY client_isolation_metrics ON metrics;
+
+CREATE POLICY client_isolation_environments ON environments
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+CREATE POLICY client_isolation_pipelines ON pipelines
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+CREATE POLICY client_isolation_deployments ON deployments
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+CREATE POLICY client_isolation_alerts ON alerts
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+CREATE POLICY client_isolation_metrics ON metrics
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+COMMIT;
+
+-- 5. Index couvrants (hors transaction pour ne pas bloquer les écritures)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_client_created ON projects(client_id, created_at DESC)
+    INCLUDE (status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_environments_client_id ON environments(client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deployments_client_deployed ON deployments(client_id, deployed_at DESC)
+    INCLUDE (project_id, environment_id, version_tag, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pipelines_client_started ON pipelines(client_id, started_at DESC)
+    INCLUDE (project_id, branch, status, finished_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_client_active_created ON alerts(client_id, created_at DESC)
+    INCLUDE (project_id, severity, message, resolved_at)
+    WHERE status = 'ACTIVE';
+
+VACUUM (ANALYZE) projects, environments, pipelines, deployments, alerts, metrics;
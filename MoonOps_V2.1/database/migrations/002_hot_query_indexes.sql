@@ -0,0 +1,55 @@
+-- ==========================================
+-- Migration 002 - Index des requêtes chaudes
+-- Index partiels/composites vérifiés par Script_test/test_query_plans.py
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/002_hot_query_indexes.sql
+-- ==========================================
+
+-- 1. Unicité (project_id, name) sur environments
+-- Les doublons éventuels (création concurrente par /api/deploy) sont fusionnés
+-- sur l'environnement le plus ancien avant de poser la contrainte.
+BEGIN;
+
+WITH ranked AS (
+    SELECT id, first_value(id) OVER (PARTITION BY project_id, name ORDER BY created_at, id) AS keep_id
+    FROM environments
+)
+UPDATE deployments d SET environment_id = r.keep_id
+FROM ranked r
+WHERE d.environment_id = r.id AND r.id <> r.keep_id;
+
+WITH ranked AS (
+    SELECT id, first_value(id) OVER (PARTITION BY project_id, name ORDER BY created_at, id) AS keep_id
+    FROM environments
+)
+DELETE FROM environments e USING ranked r
+WHERE e.id = r.id AND r.id <> r.keep_id;
+
+COMMIT;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS environments_project_id_name_key ON environments(project_id, name);
+-- Relançable: après le premier passage, l'index appartient déjà à la contrainte
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'environments'::regclass AND conname = 'environments_project_id_name_key'
+    ) THEN
+        ALTER TABLE environments ADD CONSTRAINT environments_project_id_name_key
+            UNIQUE USING INDEX environments_project_id_name_key;
+    END IF;
+END
+$$;
+
+-- 2. Nouveaux index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pipelines_project_started ON pipelines(project_id, started_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deployments_environment_id ON deployments(environment_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deployments_pipeline_id ON deployments(pipeline_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_active_created ON alerts(created_at DESC) WHERE status = 'ACTIVE';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deployments_deployed_at ON deployments(deployed_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pipelines_started_at ON pipelines(started_at DESC);
+
+-- 3. Index remplacé par idx_pipelines_project_started (même préfixe)
+DROP INDEX CONCURRENTLY IF EXISTS idx_pipelines_project_id;
+
+ANALYZE environments, pipelines, deployments, alerts;
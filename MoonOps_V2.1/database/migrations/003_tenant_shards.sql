@@ -0,0 +1,13 @@
+-- ==========================================
+-- Migration 003 - Carte des shards par tenant
+-- Lue par backend/sharding.py, modifiée par database/move_tenant.py
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/003_tenant_shards.sql
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS tenant_shards (
+    client_id UUID PRIMARY KEY REFERENCES clients(id) ON DELETE CASCADE,
+    shard VARCHAR(50) NOT NULL DEFAULT 'main',
+    state VARCHAR(20) NOT NULL DEFAULT 'active' CHECK (state IN ('active', 'moving')),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,33 @@
+-- ==========================================
+-- Migration 004 - Notifications d'invalidation du cache des résultats
+-- Écoutées par backend/result_cache.py (canal moonops_cache)
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/004_cache_notify.sql
+-- ==========================================
+
+CREATE OR REPLACE FUNCTION notify_tenant_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('moonops_cache', OLD.client_id::text);
+    ELSE
+        PERFORM pg_notify('moonops_cache', NEW.client_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_projects_cache ON projects;
+CREATE TRIGGER trg_projects_cache AFTER INSERT OR UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+DROP TRIGGER IF EXISTS trg_environments_cache ON environments;
+CREATE TRIGGER trg_environments_cache AFTER INSERT OR UPDATE OR DELETE ON environments
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+DROP TRIGGER IF EXISTS trg_pipelines_cache ON pipelines;
+CREATE TRIGGER trg_pipelines_cache AFTER INSERT OR UPDATE OR DELETE ON pipelines
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+DROP TRIGGER IF EXISTS trg_deployments_cache ON deployments;
+CREATE TRIGGER trg_deployments_cache AFTER INSERT OR UPDATE OR DELETE ON deployments
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
+DROP TRIGGER IF EXISTS trg_alerts_cache ON alerts;
+CREATE TRIGGER trg_alerts_cache AFTER INSERT OR UPDATE OR DELETE ON alerts
+    FOR EACH ROW EXECUTE FUNCTION notify_tenant_change();
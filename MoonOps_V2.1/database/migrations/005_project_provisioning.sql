@@ -0,0 +1,17 @@
+-- ==========================================
+-- Migration 005 - Provisionnement GitLab différé
+-- Projets créés pendant une panne GitLab (provisioning_state = 'PENDING'),
+-- terminés par le réconciliateur de l'API (backend/app.py)
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/005_project_provisioning.sql
+-- ==========================================
+
+ALTER TABLE projects
+    ADD COLUMN IF NOT EXISTS provisioning_state VARCHAR(20) NOT NULL DEFAULT 'READY'
+        CHECK (provisioning_state IN ('PENDING', 'READY', 'FAILED')),
+    ADD COLUMN IF NOT EXISTS provisioning_request JSONB,
+    ADD COLUMN IF NOT EXISTS provisioning_attempts INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS provisioning_error TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_projects_provisioning_pending ON projects(created_at)
+    WHERE provisioning_state = 'PENDING';
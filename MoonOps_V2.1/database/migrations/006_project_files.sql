@@ -0,0 +1,35 @@
+-- ==========================================
+-- Migration 006 - Manifeste des fichiers importés par projet
+-- Ré-upload incrémental (POST /api/projects/<id>/upload): seuls les fichiers
+-- dont l'empreinte change sont poussés vers GitLab
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/006_project_files.sql
+-- ==========================================
+
+BEGIN;
+
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS imported_commit CHAR(40);
+
+CREATE TABLE IF NOT EXISTS project_files (
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
+    path TEXT NOT NULL,
+    blob_sha CHAR(40) NOT NULL,
+    mode VARCHAR(6) NOT NULL DEFAULT '100644',
+    size BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, path),
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+DROP TRIGGER IF EXISTS trg_project_files_client_id ON project_files;
+CREATE TRIGGER trg_project_files_client_id BEFORE INSERT OR UPDATE OF project_id ON project_files
+    FOR EACH ROW EXECUTE FUNCTION set_client_id_from_project();
+
+ALTER TABLE project_files ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS client_isolation_project_files ON project_files;
+CREATE POLICY client_isolation_project_files ON project_files
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+COMMIT;
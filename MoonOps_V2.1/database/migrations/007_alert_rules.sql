@@ -0,0 +1,47 @@
+-- ==========================================
+-- Migration 007 - Règles du moteur d'alertes incrémental
+-- Les règles sont évaluées à l'ingestion des métriques (POST /api/metrics);
+-- alerts.rule_id relie une alerte à sa règle, une seule alerte non résolue
+-- par (règle, projet)
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/007_alert_rules.sql
+-- ==========================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
+    project_id UUID,
+    name TEXT NOT NULL,
+    metric_name TEXT NOT NULL,
+    kind VARCHAR(20) NOT NULL DEFAULT 'threshold' CHECK (kind IN ('threshold', 'rate', 'absence')),
+    aggregation VARCHAR(10) NOT NULL DEFAULT 'avg' CHECK (aggregation IN ('avg', 'max', 'min', 'last')),
+    comparator VARCHAR(2) NOT NULL DEFAULT '>' CHECK (comparator IN ('>', '>=', '<', '<=')),
+    threshold DOUBLE PRECISION NOT NULL DEFAULT 0,
+    clear_threshold DOUBLE PRECISION,
+    window_s INTEGER NOT NULL DEFAULT 60 CHECK (window_s > 0),
+    for_s INTEGER NOT NULL DEFAULT 0 CHECK (for_s >= 0),
+    severity alert_severity NOT NULL DEFAULT 'WARNING',
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS rule_id UUID;
+ALTER TABLE alerts DROP CONSTRAINT IF EXISTS alerts_rule_id_fkey;
+ALTER TABLE alerts ADD CONSTRAINT alerts_rule_id_fkey
+    FOREIGN KEY (rule_id) REFERENCES alert_rules(id) ON DELETE SET NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_rule_open ON alerts(rule_id, project_id)
+    WHERE rule_id IS NOT NULL AND status <> 'RESOLVED';
+CREATE INDEX IF NOT EXISTS idx_alert_rules_client_id ON alert_rules(client_id) WHERE enabled;
+
+ALTER TABLE alert_rules ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS client_isolation_alert_rules ON alert_rules;
+CREATE POLICY client_isolation_alert_rules ON alert_rules
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+COMMIT;
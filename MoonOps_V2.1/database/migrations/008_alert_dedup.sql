@@ -0,0 +1,39 @@
+-- ==========================================
+-- Migration 008 - Déduplication et regroupement des alertes
+-- Une alerte par problème (empreinte projet + règle + labels): les répétitions
+-- incrémentent occurrences et last_seen_at au lieu d'insérer des lignes.
+-- group_key regroupe les tempêtes (même règle sur plusieurs projets).
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/008_alert_dedup.sql
+-- ==========================================
+
+BEGIN;
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS fingerprint TEXT;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS labels JSONB NOT NULL DEFAULT '{}';
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS acknowledged_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS group_key TEXT
+    GENERATED ALWAYS AS (COALESCE('rule:' || rule_id::text, 'project:' || project_id::text)) STORED;
+
+-- Alertes existantes: dernière occurrence = création (pas d'empreinte, jamais fusionnées)
+UPDATE alerts SET last_seen_at = created_at WHERE last_seen_at IS NULL;
+ALTER TABLE alerts ALTER COLUMN last_seen_at SET DEFAULT CURRENT_TIMESTAMP;
+
+-- L'empreinte remplace l'unicité (règle, projet) de la migration 007
+DROP INDEX IF EXISTS idx_alerts_rule_open;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_fingerprint_open ON alerts(client_id, fingerprint)
+    WHERE fingerprint IS NOT NULL AND status <> 'RESOLVED';
+CREATE INDEX IF NOT EXISTS idx_alerts_fingerprint_resolved ON alerts(client_id, fingerprint, resolved_at DESC)
+    WHERE fingerprint IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_alerts_client_open_group ON alerts(client_id, group_key)
+    WHERE status <> 'RESOLVED';
+
+-- Liste des alertes actives triée par dernière occurrence
+DROP INDEX IF EXISTS idx_alerts_client_active_created;
+CREATE INDEX IF NOT EXISTS idx_alerts_client_active_seen ON alerts(client_id, last_seen_at DESC)
+    INCLUDE (project_id, severity, message, created_at, resolved_at, occurrences, group_key)
+    WHERE status = 'ACTIVE';
+
+COMMIT;
@@ -0,0 +1,40 @@
+-- ==========================================
+-- Migration 009 - Chunks compressés des métriques anciennes
+-- Les points de metrics plus anciens que MOONOPS_METRICS_COMPACT_AFTER_H sont
+-- déplacés par la compaction (backend/app.py) dans metric_chunks: une ligne par
+-- série et par tranche de temps, encodage Gorilla (backend/metric_chunks.py).
+-- Les noms de métriques sont remplacés par un id (metric_names).
+--
+-- psql -h localhost -U moonops_app -d moonops_appdb -f database/migrations/009_metric_chunks.sql
+-- ==========================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS metric_names (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS metric_chunks (
+    project_id UUID NOT NULL,
+    client_id UUID NOT NULL,
+    metric_id INTEGER NOT NULL REFERENCES metric_names(id),
+    start_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    end_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    points INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (project_id, metric_id, start_at),
+    FOREIGN KEY (project_id, client_id) REFERENCES projects(id, client_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+ALTER TABLE metric_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
+
+CREATE INDEX IF NOT EXISTS idx_metric_chunks_project_end ON metric_chunks(project_id, end_at);
+
+ALTER TABLE metric_chunks ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS client_isolation_metric_chunks ON metric_chunks;
+CREATE POLICY client_isolation_metric_chunks ON metric_chunks
+    FOR ALL
+    USING (client_id = get_current_client_id())
+    WITH CHECK (client_id = get_current_client_id());
+
+COMMIT;
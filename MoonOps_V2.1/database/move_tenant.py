@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Déplacement en ligne d'un tenant MoonOps entre deux shards
+
+Les shards sont ceux de l'API (MOONOPS_SHARDS, voir backend/sharding.py).
+Le tenant reste disponible pendant la copie:
+
+1. Copie initiale (en ligne): clients/users, projets et tables filles. Les
+   grosses tables en ajout seul (metrics, deployments) sont copiées jusqu'à un
+   filigrane.
+2. Gel court: tenant_shards.state = 'moving'. L'API refuse alors les écritures
+   du tenant (HTTP 503), les lectures continuent sur l'ancien shard. On copie
+   le delta (lignes après le filigrane, tables modifiables remises à jour),
+   on vérifie les comptes, puis on bascule la carte vers le nouveau shard.
+3. Nettoyage: suppression par lots des données du tenant sur l'ancien shard,
+   une fois les caches de carte des workers expirés.
+
+Usage:
+    python database/move_tenant.py --client <uuid> --to shard-2
+    python database/move_tenant.py --client <uuid> --to main --keep-source
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from config import DB_CONFIG  # noqa: E402
+from metric_chunks import COMPACTION_LOCK_ID  # noqa: E402
+from sharding import SHARD_MAP_TTL_S, ShardSet  # noqa: E402
+
+# Tables du tenant dans l'ordre des clés étrangères.
+# (table, clé de conflit, colonne de filigrane pour les tables en ajout seul)
+TENANT_TABLES = [
+    ('projects', 'id', None),
+    ('environments', 'id', None),
+    ('pipelines', 'id', None),
+    ('deployments', 'id', 'deployed_at'),
+    ('alert_rules', 'id', None),  # Avant alerts (alerts.rule_id)
+    ('alerts', 'id', None),
+    ('metrics', None, 'id'),  # BIGSERIAL: réattribué par le shard cible
+    ('metric_chunks', 'project_id, metric_id, start_at', None),  # metric_id réattribué (copy_metric_chunks)
+    ('invoices', 'id', None),
+    ('project_files', 'project_id, path', None),
+]
+BATCH_SIZE = 10000
+# Marge pour les déploiements insérés juste avant le filigrane (horloge de transaction)
+WATERMARK_MARGIN = "INTERVAL '1 minute'"
+# Filigrane de metrics et transactions en cours dans l'instantané de la copie initiale:
+# les ids BIGSERIAL ne sont pas attribués dans l'ordre des commits, une ligne d'id <= MAX(id)
+# validée après l'instantané appartient à l'une de ces transactions (xid 32 bits de xmin;
+# l'ingestion n'utilise pas de sous-transactions, absentes de la liste)
+METRICS_WATERMARK_SQL = """
+    SELECT (SELECT COALESCE(MAX(id), 0) FROM metrics WHERE client_id = %s),
+           ARRAY(SELECT (xid::text::bigint %% 4294967296) FROM pg_snapshot_xip(pg_current_snapshot()) AS xid)
+"""
+
+
+def columns_of(conn, table, skip=()):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            AND is_generated = 'NEVER'  -- Colonnes générées (alerts.group_key) recalculées par la cible
+            ORDER BY ordinal_position
+        """, (table,))
+        return [row[0] for row in cur.fetchall() if row[0] not in skip]
+
+
+def stream_rows(conn, query, params):
+    """Lecture par lots via un curseur serveur (pas de chargement complet en mémoire)"""
+    with conn.cursor(name=f"move_{time.monotonic_ns()}") as cur:
+        cur.itersize = BATCH_SIZE
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(BATCH_SIZE)
+            if not rows:
+                return
+            yield rows
+
+
+def copy_rows(source, target, table, where, params, conflict_key, update=False):
+    """Copie SELECT ... WHERE <where> de source vers target; retourne le nombre de lignes"""
+    skip = ('id',) if conflict_key is None else ()
+    cols = columns_of(source, table, skip)
+    col_list = ', '.join(cols)
+    if conflict_key is None:
+        on_conflict = ''
+    elif update:
+        assignments = ', '.join(f"{c} = EXCLUDED.{c}" for c in cols if c != conflict_key)
+        on_conflict = f" ON CONFLICT ({conflict_key}) DO UPDATE SET {assignments}"
+    else:
+        on_conflict = f" ON CONFLICT ({conflict_key}) DO NOTHING"
+
+    copied = 0
+    with target.cursor() as cur:
+        for rows in stream_rows(source, f"SELECT {col_list} FROM {table} WHERE {where}", params):
+            execute_values(cur, f"INSERT INTO {table} ({col_list}) VALUES %s{on_conflict}", rows,
+                           page_size=1000)
+            copied += len(rows)
+    return copied
+
+
+def copy_metric_chunks(source, target, where, params, update=False):
+    """Comme copy_rows pour metric_chunks: les ids de metric_names sont propres à chaque
+    shard, les noms sont ajoutés au dictionnaire cible et metric_id réattribué"""
+    with source.cursor() as cur:
+        cur.execute(f"SELECT id, name FROM metric_names WHERE id IN (SELECT metric_id FROM metric_chunks WHERE {where})",
+                    params)
+        source_names = dict(cur.fetchall())
+    if not source_names:
+        return 0
+    with target.cursor() as cur:
+        execute_values(cur, "INSERT INTO metric_names (name) VALUES %s ON CONFLICT (name) DO NOTHING",
+                       [(name,) for name in source_names.values()])
+        cur.execute("SELECT name, id FROM metric_names WHERE name = ANY(%s)", (list(source_names.values()),))
+        target_ids = dict(cur.fetchall())
+    remap = {source_id: target_ids[name] for source_id, name in source_names.items()}
+
+    cols = "project_id, client_id, metric_id, start_at, end_at, points, data"
+    if update:
+        on_conflict = " DO UPDATE SET end_at = EXCLUDED.end_at, points = EXCLUDED.points, data = EXCLUDED.data"
+    else:
+        on_conflict = " DO NOTHING"
+    copied = 0
+    with target.cursor() as cur:
+        for rows in stream_rows(source, f"SELECT {cols} FROM metric_chunks WHERE {where}", params):
+            rows = [row[:2] + (remap[row[2]],) + row[3:] for row in rows]
+            execute_values(cur, f"INSERT INTO metric_chunks ({cols}) VALUES %s "
+                                f"ON CONFLICT (project_id, metric_id, start_at){on_conflict}", rows, page_size=1000)
+            copied += len(rows)
+    return copied
+
+
+def copy_table(source, target, table, where, params, conflict_key, update=False):
+    if table == 'metric_chunks':
+        return copy_metric_chunks(source, target, where, params, update)
+    return copy_rows(source, target, table, where, params, conflict_key, update)
+
+
+def scalar(conn, query, params=()):
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchone()[0]
+
+
+def count_rows(conn, client_id):
+    return {table: scalar(conn, f"SELECT COUNT(*) FROM {table} WHERE client_id = %s", (client_id,))
+            for table, _, _ in TENANT_TABLES}
+
+
+def delete_tenant(conn, client_id, label):
+    """Suppression par lots (métriques d'abord), puis cascade depuis projects"""
+    deleted = 0
+    with conn.cursor() as cur:
+        while True:
+            cur.execute("""
+                DELETE FROM metrics WHERE id IN (
+                    SELECT id FROM metrics WHERE client_id = %s LIMIT %s
+                )
+            """, (client_id, BATCH_SIZE * 5))
+            conn.commit()
+            deleted += cur.rowcount
+            if cur.rowcount == 0:
+                break
+        cur.execute("DELETE FROM invoices WHERE client_id = %s", (client_id,))
+        cur.execute("DELETE FROM alert_rules WHERE client_id = %s", (client_id,))  # Règles sans projet
+        cur.execute("DELETE FROM projects WHERE client_id = %s", (client_id,))
+        conn.commit()
+    print(f"🗑️ Données du tenant supprimées sur {label} ({deleted} points de métriques)")
+
+
+def set_state(catalog, client_id, shard, state):
+    with catalog.cursor() as cur:
+        cur.execute("""
+            INSERT INTO tenant_shards (client_id, shard, state, updated_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (client_id) DO UPDATE
+            SET shard = EXCLUDED.shard, state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+        """, (client_id, shard, state))
+    catalog.commit()
+
+
+def connect(router):
+    return psycopg2.connect(**router.primary.config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Déplacement en ligne d'un tenant entre shards")
+    parser.add_argument('--client', required=True, help="client_id du tenant")
+    parser.add_argument('--to', required=True, help="Shard cible (nom de MOONOPS_SHARDS ou 'main')")
+    parser.add_argument('--keep-source', action='store_true', help="Ne pas supprimer les données source")
+    parser.add_argument('--freeze-wait', type=float, default=SHARD_MAP_TTL_S + 2,
+                        help="Attente (s) pour que tous les workers voient le gel / la bascule")
+    args = parser.parse_args()
+
+    shards = ShardSet.from_env(DB_CONFIG)
+    if args.to not in shards.routers:
+        print(f"❌ Shard inconnu: {args.to} (disponibles: {', '.join(shards.routers)})")
+        return False
+    shards.refresh()
+    source_name = shards.shard_of(args.client)
+    if source_name == args.to:
+        print(f"ℹ️ Le tenant est déjà sur {args.to}")
+        return True
+
+    catalog = connect(shards.catalog)
+    source = connect(shards.routers[source_name])
+    target = connect(shards.routers[args.to])
+    client_id = args.client
+
+    print("🚚 Déplacement de tenant MoonOps")
+    print("=" * 50)
+    print(f"👤 {client_id}: {source_name} → {args.to}")
+
+    # Pas de compaction des métriques (lignes de metrics -> metric_chunks) pendant le
+    # déplacement: verrou des compacteurs des workers, tenu jusqu'à la fermeture des connexions
+    for conn in (source, target):
+        scalar(conn, "SELECT pg_advisory_lock(%s)", (COMPACTION_LOCK_ID,))
+        conn.commit()
+
+    # 0. Cible propre (reprise après un essai interrompu), clients/users depuis le catalogue
+    delete_tenant(target, client_id, args.to)
+    copy_rows(catalog, target, 'clients', "id = %s", (client_id,), 'id', update=True)
+    copy_rows(catalog, target, 'users', "client_id = %s", (client_id,), 'id', update=True)
+    target.commit()
+
+    # 1. Copie initiale, en ligne, dans un seul instantané de la source (filigranes compris)
+    started = time.perf_counter()
+    source.set_session(isolation_level='REPEATABLE READ')
+    with source.cursor() as cur:
+        cur.execute(METRICS_WATERMARK_SQL, (client_id,))
+        metrics_watermark, in_progress = cur.fetchone()
+    watermarks = {
+        'deployed_at': scalar(source, "SELECT CURRENT_TIMESTAMP - " + WATERMARK_MARGIN),
+        'id': metrics_watermark,
+    }
+    for table, key, watermark in TENANT_TABLES:
+        if watermark:
+            where, params = f"client_id = %s AND {watermark} <= %s", (client_id, watermarks[watermark])
+        else:
+            where, params = "client_id = %s", (client_id,)
+        copied = copy_table(source, target, table, where, params, key)
+        target.commit()
+        print(f"   📦 {table}: {copied} lignes")
+    source.commit()
+    source.set_session(isolation_level='DEFAULT')
+    print(f"✅ Copie initiale en {time.perf_counter() - started:.1f}s")
+
+    # 2. Gel des écritures, delta, vérification, bascule
+    set_state(catalog, client_id, source_name, 'moving')
+    print(f"🧊 Écritures gelées, attente {args.freeze_wait:.0f}s (propagation de la carte)")
+    time.sleep(args.freeze_wait)
+    frozen_at = time.perf_counter()
+    try:
+        for table, key, watermark in TENANT_TABLES:
+            if watermark == 'id':
+                # Après le filigrane, plus les lignes validées après l'instantané avec un id inférieur
+                where = ("client_id = %s AND (id > %s OR xmin::text::bigint = ANY(%s::bigint[]))")
+                params = (client_id, watermarks['id'], in_progress)
+                copied = copy_table(source, target, table, where, params, key)
+            elif watermark:
+                where, params = f"client_id = %s AND {watermark} > %s", (client_id, watermarks[watermark])
+                copied = copy_table(source, target, table, where, params, key)
+            else:
+                copied = copy_table(source, target, table, "client_id = %s", (client_id,), key, update=True)
+            print(f"   🔄 {table}: {copied} lignes (delta)")
+        # Projets supprimés pendant la copie initiale (cascade sur les tables filles)
+        source_projects = [row[0] for rows in stream_rows(
+            source, "SELECT id FROM projects WHERE client_id = %s", (client_id,)) for row in rows]
+        with target.cursor() as cur:
+            cur.execute("DELETE FROM projects WHERE client_id = %s AND NOT (id = ANY(%s::uuid[]))",
+                        (client_id, source_projects))
+        source.commit()
+
+        source_counts, target_counts = count_rows(source, client_id), count_rows(target, client_id)
+        source.commit()
+        if source_counts != target_counts:
+            raise RuntimeError(f"comptes différents: source {source_counts}, cible {target_counts}")
+        target.commit()
+        set_state(catalog, client_id, args.to, 'active')
+    except Exception as e:
+        target.rollback()
+        set_state(catalog, client_id, source_name, 'active')
+        print(f"❌ Déplacement annulé, tenant réactivé sur {source_name}: {e}")
+        return False
+    print(f"✅ Bascule vers {args.to} (gel de {time.perf_counter() - frozen_at + args.freeze_wait:.1f}s)")
+
+    # 3. Nettoyage de l'ancien shard, après expiration des caches de carte
+    if not args.keep_source:
+        time.sleep(args.freeze_wait)
+        delete_tenant(source, client_id, source_name)
+
+    for conn in (catalog, source, target):
+        conn.close()
+    print("🎉 Tenant déplacé")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
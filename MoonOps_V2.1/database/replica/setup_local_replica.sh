@@ -0,0 +1,58 @@
+#!/usr/bin/env bash
+# ==========================================
+# Réplica en streaming local pour tester le routage des lectures
+# (backend/db_router.py, MOONOPS_DB_REPLICAS)
+#
+# Crée une copie du primaire local (pg_basebackup -R) dans $REPLICA_DIR
+# et la démarre en hot standby sur $REPLICA_PORT.
+#
+#   sudo -u postgres ./database/replica/setup_local_replica.sh
+#   MOONOPS_DB_REPLICAS=127.0.0.1:5433 python backend/app.py
+# ==========================================
+set -euo pipefail
+
+PRIMARY_HOST=${PRIMARY_HOST:-127.0.0.1}
+PRIMARY_PORT=${PRIMARY_PORT:-5432}
+REPLICA_PORT=${REPLICA_PORT:-5433}
+REPLICA_DIR=${REPLICA_DIR:-/tmp/moonops_replica}
+REPLICATION_USER=${REPLICATION_USER:-moonops_replicator}
+REPLICATION_PASSWORD=${REPLICATION_PASSWORD:-moonops_replica_2026!}
+PG_BIN=${PG_BIN:-$(dirname "$(command -v pg_ctl || ls /usr/lib/postgresql/*/bin/pg_ctl | tail -1)")}
+
+echo "🔁 Réplica local: ${PRIMARY_HOST}:${PRIMARY_PORT} -> 127.0.0.1:${REPLICA_PORT} (${REPLICA_DIR})"
+
+# 1. Rôle de réplication et slot sur le primaire (idempotent)
+psql -h "$PRIMARY_HOST" -p "$PRIMARY_PORT" -d postgres -v ON_ERROR_STOP=1 <<SQL
+DO \$\$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '${REPLICATION_USER}') THEN
+        CREATE ROLE ${REPLICATION_USER} WITH REPLICATION LOGIN PASSWORD '${REPLICATION_PASSWORD}';
+    END IF;
+END
+\$\$;
+SELECT pg_create_physical_replication_slot('moonops_local_replica')
+WHERE NOT EXISTS (SELECT 1 FROM pg_replication_slots WHERE slot_name = 'moonops_local_replica');
+SQL
+
+echo "ℹ️ pg_hba.conf du primaire: autoriser 'host replication ${REPLICATION_USER} 127.0.0.1/32 scram-sha-256'"
+
+# 2. Copie de base + standby.signal / primary_conninfo (-R)
+if [ -d "$REPLICA_DIR" ]; then
+    "$PG_BIN/pg_ctl" -D "$REPLICA_DIR" stop -m fast >/dev/null 2>&1 || true
+    rm -rf "$REPLICA_DIR"
+fi
+PGPASSWORD="$REPLICATION_PASSWORD" "$PG_BIN/pg_basebackup" \
+    -h "$PRIMARY_HOST" -p "$PRIMARY_PORT" -U "$REPLICATION_USER" \
+    -D "$REPLICA_DIR" -R -X stream -S moonops_local_replica -P
+chmod 700 "$REPLICA_DIR"
+
+# 3. Démarrage en hot standby sur un autre port
+cat >> "$REPLICA_DIR/postgresql.auto.conf" <<CONF
+port = ${REPLICA_PORT}
+hot_standby = on
+hot_standby_feedback = on
+CONF
+"$PG_BIN/pg_ctl" -D "$REPLICA_DIR" -l "$REPLICA_DIR/replica.log" start
+
+psql -h 127.0.0.1 -p "$REPLICA_PORT" -d postgres -Atc \
+    "SELECT '✅ Réplica prêt, en recovery: ' || pg_is_in_recovery() || ', LSN rejoué: ' || pg_last_wal_replay_lsn()"
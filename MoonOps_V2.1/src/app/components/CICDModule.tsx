@@ -125,51 +125,40 @@ export function CICDModule() {
 
   const loadAllData = async () => {
     setIsLoading(true);
-    await Promise.all([
-      loadProjects(),
-      loadDeployments()
-    ]);
-    setIsLoading(false);
-  };
-
-  const loadProjects = async () => {
     try {
-      const response = await fetch('http://localhost:5000/api/projects');
+      // Projets et déploiements en une seule requête
+      const response = await fetch('http://localhost:5000/api/dashboard?include=projects,deployments');
       const data = await response.json();
-      setProjects(data);
-      
-      if (data.length > 0) {
-        setSelectedProjectId(data[0].id);
-        
-        // Générer les pipelines basés sur les vrais projets
-        const generatedPipelines: Pipeline[] = data.slice(0, 10).map((p: Project) => ({
-          id: p.id,
-          project_name: p.name,
-          branch: 'main',
-          status: p.status === 'ACTIVE' ? 'success' : p.status === 'PENDING' ? 'pending' : 'running',
-          stages: generateStages(p.status),
-          commit: `Dernier commit`,
-          time: p.last_deployed_at 
-            ? new Date(p.last_deployed_at).toLocaleString('fr-FR', { dateStyle: 'short', timeStyle: 'short' })
-            : 'En attente',
-          progress: p.status === 'PENDING' ? 0 : p.status === 'ACTIVE' ? 100 : 65,
-          template_type: p.template_type
-        }));
-        setPipelines(generatedPipelines);
-      }
+      applyProjects(data.projects || []);
+      setDeployments(data.deployments || []);
     } catch (err) {
-      console.error('Erreur chargement projets:', err);
+      console.error('Erreur chargement CI/CD:', err);
       toast.error('Impossible de charger les projets');
     }
+    setIsLoading(false);
   };
 
-  const loadDeployments = async () => {
-    try {
-      const response = await fetch('http://localhost:5000/api/deployments');
-      const data = await response.json();
-      setDeployments(data);
-    } catch (err) {
-      console.error('Erreur chargement déploiements:', err);
+  const applyProjects = (data: Project[]) => {
+    setProjects(data);
+    
+    if (data.length > 0) {
+      setSelectedProjectId(data[0].id);
+      
+      // Générer les pipelines basés sur les vrais projets
+      const generatedPipelines: Pipeline[] = data.slice(0, 10).map((p: Project) => ({
+        id: p.id,
+        project_name: p.name,
+        branch: 'main',
+        status: p.status === 'ACTIVE' ? 'success' : p.status === 'PENDING' ? 'pending' : 'running',
+        stages: generateStages(p.status),
+        commit: `Dernier commit`,
+        time: p.last_deployed_at 
+          ? new Date(p.last_deployed_at).toLocaleString('fr-FR', { dateStyle: 'short', timeStyle: 'short' })
+          : 'En attente',
+        progress: p.status === 'PENDING' ? 0 : p.status === 'ACTIVE' ? 100 : 65,
+        template_type: p.template_type
+      }));
+      setPipelines(generatedPipelines);
     }
   };
 
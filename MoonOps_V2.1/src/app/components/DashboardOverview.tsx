@@ -92,16 +92,12 @@ export function DashboardOverview() {
 
   const loadDashboardData = async () => {
     try {
-      const [statsRes, projectsRes] = await Promise.all([
-        fetch('http://localhost:5000/api/stats'),
-        fetch('http://localhost:5000/api/projects')
-      ]);
-      
-      const statsData = await statsRes.json();
-      const projectsData = await projectsRes.json();
-      
-      setStats(statsData);
-      setProjects(projectsData);
+      // Une seule requête: stats et projets chargés en parallèle côté serveur
+      const response = await fetch('http://localhost:5000/api/dashboard?include=stats,projects');
+      const data = await response.json();
+
+      if (data.stats) setStats(data.stats);
+      setProjects(data.projects || []);
       setIsLoading(false);
     } catch (err) {
       console.error('Erreur chargement dashboard:', err);
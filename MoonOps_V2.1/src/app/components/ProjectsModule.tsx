@@ -198,11 +198,7 @@ export function ProjectsModule() {
       return;
     }
 
-    // Vérifier qu'il y a au moins une source (Git OU ZIP)
-    if (!gitUrl && !projectFile) {
-      toast.error('Veuillez fournir une URL Git OU un fichier ZIP');
-      return;
-    }
+    // Sans URL Git ni ZIP, le backend pousse le code de départ du modèle choisi
 
     setIsLoading(true);
     try {
@@ -421,7 +417,7 @@ export function ProjectsModule() {
                   <div className="space-y-6">
                     <div>
                       <h3 className="text-xl font-bold text-slate-900 mb-2">Source du code</h3>
-                      <p className="text-sm text-slate-500">Fournissez l'URL Git ou uploadez une archive ZIP</p>
+                      <p className="text-sm text-slate-500">Fournissez l'URL Git ou uploadez une archive ZIP (sinon, code de départ du modèle)</p>
                     </div>
 
                     <div className="space-y-2">
@@ -515,6 +511,7 @@ export function ProjectsModule() {
                         <div className="flex items-center gap-2">
                           {gitUrl && <Badge variant="outline"><Github className="w-3 h-3 mr-1" />Git</Badge>}
                           {projectFile && <Badge variant="outline"><FileArchive className="w-3 h-3 mr-1" />ZIP</Badge>}
+                          {!gitUrl && !projectFile && <Badge variant="outline">Modèle</Badge>}
                         </div>
                       </div>
                     </div>
@@ -538,7 +535,7 @@ export function ProjectsModule() {
                       handleCreateProject();
                     } else if (wizardStep === 1 && projectName && selectedTemplate) {
                       setWizardStep(2);
-                    } else if (wizardStep === 2 && (gitUrl || projectFile)) {
+                    } else if (wizardStep === 2) {
                       setWizardStep(3);
                     } else {
                       toast.error('Veuillez remplir tous les champs requis');
@@ -546,7 +543,6 @@ export function ProjectsModule() {
                   }}
                   disabled={
                     (wizardStep === 1 && (!projectName || !selectedTemplate)) ||
-                    (wizardStep === 2 && !gitUrl && !projectFile) ||
                     (wizardStep === 3 && isLoading)
                   }
                   className="bg-blue-600 hover:bg-blue-700 text-white rounded-lg px-6"